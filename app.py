@@ -8,21 +8,64 @@ import time
 import re
 import csv
 import sqlite3
+import hashlib
+import random
 from datetime import datetime, timedelta
 
 # 注册分析API蓝图
 from routes.analytics_api import analytics_bp
-from flask import Flask, render_template, request, jsonify, send_file, send_from_directory, redirect, url_for, session
+from flask import Flask, render_template, request, jsonify, send_file, send_from_directory, redirect, url_for, session, Response, stream_with_context
 from werkzeug.utils import secure_filename
 # Removed google.generativeai import as we're using direct API calls
-from typing import Dict, Any, List, Optional, Tuple
+from typing import Dict, Any, List, Optional, Tuple, Callable, Awaitable
 import unicodedata
 import threading
+import logging
 from utils.env_manager import env_manager
-from config import GEMINI_MAX_OUTPUT_TOKENS, GEMINI_CONCURRENT_REQUESTS
+from utils.task_state import TaskStatus, create_task_state_store
+from utils.task_events import TaskEventHub
+from utils import job_queue
+from utils.cancellation import PAUSED, TaskCancelledError, get_task_token, run_cancellable
+from utils.credential_vault import open_credentials, public_task, seal_credentials
+from utils.rate_limiter import gemini_rate_limiter
+from utils.eval_prompt import CompiledEvalPrompt
+from utils.judge_batching import (
+    AdaptiveBatchSizer, JUDGE_BATCH_WAIT_SECONDS, batch_key, build_batch_eval_prompt, split_batch_results
+)
+from utils.token_budget import (
+    BUDGET_PERIODS, BUDGET_SCOPES, BudgetGuard, check_project_access, check_token_budget, get_budget_status, period_start
+)
+from utils.sequential_sampling import SequentialSampler, STOP_BUDGET, STOP_EXHAUSTED
+from utils.prompt_budget import PromptBudgeter, judge_output_tokens
+from utils.judge_schema import (
+    build_batch_response_schema, build_response_schema, build_retry_prompt, load_fenced_json_object,
+    load_json_object, model_keys, validate_judge_result
+)
+from config import (
+    GEMINI_MAX_OUTPUT_TOKENS, GEMINI_CONCURRENT_REQUESTS, EVALUATION_PIPELINE_MODE,
+    JUDGE_CACHE_ENABLED, JUDGE_CACHE_TTL_DAYS, JUDGE_CACHE_MAX_ENTRIES,
+    TASK_STATE_BACKEND, TASK_STATE_DB_PATH, TASK_STATE_FLUSH_INTERVAL,
+    EVALUATION_EXECUTOR, EVALUATION_WORKER_SLOTS, EVALUATION_MAX_RUNNING_JOBS,
+    EVALUATION_MAX_JOBS_PER_USER, EVALUATION_HEARTBEAT_TIMEOUT, EVALUATION_CONTROL_POLL_INTERVAL,
+    JUDGE_BATCH_MODE, JUDGE_BATCH_MAX_SIZE, JUDGE_STRUCTURED_OUTPUT, JUDGE_SCHEMA_RETRIES,
+    MODEL_HEDGE_ENABLED, SEQUENTIAL_SAMPLING_ENABLED, SEQUENTIAL_ROUND_SIZE, SEQUENTIAL_MIN_QUESTIONS,
+    SEQUENTIAL_MAX_QUESTIONS, SEQUENTIAL_CONFIDENCE, SEQUENTIAL_TARGET_HALF_WIDTH,
+    JUDGE_PROMPT_MAX_TOKENS, JUDGE_ANSWER_TRUNCATION, JUDGE_MIN_ANSWER_TOKENS,
+    JUDGE_OUTPUT_TOKENS_BASE, JUDGE_OUTPUT_TOKENS_PER_MODEL
+)
 
 # 导入新的模型客户端
 from models.model_factory import model_factory
+from models.judge_pool import judge_pool
+from models.answer_store import AnswerStore
+from models.stream_reader import stream_stats
+from models.telemetry import CallRecord, CallTelemetry
+from models.hedging import HedgeStats
+from models.judge_keys import judge_key_pool
+from utils.logger import get_logger, get_logging_stats, log_payload, set_log_task
+
+logger = get_logger('app')
+verbose_logger = get_logger('app.verbose')  # 详细日志（提示词/响应内容），受详细日志开关控制
 
 def secure_chinese_filename(filename):
     """
@@ -72,7 +115,7 @@ def secure_chinese_filename(filename):
     return safe_filename
 
 # 🔧 加载.env文件中的环境变量
-print("🔧 加载环境变量...")
+logger.info("🔧 加载环境变量...")
 env_vars = env_manager.load_env()
 if env_vars:
     # 设置环境变量到当前进程
@@ -80,13 +123,13 @@ if env_vars:
         os.environ[key] = value
     api_keys = [k for k in env_vars.keys() if 'API_KEY' in k]
     if api_keys:
-        print(f"✅ 从.env文件加载了 {len(api_keys)} 个API密钥")
+        logger.info(f"✅ 从.env文件加载了 {len(api_keys)} 个API密钥")
         for key in api_keys:
-            print(f"   - {key}: ****")
+            logger.info(f"   - {key}: ****")
     else:
-        print(f"📄 从.env文件加载了 {len(env_vars)} 个配置项")
+        logger.info(f"📄 从.env文件加载了 {len(env_vars)} 个配置项")
 else:
-    print("📄 未找到.env文件或文件为空，将使用系统环境变量")
+    logger.info("📄 未找到.env文件或文件为空，将使用系统环境变量")
 
 # 导入新的历史管理和标注模块
 try:
@@ -94,7 +137,7 @@ try:
     from history_manager import history_manager
     from utils.advanced_analytics import analytics
 except ImportError as e:
-    print(f"警告: 无法导入高级功能模块: {e}")
+    logger.info(f"警告: 无法导入高级功能模块: {e}")
     db = None
     history_manager = None
     analytics = None
@@ -119,9 +162,9 @@ for folder in [app.config['UPLOAD_FOLDER'], app.config['RESULTS_FOLDER'], app.co
 MODEL_NAME = "gemini-2.5-flash"
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 if GOOGLE_API_KEY:
-    print(f"✅ Gemini配置成功: {MODEL_NAME}")
+    logger.info(f"✅ Gemini配置成功: {MODEL_NAME}")
 else:
-    print("⚠️ 未配置GOOGLE_API_KEY")
+    logger.warning("⚠️ 未配置GOOGLE_API_KEY")
 
 # 日志开关配置 - 支持环境变量和数据库配置
 def get_verbose_logging_status():
@@ -138,42 +181,92 @@ def get_verbose_logging_status():
 
 ENABLE_VERBOSE_LOGGING = get_verbose_logging_status()
 if ENABLE_VERBOSE_LOGGING:
-    print("🔍 详细日志已启用")
+    logger.info("🔍 详细日志已启用")
 else:
-    print("🔕 详细日志已禁用")
-
-def log_verbose(*args, **kwargs):
-    """详细日志输出函数，受开关控制，每次调用时动态检查配置"""
-    # 每次调用时重新检查配置状态
-    current_status = get_verbose_logging_status()
-    if current_status:
-        print(*args, **kwargs)
-
-# 全局任务状态管理
-task_status = {}
-
-class TaskStatus:
-    def __init__(self, task_id):
-        self.task_id = task_id
-        self.status = "待开始"
-        self.progress = 0
-        self.total = 0
-        self.current_step = ""
-        self.result_file = ""
-        self.error_message = ""
-        self.evaluation_mode = ""
-        self.selected_models = []
-        self.start_time = datetime.now()
-        self.end_time = None
-        self.question_count = 0
+    logger.info("🔕 详细日志已禁用")
+
+def log_verbose(label: str, body=None):
+    """详细日志：受详细日志开关控制（配置已缓存，每次调用不查询数据库），
+    提示词/响应等大段内容按任务抽样并截断，通过日志队列异步输出"""
+    if not get_verbose_logging_status():
+        return
+    if body is None:
+        verbose_logger.info(label)
+    else:
+        log_payload(verbose_logger, label, body, level=logging.INFO)
+
+# 全局任务状态管理（多worker共享，进度变化由后台线程批量同步）
+task_status = create_task_state_store(TASK_STATE_BACKEND, TASK_STATE_DB_PATH, TASK_STATE_FLUSH_INTERVAL)
+
+def sync_running_task_progress(snapshots: List[Dict]):
+    """任务状态批量同步后，顺带把运行中任务的进度写入 running_tasks 表"""
+    rows = [
+        (snapshot['progress'], snapshot['current_step'], snapshot['task_id'])
+        for snapshot in snapshots
+        if snapshot.get('status') not in ('完成', '失败')
+    ]
+    if rows:
+        db.update_tasks_progress(rows)
+
+task_status.add_flush_listener(sync_running_task_progress)
+
+# 进度事件中心（SSE推送）
+task_events = TaskEventHub(task_status)
+
+# 评测任务调度器（embedded 模式下每个Web进程内置一个；worker 模式由 eval_worker.py 创建）
+evaluation_scheduler = None
 
 # 流式响应解析现在由各自的客户端模块处理
 
 # 模型答案获取现在由 model_factory 统一处理
 
-async def get_multiple_model_answers(queries: List[str], selected_models: List[str], task_id: str, request_headers: dict = None) -> Dict[str, List[str]]:
+async def get_multiple_model_answers(queries: List[str], selected_models: List[str], task_id: str, request_headers: dict = None,
+                                     answer_store: AnswerStore = None, telemetry: CallTelemetry = None,
+                                     indices: List[int] = None, hedge_stats: HedgeStats = None) -> Dict[str, List[str]]:
     """获取多个模型的答案"""
-    return await model_factory.get_multiple_model_answers(queries, selected_models, task_id, task_status, request_headers)
+    return await model_factory.get_multiple_model_answers(queries, selected_models, task_id, task_status, request_headers,
+                                                          answer_store=answer_store, telemetry=telemetry,
+                                                          indices=indices, hedge_stats=hedge_stats)
+
+def user_can_access_result(result: Dict, user_id: str) -> bool:
+    """权限检查：普通用户只能访问自己的结果，管理员可以访问全部结果"""
+    if result.get('created_by') == user_id:
+        return True
+    user = db.get_user_by_id(user_id)
+    return bool(user and user['role'] == 'admin')
+
+def load_answers_from_result(result_id: str, selected_models: List[str], user_id: str) -> Dict[str, Dict[str, str]]:
+    """从历史评测结果中读取各模型答案，返回 {模型名: {问题: 答案}}，用于重新评测时复用答案
+    
+    user_id 为提交任务的用户，只能复用该用户有权访问的结果（续跑时同样重新检查）。
+    """
+    result = db.get_result_by_id(result_id)
+    if not result:
+        raise ValueError(f"评测结果不存在: {result_id}")
+    if not user_can_access_result(result, user_id):
+        raise ValueError(f"没有权限复用评测结果: {result_id}")
+    
+    result_file = result.get('result_file', '')
+    if not os.path.exists(result_file):
+        raise ValueError(f"评测结果文件不存在: {result_file}")
+    
+    df = pd.read_csv(result_file, encoding='utf-8-sig')
+    if 'query' not in df.columns:
+        raise ValueError("评测结果文件缺少query列，无法复用答案")
+    
+    preloaded = {}
+    for model_name in selected_models:
+        answer_column = f'{model_name}_答案'
+        if answer_column not in df.columns:
+            continue
+        preloaded[model_name] = {
+            str(query): str(answer)
+            for query, answer in zip(df['query'], df[answer_column])
+            if pd.notna(answer)
+        }
+    
+    logger.info(f"♻️ 从评测结果 {result_id} 载入 {len(preloaded)} 个模型的答案")
+    return preloaded
 
 def detect_evaluation_mode(df: pd.DataFrame) -> str:
     """自动检测评测模式"""
@@ -186,11 +279,11 @@ def parse_json_str(s: str) -> Dict[str, Any]:
     """解析JSON字符串 - 增强版，支持多种格式和错误恢复"""
     s = (s or "").strip()
     if not s:
-        print("⚠️ JSON解析: 输入为空")
+        logger.debug("⚠️ JSON解析: 输入为空")
         return {}
     
-    print(f"🔍 JSON解析: 开始解析长度为 {len(s)} 的字符串")
-    print(f"📝 JSON解析: 原始内容前100字符: {s[:100]}...")
+    logger.debug(f"🔍 JSON解析: 开始解析长度为 {len(s)} 的字符串")
+    logger.debug(f"📝 JSON解析: 原始内容前100字符: {s[:100]}...")
     
     # 预处理：移除常见的非JSON前缀和后缀
     original_s = s
@@ -207,22 +300,22 @@ def parse_json_str(s: str) -> Dict[str, Any]:
                 end_marker = remaining.find('```')
                 if end_marker != -1:
                     s = remaining[:end_marker].strip()
-                    print(f"✂️ JSON解析: 从markdown中提取JSON，长度: {len(s)}")
+                    logger.debug(f"✂️ JSON解析: 从markdown中提取JSON，长度: {len(s)}")
                 else:
                     # 没有找到结束标记，取从```json后的所有内容
                     s = remaining.strip()
-                    print(f"⚠️ JSON解析: 未找到结束markdown标记，使用剩余内容")
+                    logger.debug(f"⚠️ JSON解析: 未找到结束markdown标记，使用剩余内容")
         
         elif '```' in s:
             # 通用代码块处理
             parts = s.split('```')
             if len(parts) >= 3:
                 s = parts[1].strip()
-                print(f"✂️ JSON解析: 从通用代码块中提取内容，长度: {len(s)}")
+                logger.debug(f"✂️ JSON解析: 从通用代码块中提取内容，长度: {len(s)}")
             elif len(parts) == 2:
                 # 只有开始标记，没有结束标记
                 s = parts[1].strip()
-                print(f"⚠️ JSON解析: 只找到开始代码块标记")
+                logger.debug(f"⚠️ JSON解析: 只找到开始代码块标记")
         
         # 2. 移除常见的前缀文本
         prefixes_to_remove = [
@@ -238,7 +331,7 @@ def parse_json_str(s: str) -> Dict[str, Any]:
         for prefix in prefixes_to_remove:
             if s.lower().startswith(prefix.lower()):
                 s = s[len(prefix):].strip()
-                print(f"✂️ JSON解析: 移除前缀 '{prefix}'")
+                logger.debug(f"✂️ JSON解析: 移除前缀 '{prefix}'")
                 break
         
         # 3. 查找JSON对象的开始和结束
@@ -250,7 +343,7 @@ def parse_json_str(s: str) -> Dict[str, Any]:
                 break
         
         if json_start == -1:
-            print(f"❌ JSON解析: 未找到JSON起始符号 {{ 或 [")
+            logger.warning(f"❌ JSON解析: 未找到JSON起始符号 {{ 或 [")
             return {}
         
         # 从起始位置开始提取JSON
@@ -259,10 +352,10 @@ def parse_json_str(s: str) -> Dict[str, Any]:
         # 4. 尝试解析JSON
         try:
             result = json.loads(s)
-            print(f"✅ JSON解析成功: 包含 {len(result)} 个顶级键")
+            logger.debug(f"✅ JSON解析成功: 包含 {len(result)} 个顶级键")
             return result
         except json.JSONDecodeError as json_error:
-            print(f"⚠️ 第一次JSON解析失败: {json_error}")
+            logger.debug(f"⚠️ 第一次JSON解析失败: {json_error}")
             
             # 5. 尝试修复常见的JSON错误
             fixed_attempts = []
@@ -304,14 +397,14 @@ def parse_json_str(s: str) -> Dict[str, Any]:
             for attempt_name, attempt_json in fixed_attempts:
                 try:
                     result = json.loads(attempt_json)
-                    print(f"✅ JSON解析成功 (使用{attempt_name}): 包含 {len(result)} 个顶级键")
+                    logger.debug(f"✅ JSON解析成功 (使用{attempt_name}): 包含 {len(result)} 个顶级键")
                     return result
                 except json.JSONDecodeError:
                     continue
             
             # 6. 如果所有尝试都失败，尝试提取关键信息
-            print(f"⚠️ 所有JSON修复尝试失败，尝试提取关键信息")
-            print(f"📝 原始响应内容: {original_s[:500]}...")
+            logger.debug(f"⚠️ 所有JSON修复尝试失败，尝试提取关键信息")
+            logger.debug(f"📝 原始响应内容: {original_s[:500]}...")
             
             # 使用正则表达式提取评分信息
             extracted_data = {}
@@ -328,22 +421,19 @@ def parse_json_str(s: str) -> Dict[str, Any]:
                     pass
             
             if extracted_data:
-                print(f"✅ 使用正则提取到 {len(extracted_data)} 个模型的评分")
+                logger.debug(f"✅ 使用正则提取到 {len(extracted_data)} 个模型的评分")
                 return extracted_data
             
             # 7. 最后的备用方案：返回空字典但记录详细错误
-            print(f"❌ JSON解析完全失败")
-            print(f"原始内容长度: {len(original_s)}")
-            print(f"处理后内容: {s[:200]}...")
-            print(f"JSON错误详情: {json_error}")
+            logger.warning(f"❌ JSON解析完全失败")
+            logger.debug(f"原始内容长度: {len(original_s)}")
+            logger.debug(f"处理后内容: {s[:200]}...")
+            logger.debug(f"JSON错误详情: {json_error}")
             
             return {}
     
     except Exception as e:
-        print(f"❌ JSON解析过程中发生异常: {e}")
-        print(f"异常类型: {type(e).__name__}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"❌ JSON解析过程中发生异常: {e}")
         return {}
 
 
@@ -378,33 +468,43 @@ def generate_default_evaluation_response(model_count: int = None, prompt: str =
     import json
     return json.dumps(default_response, ensure_ascii=False)
 
-async def query_gemini_model(prompt: str, api_key: str = None, retry_count: int = 3) -> str:
-    """查询Gemini模型 使用数据库配置的端点 - 增强版，支持重试和更好的错误处理"""
-    from database import db
+def build_judge_cache_key(model_name: str, prompt: str, generation_config: Dict) -> str:
+    """计算评测缓存键：评测模型名、完整prompt和生成配置共同决定评测输出"""
+    key_source = json.dumps({
+        'model': model_name,
+        'prompt': prompt,
+        'generation_config': generation_config
+    }, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(key_source.encode('utf-8')).hexdigest()
+
+async def query_gemini_model(prompt: str, api_key: str = None, retry_count: int = 3, use_cache: bool = True,
+                             call: CallRecord = None, response_schema: Dict = None,
+                             max_output_tokens: int = None) -> str:
+    """查询Gemini模型 使用数据库配置的端点 - 增强版，支持重试和更好的错误处理
     
-    # 使用传入的API密钥或默认密钥
-    actual_api_key = api_key or GOOGLE_API_KEY
+    use_cache 为 True 时先查询评测缓存，成功的评测结果会写入缓存供后续复用。
+    提供 call 时记录限流等待、连接耗时、重试次数和HTTP状态码。
+    提供 response_schema 时要求Gemini按该JSON schema输出；此时调用失败返回空字符串，
+    不再生成默认评分，由调用方按模型重试。
+    max_output_tokens 为本次请求的输出token上限，缺省时使用 GEMINI_MAX_OUTPUT_TOKENS。
+    """
+    call = call or CallRecord(-1, 'Gemini', 'judge')
+    from database import db
     
-    if not actual_api_key:
+    # 使用传入的API密钥，未传入时由评测密钥池选择
+    if not api_key and not judge_key_pool.size():
         return "Gemini模型调用失败: 未配置GOOGLE_API_KEY"
     
     # 从数据库获取配置
-    api_endpoint = db.get_system_config('gemini_api_endpoint', 'https://gemini-proxy.hkgai.net/v1beta/models')
     model_name = db.get_system_config('gemini_model_name', MODEL_NAME)
     timeout_str = db.get_system_config('gemini_api_timeout', '60')
+    call.model_name = model_name
     
     try:
         timeout = int(timeout_str)
     except (ValueError, TypeError):
         timeout = 60
     
-    # 构建 API 请求
-    url = f"{api_endpoint}/{model_name}:generateContent"
-    headers = {
-        "x-goog-api-key": actual_api_key,
-        "Content-Type": "application/json"
-    }
-    
     # 基础请求数据
     data = {
         "contents": [
@@ -418,399 +518,273 @@ async def query_gemini_model(prompt: str, api_key: str = None, retry_count: int
             "temperature": 0.1,  # 降低随机性，提高JSON格式一致性
             "topK": 40,
             "topP": 0.95,
-            "maxOutputTokens": GEMINI_MAX_OUTPUT_TOKENS,
+            "maxOutputTokens": max_output_tokens or GEMINI_MAX_OUTPUT_TOKENS,
         }
     }
+    if response_schema is not None:
+        data["generationConfig"]["responseMimeType"] = "application/json"
+        data["generationConfig"]["responseSchema"] = response_schema
     
-    # 🔍 [Google API日志] 输出发送给Google的最终prompt
-    log_verbose("=" * 80)
-    log_verbose(f"📤 [Google Gemini API] 发送Prompt到: {url}")
-    log_verbose(f"🔑 [API密钥] {actual_api_key[:10]}...{actual_api_key[-4:] if len(actual_api_key) > 14 else '****'}")
-    log_verbose(f"🎯 [模型名称] {model_name}")
-    log_verbose("📋 [最终Prompt内容]:")
-    log_verbose("-" * 40)
-    log_verbose(prompt)
-    log_verbose("-" * 40)
-    log_verbose(f"⚙️ [生成配置] 温度: {data['generationConfig']['temperature']}, 最大令牌: {data['generationConfig']['maxOutputTokens']}")
-    log_verbose("=" * 80)
+    def default_response() -> str:
+        # 结构化输出模式下不伪造评分，缺失的结果由调用方重试
+        return "" if response_schema is not None else generate_default_evaluation_response(prompt=prompt)
+    
+    # 评测缓存：相同的模型、prompt和生成配置直接复用之前的评测输出
+    use_cache = use_cache and JUDGE_CACHE_ENABLED
+    cache_key = build_judge_cache_key(model_name, prompt, data["generationConfig"])
+    if use_cache:
+        cached_response = db.get_judge_cache(cache_key, ttl_seconds=JUDGE_CACHE_TTL_DAYS * 86400)
+        # 旧版本可能缓存了无法解析的输出，这类缓存按未命中处理
+        if cached_response is not None and load_fenced_json_object(cached_response):
+            logger.debug(f"♻️ 命中评测缓存: {cache_key[:12]}")
+            call.cached = True
+            return cached_response
+    
+    # 🔍 [Google API日志] 输出发送给Google的最终prompt（抽样、截断）
+    log_verbose(
+        f"📤 [Google Gemini API] 模型: {model_name}，温度: {data['generationConfig']['temperature']}，"
+        f"最大令牌: {data['generationConfig']['maxOutputTokens']}，Prompt",
+        prompt
+    )
     
     # 尝试重试机制
     last_error = None
     for attempt in range(retry_count):
         try:
-            print(f"🔄 Gemini API调用尝试 {attempt + 1}/{retry_count}")
+            logger.debug(f"🔄 Gemini API调用尝试 {attempt + 1}/{retry_count}")
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, headers=headers, json=data, timeout=timeout) as response:
-                    if response.status == 200:
-                        try:
-                            result = await response.json()
-                        except json.JSONDecodeError as json_err:
-                            print(f"⚠️ Gemini响应JSON解析失败: {json_err}")
-                            # 尝试获取原始文本
-                            text_response = await response.text()
-                            print(f"📝 原始响应: {text_response[:200]}...")
+            # 每次尝试重新选择密钥（按剩余容量加权），并等待该密钥的自适应限流
+            call.retries = attempt
+            wait_started_at = time.monotonic()
+            credential = await judge_key_pool.acquire(api_key)
+            call.queue_wait += time.monotonic() - wait_started_at
+            url = f"{credential.endpoint}/{model_name}:generateContent"
+            headers = {
+                "x-goog-api-key": credential.key,
+                "Content-Type": "application/json"
+            }
+            response = await judge_pool.post(url, headers, data, timeout, trace_ctx=call)
+            call.http_status = response.status
+            call.bytes = len(response.text.encode('utf-8'))
+            judge_key_pool.report(credential, response.status, response.retry_after)
+            
+            if response.status == 200:
+                try:
+                    result = json.loads(response.text)
+                except json.JSONDecodeError as json_err:
+                    logger.warning(f"⚠️ Gemini响应JSON解析失败: {json_err}")
+                    # 输出原始文本
+                    logger.info(f"📝 原始响应: {response.text[:200]}...")
+                    if attempt < retry_count - 1:
+                        continue
+                    return f"Gemini模型调用失败: 响应JSON格式错误 - {json_err}"
+                
+                # 记录token用量（每次尝试都计费，重试时累加；思考token按输出计费）
+                usage = result.get('usageMetadata') or {}
+                call.input_tokens += int(usage.get('promptTokenCount') or 0)
+                call.output_tokens += int(usage.get('candidatesTokenCount') or 0) + int(usage.get('thoughtsTokenCount') or 0)
+                
+                # 提取结果文本
+                if "candidates" in result and len(result["candidates"]) > 0:
+                    candidate = result["candidates"][0]
+                    
+                    # 检查finishReason
+                    if "finishReason" in candidate:
+                        finish_reason = candidate["finishReason"]
+                        
+                        if finish_reason == "SAFETY":
+                            logger.warning(f"⚠️ Gemini响应被安全过滤器阻止")
                             if attempt < retry_count - 1:
+                                # 稍微修改提示词重试
+                                data["contents"][0]["parts"][0]["text"] = prompt + "\n\n请严格按照JSON格式输出评测结果。"
                                 continue
-                            return f"Gemini模型调用失败: 响应JSON格式错误 - {json_err}"
+                            return "Gemini模型调用失败: 内容被安全过滤器阻止"
                         
-                        # 提取结果文本
-                        if "candidates" in result and len(result["candidates"]) > 0:
-                            candidate = result["candidates"][0]
+                        elif finish_reason == "MAX_TOKENS":
+                            logger.warning(f"⚠️ Gemini响应因达到最大token限制被截断")
+                            logger.info(f"📊 使用情况: {result.get('usageMetadata', {})}")
                             
-                            # 检查finishReason
-                            if "finishReason" in candidate:
-                                finish_reason = candidate["finishReason"]
-                                
-                                if finish_reason == "SAFETY":
-                                    print(f"⚠️ Gemini响应被安全过滤器阻止")
-                                    if attempt < retry_count - 1:
-                                        # 稍微修改提示词重试
-                                        data["contents"][0]["parts"][0]["text"] = prompt + "\n\n请严格按照JSON格式输出评测结果。"
-                                        continue
-                                    return "Gemini模型调用失败: 内容被安全过滤器阻止"
-                                
-                                elif finish_reason == "MAX_TOKENS":
-                                    print(f"⚠️ Gemini响应因达到最大token限制被截断")
-                                    print(f"📊 使用情况: {result.get('usageMetadata', {})}")
-                                    
-                                    # 尝试从不完整的响应中提取内容
-                                    partial_text = None
-                                    if "content" in candidate:
-                                        content = candidate["content"]
-                                        if "parts" in content and len(content["parts"]) > 0:
-                                            if "text" in content["parts"][0]:
-                                                partial_text = content["parts"][0]["text"]
-                                                print(f"📝 获取到部分响应: {len(partial_text)} 字符")
-                                        else:
-                                            print(f"⚠️ content字段异常，缺少parts: {content}")
-                                    
-                                    # 如果有部分内容，尝试返回
-                                    if partial_text and partial_text.strip():
-                                        return partial_text
-                                    
-                                    # 如果没有可用内容，生成基于问题数量的默认评分结构
-                                    print(f"⚠️ 无法获取完整响应，生成默认评分")
-                                    
-                                    # 使用智能默认响应生成
-                                    return generate_default_evaluation_response(prompt=prompt)
-                                
-                                elif finish_reason in ["RECITATION", "OTHER"]:
-                                    print(f"⚠️ Gemini响应因其他原因停止: {finish_reason}")
-                                    if attempt < retry_count - 1:
-                                        continue
-                                    return f"Gemini模型调用失败: {finish_reason}"
+                            # 尝试从不完整的响应中提取内容
+                            partial_text = None
+                            if "content" in candidate:
+                                content = candidate["content"]
+                                if "parts" in content and len(content["parts"]) > 0:
+                                    if "text" in content["parts"][0]:
+                                        partial_text = content["parts"][0]["text"]
+                                        logger.info(f"📝 获取到部分响应: {len(partial_text)} 字符")
+                                else:
+                                    logger.warning(f"⚠️ content字段异常，缺少parts: {content}")
                             
-                            if "content" in candidate and "parts" in candidate["content"]:
-                                parts = candidate["content"]["parts"]
-                                if len(parts) > 0 and "text" in parts[0]:
-                                    text_result = parts[0]["text"]
-                                    
-                                    # 验证返回的内容是否包含JSON结构
-                                    if not text_result.strip():
-                                        print(f"⚠️ Gemini返回空内容")
-                                        if attempt < retry_count - 1:
-                                            continue
-                                        return "Gemini模型调用失败: 返回内容为空"
-                                    
-                                    # 检查是否包含可能的JSON结构
-                                    if '{' not in text_result and '[' not in text_result:
-                                        print(f"⚠️ Gemini返回内容不包含JSON结构: {text_result[:100]}...")
-                                        if attempt < retry_count - 1:
-                                            # 修改提示词强调JSON格式要求
-                                            data["contents"][0]["parts"][0]["text"] = prompt + "\n\n重要：必须严格按照JSON格式输出，不要包含任何解释文字。"
-                                            continue
-                                    
-                                    print(f"✅ Gemini评测成功，返回长度: {len(text_result)}")
-                                    
-                                    # 🔍 [Google API响应日志] 输出Google的响应内容
-                                    log_verbose("=" * 80)
-                                    log_verbose("📨 [Google Gemini API] 响应内容:")
-                                    log_verbose("-" * 40)
-                                    log_verbose(text_result[:500] + ("..." if len(text_result) > 500 else ""))  # 显示前500字符
-                                    log_verbose("-" * 40)
-                                    log_verbose(f"📏 [响应长度] {len(text_result)} 字符")
-                                    log_verbose("=" * 80)
-                                    
-                                    return text_result
-                        
-                        # 如果到这里，说明响应格式异常
-                        print(f"⚠️ Gemini返回格式异常: {result}")
+                            # 如果有部分内容，尝试返回
+                            if partial_text and partial_text.strip():
+                                return partial_text
+                            
+                            # 如果没有可用内容，生成基于问题数量的默认评分结构
+                            logger.warning(f"⚠️ 无法获取完整响应，生成默认评分")
+                            
+                            # 使用智能默认响应生成
+                            return default_response()
                         
-                        # 检查是否有错误信息
-                        if "error" in result:
-                            error_msg = result["error"].get("message", "未知错误")
-                            print(f"❌ Gemini API返回错误: {error_msg}")
+                        elif finish_reason in ["RECITATION", "OTHER"]:
+                            logger.warning(f"⚠️ Gemini响应因其他原因停止: {finish_reason}")
                             if attempt < retry_count - 1:
-                                await asyncio.sleep(1)  # 等待1秒后重试
                                 continue
-                            print(f"⚠️ API错误，生成默认评分")
-                            return generate_default_evaluation_response(prompt=prompt)
-                        
-                        if attempt < retry_count - 1:
-                            continue
+                            return f"Gemini模型调用失败: {finish_reason}"
+                    
+                    if "content" in candidate and "parts" in candidate["content"]:
+                        parts = candidate["content"]["parts"]
+                        if len(parts) > 0 and "text" in parts[0]:
+                            text_result = parts[0]["text"]
                             
-                        # 最后一次重试失败，生成默认响应避免完全失败
-                        print(f"⚠️ 所有重试均失败，生成默认评分以继续评测")
-                        return generate_default_evaluation_response(prompt=prompt)
-                        
-                    elif response.status == 429:  # 速率限制
-                        print(f"⚠️ Gemini API速率限制，等待重试...")
-                        if attempt < retry_count - 1:
-                            await asyncio.sleep(2 ** attempt)  # 指数退避
-                            continue
-                        error_text = await response.text()
-                        print(f"⚠️ 速率限制，生成默认评分")
-                        return generate_default_evaluation_response(prompt=prompt)
-                        
-                    elif response.status == 400:  # 请求错误
-                        error_text = await response.text()
-                        print(f"❌ Gemini API请求错误: {error_text}")
-                        try:
-                            error_json = json.loads(error_text)
-                            if "error" in error_json:
-                                error_detail = error_json["error"].get("message", error_text)
-                                print(f"⚠️ API参数错误，生成默认评分")
-                                return generate_default_evaluation_response(prompt=prompt)
-                        except:
-                            pass
-                        print(f"⚠️ 请求参数错误，生成默认评分")
-                        return generate_default_evaluation_response(prompt=prompt)
-                        
-                    else:
-                        error_text = await response.text()
-                        print(f"❌ Gemini API请求失败: HTTP {response.status} - {error_text[:200]}...")
-                        if attempt < retry_count - 1:
-                            await asyncio.sleep(1)
-                            continue
-                        print(f"⚠️ HTTP错误，生成默认评分")
-                        return generate_default_evaluation_response(prompt=prompt)
-                        
+                            # 验证返回的内容是否包含JSON结构
+                            if not text_result.strip():
+                                logger.warning(f"⚠️ Gemini返回空内容")
+                                if attempt < retry_count - 1:
+                                    continue
+                                return "Gemini模型调用失败: 返回内容为空"
+                            
+                            # 检查是否包含可能的JSON结构
+                            if '{' not in text_result and '[' not in text_result:
+                                logger.warning(f"⚠️ Gemini返回内容不包含JSON结构: {text_result[:100]}...")
+                                if attempt < retry_count - 1:
+                                    # 修改提示词强调JSON格式要求
+                                    data["contents"][0]["parts"][0]["text"] = prompt + "\n\n重要：必须严格按照JSON格式输出，不要包含任何解释文字。"
+                                    continue
+                            
+                            logger.debug(f"✅ Gemini评测成功，返回长度: {len(text_result)}")
+                            
+                            # 🔍 [Google API响应日志] 输出Google的响应内容（抽样、截断）
+                            log_verbose("📨 [Google Gemini API] 响应内容", text_result)
+                            
+                            # 只缓存能解析为JSON对象的评测结果，解析失败的输出重新评测时可以得到修正
+                            parsed = load_json_object(text_result) if response_schema is not None \
+                                else load_fenced_json_object(text_result)
+                            if use_cache and parsed:
+                                db.set_judge_cache(cache_key, model_name, text_result)
+                            
+                            return text_result
+                
+                # 如果到这里，说明响应格式异常
+                logger.warning(f"⚠️ Gemini返回格式异常: {result}")
+                
+                # 检查是否有错误信息
+                if "error" in result:
+                    error_msg = result["error"].get("message", "未知错误")
+                    logger.error(f"❌ Gemini API返回错误: {error_msg}")
+                    if attempt < retry_count - 1:
+                        await asyncio.sleep(1)  # 等待1秒后重试
+                        continue
+                    logger.warning(f"⚠️ API错误，生成默认评分")
+                    return default_response()
+                
+                if attempt < retry_count - 1:
+                    continue
+                    
+                # 最后一次重试失败，生成默认响应避免完全失败
+                logger.warning(f"⚠️ 所有重试均失败，生成默认评分以继续评测")
+                return default_response()
+                
+            elif response.status == 429:  # 速率限制
+                logger.warning(f"⚠️ Gemini API速率限制（密钥 {credential.label}），当前限流速率 {credential.limiter.rate:.2f} 请求/秒，等待重试...")
+                if attempt < retry_count - 1:
+                    await asyncio.sleep(credential.limiter.backoff_delay(attempt))  # 随机指数退避，重试仍需通过限流
+                    continue
+                error_text = response.text
+                logger.warning(f"⚠️ 速率限制，生成默认评分")
+                return default_response()
+                
+            elif response.status == 400:  # 请求错误
+                error_text = response.text
+                logger.error(f"❌ Gemini API请求错误: {error_text}")
+                try:
+                    error_json = json.loads(error_text)
+                    if "error" in error_json:
+                        error_detail = error_json["error"].get("message", error_text)
+                        logger.warning(f"⚠️ API参数错误，生成默认评分")
+                        return default_response()
+                except:
+                    pass
+                logger.warning(f"⚠️ 请求参数错误，生成默认评分")
+                return default_response()
+                
+            else:
+                error_text = response.text
+                logger.error(f"❌ Gemini API请求失败（密钥 {credential.label}）: HTTP {response.status} - {error_text[:200]}...")
+                if attempt < retry_count - 1:
+                    # 按该密钥的限流状态退避；5xx 已通过 judge_key_pool.report 计入该密钥的健康状态
+                    await asyncio.sleep(credential.limiter.backoff_delay(attempt))
+                    continue
+                logger.warning(f"⚠️ HTTP错误，生成默认评分")
+                return default_response()
+                
         except asyncio.TimeoutError:
-            print(f"⏰ Gemini API请求超时 (尝试 {attempt + 1}/{retry_count})")
+            logger.warning(f"⏰ Gemini API请求超时 (尝试 {attempt + 1}/{retry_count})")
             last_error = "请求超时"
             if attempt < retry_count - 1:
                 await asyncio.sleep(2)
                 continue
                 
         except aiohttp.ClientError as client_err:
-            print(f"🌐 Gemini API网络错误: {client_err}")
+            logger.warning(f"🌐 Gemini API网络错误: {client_err}")
             last_error = f"网络连接错误: {client_err}"
             if attempt < retry_count - 1:
                 await asyncio.sleep(1)
                 continue
                 
         except Exception as e:
-            print(f"❌ Gemini评测异常 (尝试 {attempt + 1}/{retry_count}): {e}")
+            logger.error(f"❌ Gemini评测异常 (尝试 {attempt + 1}/{retry_count}): {e}")
             last_error = str(e)
             if attempt < retry_count - 1:
                 await asyncio.sleep(1)
                 continue
     
     # 所有重试都失败了
-    print(f"❌ Gemini API调用完全失败，已尝试 {retry_count} 次")
-    print(f"⚠️ 生成默认评分以避免评测中断")
+    logger.error(f"❌ Gemini API调用完全失败，已尝试 {retry_count} 次")
+    logger.warning(f"⚠️ 生成默认评分以避免评测中断")
     
     # 生成默认响应确保评测流程继续
-    return generate_default_evaluation_response(prompt=prompt)
+    return default_response()
 
-def build_subjective_eval_prompt(query: str, answers: Dict[str, str], question_type: str = "", filename: str = None) -> str:
-    """构建主观题评测提示"""
-    type_context = f"问题类型: {question_type}\n" if question_type else ""
-    
-    models_text = ""
-    for i, (model_name, answer) in enumerate(answers.items(), 1):
-        models_text += f"模型{i}({model_name})回答: {answer}\n\n"
-    
-    model_keys = list(answers.keys())
+def compile_eval_prompt(mode: str, filename: str, model_count: int) -> CompiledEvalPrompt:
+    """解析评分标准并编译评测提示模板（每次评测只查询一次数据库）
     
-    # 默认评分范围和格式
-    default_score_range = "按提示词中的评分标准"
-    score_instruction = "请严格按照上述提示词中定义的评分标准进行评分"
-    score_validation = "评分必须符合提示词中定义的评分标准和范围"
-    json_format = {f"模型{i+1}": {"评分": "按提示词标准", "理由": "评分理由"} for i in range(len(model_keys))}
-    
-    # 初始化为空的自定义提示词
-    custom_prompt = None
-    
-    if filename:
-        print(f"🔍 [评测引擎] 正在检查文件 {filename} 是否有自定义提示词...")
-        try:
-            file_prompt = db.get_file_prompt(filename)
-            if file_prompt:
-                prompt_length = len(file_prompt)
-                print(f"✅ [评测引擎] 使用文件 {filename} 的自定义提示词，长度: {prompt_length} 字符")
-                custom_prompt = file_prompt
-                
-                # 如果使用自定义提示词，更新评分指导
-                score_instruction = "请严格按照上述自定义提示词中定义的评分标准进行评分"
-                score_validation = "评分必须符合自定义提示词中定义的评分标准和范围"
-            else:
-                print(f"⚠️ [评测引擎] 文件 {filename} 未设置自定义提示词，尝试使用默认提示词...")
-                # 尝试使用默认主观题提示词
-                default_prompt = db.get_default_prompt('subjective')
-                if default_prompt:
-                    print(f"✅ [评测引擎] 使用默认主观题提示词，长度: {len(default_prompt)} 字符")
-                    custom_prompt = default_prompt
-                else:
-                    print(f"❌ [评测引擎] 未找到默认主观题提示词！")
-                    raise ValueError(f"文件 {filename} 未设置自定义提示词，且系统默认主观题提示词不存在。请在管理后台配置评分标准或为该文件设置自定义提示词。")
-        except Exception as e:
-            if "未设置自定义提示词，且系统默认" in str(e):
-                raise e
-            print(f"⚠️ [评测引擎] 获取文件 {filename} 的评测提示词失败: {e}")
-            # 最后尝试默认提示词
-            try:
-                default_prompt = db.get_default_prompt('subjective')
-                if default_prompt:
-                    print(f"✅ [评测引擎] 异常情况下使用默认主观题提示词作为备选")
-                    custom_prompt = default_prompt
-                else:
-                    raise ValueError(f"无法获取文件 {filename} 的评测提示词，请检查文件设置或联系管理员。")
-            except:
-                raise ValueError(f"无法获取文件 {filename} 的评测提示词，请检查文件设置或联系管理员。")
-    else:
-        print(f"❌ [评测引擎] 主观题评测必须提供文件名以获取自定义提示词！")
-        raise ValueError("主观题评测必须设置自定义评测提示词。请确保上传的文件已配置相应的评测标准。")
-    
-    if not custom_prompt:
-        raise ValueError("未找到有效的自定义评测提示词，无法进行主观题评测。")
-    
-    return f"""
-{custom_prompt}
-
-=== 评测任务 ===
-{type_context}问题: {query}
-
-=== 模型回答 ===
-{models_text}
-
-=== 评测要求 ===
-1. {score_instruction}
-2. 提供详细的评分理由
-3. 确保评分客观公正，基于事实和逻辑
-
-=== 关键输出格式要求 ===
-❗重要：必须严格按照JSON格式输出，不得包含任何解释文字❗
-
-✅ 正确格式示例：
-{json.dumps(json_format, ensure_ascii=False, indent=2)}
-
-❌ 错误格式：
-- 不要添加"以下是评测结果："等前缀
-- 不要使用markdown代码块```json```
-- 不要在JSON前后添加任何说明文字
-- 不要使用不标准的引号或符号
-
-⚠️ 格式检查清单：
-1. 输出必须以 {{ 开始，以 }} 结束
-2. 所有字符串必须用双引号包围
-3. {score_validation}
-4. 理由字段不能为空
-5. JSON结构必须完整且有效
-
-请现在输出评测结果的JSON：
-"""
-
-def build_objective_eval_prompt(query: str, standard_answer: str, answers: Dict[str, str], question_type: str = "", filename: str = None) -> str:
-    """构建客观题评测提示"""
-    type_context = f"问题类型: {question_type}\n" if question_type else ""
-    
-    models_text = ""
-    for i, (model_name, answer) in enumerate(answers.items(), 1):
-        models_text += f"模型{i}({model_name})回答: {answer}\n\n"
-    
-    model_keys = list(answers.keys())
-    
-    # 默认评分范围和格式
-    score_instruction = "请严格按照上述提示词中定义的评分标准进行评分"
-    score_validation = "评分必须符合提示词中定义的评分标准和范围"
-    json_format = {f"模型{i+1}": {"评分": "按提示词标准", "准确性": "正确/部分正确/错误", "理由": "评分理由"} for i in range(len(model_keys))}
+    文件自定义提示词优先，其次为系统默认提示词，两者都不存在时抛出 ValueError。
+    """
+    mode_label = '客观题' if mode == 'objective' else '主观题'
+    if not filename:
+        logger.error(f"❌ [评测引擎] {mode_label}评测必须提供文件名以获取自定义提示词！")
+        raise ValueError(f"{mode_label}评测必须设置自定义评测提示词。请确保上传的文件已配置相应的评测标准。")
     
-    # 初始化为空的自定义提示词
-    custom_prompt = None
+    logger.info(f"🔍 [评测引擎] 正在检查文件 {filename} 是否有自定义提示词...")
+    rubric, rubric_source = None, 'default'
+    try:
+        rubric = db.get_file_prompt(filename)
+        if rubric:
+            rubric_source = 'file'
+            logger.info(f"✅ [评测引擎] 使用文件 {filename} 的自定义提示词，长度: {len(rubric)} 字符")
+        else:
+            logger.warning(f"⚠️ [评测引擎] 文件 {filename} 未设置自定义提示词，尝试使用默认提示词...")
+    except Exception as e:
+        logger.warning(f"⚠️ [评测引擎] 获取文件 {filename} 的评测提示词失败: {e}")
     
-    if filename:
-        print(f"🔍 [客观题评测引擎] 正在检查文件 {filename} 是否有自定义提示词...")
+    if not rubric:
         try:
-            file_prompt = db.get_file_prompt(filename)
-            if file_prompt:
-                prompt_length = len(file_prompt)
-                print(f"✅ [客观题评测引擎] 使用文件 {filename} 的自定义提示词，长度: {prompt_length} 字符")
-                custom_prompt = file_prompt
-                
-                # 如果使用自定义提示词，更新评分指导
-                score_instruction = "请严格按照上述自定义提示词中定义的评分标准进行评分"
-                score_validation = "评分必须符合自定义提示词中定义的评分标准和范围"
-            else:
-                print(f"⚠️ [客观题评测引擎] 文件 {filename} 未设置自定义提示词，尝试使用默认提示词...")
-                # 尝试使用默认客观题提示词
-                default_prompt = db.get_default_prompt('objective')
-                if default_prompt:
-                    print(f"✅ [客观题评测引擎] 使用默认客观题提示词，长度: {len(default_prompt)} 字符")
-                    custom_prompt = default_prompt
-                else:
-                    print(f"❌ [客观题评测引擎] 未找到默认客观题提示词！")
-                    raise ValueError(f"文件 {filename} 未设置自定义提示词，且系统默认客观题提示词不存在。请在管理后台配置评分标准或为该文件设置自定义提示词。")
+            rubric = db.get_default_prompt(mode)
         except Exception as e:
-            if "未设置自定义提示词，且系统默认" in str(e):
-                raise e
-            print(f"⚠️ [客观题评测引擎] 获取文件 {filename} 的评测提示词失败: {e}")
-            # 最后尝试默认提示词
-            try:
-                default_prompt = db.get_default_prompt('objective')
-                if default_prompt:
-                    print(f"✅ [客观题评测引擎] 异常情况下使用默认客观题提示词作为备选")
-                    custom_prompt = default_prompt
-                else:
-                    raise ValueError(f"无法获取文件 {filename} 的评测提示词，请检查文件设置或联系管理员。")
-            except:
-                raise ValueError(f"无法获取文件 {filename} 的评测提示词，请检查文件设置或联系管理员。")
-    else:
-        print(f"❌ [客观题评测引擎] 客观题评测必须提供文件名以获取自定义提示词！")
-        raise ValueError("客观题评测必须设置自定义评测提示词。请确保上传的文件已配置相应的评测标准。")
+            logger.warning(f"⚠️ [评测引擎] 获取默认{mode_label}提示词失败: {e}")
+            raise ValueError(f"无法获取文件 {filename} 的评测提示词，请检查文件设置或联系管理员。")
+        if not rubric:
+            logger.error(f"❌ [评测引擎] 未找到默认{mode_label}提示词！")
+            raise ValueError(f"文件 {filename} 未设置自定义提示词，且系统默认{mode_label}提示词不存在。请在管理后台配置评分标准或为该文件设置自定义提示词。")
+        logger.info(f"✅ [评测引擎] 使用默认{mode_label}提示词，长度: {len(rubric)} 字符")
     
-    if not custom_prompt:
-        raise ValueError("未找到有效的自定义评测提示词，无法进行客观题评测。")
-    
-    return f"""
-{custom_prompt}
-
-=== 评测任务 ===
-{type_context}问题: {query}
-标准答案: {standard_answer}
-
-=== 模型回答 ===
-{models_text}
-
-=== 评测要求 ===
-1. {score_instruction}
-2. 重点评估内容的准确性、完整性和语言本地化程度  
-3. 提供详细的评分依据和理由
-4. 客观公正，基于事实判断
+    template = CompiledEvalPrompt(mode, rubric, rubric_source, model_count)
+    logger.info(f"🧩 [评测引擎] 评测提示模板已编译，版本: {template.version}")
+    return template
 
-=== 关键输出格式要求 ===
-❗重要：必须严格按照JSON格式输出，不得包含任何解释文字❗
-
-✅ 正确格式示例：
-{json.dumps(json_format, ensure_ascii=False, indent=2)}
-
-❌ 错误格式：
-- 不要添加"以下是评测结果："等前缀
-- 不要使用markdown代码块```json```
-- 不要在JSON前后添加任何说明文字
-- 不要使用不标准的引号或符号
-
-⚠️ 格式检查清单：
-1. 输出必须以 {{ 开始，以 }} 结束
-2. 所有字符串必须用双引号包围
-3. {score_validation}
-4. 准确性必须是"正确"、"部分正确"或"错误"之一
-5. 理由字段不能为空
-6. JSON结构必须完整且有效
-
-请现在输出评测结果的JSON：
-"""
+def create_prompt_budgeter(template: CompiledEvalPrompt) -> PromptBudgeter:
+    """按配置创建评测提示的token预算（过长的回答按截断策略处理）"""
+    return PromptBudgeter(template, JUDGE_PROMPT_MAX_TOKENS, JUDGE_ANSWER_TRUNCATION, JUDGE_MIN_ANSWER_TOKENS)
 
 def flatten_json(data: Dict[str, Any], prefix: str = "") -> Dict[str, Any]:
     """平铺JSON字典"""
@@ -825,21 +799,8 @@ def flatten_json(data: Dict[str, Any], prefix: str = "") -> Dict[str, Any]:
             flat_data[new_key] = value
     return flat_data
 
-async def evaluate_models(data: List[Dict], mode: str, model_results: Dict[str, List[str]], task_id: str, google_api_key: str = None, filename: str = None) -> str:
-    """评测模型表现"""
-    if task_id in task_status:
-        task_status[task_id].status = "评测中"
-        task_status[task_id].total = len(data)
-        task_status[task_id].progress = 0
-        
-        # 更新数据库状态
-        db.update_task_status(task_id, "running")
-
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    output_file = os.path.join(app.config['RESULTS_FOLDER'], f"evaluation_result_{timestamp}.csv")
-    
-    # 准备CSV表头
-    model_names = list(model_results.keys())
+def build_result_headers(model_names: List[str], mode: str) -> List[str]:
+    """生成评测结果CSV表头"""
     base_headers = ['序号', '类型', 'query']
     
     if mode == 'objective':
@@ -847,7 +808,7 @@ async def evaluate_models(data: List[Dict], mode: str, model_results: Dict[str,
     
     # 动态生成模型相关的列
     eval_headers = []
-    for i, model_name in enumerate(model_names, 1):
+    for model_name in model_names:
         eval_headers.extend([
             f'{model_name}_答案',
             f'{model_name}_评分',
@@ -856,159 +817,469 @@ async def evaluate_models(data: List[Dict], mode: str, model_results: Dict[str,
         if mode == 'objective':
             eval_headers.append(f'{model_name}_准确性')
     
-    headers = base_headers + eval_headers
-    
+    return base_headers + eval_headers
+
+def write_result_csv_from_journal(task_id: str, output_file: str, headers: List[str]) -> int:
+    """按题目顺序把任务结果日志写成CSV（逐行流式写入），返回写入的行数"""
+    written_count = 0
     with open(output_file, 'w', encoding='utf-8-sig', newline='') as f:
         writer = csv.writer(f)
         writer.writerow(headers)
+        for _, row_data in db.iter_task_result_rows(task_id):
+            writer.writerow(row_data)
+            written_count += 1
+    logger.info(f"📝 写入CSV文件，共 {written_count} 条有效记录...")
+    return written_count
+
+async def evaluate_models(data: List[Dict], mode: str, model_results: Dict[str, List[str]], task_id: str, google_api_key: str = None, filename: str = None,
+                          answer_provider: Optional[Callable[[int], Awaitable[Dict[str, str]]]] = None,
+                          use_judge_cache: bool = True, output_file: str = None, batch_judge: bool = False,
+                          telemetry: CallTelemetry = None, prompt_template: CompiledEvalPrompt = None,
+                          structured_judge: bool = False, indices: Optional[List[int]] = None,
+                          prompt_budgeter: PromptBudgeter = None) -> str:
+    """评测模型表现
+    
+    answer_provider 不为空时进入流水线模式：model_results 只提供模型列表，
+    每道题的答案在评测前通过 answer_provider(i) 按需获取。
+    use_judge_cache 为 False 时本次评测绕过评测缓存，全部重新调用Gemini。
+    batch_judge 为 True 时多道题合并为一次评测请求，结果缺失的题目拆分后重试。
+    提供 telemetry 时记录每次评测请求的耗时明细。
+    prompt_template 为编译好的评测提示模板，缺省时按 mode/filename 编译。
+    structured_judge 为 True 时请求附带JSON responseSchema，结果只解析一次，
+    缺失或不合规的模型单独重试，重试后仍缺失的留空并计入错误数，不再填充默认评分。
+    indices 不为空时只评测这些题目（序贯抽样评测），进度总数为已完成题目与本次题目之和；
+    此时只写入结果日志，不生成CSV，由调用方在全部轮次结束后生成一次。
+    prompt_budgeter 按评测提示的token预算截断过长的回答（只影响评测提示，结果中保存完整回答），
+    缺省时按配置创建；单题评测的输出token上限按模型数量确定。
+    
+    每道题完成后立即追加到任务结果日志，日志中已有的题目不会重复评测；
+    全部完成后再按题目顺序把日志生成为CSV。进程中断后用同一task_id重新调用即可续跑。
+    """
+    completed_indices = db.get_task_result_indices(task_id)
+    question_total = len(data) if indices is None else len(completed_indices | set(indices))
+    if completed_indices:
+        logger.info(f"♻️ 任务 {task_id} 已完成 {len(completed_indices)}/{question_total} 题，只评测剩余题目")
+    
+    if task_id in task_status:
+        task_status[task_id].status = "流水线评测中" if answer_provider is not None else "评测中"
+        task_status[task_id].total = question_total
+        task_status[task_id].progress = len(completed_indices)
+        task_status[task_id].answers_fetched = len(completed_indices)
         
-        # 创建并发任务来评测所有问题，添加实时进度更新
-        print(f"🚀 开始并发评测，并发数: {GEMINI_CONCURRENT_REQUESTS}")
-        semaphore = asyncio.Semaphore(GEMINI_CONCURRENT_REQUESTS)
+        # 更新数据库状态
+        db.update_task_status(task_id, "running")
+
+    if not output_file:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        output_file = os.path.join(app.config['RESULTS_FOLDER'], f"evaluation_result_{timestamp}.csv")
+    
+    # 准备CSV表头
+    model_names = list(model_results.keys())
+    headers = build_result_headers(model_names, mode)
+    
+    # 评分标准每次评测只解析一次，各题只填入问题和回答
+    if prompt_template is None:
+        prompt_template = compile_eval_prompt(mode, filename, len(model_names))
+    if prompt_budgeter is None:
+        prompt_budgeter = create_prompt_budgeter(prompt_template)
+    judge_max_output = judge_output_tokens(len(model_names), JUDGE_OUTPUT_TOKENS_BASE,
+                                           JUDGE_OUTPUT_TOKENS_PER_MODEL, GEMINI_MAX_OUTPUT_TOKENS)
+    
+    # 创建并发任务来评测所有问题，添加实时进度更新
+    # 并发数按评测密钥数量放大，每个密钥仍受各自的限流约束
+    key_count = max(1, judge_key_pool.size())
+    concurrency = GEMINI_CONCURRENT_REQUESTS * key_count
+    logger.info(f"🚀 开始并发评测，并发数: {concurrency}，评测密钥: {key_count} 个，总限流速率: {judge_key_pool.total_rate():.2f} 请求/秒")
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    # 进度计数器（线程安全）
+    import threading
+    progress_lock = threading.Lock()
+    completed_count = [len(completed_indices)]  # 使用列表以便在闭包中修改
+    
+    fetched_count = [len(completed_indices)]  # 流水线模式下已获取答案的题目数
+    
+    # 任务控制令牌：由取消/暂停接口或调度器的控制轮询设置，不再逐题查询数据库
+    token = get_task_token(task_id)
+    
+    def is_task_cancelled(i: int) -> bool:
+        """检查任务是否被取消"""
+        if token.cancelled:
+            logger.info(f"任务 {task_id} 已被取消，跳过第{i+1}题")
+            return True
+        return False
+    
+    async def collect_answers(i: int, row: Dict) -> Optional[Dict]:
+        """准备一道题的评测数据（流水线模式下先获取模型答案），任务取消时返回None"""
+        # 任务暂停时在开始新题目前等待恢复
+        if not await token.wait_if_paused():
+            return None
+        pipeline_answers = None
+        if answer_provider is not None:
+            # 流水线模式：先在评测信号量之外获取本题答案，避免占用Gemini并发名额
+            try:
+                pipeline_answers = await answer_provider(i)
+            except Exception as e:
+                logger.error(f"❌ 获取第{i+1}题模型答案失败: {e}")
+                pipeline_answers = {model_name: "获取答案失败" for model_name in model_names}
+            with progress_lock:
+                fetched_count[0] += 1
+                if task_id in task_status:
+                    task_status[task_id].answers_fetched = fetched_count[0]
+        
+        # 获取各模型的答案
+        current_answers = {}
+        for model_name in model_names:
+            if pipeline_answers is not None:
+                current_answers[model_name] = pipeline_answers.get(model_name, "获取答案失败")
+            elif i < len(model_results[model_name]):
+                current_answers[model_name] = model_results[model_name][i]
+            else:
+                current_answers[model_name] = "获取答案失败"
+        
+        query = str(row.get("query", ""))
+        question_type = str(row.get("type", "未分类"))
+        standard_answer = str(row.get("answer", "")) if mode == 'objective' else ""
+        # 评测提示中使用按token预算截断后的回答，结果中仍保存完整回答
+        judge_answers, truncated = prompt_budgeter.fit(query, current_answers, question_type, standard_answer)
+        for model_name, (original, kept) in truncated.items():
+            logger.debug(f"✂️ 第{i+1}题 {model_name} 的回答约 {original} token，评测提示中截断为约 {kept} token")
+        
+        return {
+            'index': i,
+            'query': query,
+            'question_type': question_type,
+            'standard_answer': standard_answer,
+            'answers': current_answers,
+            'judge_answers': judge_answers
+        }
+    
+    def finish_call(call: CallRecord):
+        """记录一次评测请求的耗时明细"""
+        call.finish()
+        if telemetry is not None:
+            telemetry.record(call)
+    
+    async def judge_structured(i: int, prompt: str, call: CallRecord = None) -> Dict:
+        """结构化输出评测：一次解析校验，只针对缺失或不合规的模型重试"""
+        keys = model_keys(len(model_names))
+        gem_raw = await query_gemini_model(prompt, google_api_key, use_cache=use_judge_cache, call=call,
+                                           response_schema=build_response_schema(mode, keys),
+                                           max_output_tokens=judge_max_output)
+        result_json, missing = validate_judge_result(gem_raw, mode, keys)
+        for attempt in range(JUDGE_SCHEMA_RETRIES):
+            if not missing:
+                break
+            logger.warning(f"⚠️ 第{i+1}题 {'、'.join(missing)} 的评测结果缺失或不合规，重试 {attempt + 1}/{JUDGE_SCHEMA_RETRIES}")
+            retry_call = CallRecord(i, 'Gemini', 'judge')
+            gem_raw = await query_gemini_model(build_retry_prompt(prompt, missing), google_api_key,
+                                               use_cache=use_judge_cache, call=retry_call,
+                                               response_schema=build_response_schema(mode, missing),
+                                               max_output_tokens=judge_output_tokens(
+                                                   len(missing), JUDGE_OUTPUT_TOKENS_BASE,
+                                                   JUDGE_OUTPUT_TOKENS_PER_MODEL, GEMINI_MAX_OUTPUT_TOKENS))
+            finish_call(retry_call)
+            retried, missing = validate_judge_result(gem_raw, mode, missing)
+            result_json.update(retried)
+        if missing:
+            logger.error(f"❌ 第{i+1}题 {'、'.join(missing)} 重试后仍无有效评测结果，留空")
+            with progress_lock:
+                if task_id in task_status:
+                    task_status[task_id].error_count += 1
+        return result_json
+    
+    async def judge_item(item: Dict, call: CallRecord = None) -> Dict:
+        """单题评测，返回解析后的评测JSON"""
+        i = item['index']
+        query = item['query']
+        standard_answer = item['standard_answer']
+        current_answers = item['answers']
         
-        # 进度计数器（线程安全）
-        import threading
-        progress_lock = threading.Lock()
-        completed_count = [0]  # 使用列表以便在闭包中修改
+        # 构建评测提示（评分标准已在评测开始时编译）
+        prompt = prompt_template.render(query, item['judge_answers'], item['question_type'], standard_answer)
         
-        async def evaluate_single_question(i: int, row: Dict) -> Tuple[int, List]:
-            """评测单个问题"""
-            async with semaphore:
-                try:
-                    # 检查任务是否被取消
-                    if task_id in task_status:
-                        # 检查数据库状态
-                        db_task = db.get_running_task(task_id)
-                        if not db_task or db_task['status'] == 'cancelled':
-                            print(f"任务 {task_id} 已被取消，跳过第{i+1}题")
-                            return i, []
-                    
-                    query = str(row.get("query", ""))
-                    question_type = str(row.get("type", "未分类"))
-                    standard_answer = str(row.get("answer", "")) if mode == 'objective' else ""
-                    
-                    # 获取各模型的答案
-                    current_answers = {}
-                    for model_name in model_names:
-                        if i < len(model_results[model_name]):
-                            current_answers[model_name] = model_results[model_name][i]
-                        else:
-                            current_answers[model_name] = "获取答案失败"
-                    
-                    # 构建评测提示
-                    if mode == 'objective':
-                        prompt = build_objective_eval_prompt(query, standard_answer, current_answers, question_type, filename)
-                    else:
-                        prompt = build_subjective_eval_prompt(query, current_answers, question_type, filename)
-                    
-                    try:
-                        print(f"🔄 开始评测第{i+1}题...")
-                        
-                        # 🔍 [评测上下文日志] 显示即将评测的问题信息
-                        log_verbose("=" * 60)
-                        log_verbose(f"📋 [评测上下文] 第{i+1}题 ({mode}模式)")
-                        log_verbose(f"❓ 问题: {query[:100]}{'...' if len(query) > 100 else ''}")
-                        if mode == 'objective' and standard_answer:
-                            log_verbose(f"✅ 标准答案: {standard_answer[:50]}{'...' if len(standard_answer) > 50 else ''}")
-                        log_verbose(f"🤖 模型数量: {len(current_answers)}")
-                        for model_name, answer in current_answers.items():
-                            log_verbose(f"   - {model_name}: {answer[:50]}{'...' if len(answer) > 50 else ''}")
-                        log_verbose("=" * 60)
-                        
-                        gem_raw = await query_gemini_model(prompt, google_api_key)
-                        result_json = parse_json_str(gem_raw)
-                        print(f"✅ 完成评测第{i+1}题")
-                    except Exception as e:
-                        print(f"❌ 评测第{i+1}题时出错: {e}")
-                        result_json = {}
-                    
-                    # 构造CSV行数据
-                    row_data = [i+1, question_type, query]
-                    if mode == 'objective':
-                        row_data.append(standard_answer)
-                    
-                    # 添加各模型的结果
-                    for j, model_name in enumerate(model_names, 1):
-                        model_key = f"模型{j}"
-                        row_data.append(current_answers[model_name])  # 模型答案
-                        
-                        if model_key in result_json:
-                            # 处理评分，如果是"按提示词标准"则转换为3分
-                            raw_score = result_json[model_key].get("评分", "")
-                            processed_score = raw_score
-                            if raw_score == "按提示词标准":
-                                processed_score = "3"
-                                print(f"🔄 [评分处理] 将模型{j}的评分从'按提示词标准'转换为'3'")
-                            
-                            row_data.append(processed_score)  # 评分
-                            row_data.append(result_json[model_key].get("理由", ""))  # 理由
-                            if mode == 'objective':
-                                row_data.append(result_json[model_key].get("准确性", ""))  # 准确性
-                        else:
-                            row_data.extend(["", ""])  # 评分、理由
-                            if mode == 'objective':
-                                row_data.append("")  # 准确性
-                    
-                    # 实时更新进度
-                    with progress_lock:
-                        completed_count[0] += 1
-                        current_progress = completed_count[0]
-                        
-                        if task_id in task_status:
-                            task_status[task_id].progress = current_progress
-                            task_status[task_id].current_step = f"已评测 {current_progress}/{len(data)} 题 (第{i+1}题完成)"
-                            
-                            # 同时更新数据库
-                            try:
-                                db.update_task_progress(task_id, current_progress, task_status[task_id].current_step)
-                            except Exception as e:
-                                print(f"⚠️ 更新数据库进度失败: {e}")
-                    
-                    return i, row_data
-                    
-                except Exception as e:
-                    print(f"❌ 评测第{i+1}题出现异常: {e}")
-                    # 即使失败也要更新进度
-                    with progress_lock:
-                        completed_count[0] += 1
-                        current_progress = completed_count[0]
-                        if task_id in task_status:
-                            task_status[task_id].progress = current_progress
-                            task_status[task_id].current_step = f"已处理 {current_progress}/{len(data)} 题 (第{i+1}题失败)"
-                            try:
-                                db.update_task_progress(task_id, current_progress, task_status[task_id].current_step)
-                            except:
-                                pass
-                    return i, []
-        
-        # 创建所有评测任务
-        tasks = [evaluate_single_question(i, row) for i, row in enumerate(data)]
+        try:
+            logger.debug(f"🔄 开始评测第{i+1}题...")
+            
+            # 🔍 [评测上下文日志] 显示即将评测的问题信息
+            context_lines = [f"❓ 问题: {query[:100]}{'...' if len(query) > 100 else ''}"]
+            if mode == 'objective' and standard_answer:
+                context_lines.append(f"✅ 标准答案: {standard_answer[:50]}{'...' if len(standard_answer) > 50 else ''}")
+            context_lines.append(f"🤖 模型数量: {len(current_answers)}")
+            for model_name, answer in current_answers.items():
+                context_lines.append(f"   - {model_name}: {answer[:50]}{'...' if len(answer) > 50 else ''}")
+            log_verbose(f"📋 [评测上下文] 第{i+1}题 ({mode}模式)", "\n".join(context_lines))
+            
+            if structured_judge:
+                result_json = await judge_structured(i, prompt, call)
+            else:
+                gem_raw = await query_gemini_model(prompt, google_api_key, use_cache=use_judge_cache, call=call,
+                                                   max_output_tokens=judge_max_output)
+                result_json = parse_json_str(gem_raw)
+            logger.debug(f"✅ 完成评测第{i+1}题")
+        except Exception as e:
+            logger.error(f"❌ 评测第{i+1}题时出错: {e}")
+            result_json = {}
+        return result_json
+    
+    def record_result(item: Dict, result_json: Dict):
+        """把一道题的评测结果写入任务结果日志并更新进度"""
+        i = item['index']
+        current_answers = item['answers']
         
-        # 并发执行所有任务
-        print(f"📊 开始并发执行 {len(tasks)} 个评测任务...")
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+        # 构造CSV行数据
+        row_data = [i+1, item['question_type'], item['query']]
+        if mode == 'objective':
+            row_data.append(item['standard_answer'])
         
-        # 按序号排序并写入CSV
-        valid_results = []
-        for result in results:
-            if isinstance(result, Exception):
-                print(f"❌ 评测任务异常: {result}")
-                continue
-            if len(result) == 2 and len(result[1]) > 0:  # 有效结果
-                valid_results.append(result)
+        # 添加各模型的结果
+        for j, model_name in enumerate(model_names, 1):
+            model_key = f"模型{j}"
+            row_data.append(current_answers[model_name])  # 模型答案
+            
+            if model_key in result_json:
+                # 处理评分，如果是"按提示词标准"则转换为3分
+                raw_score = result_json[model_key].get("评分", "")
+                processed_score = raw_score
+                if raw_score == "按提示词标准":
+                    processed_score = "3"
+                    logger.info(f"🔄 [评分处理] 将模型{j}的评分从'按提示词标准'转换为'3'")
+                
+                row_data.append(processed_score)  # 评分
+                row_data.append(result_json[model_key].get("理由", ""))  # 理由
+                if mode == 'objective':
+                    row_data.append(result_json[model_key].get("准确性", ""))  # 准确性
+            else:
+                row_data.extend(["", ""])  # 评分、理由
+                if mode == 'objective':
+                    row_data.append("")  # 准确性
         
-        # 按题目序号排序
-        valid_results.sort(key=lambda x: x[0])
+        # 立即写入任务结果日志，进程中断时已完成的题目不会丢失
+        db.append_task_result_row(task_id, i, row_data)
         
-        # 写入CSV
-        print(f"📝 写入CSV文件，共 {len(valid_results)} 条有效记录...")
-        for i, (question_index, row_data) in enumerate(valid_results):
-            writer.writerow(row_data)
+        # 实时更新进度
+        with progress_lock:
+            completed_count[0] += 1
+            current_progress = completed_count[0]
+            
+            if task_id in task_status:
+                task_status[task_id].progress = current_progress
+                task_status[task_id].current_step = f"已评测 {current_progress}/{question_total} 题 (第{i+1}题完成)"
+                if answer_provider is not None:
+                    task_status[task_id].current_step += f"，已获取答案 {fetched_count[0]}/{question_total} 题"
+    
+    def record_failure(i: int):
+        """评测出现异常时也要更新进度"""
+        with progress_lock:
+            completed_count[0] += 1
+            current_progress = completed_count[0]
+            if task_id in task_status:
+                task_status[task_id].progress = current_progress
+                task_status[task_id].error_count += 1
+                task_status[task_id].current_step = f"已处理 {current_progress}/{question_total} 题 (第{i+1}题失败)"
+    
+    async def evaluate_single_question(i: int, row: Dict) -> Tuple[int, bool]:
+        """评测单个问题，结果写入任务结果日志，返回 (题目序号, 是否成功)"""
+        item = await collect_answers(i, row)
+        if item is None:
+            return i, False
+        
+        call = CallRecord(i, 'Gemini', 'judge')
+        async with semaphore:
+            # 任务暂停时不再发出新的评测请求，等待恢复
+            await token.wait_if_paused()
+            call.queue_wait = call.elapsed()
+            try:
+                # 检查任务是否被取消
+                if is_task_cancelled(i):
+                    return i, False
+                
+                result_json = await judge_item(item, call)
+                finish_call(call)
+                record_result(item, result_json)
+                return i, True
+                
+            except Exception as e:
+                logger.error(f"❌ 评测第{i+1}题出现异常: {e}")
+                record_failure(i)
+                return i, False
+    
+    async def judge_batch(items: List[Dict]) -> List[Tuple[int, bool]]:
+        """批量评测一组题目；缺失的题目拆成两半重试，单题时退回单题评测"""
+        if len(items) == 1:
+            item = items[0]
+            call = CallRecord(item['index'], 'Gemini', 'judge')
+            async with semaphore:
+                await token.wait_if_paused()
+                call.queue_wait = call.elapsed()
+                if is_task_cancelled(item['index']):
+                    return [(item['index'], False)]
+                result_json = await judge_item(item, call)
+            finish_call(call)
+            record_result(item, result_json)
+            return [(item['index'], True)]
+        
+        indices = f"{items[0]['index']+1}-{items[-1]['index']+1}"
+        completed, missing = [], items
+        call = CallRecord(items[0]['index'], 'Gemini', 'judge', item_count=len(items))
+        try:
+            async with semaphore:
+                await token.wait_if_paused()
+                call.queue_wait = call.elapsed()
+                if is_task_cancelled(items[0]['index']):
+                    return [(item['index'], False) for item in items]
+                logger.info(f"🔄 开始批量评测第{indices}题（{len(items)}题/批）...")
+                prompt = build_batch_eval_prompt(prompt_template.rubric, items, mode)
+                response_schema = None
+                if structured_judge:
+                    response_schema = build_batch_response_schema(
+                        mode, [batch_key(item['index']) for item in items], len(model_names)
+                    )
+                gem_raw = await query_gemini_model(prompt, google_api_key, use_cache=use_judge_cache, call=call,
+                                                   response_schema=response_schema)
+            finish_call(call)
+            parsed = load_json_object(gem_raw) if structured_judge else parse_json_str(gem_raw)
+            completed, missing = split_batch_results(parsed, items)
+            if not missing:
+                sizer.observe(len(gem_raw), len(items))
+        except Exception as e:
+            logger.error(f"❌ 批量评测第{indices}题时出错: {e}")
+        
+        outcomes = []
+        for item, result_json in completed:
+            record_result(item, result_json)
+            outcomes.append((item['index'], True))
+        
+        if missing:
+            # 输出被截断或漏题：调小之后的批次，只拆分重试缺失的题目
+            sizer.on_incomplete()
+            logger.warning(f"⚠️ 批量评测第{indices}题缺少 {len(missing)} 题结果，拆分重试（之后每批 {sizer.size} 题）")
+            half = (len(missing) + 1) // 2
+            parts = [missing[:half], missing[half:]] if len(missing) > 1 else [missing]
+            for part_outcomes in await asyncio.gather(*(judge_batch(part) for part in parts)):
+                outcomes.extend(part_outcomes)
+        return outcomes
+    
+    async def evaluate_in_batches(rows: List[Tuple[int, Dict]]) -> List[Tuple[int, bool]]:
+        """答案就绪的题目进入队列，按当前批大小组批后并发评测"""
+        ready: asyncio.Queue = asyncio.Queue()
+        
+        async def produce(i: int, row: Dict):
+            try:
+                item = await collect_answers(i, row)
+            except Exception as e:
+                logger.error(f"❌ 准备第{i+1}题评测数据时出错: {e}")
+                item = None
+            await ready.put(item if item is not None else i)
         
-        print(f"✅ 并发评测完成，成功处理 {len(valid_results)}/{len(data)} 题")
+        async def run_batch(batch: List[Dict]) -> List[Tuple[int, bool]]:
+            try:
+                return await judge_batch(batch)
+            except Exception as e:
+                logger.error(f"❌ 批量评测出现异常: {e}")
+                for item in batch:
+                    record_failure(item['index'])
+                return [(item['index'], False) for item in batch]
+        
+        producers = [asyncio.create_task(produce(i, row)) for i, row in rows]
+        batch_tasks, outcomes, batch = [], [], []
+        for received in range(len(rows)):
+            # 非流水线模式下答案已全部就绪，流水线模式下等待片刻凑满一批
+            try:
+                entry = await asyncio.wait_for(ready.get(), timeout=JUDGE_BATCH_WAIT_SECONDS) if batch else await ready.get()
+            except asyncio.TimeoutError:
+                batch_tasks.append(asyncio.create_task(run_batch(batch)))
+                batch = []
+                entry = await ready.get()
+            if isinstance(entry, int):
+                outcomes.append((entry, False))  # 任务已取消或答案准备失败
+            else:
+                batch.append(entry)
+            if batch and (len(batch) >= sizer.size or received == len(rows) - 1):
+                batch_tasks.append(asyncio.create_task(run_batch(batch)))
+                batch = []
+        
+        await asyncio.gather(*producers, return_exceptions=True)
+        for batch_outcomes in await asyncio.gather(*batch_tasks):
+            outcomes.extend(batch_outcomes)
+        return outcomes
+    
+    target_indices = range(len(data)) if indices is None else sorted(set(indices))
+    pending_rows = [(i, data[i]) for i in target_indices if i not in completed_indices]
+    
+    if batch_judge and pending_rows:
+        # 批量评测：多道题合并为一次请求，评分标准只发送一次
+        sizer = AdaptiveBatchSizer(GEMINI_MAX_OUTPUT_TOKENS, len(model_names), JUDGE_BATCH_MAX_SIZE)
+        logger.info(f"📦 批量评测模式，初始每批 {sizer.size} 题（上限 {JUDGE_BATCH_MAX_SIZE} 题）")
+        results = await evaluate_in_batches(pending_rows)
+        task_count = len(pending_rows)
+    else:
+        # 创建所有评测任务（跳过日志中已完成的题目）
+        tasks = [evaluate_single_question(i, row) for i, row in pending_rows]
+        task_count = len(tasks)
+        
+        # 并发执行所有任务
+        logger.info(f"📊 开始并发执行 {len(tasks)} 个评测任务...")
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+    
+    success_count = 0
+    for result in results:
+        if isinstance(result, Exception):
+            logger.error(f"❌ 评测任务异常: {result}")
+            continue
+        if result[1]:
+            success_count += 1
+    
+    if telemetry is not None:
+        telemetry.flush()
+    
+    if indices is not None:
+        # 序贯抽样的每一轮只写入结果日志，全部轮次结束后由调用方生成一次CSV
+        logger.info(f"✅ 本轮评测完成，成功处理 {success_count}/{task_count} 题")
+        return output_file
+    
+    # 按题目顺序把结果日志生成为CSV
+    written_count = write_result_csv_from_journal(task_id, output_file, headers)
+    
+    logger.info(f"✅ 并发评测完成，本次成功处理 {success_count}/{task_count} 题，结果文件共 {written_count}/{question_total} 题")
 
     return output_file
 
+async def evaluate_models_pipelined(data: List[Dict], mode: str, selected_models: List[str], task_id: str,
+                                    request_headers: dict = None, google_api_key: str = None, filename: str = None,
+                                    use_judge_cache: bool = True, answer_store: AnswerStore = None,
+                                    output_file: str = None, batch_judge: bool = False,
+                                    telemetry: CallTelemetry = None, prompt_template: CompiledEvalPrompt = None,
+                                    structured_judge: bool = False, hedge_stats: HedgeStats = None,
+                                    indices: Optional[List[int]] = None,
+                                    prompt_budgeter: PromptBudgeter = None) -> str:
+    """流水线评测：答案获取与Gemini评测在同一事件循环中按题重叠执行
+    
+    每道题的所有模型答案就绪后立即进入评测队列，总耗时约为 max(获取答案, 评测)，而不是两者之和。
+    提供 hedge_stats 时对慢的答案请求发出对冲请求；indices 不为空时只获取并评测这些题目。
+    """
+    queries = [str(row.get("query", "")) for row in data]
+    sem_models = model_factory.create_model_semaphores(selected_models)  # 每个模型独立控制并发
+    
+    async with model_factory.create_session(selected_models) as session:
+        async def provide_answers(i: int) -> Dict[str, str]:
+            # 进度由评测阶段统一维护，这里不向客户端传递task_status
+            return await model_factory.get_query_answers(
+                session, queries[i], i, selected_models, sem_models, task_id, request_headers=request_headers,
+                answer_store=answer_store, telemetry=telemetry, hedge_stats=hedge_stats
+            )
+        
+        model_results = {model_name: [] for model_name in selected_models}
+        try:
+            return await evaluate_models(data, mode, model_results, task_id, google_api_key, filename,
+                                         answer_provider=provide_answers, use_judge_cache=use_judge_cache,
+                                         output_file=output_file, batch_judge=batch_judge, telemetry=telemetry,
+                                         prompt_template=prompt_template, structured_judge=structured_judge,
+                                         indices=indices, prompt_budgeter=prompt_budgeter)
+        finally:
+            if answer_store is not None:
+                answer_store.flush()
+
 def run_async_task(func, *args):
     """在新线程中运行异步任务"""
     loop = asyncio.new_event_loop()
@@ -1019,6 +1290,342 @@ def run_async_task(func, *args):
         loop.close()
 
 
+def load_evaluation_dataset(filepath: str) -> pd.DataFrame:
+    """读取评测数据集文件，缺少type列时补充默认值"""
+    if filepath.endswith('.csv'):
+        df = pd.read_csv(filepath, encoding='utf-8-sig')
+    else:
+        df = pd.read_excel(filepath, engine='openpyxl')
+    
+    # 如果没有type列，添加默认值
+    if 'type' not in df.columns:
+        df['type'] = '未分类'
+    return df
+
+def extract_credential_headers(headers):
+    """提取请求头中用户提供的模型密钥（X-xxx-Key），加密后随任务保存供评测进程使用"""
+    return seal_credentials({key: value for key, value in dict(headers).items()
+                             if key.lower().startswith('x-') and key.lower().endswith('-key') and value})
+
+
+def execute_queued_task(task: Dict):
+    """执行调度器领取的任务：在本进程中建立任务状态后运行评测
+    
+    任务结束（完成、失败、取消或未执行）后删除随任务保存的用户密钥。
+    """
+    task_id = task['task_id']
+    try:
+        _execute_queued_task(task)
+    finally:
+        db.update_task_metadata(task_id, {'credentials': None})
+
+
+def _execute_queued_task(task: Dict):
+    task_id = task['task_id']
+    metadata = task.get('metadata') or {}
+    job = metadata.get('job')
+    if not job:
+        db.update_task_status(task_id, "failed", error_message="任务缺少执行参数")
+        return
+    
+    # 启动或续跑前检查项目权限和用户、项目的token预算
+    allowed, budget_message = check_project_access(db, job.get('user_id'), job.get('project_id', 'default'))
+    if allowed:
+        allowed, budget_message = check_token_budget(db, job.get('user_id'), job.get('project_id', 'default'))
+    if not allowed:
+        logger.warning(f"⛔ 任务 {task_id} 未执行: {budget_message}")
+        db.update_task_status(task_id, "failed", error_message=budget_message)
+        failed_status = TaskStatus(task_id)
+        failed_status.status = "失败"
+        failed_status.error_message = budget_message
+        failed_status.end_time = datetime.now()
+        task_status[task_id] = failed_status
+        task_status.flush()
+        return
+    
+    completed_count = len(db.get_task_result_indices(task_id))
+    status = TaskStatus(task_id)
+    status.evaluation_mode = task['evaluation_mode']
+    status.selected_models = task['selected_models']
+    status.total = task['total']
+    status.question_count = task['total']
+    status.progress = completed_count
+    status.status = "运行中"
+    status.current_step = f"续跑中，已完成 {completed_count}/{task['total']} 题" if completed_count else "开始评测"
+    if task.get('started_at'):
+        status.start_time = datetime.fromisoformat(task['started_at'])
+    task_status[task_id] = status
+    
+    credentials = open_credentials(metadata.get('credentials'))
+    # 与原有顺序一致：优先使用服务端评测密钥池，未配置时才使用用户在请求头中提供的密钥
+    google_api_key = None if judge_key_pool.size() else credentials.get('x-google-api-key')
+    run_evaluation_job(task_id, job, credentials, google_api_key)
+
+
+def run_evaluation_job(task_id: str, job: Dict, headers_dict: dict = None, google_api_key: str = None):
+    """执行评测任务（新任务和续跑共用）
+    
+    job 是保存在 running_tasks.metadata['job'] 中的任务参数，续跑时从数据库读出后原样传入；
+    已写入任务结果日志的题目会被跳过。
+    """
+    filename = job['filename']
+    mode = job['mode']
+    selected_models = job['selected_models']
+    user_id = job['user_id']
+    task_custom_name = job.get('custom_name', '')
+    task_save_to_history = job.get('save_to_history', True)
+    bypass_cache = job.get('bypass_cache', False)
+    batch_judge = job.get('batch_judge', JUDGE_BATCH_MODE)
+    structured_judge = job.get('structured_judge', JUDGE_STRUCTURED_OUTPUT)
+    hedge_stats = HedgeStats() if job.get('hedge_requests', MODEL_HEDGE_ENABLED) else None
+    sampling_summary = None
+    
+    # 本线程之后的日志（包括评测协程中的日志）带上task_id
+    set_log_task(task_id)
+    
+    # 取消时中断正在进行的请求；暂停/恢复时更新任务状态显示
+    token = get_task_token(task_id)
+    status_before_pause = [None]
+    
+    def on_budget_exceeded(message: str):
+        logger.warning(f"⛔ 任务 {task_id} 运行中{message}，停止评测")
+        token.cancel()
+    
+    # 运行中每次写入token用量后检查预算，用完时中断评测（已完成的题目保留在结果日志中，提高预算后可续跑）
+    budget_guard = BudgetGuard(db, user_id, job.get('project_id', 'default'), on_budget_exceeded)
+    
+    def on_state_change(state: str):
+        if task_id not in task_status:
+            return
+        if state == PAUSED:
+            status_before_pause[0] = task_status[task_id].status
+            task_status[task_id].status = "已暂停"
+        elif status_before_pause[0]:
+            task_status[task_id].status = status_before_pause[0]
+    
+    try:
+        data_list = load_evaluation_dataset(job['filepath']).to_dict('records')
+        queries = [str(row.get("query", "")) for row in data_list]
+        
+        # 答案存储：新答案写入缓存，按需复用历史结果或缓存中的答案
+        reuse_result_id = job.get('reuse_result_id')
+        preloaded = load_answers_from_result(reuse_result_id, selected_models, user_id) if reuse_result_id else None
+        answer_store = model_factory.create_answer_store(db, selected_models, job.get('reuse_cached_answers', False), preloaded)
+        answer_store.prefetch(selected_models, queries)
+        prompt_template = compile_eval_prompt(mode, filename, len(selected_models))
+        prompt_budgeter = create_prompt_budgeter(prompt_template)
+        # 每次调用的耗时明细和token用量，结果保存后关联到result_id
+        telemetry = CallTelemetry(db, task_id, {
+            'user_id': user_id,
+            'project_id': job.get('project_id', 'default'),
+            'dataset_file': filename,
+            'prompt_version': prompt_template.version
+        }, on_usage=budget_guard.check)
+        db.update_task_metadata(task_id, {'prompt_version': prompt_template.version})
+        
+        if job.get('sequential_sampling', SEQUENTIAL_SAMPLING_ENABLED):
+            # 序贯抽样：分轮评测分层抽取的题目（答案获取与评测按流水线执行），排序确定或达到题数上限时停止
+            sampler = SequentialSampler(
+                [str(row.get("type", "未分类")) for row in data_list], selected_models, mode,
+                job.get('sampling_seed', 0), SEQUENTIAL_ROUND_SIZE, job.get('sample_budget', SEQUENTIAL_MAX_QUESTIONS),
+                SEQUENTIAL_MIN_QUESTIONS, SEQUENTIAL_CONFIDENCE, SEQUENTIAL_TARGET_HALF_WIDTH
+            )
+            attempted = set()  # 本次已尝试的题目，评测失败的题目不再重复抽取
+            while True:
+                sampling_summary = sampler.analyze(db.iter_task_result_rows(task_id))
+                stop_reason = sampler.stop_reason(sampling_summary)
+                round_indices = [] if stop_reason else sampler.next_round(db.get_task_result_indices(task_id) | attempted)
+                if not round_indices:
+                    stop_reason = stop_reason or (STOP_EXHAUSTED if len(attempted) >= len(data_list) else STOP_BUDGET)
+                    break
+                attempted.update(round_indices)
+                logger.info(f"🎯 序贯抽样第{sampler.rounds}轮: 新增 {len(round_indices)} 题，"
+                            f"已评测 {sampling_summary['judged']}/{len(data_list)} 题（上限 {sampler.budget} 题）")
+                run_async_task(run_cancellable, token, evaluate_models_pipelined(
+                    data_list, mode, selected_models, task_id, headers_dict, google_api_key, filename,
+                    use_judge_cache=not bypass_cache, answer_store=answer_store, output_file=job['output_file'],
+                    batch_judge=batch_judge, telemetry=telemetry, prompt_template=prompt_template,
+                    structured_judge=structured_judge, hedge_stats=hedge_stats, indices=round_indices,
+                    prompt_budgeter=prompt_budgeter
+                ), on_state_change)
+                if token.cancelled:
+                    if budget_guard.exceeded_message:
+                        raise TaskCancelledError(task_id)
+                    break
+            
+            sampling_summary['stop_reason'] = stop_reason
+            separated = sum(1 for pair in sampling_summary['pairs'] if pair['separated'])
+            logger.info(f"🎯 序贯抽样结束({stop_reason}): 共评测 {sampling_summary['judged']}/{len(data_list)} 题，"
+                        f"{separated}/{len(sampling_summary['pairs'])} 对模型差异显著（置信水平 {SEQUENTIAL_CONFIDENCE:.0%}）")
+            for pair in sampling_summary['pairs']:
+                if 'mean' in pair:
+                    logger.info(f"   {pair['models'][0]} - {pair['models'][1]}: {pair['mean']:+.3f} "
+                                f"[{pair['ci'][0]:+.3f}, {pair['ci'][1]:+.3f}]")
+            db.update_task_metadata(task_id, {'sampling': sampling_summary})
+            output_file = job['output_file']
+            write_result_csv_from_journal(task_id, output_file, build_result_headers(selected_models, mode))
+        elif job.get('pipeline_mode', EVALUATION_PIPELINE_MODE):
+            # 流水线模式：答案获取与评测按题重叠执行
+            output_file = run_async_task(run_cancellable, token, evaluate_models_pipelined(
+                data_list, mode, selected_models, task_id, headers_dict, google_api_key, filename,
+                use_judge_cache=not bypass_cache, answer_store=answer_store, output_file=job['output_file'],
+                batch_judge=batch_judge, telemetry=telemetry, prompt_template=prompt_template,
+                structured_judge=structured_judge, hedge_stats=hedge_stats, prompt_budgeter=prompt_budgeter
+            ), on_state_change)
+        else:
+            # 第一步：获取模型答案（只获取结果日志中缺失的题目）
+            completed_indices = db.get_task_result_indices(task_id)
+            pending_indices = [i for i in range(len(queries)) if i not in completed_indices]
+            pending_results = run_async_task(run_cancellable, token, get_multiple_model_answers(
+                [queries[i] for i in pending_indices], selected_models, task_id, headers_dict,
+                answer_store=answer_store, telemetry=telemetry, indices=pending_indices, hedge_stats=hedge_stats
+            ), on_state_change)
+            
+            model_results = {model_name: ["获取答案失败"] * len(queries) for model_name in selected_models}
+            for model_name, answers in pending_results.items():
+                for i, answer in zip(pending_indices, answers):
+                    model_results[model_name][i] = answer
+            
+            # 第二步：评测
+            output_file = run_async_task(run_cancellable, token, evaluate_models(
+                data_list, mode, model_results, task_id, google_api_key, filename,
+                use_judge_cache=not bypass_cache, output_file=job['output_file'], batch_judge=batch_judge,
+                telemetry=telemetry, prompt_template=prompt_template, structured_judge=structured_judge,
+                prompt_budgeter=prompt_budgeter
+            ), on_state_change)
+        
+        logger.info(f"♻️ 答案复用统计: 复用 {answer_store.hits} 个，请求模型 {answer_store.misses} 个")
+        if hedge_stats is not None:
+            hedge_summary = hedge_stats.to_dict()
+            logger.info(f"🔀 请求对冲统计: 请求 {hedge_summary['requests']} 个，对冲 {hedge_summary['hedged']} 个，"
+                        f"对冲请求先返回 {hedge_summary['hedge_wins']} 个")
+            db.update_task_metadata(task_id, {'hedging': hedge_summary})
+        
+        token_usage = db.get_token_usage(task_id=task_id)
+        logger.info(f"🪙 Token用量: 输入 {token_usage['input_tokens']:,}，输出 {token_usage['output_tokens']:,}，"
+                    f"其中估算 {token_usage['estimated_tokens']:,}")
+        db.update_task_metadata(task_id, {'token_usage': token_usage})
+        
+        prompt_budget = prompt_budgeter.to_dict()
+        if prompt_budget['truncated_answers']:
+            logger.info(f"✂️ 评测提示截断统计: {prompt_budget['truncated_prompts']}/{prompt_budget['prompts']} 题截断了 "
+                        f"{prompt_budget['truncated_answers']} 个回答，共省略约 {prompt_budget['tokens_removed']:,} token"
+                        f"（策略 {prompt_budget['policy']}，上限 {prompt_budget['max_input_tokens']:,} token）")
+        db.update_task_metadata(task_id, {'prompt_budget': prompt_budget})
+        
+        if token.cancelled and not budget_guard.exceeded_message:
+            # 任务已被删除：不保存结果，清理本进程写回的状态（最后一次写入用量时才超出预算的任务已评测完成，正常保存）
+            logger.info(f"🛑 任务 {task_id} 已取消，放弃保存结果")
+            del task_status[task_id]
+            return
+        
+        task_status[task_id].status = "完成"
+        task_status[task_id].result_file = os.path.basename(output_file)
+        task_status[task_id].current_step = f"评测完成，结果已保存到 {os.path.basename(output_file)}"
+        if sampling_summary is not None:
+            task_status[task_id].current_step += f"（抽样评测 {sampling_summary['judged']}/{len(data_list)} 题）"
+        task_status[task_id].end_time = datetime.now()
+        task_status.flush()
+        
+        # 同时更新数据库（任务结束时同时删除用户密钥）
+        db.update_task_status(task_id, "completed", result_file=output_file)
+        
+        # 保存到历史记录（始终保存基础记录，确保数据库一致性）
+        try:
+            evaluation_data = {
+                'dataset_file': filename,
+                'models': selected_models,
+                'evaluation_mode': mode,
+                'start_time': task_status[task_id].start_time.isoformat(),
+                'end_time': task_status[task_id].end_time.isoformat() if task_status[task_id].end_time else None,
+                'question_count': sampling_summary['judged'] if sampling_summary else len(data_list),
+                'custom_name': task_custom_name if task_save_to_history else '',  # 只有选择保存时才使用自定义名称
+                'created_by': user_id,  # 使用传递的用户ID
+                'save_to_history': task_save_to_history,  # 标记是否为用户主动保存
+                'prompt_version': prompt_template.version,  # 评测提示模板版本
+                'hedging': hedge_stats.to_dict() if hedge_stats is not None else None,  # 请求对冲统计
+                'sampling': sampling_summary,  # 序贯抽样的评测题数、停止原因和置信区间
+                'token_usage': token_usage,  # 本次评测的token用量
+                'prompt_budget': prompt_budget  # 评测提示中回答的截断统计
+            }
+            
+            if task_save_to_history:
+                # 用户选择保存到历史记录，完整保存
+                logger.info(f"💾 [评测完成] 用户选择保存到历史记录")
+                result_id = history_manager.save_evaluation_result(evaluation_data, output_file)
+            else:
+                # 用户未选择保存，但仍需创建基础数据库记录以支持查看功能
+                logger.info(f"📝 [评测完成] 创建基础数据库记录以支持查看功能")
+                result_name = f"临时结果_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+                result_id = db.save_evaluation_result(
+                    project_id='default',
+                    name=result_name,
+                    dataset_file=filename,
+                    models=selected_models,
+                    result_file=output_file,
+                    evaluation_mode=mode,
+                    created_by=user_id,
+                    metadata={
+                        'start_time': evaluation_data['start_time'],
+                        'end_time': evaluation_data['end_time'],
+                        'question_count': evaluation_data['question_count'],
+                        'prompt_version': evaluation_data['prompt_version'],
+                        'hedging': evaluation_data['hedging'],
+                        'sampling': evaluation_data['sampling'],
+                        'token_usage': evaluation_data['token_usage'],
+                        'prompt_budget': evaluation_data['prompt_budget'],
+                        'is_temporary': True  # 标记为临时记录
+                    }
+                )
+            
+            if result_id:
+                db.attach_call_telemetry(task_id, result_id)
+                
+        except Exception as e:
+            logger.error(f"❌ 保存评测记录失败: {e}")
+            # 即使保存失败，也要确保有基础记录
+            try:
+                logger.info(f"🔄 [评测完成] 尝试创建最小化数据库记录")
+                fallback_name = f"评测结果_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+                result_id = db.save_evaluation_result(
+                    project_id='default',
+                    name=fallback_name,
+                    dataset_file=filename or '',
+                    models=selected_models,
+                    result_file=output_file,
+                    evaluation_mode=mode,
+                    created_by=user_id,
+                    metadata={'is_fallback': True, 'prompt_version': prompt_template.version}
+                )
+                db.attach_call_telemetry(task_id, result_id)
+                logger.info(f"✅ [评测完成] 已创建最小化记录: {fallback_name}")
+            except Exception as fallback_error:
+                logger.error(f"❌ [评测完成] 连最小化记录都创建失败: {fallback_error}")
+        
+    except TaskCancelledError:
+        if budget_guard.exceeded_message:
+            # token预算用完：任务标记为失败，已完成的题目保留在结果日志中
+            task_status[task_id].status = "失败"
+            task_status[task_id].error_message = budget_guard.exceeded_message
+            task_status[task_id].end_time = datetime.now()
+            task_status.flush()
+            db.update_task_status(task_id, "failed", error_message=budget_guard.exceeded_message)
+            return
+        # 评测中途被取消：正在进行的请求已中断，不保存结果
+        logger.info(f"🛑 任务 {task_id} 已取消，评测已中断")
+        db.update_task_metadata(task_id, {'credentials': None})
+        del task_status[task_id]
+    except Exception as e:
+        task_status[task_id].status = "失败"
+        task_status[task_id].error_message = str(e)
+        task_status[task_id].end_time = datetime.now()
+        task_status.flush()
+        logger.info(f"评测任务失败: {e}")  # 添加日志
+        
+        # 同时更新数据库（任务结束时同时删除用户密钥）
+        db.update_task_status(task_id, "failed", error_message=str(e))
+
+
 # ===== 用户认证装饰器 =====
 
 def login_required(f):
@@ -1087,7 +1694,7 @@ def auto_fix_file_path(file_record):
         db_filename = file_record['filename']
         uploaded_by = file_record['uploaded_by']
         
-        print(f"🔍 搜索匹配文件: {db_filename}")
+        logger.info(f"🔍 搜索匹配文件: {db_filename}")
         
         # 获取uploads目录中的所有文件
         actual_files = [f for f in os.listdir(upload_folder) 
@@ -1098,7 +1705,7 @@ def auto_fix_file_path(file_record):
         username = uploader_info['username'] if uploader_info else None
         display_name = uploader_info['display_name'] if uploader_info else None
         
-        print(f"🔍 用户信息: username={username}, display_name={display_name}")
+        logger.info(f"🔍 用户信息: username={username}, display_name={display_name}")
         
         # 匹配策略
         def calculate_similarity(actual_file, db_file):
@@ -1135,7 +1742,7 @@ def auto_fix_file_path(file_record):
         
         for actual_file in actual_files:
             score = calculate_similarity(actual_file, db_filename)
-            print(f"  📊 {actual_file}: 匹配分数 {score}")
+            logger.info(f"  📊 {actual_file}: 匹配分数 {score}")
             
             if score > best_score and score >= 40:  # 最低匹配阈值
                 best_match = actual_file
@@ -1155,18 +1762,18 @@ def auto_fix_file_path(file_record):
                     ''', (best_match, new_filepath, best_match, file_record['id']))
                     conn.commit()
                     
-                print(f"✅ 数据库更新成功: {db_filename} -> {best_match}")
+                logger.info(f"✅ 数据库更新成功: {db_filename} -> {best_match}")
                 return new_filepath
                 
             except Exception as e:
-                print(f"❌ 数据库更新失败: {e}")
+                logger.error(f"❌ 数据库更新失败: {e}")
                 return None
         else:
-            print(f"❌ 未找到匹配文件")
+            logger.error(f"❌ 未找到匹配文件")
             return None
             
     except Exception as e:
-        print(f"❌ 自动修复失败: {e}")
+        logger.error(f"❌ 自动修复失败: {e}")
         return None
 
 
@@ -1203,15 +1810,15 @@ def get_uploaded_files():
                 
                 # 🔧 自动文件名同步检查
                 if not os.path.exists(filepath):
-                    print(f"🔍 文件不存在，尝试自动修复: {file_record['filename']}")
+                    logger.info(f"🔍 文件不存在，尝试自动修复: {file_record['filename']}")
                     
                     # 尝试在uploads目录中找到匹配的文件
                     fixed_filepath = auto_fix_file_path(file_record)
                     if fixed_filepath:
                         filepath = fixed_filepath
-                        print(f"✅ 自动修复成功: {file_record['filename']} -> {filepath}")
+                        logger.info(f"✅ 自动修复成功: {file_record['filename']} -> {filepath}")
                     else:
-                        print(f"❌ 无法自动修复: {file_record['filename']}")
+                        logger.error(f"❌ 无法自动修复: {file_record['filename']}")
                         continue
                 
                 if os.path.exists(filepath):
@@ -1242,9 +1849,9 @@ def get_uploaded_files():
                         'total_count': file_record.get('total_count', 0)
                     })
                     
-                    print(f"✅ 加载测试集文件: {file_record['filename']} (上传者: {uploader_name})")
+                    logger.info(f"✅ 加载测试集文件: {file_record['filename']} (上传者: {uploader_name})")
             except Exception as file_error:
-                print(f"❌ 处理文件记录 {file_record.get('filename', 'unknown')} 时出错: {file_error}")
+                logger.error(f"❌ 处理文件记录 {file_record.get('filename', 'unknown')} 时出错: {file_error}")
                 continue
         
         # 如果是管理员且没有选择特定用户，还需要检查文件系统中的遗留文件（没有数据库记录的）
@@ -1283,17 +1890,17 @@ def get_uploaded_files():
                                 'total_count': 0
                             })
                             
-                            print(f"✅ 加载遗留文件: {filename}")
+                            logger.info(f"✅ 加载遗留文件: {filename}")
                             
                         except Exception as file_error:
-                            print(f"❌ 处理遗留文件 {filename} 时出错: {file_error}")
+                            logger.error(f"❌ 处理遗留文件 {filename} 时出错: {file_error}")
                             continue
             except UnicodeDecodeError as e:
-                print(f"⚠️ 编码错误: {e}")
+                logger.warning(f"⚠️ 编码错误: {e}")
         
         # 按上传时间倒序排列
         files.sort(key=lambda x: x['upload_time'], reverse=True)
-        print(f"📋 共找到 {len(files)} 个测试集文件")
+        logger.info(f"📋 共找到 {len(files)} 个测试集文件")
         
         # 获取用户列表（仅管理员需要）
         users_list = []
@@ -1312,7 +1919,7 @@ def get_uploaded_files():
         return response
         
     except Exception as e:
-        print(f"❌ 获取文件列表失败: {e}")
+        logger.error(f"❌ 获取文件列表失败: {e}")
         return jsonify({'error': f'获取文件列表失败: {str(e)}'}), 500
 
 @app.route('/api/debug/files', methods=['GET'])
@@ -1460,7 +2067,7 @@ def delete_file(filename):
             return jsonify({'error': '没有权限删除此文件'}), 403
         
         os.remove(filepath)
-        print(f"✅ 文件已删除: {filename} (用户: {current_user['display_name']})")
+        logger.info(f"✅ 文件已删除: {filename} (用户: {current_user['display_name']})")
         return jsonify({'success': True, 'message': f'文件 {filename} 已删除'})
     except Exception as e:
         return jsonify({'error': f'删除文件失败: {str(e)}'}), 500
@@ -1500,7 +2107,7 @@ def rename_dataset_file():
         # 安全文件名处理
         original_filename = secure_chinese_filename(original_filename)
         new_filename = secure_chinese_filename(new_filename)
-        print(f"🏷️ 重命名文件: '{original_filename}' -> '{new_filename}'")
+        logger.info(f"🏷️ 重命名文件: '{original_filename}' -> '{new_filename}'")
         
         # 构建文件路径
         upload_folder = app.config['UPLOAD_FOLDER']
@@ -1517,7 +2124,7 @@ def rename_dataset_file():
         
         # 重命名文件
         os.rename(original_path, new_path)
-        print(f"✅ 文件重命名成功: {original_filename} -> {new_filename}")
+        logger.info(f"✅ 文件重命名成功: {original_filename} -> {new_filename}")
         
         # 🔧 更新数据库中的uploaded_files记录
         try:
@@ -1534,12 +2141,12 @@ def rename_dataset_file():
                     
                     if cursor.rowcount > 0:
                         conn.commit()
-                        print(f"✅ 数据库记录已更新: {original_filename} -> {new_filename}")
+                        logger.info(f"✅ 数据库记录已更新: {original_filename} -> {new_filename}")
                     else:
-                        print(f"⚠️ 未找到数据库记录: {original_filename}")
+                        logger.warning(f"⚠️ 未找到数据库记录: {original_filename}")
                         
         except Exception as e:
-            print(f"⚠️ 更新数据库记录时出现警告: {e}")
+            logger.warning(f"⚠️ 更新数据库记录时出现警告: {e}")
             # 不阻断重命名操作，仅记录警告
         
         # 更新数据库中的文件提示词关联（如果存在）
@@ -1554,20 +2161,20 @@ def rename_dataset_file():
                     # 为新文件名设置相同的提示词
                     success = db.set_file_prompt(new_filename, old_prompt, updated_by)
                     if success:
-                        print(f"✅ 提示词关联已更新: {original_filename} -> {new_filename}")
+                        logger.info(f"✅ 提示词关联已更新: {original_filename} -> {new_filename}")
                         
                         # 删除旧的提示词记录（避免数据冗余）
                         deleted = db.delete_file_prompt(original_filename)
                         if deleted:
-                            print(f"🗑️ 已删除旧文件的提示词记录: {original_filename}")
+                            logger.info(f"🗑️ 已删除旧文件的提示词记录: {original_filename}")
                         else:
-                            print(f"⚠️ 删除旧文件提示词记录失败: {original_filename}")
+                            logger.warning(f"⚠️ 删除旧文件提示词记录失败: {original_filename}")
                     else:
-                        print(f"❌ 设置新文件提示词失败: {new_filename}")
+                        logger.error(f"❌ 设置新文件提示词失败: {new_filename}")
                 else:
-                    print(f"📝 原文件 {original_filename} 没有提示词记录，无需迁移")
+                    logger.info(f"📝 原文件 {original_filename} 没有提示词记录，无需迁移")
         except Exception as e:
-            print(f"⚠️ 更新提示词关联时出现警告: {e}")
+            logger.warning(f"⚠️ 更新提示词关联时出现警告: {e}")
             # 不阻断重命名操作，仅记录警告
         
         return jsonify({
@@ -1578,7 +2185,7 @@ def rename_dataset_file():
         })
         
     except Exception as e:
-        print(f"❌ 文件重命名失败: {e}")
+        logger.error(f"❌ 文件重命名失败: {e}")
         return jsonify({'success': False, 'error': f'重命名失败: {str(e)}'}), 500
 
 @app.route('/upload_file', methods=['POST'])
@@ -1605,7 +2212,7 @@ def upload_file():
     if file and file.filename.endswith(('.xlsx', '.xls', '.csv')):
         filename = secure_chinese_filename(file.filename)
         filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        print(f"📤 上传文件: 原始名称='{file.filename}' -> 安全名称='{filename}'")
+        logger.info(f"📤 上传文件: 原始名称='{file.filename}' -> 安全名称='{filename}'")
         
         # 检查文件冲突，考虑用户权限
         current_user_id = session['user_id']
@@ -1660,9 +2267,9 @@ def upload_file():
             )
             
             if file_id:
-                print(f"✅ 保存文件上传记录: {filename} (ID: {file_id}, 用户: {current_user['display_name']})")
+                logger.info(f"✅ 保存文件上传记录: {filename} (ID: {file_id}, 用户: {current_user['display_name']})")
             else:
-                print(f"⚠️ 保存文件上传记录失败: {filename}")
+                logger.warning(f"⚠️ 保存文件上传记录失败: {filename}")
             
             return jsonify({
                 'success': True,
@@ -1855,7 +2462,7 @@ def get_available_models():
     models = model_factory.get_available_models()
     
     # 检查Google API密钥
-    google_key = GOOGLE_API_KEY or request.headers.get('X-Google-API-Key')
+    google_key = judge_key_pool.size() or request.headers.get('X-Google-API-Key')
     
     return jsonify({
         'models': models,
@@ -1872,6 +2479,16 @@ def start_evaluation():
     force_mode = data.get('force_mode')  # 'auto', 'subjective', 'objective'
     custom_name = data.get('custom_name', '').strip()  # 自定义结果名称
     save_to_history = data.get('save_to_history', True)  # 是否保存到历史记录
+    pipeline_mode = data.get('pipeline_mode', EVALUATION_PIPELINE_MODE)  # 是否使用流水线评测
+    bypass_cache = data.get('bypass_cache', False)  # 是否绕过评测缓存
+    batch_judge = data.get('batch_judge', JUDGE_BATCH_MODE)  # 是否多题合并评测
+    structured_judge = data.get('structured_judge', JUDGE_STRUCTURED_OUTPUT)  # 是否使用结构化输出评测
+    hedge_requests = data.get('hedge_requests', MODEL_HEDGE_ENABLED)  # 是否对慢的答案请求发出对冲请求
+    sequential_sampling = data.get('sequential_sampling', SEQUENTIAL_SAMPLING_ENABLED)  # 是否分层抽样、排序确定后提前停止
+    sample_budget = data.get('sample_budget', SEQUENTIAL_MAX_QUESTIONS)  # 序贯抽样最多评测题数
+    project_id = data.get('project_id', 'default')  # 所属项目（用于token用量统计和预算）
+    reuse_result_id = data.get('reuse_result_id')  # 复用指定历史结果中的模型答案
+    reuse_cached_answers = data.get('reuse_cached_answers', False)  # 复用答案缓存中的模型答案
     
     if not filename:
         return jsonify({'error': '缺少文件名'}), 400
@@ -1879,9 +2496,23 @@ def start_evaluation():
     if not selected_models:
         return jsonify({'error': '请至少选择一个模型'}), 400
     
-    if not GOOGLE_API_KEY:
+    if not judge_key_pool.size():
         return jsonify({'error': '请配置GOOGLE_API_KEY环境变量'}), 400
     
+    try:
+        sample_budget = int(sample_budget)
+    except (TypeError, ValueError):
+        return jsonify({'error': '抽样题数上限必须是整数'}), 400
+    
+    # 计入的项目由服务端校验，客户端不能指定不存在或无权使用的项目
+    allowed, project_message = check_project_access(db, session.get('user_id', 'anonymous'), project_id)
+    if not allowed:
+        return jsonify({'error': project_message}), 403
+    
+    allowed, budget_message = check_token_budget(db, session.get('user_id', 'anonymous'), project_id)
+    if not allowed:
+        return jsonify({'error': budget_message}), 403
+    
     # 检查选中的模型是否可用
     is_valid, error_msg = model_factory.validate_models(selected_models)
     if not is_valid:
@@ -1891,12 +2522,17 @@ def start_evaluation():
     if not os.path.exists(filepath):
         return jsonify({'error': '文件不存在'}), 400
     
+    if reuse_result_id:
+        reuse_result = db.get_result_by_id(reuse_result_id)
+        if not reuse_result:
+            return jsonify({'error': '要复用答案的评测结果不存在'}), 400
+        # 只能复用自己的评测结果中的答案（管理员除外）
+        if not user_can_access_result(reuse_result, session.get('user_id', 'anonymous')):
+            return jsonify({'error': '没有权限复用此评测结果'}), 403
+    
     try:
         # 读取文件
-        if filename.endswith('.csv'):
-            df = pd.read_csv(filepath, encoding='utf-8-sig')
-        else:
-            df = pd.read_excel(filepath, engine='openpyxl')
+        df = load_evaluation_dataset(filepath)
         
         # 确定评测模式
         if force_mode == 'auto':
@@ -1908,23 +2544,45 @@ def start_evaluation():
         if mode == 'objective' and 'answer' not in df.columns:
             return jsonify({'error': '客观题评测模式需要文件包含"answer"列'}), 400
         
-        # 如果没有type列，添加默认值
-        if 'type' not in df.columns:
-            df['type'] = '未分类'
-        
         data_list = df.to_dict('records')
-        queries = [str(row['query']) for row in data_list]
         
         task_id = str(uuid.uuid4())
-        task_status[task_id] = TaskStatus(task_id)
-        task_status[task_id].evaluation_mode = mode
-        task_status[task_id].selected_models = selected_models
-        task_status[task_id].start_time = datetime.now()
-        task_status[task_id].question_count = len(data_list)
-        
-        # 同时保存到数据库
         task_name = f"{os.path.basename(filename)}_{mode}评测"
         current_user_id = session.get('user_id', 'anonymous')
+        
+        # 任务优先级：普通用户只能降低自己任务的优先级
+        try:
+            priority = int(data.get('priority', 0))
+        except (TypeError, ValueError):
+            return jsonify({'error': '优先级必须是整数'}), 400
+        if session.get('role') != 'admin':
+            priority = min(priority, 0)
+        
+        # 保存任务参数，评测进程领取任务或中断后续跑时使用
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        job = {
+            'filename': filename,
+            'filepath': filepath,
+            'mode': mode,
+            'selected_models': selected_models,
+            'user_id': current_user_id,
+            'custom_name': custom_name,
+            'save_to_history': save_to_history,
+            'pipeline_mode': pipeline_mode,
+            'bypass_cache': bypass_cache,
+            'batch_judge': batch_judge,
+            'structured_judge': structured_judge,
+            'hedge_requests': hedge_requests,
+            'sequential_sampling': sequential_sampling,
+            'sample_budget': sample_budget,
+            'sampling_seed': random.randint(0, 2 ** 31 - 1),  # 续跑时保持相同的抽题顺序
+            'project_id': project_id,
+            'reuse_result_id': reuse_result_id,
+            'reuse_cached_answers': reuse_cached_answers,
+            'output_file': os.path.join(app.config['RESULTS_FOLDER'], f"evaluation_result_{timestamp}.csv")
+        }
+        
+        # 加入任务队列，由评测worker按并发上限和优先级领取
         db.create_running_task(
             task_id=task_id,
             task_name=task_name,
@@ -1933,126 +2591,62 @@ def start_evaluation():
             evaluation_mode=mode,
             selected_models=selected_models,
             total=len(data_list),
-            created_by=current_user_id
+            created_by=current_user_id,
+            status='queued',
+            priority=priority,
+            metadata={'job': job, 'credentials': extract_credential_headers(request.headers)}
         )
         
-        # 在主线程中获取所有需要的数据
-        headers_dict = dict(request.headers)
-        google_api_key = GOOGLE_API_KEY or request.headers.get('X-Google-API-Key')
-        data_list = df.to_dict('records')
-        queries = [str(row.get("query", "")) for row in data_list]
+        queued_status = TaskStatus(task_id)
+        queued_status.status = "排队中"
+        queued_status.current_step = "等待评测worker领取任务"
+        queued_status.evaluation_mode = mode
+        queued_status.selected_models = selected_models
+        queued_status.total = len(data_list)
+        queued_status.question_count = len(data_list)
+        task_status.publish(queued_status)
         
-        def task(user_id, task_custom_name, task_save_to_history):
-            try:
-                # 第一步：获取模型答案
-                model_results = run_async_task(get_multiple_model_answers, queries, selected_models, task_id, headers_dict)
-                
-                # 第二步：评测
-                output_file = run_async_task(evaluate_models, data_list, mode, model_results, task_id, google_api_key, filename)
-                
-                task_status[task_id].status = "完成"
-                task_status[task_id].result_file = os.path.basename(output_file)
-                task_status[task_id].current_step = f"评测完成，结果已保存到 {os.path.basename(output_file)}"
-                task_status[task_id].end_time = datetime.now()
-                
-                # 同时更新数据库
-                db.update_task_status(task_id, "completed", result_file=output_file)
-                
-                # 保存到历史记录（始终保存基础记录，确保数据库一致性）
-                try:
-                    evaluation_data = {
-                        'dataset_file': filename,
-                        'models': selected_models,
-                        'evaluation_mode': mode,
-                        'start_time': task_status[task_id].start_time.isoformat(),
-                        'end_time': task_status[task_id].end_time.isoformat() if task_status[task_id].end_time else None,
-                        'question_count': len(data_list),
-                        'custom_name': task_custom_name if task_save_to_history else '',  # 只有选择保存时才使用自定义名称
-                        'created_by': user_id,  # 使用传递的用户ID
-                        'save_to_history': task_save_to_history  # 标记是否为用户主动保存
-                    }
-                    
-                    if task_save_to_history:
-                        # 用户选择保存到历史记录，完整保存
-                        print(f"💾 [评测完成] 用户选择保存到历史记录")
-                        history_manager.save_evaluation_result(evaluation_data, output_file)
-                    else:
-                        # 用户未选择保存，但仍需创建基础数据库记录以支持查看功能
-                        print(f"📝 [评测完成] 创建基础数据库记录以支持查看功能")
-                        result_name = f"临时结果_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-                        db.save_evaluation_result(
-                            project_id='default',
-                            name=result_name,
-                            dataset_file=filename,
-                            models=selected_models,
-                            result_file=output_file,
-                            evaluation_mode=mode,
-                            created_by=user_id,
-                            metadata={
-                                'start_time': evaluation_data['start_time'],
-                                'end_time': evaluation_data['end_time'],
-                                'question_count': evaluation_data['question_count'],
-                                'is_temporary': True  # 标记为临时记录
-                            }
-                        )
-                        
-                except Exception as e:
-                    print(f"❌ 保存评测记录失败: {e}")
-                    # 即使保存失败，也要确保有基础记录
-                    try:
-                        print(f"🔄 [评测完成] 尝试创建最小化数据库记录")
-                        fallback_name = f"评测结果_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-                        db.save_evaluation_result(
-                            project_id='default',
-                            name=fallback_name,
-                            dataset_file=filename or '',
-                            models=selected_models,
-                            result_file=output_file,
-                            evaluation_mode=mode,
-                            created_by=user_id,
-                            metadata={'is_fallback': True}
-                        )
-                        print(f"✅ [评测完成] 已创建最小化记录: {fallback_name}")
-                    except Exception as fallback_error:
-                        print(f"❌ [评测完成] 连最小化记录都创建失败: {fallback_error}")
-                
-            except Exception as e:
-                task_status[task_id].status = "失败"
-                task_status[task_id].error_message = str(e)
-                print(f"评测任务失败: {e}")  # 添加日志
-                
-                # 同时更新数据库
-                db.update_task_status(task_id, "failed", error_message=str(e))
-        
-        # 在后台运行任务
-        thread = threading.Thread(target=task, args=(current_user_id, custom_name, save_to_history))
-        thread.start()
+        if evaluation_scheduler:
+            evaluation_scheduler.wake()
         
-        return jsonify({'success': True, 'task_id': task_id})
+        return jsonify({'success': True, 'task_id': task_id, 'queued': True})
         
     except Exception as e:
         return jsonify({'error': f'处理错误: {str(e)}'}), 400
 
+def build_task_status_payload(task: TaskStatus) -> Dict[str, Any]:
+    """把任务状态转换为前端使用的字典（轮询接口和SSE共用）"""
+    end_time = task.end_time if task.end_time and task.status in ('完成', '失败') else datetime.now()
+    elapsed_time = (end_time - task.start_time).total_seconds() if task.start_time else 0
+    
+    # 按已完成题目的平均耗时估算剩余时间
+    eta_seconds = None
+    if task.status not in ('完成', '失败') and task.total and 0 < task.progress < task.total:
+        eta_seconds = round(elapsed_time / task.progress * (task.total - task.progress), 1)
+    
+    return {
+        'status': task.status,
+        'progress': task.progress,
+        'total': task.total,
+        'current_step': task.current_step,
+        'result_file': os.path.basename(task.result_file) if task.result_file else "",
+        'error_message': task.error_message,
+        'evaluation_mode': task.evaluation_mode,
+        'selected_models': task.selected_models,
+        'answers_fetched': task.answers_fetched,
+        'error_count': task.error_count,
+        'elapsed_time': f"{elapsed_time:.1f}秒",
+        'eta_seconds': eta_seconds
+    }
+
 @app.route('/task_status/<task_id>')
 @login_required
 def get_task_status(task_id):
     """获取任务状态"""
-    # 先检查内存中是否有此任务
-    if task_id in task_status:
-        task = task_status[task_id]
-        elapsed_time = (datetime.now() - task.start_time).total_seconds() if hasattr(task, 'start_time') and task.start_time else 0
-        
-        return jsonify({
-            'status': task.status,
-            'progress': task.progress,
-            'total': task.total,
-            'current_step': task.current_step,
-            'result_file': os.path.basename(task.result_file) if task.result_file else "",
-            'error_message': task.error_message,
-            'evaluation_mode': task.evaluation_mode,
-            'selected_models': task.selected_models,
-            'elapsed_time': f"{elapsed_time:.1f}秒"
-        })
+    # 先检查共享任务状态中是否有此任务
+    task = task_status.get(task_id)
+    if task is not None:
+        return jsonify(build_task_status_payload(task))
     
     # 如果内存中没有，尝试从数据库获取
     try:
@@ -2079,13 +2673,68 @@ def get_task_status(task_id):
                 'elapsed_time': "已完成"
             })
         else:
-            # 任务还在运行但内存中没有（可能是服务器重启了）
-            return jsonify({'error': '任务状态丢失，请重新连接任务'}), 404
+            # 任务还在运行但没有存活的worker在刷新状态（可能是服务器重启了）
+            return jsonify({'error': '任务状态丢失，可在任务列表中续跑此任务'}), 404
             
     except Exception as e:
-        print(f"❌ 获取任务状态失败: {e}")
+        logger.error(f"❌ 获取任务状态失败: {e}")
         return jsonify({'error': '获取任务状态失败'}), 500
 
+# SSE连接空闲时发送注释保持连接的间隔，以及单个连接的最长时间（到期后浏览器自动重连）
+TASK_EVENTS_KEEPALIVE_SECONDS = 15
+TASK_EVENTS_MAX_STREAM_SECONDS = 300
+
+@app.route('/api/tasks/<task_id>/events')
+@login_required
+def stream_task_events(task_id):
+    """以Server-Sent Events推送任务进度，只发送变化的字段"""
+    current_user_id = session.get('user_id', 'anonymous')
+    db_task = db.get_running_task(task_id)
+    if db_task and db_task['created_by'] != current_user_id:
+        return jsonify({'error': '无权限访问此任务'}), 403
+    
+    task = task_status.get(task_id)
+    if task is None:
+        # 没有存活的进度可推送（已结束并清理或执行进程已退出），由前端回退到轮询接口
+        return jsonify({'error': '任务不存在或已结束'}), 404
+    
+    subscription = task_events.subscribe(task_id)
+    
+    def format_event(event: str, data: Dict) -> str:
+        return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+    
+    def generate():
+        try:
+            last_payload = build_task_status_payload(task)
+            yield "retry: 3000\n\n"
+            yield format_event('status', last_payload)
+            if last_payload['status'] in ('完成', '失败'):
+                yield format_event('done', last_payload)
+                return
+            
+            deadline = time.time() + TASK_EVENTS_MAX_STREAM_SECONDS
+            while time.time() < deadline:
+                snapshot = subscription.wait(TASK_EVENTS_KEEPALIVE_SECONDS)
+                if snapshot is None:
+                    yield ": keepalive\n\n"
+                    continue
+                
+                payload = build_task_status_payload(TaskStatus.from_dict(snapshot))
+                delta = {key: value for key, value in payload.items() if last_payload.get(key) != value}
+                last_payload = payload
+                if delta:
+                    yield format_event('progress', delta)
+                if payload['status'] in ('完成', '失败'):
+                    yield format_event('done', payload)
+                    return
+        finally:
+            task_events.unsubscribe(subscription)
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
 @app.route('/download/<filename>')
 @login_required
 def download_file(filename):
@@ -2131,7 +2780,7 @@ def download_history_result(result_id):
             return jsonify({'error': '数据库连接失败'}), 500
             
     except Exception as e:
-        print(f"下载历史记录失败: {str(e)}")
+        logger.info(f"下载历史记录失败: {str(e)}")
         return jsonify({'error': f'下载失败: {str(e)}'}), 500
 
 @app.route('/api/result_data/<path:filename>')
@@ -2154,11 +2803,11 @@ def get_result_data(filename):
         for path in possible_paths:
             if os.path.exists(path):
                 filepath = path
-                print(f"✅ [API] 找到文件: {path}")
+                logger.info(f"✅ [API] 找到文件: {path}")
                 break
         
         if not filepath:
-            print(f"❌ [API] 文件不存在，尝试的路径: {possible_paths}")
+            logger.error(f"❌ [API] 文件不存在，尝试的路径: {possible_paths}")
             return jsonify({
                 'success': False, 
                 'error': f'文件不存在: {filename}',
@@ -2221,11 +2870,11 @@ def view_results(filename):
     for path in possible_paths:
         if os.path.exists(path):
             filepath = path
-            print(f"✅ [view_results] 找到文件: {path}")
+            logger.info(f"✅ [view_results] 找到文件: {path}")
             break
     
     if not filepath:
-        print(f"❌ [view_results] 文件不存在，尝试的路径: {possible_paths}")
+        logger.error(f"❌ [view_results] 文件不存在，尝试的路径: {possible_paths}")
         return jsonify({'error': '文件不存在'}), 404
     
     try:
@@ -2233,8 +2882,8 @@ def view_results(filename):
         
         # 获取高级分析结果
         advanced_stats = None
-        print(f"🔍 [view_results] 正在为文件 {filename} 生成统计分析...")
-        print(f"📊 [view_results] Analytics 模块状态: {'可用' if analytics else '不可用'}")
+        logger.info(f"🔍 [view_results] 正在为文件 {filename} 生成统计分析...")
+        logger.info(f"📊 [view_results] Analytics 模块状态: {'可用' if analytics else '不可用'}")
         
         if analytics:
             try:
@@ -2253,9 +2902,9 @@ def view_results(filename):
                                     'question_count': metadata.get('question_count', len(df)),
                                     'from_database': True
                                 }
-                                print(f"✅ [view_results] 从数据库获取到持久化时间数据")
+                                logger.info(f"✅ [view_results] 从数据库获取到持久化时间数据")
                         except Exception as e:
-                            print(f"⚠️ [view_results] 解析数据库元数据失败: {e}")
+                            logger.warning(f"⚠️ [view_results] 解析数据库元数据失败: {e}")
                 
                 # 如果没有数据库数据，尝试从task_status获取时间数据
                 if not evaluation_data:
@@ -2269,7 +2918,7 @@ def view_results(filename):
                                 'question_count': len(df),
                                 'from_task_status': True
                             }
-                            print(f"✅ [view_results] 从任务状态获取到时间数据")
+                            logger.info(f"✅ [view_results] 从任务状态获取到时间数据")
                             break
                 
                 # 如果还是没有找到时间数据，使用文件的创建和修改时间作为估算
@@ -2287,12 +2936,12 @@ def view_results(filename):
                             'question_count': len(df),
                             'is_estimated': True
                         }
-                        print(f"⏰ [view_results] 使用估算时间数据")
+                        logger.warning(f"⏰ [view_results] 使用估算时间数据")
                     except Exception as e:
-                        print(f"⚠️ [view_results] 获取文件时间失败: {e}")
+                        logger.warning(f"⚠️ [view_results] 获取文件时间失败: {e}")
                         evaluation_data = {'question_count': len(df)}
                 
-                print(f"🔄 [view_results] 开始分析评测结果...")
+                logger.info(f"🔄 [view_results] 开始分析评测结果...")
                 analysis_result = analytics.analyze_evaluation_results(
                     result_file=filepath,
                     evaluation_data=evaluation_data
@@ -2300,17 +2949,17 @@ def view_results(filename):
                 
                 if analysis_result.get('success'):
                     advanced_stats = analysis_result['analysis']
-                    print(f"✅ [view_results] 成功生成高级统计分析")
+                    logger.info(f"✅ [view_results] 成功生成高级统计分析")
                 else:
-                    print(f"❌ [view_results] 分析失败: {analysis_result.get('error', '未知错误')}")
+                    logger.error(f"❌ [view_results] 分析失败: {analysis_result.get('error', '未知错误')}")
             
             except Exception as e:
-                print(f"❌ [view_results] 分析过程出错: {e}")
+                logger.error(f"❌ [view_results] 分析过程出错: {e}")
                 advanced_stats = None
         
         # 如果没有高级统计，也要确保有基础的统计数据用于前端显示
         if not advanced_stats:
-            print(f"📝 [view_results] 生成基础统计数据作为后备方案")
+            logger.info(f"📝 [view_results] 生成基础统计数据作为后备方案")
             # 创建基础统计数据，确保前端能显示基本的图表
             try:
                 # 简单的分数统计
@@ -2345,9 +2994,9 @@ def view_results(filename):
                                 }
                     
                     advanced_stats = basic_stats
-                    print(f"✅ [view_results] 生成基础统计数据成功")
+                    logger.info(f"✅ [view_results] 生成基础统计数据成功")
             except Exception as e:
-                print(f"⚠️ [view_results] 生成基础统计数据失败: {e}")
+                logger.warning(f"⚠️ [view_results] 生成基础统计数据失败: {e}")
         
         # 查找结果详情以支持分享功能
         result_detail = None
@@ -2355,9 +3004,9 @@ def view_results(filename):
             result_id = db.get_result_id_by_filename(filename)
             if result_id:
                 result_detail = db.get_result_by_id(result_id)
-                print(f"✅ [view_results] 找到结果详情: {result_id}")
+                logger.info(f"✅ [view_results] 找到结果详情: {result_id}")
             else:
-                print(f"⚠️ [view_results] 未找到文件 {filename} 对应的数据库记录")
+                logger.warning(f"⚠️ [view_results] 未找到文件 {filename} 对应的数据库记录")
                 
                 # 检查是否为临时评测结果文件（避免为每个查看的文件都创建记录）
                 should_create_record = True
@@ -2366,7 +3015,7 @@ def view_results(filename):
                 # 如果是evaluation_result_格式的临时文件，检查是否已有相关历史记录
                 if filename.startswith('evaluation_result_'):
                     timestamp_part = filename.replace('evaluation_result_', '').replace('.csv', '')
-                    print(f"🔍 [view_results] 检查时间戳 {timestamp_part} 是否有对应的历史记录...")
+                    logger.info(f"🔍 [view_results] 检查时间戳 {timestamp_part} 是否有对应的历史记录...")
                     
                     try:
                         # 查找可能的相关历史记录
@@ -2377,13 +3026,13 @@ def view_results(filename):
                             if timestamp_part in result_file_path and 'results_history' in result_file_path:
                                 potential_duplicate = history_item
                                 should_create_record = False
-                                print(f"🔗 [view_results] 找到对应的历史记录: {history_item['name']}")
+                                logger.info(f"🔗 [view_results] 找到对应的历史记录: {history_item['name']}")
                                 break
                     except Exception as e:
-                        print(f"⚠️ [view_results] 检查历史记录失败: {e}")
+                        logger.warning(f"⚠️ [view_results] 检查历史记录失败: {e}")
                 
                 if should_create_record:
-                    print(f"📝 [view_results] 创建临时数据库记录以支持查看功能...")
+                    logger.info(f"📝 [view_results] 创建临时数据库记录以支持查看功能...")
                     try:
                         # 分析文件名获取模型信息
                         models = []
@@ -2418,9 +3067,9 @@ def view_results(filename):
                         )
                         
                         result_detail = db.get_result_by_id(result_id)
-                        print(f"✅ [view_results] 已创建临时记录: {result_id}")
+                        logger.info(f"✅ [view_results] 已创建临时记录: {result_id}")
                     except Exception as create_error:
-                        print(f"⚠️ [view_results] 创建数据库记录失败: {create_error}")
+                        logger.warning(f"⚠️ [view_results] 创建数据库记录失败: {create_error}")
                         # 创建一个临时的 result_detail 以支持分享功能
                         result_detail = {
                             'id': f"temp_{filename}",
@@ -2431,9 +3080,9 @@ def view_results(filename):
                 else:
                     # 使用找到的相关历史记录
                     result_detail = potential_duplicate
-                    print(f"🔗 [view_results] 使用相关历史记录: {result_detail['name']}")
+                    logger.info(f"🔗 [view_results] 使用相关历史记录: {result_detail['name']}")
         except Exception as e:
-            print(f"⚠️ [view_results] 查找结果详情失败: {e}")
+            logger.warning(f"⚠️ [view_results] 查找结果详情失败: {e}")
         
         current_user = db.get_user_by_id(session['user_id'])
         return render_template('results.html', 
@@ -2663,10 +3312,10 @@ def get_history_list():
                 if not is_temp_record and not is_duplicate:
                     filtered_for_duplicates.append(result)
                 else:
-                    print(f"🚫 [history] 过滤记录: {result['name']} (临时:{is_temp_record}, 重复:{is_duplicate})")
+                    logger.info(f"🚫 [history] 过滤记录: {result['name']} (临时:{is_temp_record}, 重复:{is_duplicate})")
             
             history['results'] = filtered_for_duplicates
-            print(f"📊 [history] 过滤后剩余 {len(filtered_for_duplicates)} 条记录")
+            logger.info(f"📊 [history] 过滤后剩余 {len(filtered_for_duplicates)} 条记录")
         
         # 简单的搜索过滤（在返回的结果中过滤）
         if search and history['success']:
@@ -2767,8 +3416,8 @@ def view_history(result_id):
         
         # 获取高级分析结果
         advanced_stats = None
-        print(f"🔍 [view_history] 正在为结果 {result_id} 生成统计分析...")
-        print(f"📊 [view_history] Analytics 模块状态: {'可用' if analytics else '不可用'}")
+        logger.info(f"🔍 [view_history] 正在为结果 {result_id} 生成统计分析...")
+        logger.info(f"📊 [view_history] Analytics 模块状态: {'可用' if analytics else '不可用'}")
         
         if analytics:
             try:
@@ -2784,9 +3433,9 @@ def view_history(result_id):
                                 'question_count': metadata.get('question_count', len(df)),
                                 'from_database': True
                             }
-                            print(f"✅ [view_history] 从数据库获取到持久化时间数据")
+                            logger.info(f"✅ [view_history] 从数据库获取到持久化时间数据")
                     except Exception as e:
-                        print(f"⚠️ [view_history] 解析数据库元数据失败: {e}")
+                        logger.warning(f"⚠️ [view_history] 解析数据库元数据失败: {e}")
                 
                 # 如果没有数据库数据，尝试从result_detail获取时间数据
                 if not evaluation_data:
@@ -2797,7 +3446,7 @@ def view_history(result_id):
                         'question_count': len(df),
                         'from_result_detail': True
                     }
-                    print(f"📋 [view_history] 从结果详情获取时间数据")
+                    logger.info(f"📋 [view_history] 从结果详情获取时间数据")
                 
                 # 如果还是没有时间数据，使用文件的创建和修改时间作为估算
                 if not evaluation_data.get('start_time') or not evaluation_data.get('end_time'):
@@ -2813,12 +3462,15 @@ def view_history(result_id):
                             'end_time': file_mtime.isoformat(),
                             'is_estimated': True
                         })
-                        print(f"⏰ [view_history] 使用估算时间数据")
+                        logger.warning(f"⏰ [view_history] 使用估算时间数据")
                     except Exception as e:
-                        print(f"⚠️ [view_history] 获取文件时间失败: {e}")
+                        logger.warning(f"⚠️ [view_history] 获取文件时间失败: {e}")
                         evaluation_data = {'question_count': len(df)}
                 
-                print(f"🔄 [view_history] 开始分析评测结果...")
+                # 每次调用的耗时明细，用于按模型/问题类型计算延迟分位数
+                evaluation_data['call_telemetry'] = db.get_call_telemetry(result_id)
+                
+                logger.info(f"🔄 [view_history] 开始分析评测结果...")
                 analysis_result = analytics.analyze_evaluation_results(
                     result_file=filepath,
                     evaluation_data=evaluation_data
@@ -2826,17 +3478,17 @@ def view_history(result_id):
                 
                 if analysis_result.get('success'):
                     advanced_stats = analysis_result['analysis']
-                    print(f"✅ [view_history] 成功生成高级统计分析")
+                    logger.info(f"✅ [view_history] 成功生成高级统计分析")
                 else:
-                    print(f"❌ [view_history] 分析失败: {analysis_result.get('error', '未知错误')}")
+                    logger.error(f"❌ [view_history] 分析失败: {analysis_result.get('error', '未知错误')}")
             
             except Exception as e:
-                print(f"❌ [view_history] 分析过程出错: {e}")
+                logger.error(f"❌ [view_history] 分析过程出错: {e}")
                 advanced_stats = None
         
         # 如果没有高级统计，也要确保有基础的统计数据用于前端显示
         if not advanced_stats:
-            print(f"📝 [view_history] 生成基础统计数据作为后备方案")
+            logger.info(f"📝 [view_history] 生成基础统计数据作为后备方案")
             try:
                 # 简单的分数统计
                 score_columns = [col for col in df.columns if '评分' in col or 'score' in col.lower()]
@@ -2905,9 +3557,9 @@ def view_history(result_id):
                     basic_stats['model_rankings'] = model_rankings
                     
                     advanced_stats = basic_stats
-                    print(f"✅ [view_history] 生成基础统计数据成功")
+                    logger.info(f"✅ [view_history] 生成基础统计数据成功")
             except Exception as e:
-                print(f"⚠️ [view_history] 生成基础统计数据失败: {e}")
+                logger.warning(f"⚠️ [view_history] 生成基础统计数据失败: {e}")
         
         current_user = db.get_user_by_id(session['user_id'])
         return render_template('results.html', 
@@ -2967,7 +3619,7 @@ def debug_score_update():
         data = request.get_json()
         filename = data.get('filename')
         
-        print(f"\n🔍 [调试] 开始调试文件: {filename}")
+        logger.info(f"\n🔍 [调试] 开始调试文件: {filename}")
         
         # 检查文件状态
         filepath = os.path.join(app.config['RESULTS_FOLDER'], filename)
@@ -2996,7 +3648,7 @@ def debug_score_update():
             try:
                 result_id = db.get_result_id_by_filename(filename)
             except Exception as db_error:
-                print(f"⚠️ [调试] 查找result_id失败: {db_error}")
+                logger.warning(f"⚠️ [调试] 查找result_id失败: {db_error}")
                 result_id = None
             
             debug_info.update({
@@ -3009,7 +3661,7 @@ def debug_score_update():
                 'database_result_id': result_id
             })
         
-        print(f"🔍 [调试] 调试信息: {debug_info}")
+        logger.info(f"🔍 [调试] 调试信息: {debug_info}")
         
         return jsonify({
             'success': True,
@@ -3017,9 +3669,8 @@ def debug_score_update():
         })
         
     except Exception as e:
-        print(f"❌ [调试] 调试失败: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.error(f"❌ [调试] 调试失败: {e}")
+        logger.error("详细错误堆栈", exc_info=True)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/update_score', methods=['POST'])
@@ -3054,31 +3705,31 @@ def update_score():
         result_id = None
         
         # 标注功能已移除，仅更新CSV文件
-        print(f"📝 [编辑评分] 准备更新CSV文件: {filename} 第{row_index+1}行 {model_name} -> {new_score}分")
+        logger.info(f"📝 [编辑评分] 准备更新CSV文件: {filename} 第{row_index+1}行 {model_name} -> {new_score}分")
         
         # 同时更新CSV文件以保持兼容性
         # 处理文件名，去除可能的路径前缀
         clean_filename = filename
         if filename.startswith('results_history/'):
             clean_filename = filename.replace('results_history/', '', 1)
-            print(f"📁 [文件名处理] 检测到history路径前缀，清理后: {clean_filename}")
+            logger.info(f"📁 [文件名处理] 检测到history路径前缀，清理后: {clean_filename}")
         elif filename.startswith('results/'):
             clean_filename = filename.replace('results/', '', 1)
-            print(f"📁 [文件名处理] 检测到results路径前缀，清理后: {clean_filename}")
+            logger.info(f"📁 [文件名处理] 检测到results路径前缀，清理后: {clean_filename}")
         
         # 首先尝试原始路径（适用于传入完整路径的情况）
         if filename.startswith('results_history/'):
             filepath = filename  # 直接使用原始路径
-            print(f"📁 [CSV文件] 使用完整路径: {filepath}")
+            logger.info(f"📁 [CSV文件] 使用完整路径: {filepath}")
         else:
             filepath = os.path.join(app.config['RESULTS_FOLDER'], clean_filename)
-            print(f"📁 [CSV文件] 目标文件路径: {filepath}")
+            logger.info(f"📁 [CSV文件] 目标文件路径: {filepath}")
         
-        print(f"📁 [CSV文件] 文件是否存在: {os.path.exists(filepath)}")
+        logger.info(f"📁 [CSV文件] 文件是否存在: {os.path.exists(filepath)}")
         
         # 如果文件不存在，尝试在其他位置查找
         if not os.path.exists(filepath):
-            print(f"🔍 [文件查找] 在主路径未找到文件，开始在其他位置搜索...")
+            logger.info(f"🔍 [文件查找] 在主路径未找到文件，开始在其他位置搜索...")
             found_filepath = None
             
             # 在results_history目录中查找
@@ -3087,14 +3738,14 @@ def update_score():
                 history_filepath = os.path.join(history_path, clean_filename)
                 if os.path.exists(history_filepath):
                     found_filepath = history_filepath
-                    print(f"✅ [文件查找] 在results_history中找到文件: {found_filepath}")
+                    logger.info(f"✅ [文件查找] 在results_history中找到文件: {found_filepath}")
             
             # 在results目录中查找（如果原来用的是history路径）
             if not found_filepath:
                 results_filepath = os.path.join(app.config['RESULTS_FOLDER'], clean_filename)
                 if os.path.exists(results_filepath):
                     found_filepath = results_filepath
-                    print(f"✅ [文件查找] 在results中找到文件: {found_filepath}")
+                    logger.info(f"✅ [文件查找] 在results中找到文件: {found_filepath}")
             
             # 如果找到文件，使用该路径
             if found_filepath:
@@ -3104,122 +3755,122 @@ def update_score():
         if db:
             try:
                 result_id = db.get_result_id_by_filename(clean_filename)
-                print(f"🔗 [数据库] 找到对应的result_id: {result_id}")
+                logger.info(f"🔗 [数据库] 找到对应的result_id: {result_id}")
             except Exception as db_error:
-                print(f"⚠️ [数据库] 查找result_id失败: {db_error}")
+                logger.warning(f"⚠️ [数据库] 查找result_id失败: {db_error}")
                 result_id = None
         else:
             # 如果没有数据库连接，result_id保持为None
             result_id = None
         
         if os.path.exists(filepath):
-            print(f"📖 [CSV文件] 开始读取文件...")
+            logger.info(f"📖 [CSV文件] 开始读取文件...")
             # 读取CSV文件
             df = pd.read_csv(filepath, encoding='utf-8-sig')
-            print(f"📊 [CSV文件] 文件行数: {len(df)}, 列数: {len(df.columns)}")
-            print(f"📊 [CSV文件] 列名: {list(df.columns)}")
+            logger.info(f"📊 [CSV文件] 文件行数: {len(df)}, 列数: {len(df.columns)}")
+            logger.info(f"📊 [CSV文件] 列名: {list(df.columns)}")
             
             # 验证行索引
             if row_index < 0 or row_index >= len(df):
-                print(f"❌ [CSV文件] 行索引 {row_index} 超出范围 [0, {len(df)-1}]")
+                logger.error(f"❌ [CSV文件] 行索引 {row_index} 超出范围 [0, {len(df)-1}]")
                 return jsonify({'success': False, 'error': '行索引超出范围'}), 400
             
             # 验证列名
             if score_column not in df.columns:
-                print(f"❌ [CSV文件] 评分列 '{score_column}' 不存在")
-                print(f"📊 [CSV文件] 可用的列: {list(df.columns)}")
+                logger.error(f"❌ [CSV文件] 评分列 '{score_column}' 不存在")
+                logger.info(f"📊 [CSV文件] 可用的列: {list(df.columns)}")
                 return jsonify({'success': False, 'error': f'列 {score_column} 不存在'}), 400
             
-            print(f"📝 [CSV文件] 准备更新第 {row_index} 行的 '{score_column}' 列")
-            print(f"📝 [CSV文件] 原值: {df.loc[row_index, score_column]} -> 新值: {new_score}")
+            logger.info(f"📝 [CSV文件] 准备更新第 {row_index} 行的 '{score_column}' 列")
+            logger.info(f"📝 [CSV文件] 原值: {df.loc[row_index, score_column]} -> 新值: {new_score}")
             
             # 更新评分
             df.loc[row_index, score_column] = new_score
             
             # 如果有理由列，也更新理由
             if reason_column in df.columns and reason:
-                print(f"📝 [CSV文件] 更新理由列 '{reason_column}'")
-                print(f"📝 [CSV文件] 原理由: {str(df.loc[row_index, reason_column])[:50]}...")
-                print(f"📝 [CSV文件] 新理由: {reason[:50]}...")
+                logger.info(f"📝 [CSV文件] 更新理由列 '{reason_column}'")
+                logger.info(f"📝 [CSV文件] 原理由: {str(df.loc[row_index, reason_column])[:50]}...")
+                logger.info(f"📝 [CSV文件] 新理由: {reason[:50]}...")
                 df.loc[row_index, reason_column] = reason
             elif reason:
-                print(f"⚠️ [CSV文件] 理由列 '{reason_column}' 不存在，跳过理由更新")
+                logger.warning(f"⚠️ [CSV文件] 理由列 '{reason_column}' 不存在，跳过理由更新")
             else:
-                print(f"ℹ️ [CSV文件] 没有提供理由，跳过理由更新")
+                logger.info(f"ℹ️ [CSV文件] 没有提供理由，跳过理由更新")
             
             # 保存文件前先备份
             backup_path = filepath + '.backup'
-            print(f"💾 [备份] 准备备份原文件...")
+            logger.info(f"💾 [备份] 准备备份原文件...")
             if os.path.exists(filepath):
                 import shutil
                 shutil.copy2(filepath, backup_path)
-                print(f"✅ [备份] 已创建文件备份: {backup_path}")
+                logger.info(f"✅ [备份] 已创建文件备份: {backup_path}")
             
             # 保存文件
-            print(f"💾 [保存] 开始保存CSV文件到: {filepath}")
+            logger.info(f"💾 [保存] 开始保存CSV文件到: {filepath}")
             try:
                 df.to_csv(filepath, index=False, encoding='utf-8-sig')
-                print(f"✅ [保存] CSV文件保存完成")
+                logger.info(f"✅ [保存] CSV文件保存完成")
             except Exception as save_error:
-                print(f"❌ [保存] CSV文件保存失败: {save_error}")
+                logger.error(f"❌ [保存] CSV文件保存失败: {save_error}")
                 return jsonify({'success': False, 'error': f'文件保存失败: {str(save_error)}'}), 500
             
             # 验证保存是否成功
-            print(f"🔍 [验证] 开始验证文件保存结果...")
+            logger.info(f"🔍 [验证] 开始验证文件保存结果...")
             if os.path.exists(filepath):
                 try:
                     # 重新读取文件验证更新
                     verify_df = pd.read_csv(filepath, encoding='utf-8-sig')
-                    print(f"🔍 [验证] 重新读取文件成功，行数: {len(verify_df)}")
+                    logger.info(f"🔍 [验证] 重新读取文件成功，行数: {len(verify_df)}")
                     
                     if row_index < len(verify_df):
                         saved_score = verify_df.loc[row_index, score_column]
                         saved_reason = verify_df.loc[row_index, reason_column] if reason_column in verify_df.columns else None
                         
-                        print(f"🔍 [验证] 文件中第{row_index}行的数据:")
-                        print(f"   评分列 '{score_column}': {saved_score} (期望: {new_score})")
+                        logger.info(f"🔍 [验证] 文件中第{row_index}行的数据:")
+                        logger.info(f"   评分列 '{score_column}': {saved_score} (期望: {new_score})")
                         if reason_column in verify_df.columns:
-                            print(f"   理由列 '{reason_column}': {str(saved_reason)[:100]}...")
+                            logger.info(f"   理由列 '{reason_column}': {str(saved_reason)[:100]}...")
                         
                         score_match = str(saved_score) == str(new_score)
                         reason_match = (not reason) or (saved_reason and str(saved_reason) == str(reason))
                         
                         if score_match:
-                            print(f"✅ [验证] 评分保存成功: {saved_score}")
+                            logger.info(f"✅ [验证] 评分保存成功: {saved_score}")
                         else:
-                            print(f"❌ [验证] 评分保存失败: 期望 {new_score}, 实际 {saved_score}")
+                            logger.error(f"❌ [验证] 评分保存失败: 期望 {new_score}, 实际 {saved_score}")
                             
                         if reason and reason_column in verify_df.columns:
                             if reason_match:
-                                print(f"✅ [验证] 理由保存成功")
+                                logger.info(f"✅ [验证] 理由保存成功")
                             else:
-                                print(f"❌ [验证] 理由保存失败")
-                                print(f"   期望: {reason}")
-                                print(f"   实际: {saved_reason}")
+                                logger.error(f"❌ [验证] 理由保存失败")
+                                logger.info(f"   期望: {reason}")
+                                logger.info(f"   实际: {saved_reason}")
                         
                         if not (score_match and reason_match):
-                            print(f"⚠️ [验证] 数据保存验证失败，但继续返回成功状态")
+                            logger.warning(f"⚠️ [验证] 数据保存验证失败，但继续返回成功状态")
                             
                     else:
-                        print(f"❌ [验证] 行索引 {row_index} 超出验证文件范围 [0, {len(verify_df)-1}]")
+                        logger.error(f"❌ [验证] 行索引 {row_index} 超出验证文件范围 [0, {len(verify_df)-1}]")
                         
                 except Exception as verify_error:
-                    print(f"❌ [验证] 文件验证失败: {verify_error}")
+                    logger.error(f"❌ [验证] 文件验证失败: {verify_error}")
             else:
-                print(f"❌ [验证] 文件保存失败，文件不存在: {filepath}")
+                logger.error(f"❌ [验证] 文件保存失败，文件不存在: {filepath}")
         else:
             # 如果CSV文件不存在但数据库操作成功，仍然返回成功
             if db and result_id:
-                print(f"⚠️ CSV文件未找到: {filename}")
-                print(f"📋 在以下位置搜索过文件:")
-                print(f"   - {os.path.join(app.config['RESULTS_FOLDER'], filename)}")
+                logger.warning(f"⚠️ CSV文件未找到: {filename}")
+                logger.info(f"📋 在以下位置搜索过文件:")
+                logger.info(f"   - {os.path.join(app.config['RESULTS_FOLDER'], filename)}")
                 history_path = os.path.join(os.path.dirname(app.config['RESULTS_FOLDER']), 'results_history')
-                print(f"   - {os.path.join(history_path, filename)}")
-                print(f"✅ 数据库更新成功，但CSV文件同步失败")
+                logger.info(f"   - {os.path.join(history_path, filename)}")
+                logger.info(f"✅ 数据库更新成功，但CSV文件同步失败")
             else:
                 return jsonify({'success': False, 'error': '文件不存在且数据库中无记录'}), 404
         
-        print(f"🎉 [完成] 评分更新操作完成，准备返回结果")
+        logger.info(f"🎉 [完成] 评分更新操作完成，准备返回结果")
         
         # 准备返回信息
         csv_updated = os.path.exists(filepath)
@@ -3255,9 +3906,8 @@ def update_score():
         })
         
     except Exception as e:
-        print(f"❌ 更新评分失败: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.error(f"❌ 更新评分失败: {e}")
+        logger.error("详细错误堆栈", exc_info=True)
         
         # 提供更详细的错误信息用于调试
         error_details = {
@@ -3269,7 +3919,7 @@ def update_score():
             'model_name': data.get('model_name', 'unknown')
         }
         
-        print(f"🔍 [错误详情] {error_details}")
+        logger.info(f"🔍 [错误详情] {error_details}")
         
         return jsonify({
             'success': False, 
@@ -3298,10 +3948,10 @@ def generate_complete_report(filename, format_type='excel'):
             # 其他历史文件，放在results_history目录下
             filepath = os.path.join('results_history', filename)
         
-        print(f"🔍 尝试访问文件: {filepath}")
+        logger.info(f"🔍 尝试访问文件: {filepath}")
         
         if not os.path.exists(filepath):
-            print(f"❌ 文件不存在: {filepath}")
+            logger.error(f"❌ 文件不存在: {filepath}")
             # 如果文件不存在，尝试其他可能的路径
             alternative_paths = []
             
@@ -3318,7 +3968,7 @@ def generate_complete_report(filename, format_type='excel'):
             for alt_path in alternative_paths:
                 if os.path.exists(alt_path):
                     filepath = alt_path
-                    print(f"✅ 找到备用路径: {filepath}")
+                    logger.info(f"✅ 找到备用路径: {filepath}")
                     break
             else:
                 return jsonify({'error': f'文件不存在: {filename}'}), 404
@@ -3348,7 +3998,7 @@ def generate_complete_report(filename, format_type='excel'):
                             'evaluation_mode': result_info.get('evaluation_mode', 'unknown')
                         }
             except Exception as e:
-                print(f"⚠️ 无法从数据库获取evaluation_data: {e}")
+                logger.warning(f"⚠️ 无法从数据库获取evaluation_data: {e}")
         
         # 如果数据库中没有找到，使用文件时间估算
         if not evaluation_data:
@@ -3387,7 +4037,7 @@ def generate_complete_report(filename, format_type='excel'):
         if analysis_response.get('success'):
             analysis_result = analysis_response.get('analysis', {})
         else:
-            print(f"⚠️ 分析失败: {analysis_response.get('error', '未知错误')}")
+            logger.warning(f"⚠️ 分析失败: {analysis_response.get('error', '未知错误')}")
             # 使用基础分析作为备选
             analysis_result = {
                 'basic_stats': {
@@ -3593,9 +4243,8 @@ def generate_complete_report(filename, format_type='excel'):
         )
         
     except Exception as e:
-        print(f"❌ 生成报告失败: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.error(f"❌ 生成报告失败: {str(e)}")
+        logger.error("详细错误堆栈", exc_info=True)
         return jsonify({'error': f'生成报告失败: {str(e)}'}), 500
 
 @app.route('/api/export_filtered', methods=['POST'])
@@ -3622,9 +4271,9 @@ def export_filtered_results():
         base_name = os.path.splitext(pure_filename)[0]  # 去除扩展名
         
         # 调试信息
-        print(f"📄 [导出筛选] 原始filename: {filename}")
-        print(f"📄 [导出筛选] 提取的纯文件名: {pure_filename}")
-        print(f"📄 [导出筛选] 基础名称: {base_name}")
+        logger.info(f"📄 [导出筛选] 原始filename: {filename}")
+        logger.info(f"📄 [导出筛选] 提取的纯文件名: {pure_filename}")
+        logger.info(f"📄 [导出筛选] 基础名称: {base_name}")
         
         # 生成筛选条件描述
         filter_desc = []
@@ -3646,9 +4295,9 @@ def export_filtered_results():
         temp_dir = tempfile.gettempdir()
         temp_path = os.path.join(temp_dir, export_filename)
         
-        print(f"📁 [导出筛选] 临时目录: {temp_dir}")
-        print(f"📁 [导出筛选] 导出文件名: {export_filename}")
-        print(f"📁 [导出筛选] 完整临时路径: {temp_path}")
+        logger.info(f"📁 [导出筛选] 临时目录: {temp_dir}")
+        logger.info(f"📁 [导出筛选] 导出文件名: {export_filename}")
+        logger.info(f"📁 [导出筛选] 完整临时路径: {temp_path}")
         
         # 保存CSV文件
         df.to_csv(temp_path, index=False, encoding='utf-8-sig')
@@ -3662,7 +4311,7 @@ def export_filtered_results():
         )
         
     except Exception as e:
-        print(f"❌ 导出筛选结果失败: {str(e)}")
+        logger.error(f"❌ 导出筛选结果失败: {str(e)}")
         return jsonify({'error': f'导出失败: {str(e)}'}), 500
 
 
@@ -3715,7 +4364,7 @@ def login():
                 }), 401
                 
         except Exception as e:
-            print(f"❌ 登录错误: {e}")
+            logger.error(f"❌ 登录错误: {e}")
             return jsonify({
                 'success': False,
                 'message': '登录过程中发生错误'
@@ -3759,7 +4408,7 @@ def get_users():
         users = db.list_users()
         return jsonify(users)
     except Exception as e:
-        print(f"❌ 获取用户列表错误: {e}")
+        logger.error(f"❌ 获取用户列表错误: {e}")
         return jsonify({'error': '获取用户列表失败'}), 500
 
 
@@ -3809,7 +4458,7 @@ def create_user():
             'message': str(e)
         }), 400
     except Exception as e:
-        print(f"❌ 创建用户错误: {e}")
+        logger.error(f"❌ 创建用户错误: {e}")
         return jsonify({
             'success': False,
             'message': '创建用户失败'
@@ -3853,7 +4502,7 @@ def update_user(user_id):
             }), 404
             
     except Exception as e:
-        print(f"❌ 更新用户错误: {e}")
+        logger.error(f"❌ 更新用户错误: {e}")
         return jsonify({
             'success': False,
             'message': '更新用户失败'
@@ -3895,7 +4544,7 @@ def change_user_password(user_id):
             }), 404
             
     except Exception as e:
-        print(f"❌ 修改密码错误: {e}")
+        logger.error(f"❌ 修改密码错误: {e}")
         return jsonify({
             'success': False,
             'message': '修改密码失败'
@@ -3915,12 +4564,12 @@ def get_file_prompt(filename):
         current_user = db.get_user_by_id(session['user_id'])
         username = current_user['username'] if current_user else 'unknown'
         
-        print(f"📝 [提示词查看] 用户 {username} 正在查看文件 {filename} 的提示词")
+        logger.info(f"📝 [提示词查看] 用户 {username} 正在查看文件 {filename} 的提示词")
         
         # 确保文件存在
         filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
         if not os.path.exists(filepath):
-            print(f"⚠️ [提示词查看] 文件不存在: {filename}")
+            logger.warning(f"⚠️ [提示词查看] 文件不存在: {filename}")
             return jsonify({'error': '文件不存在'}), 404
         
         # 确保文件有提示词记录
@@ -3932,7 +4581,7 @@ def get_file_prompt(filename):
         
         if prompt_info:
             prompt_length = len(prompt_info['custom_prompt'])
-            print(f"✅ [提示词查看] 成功获取文件 {filename} 的提示词，长度: {prompt_length} 字符")
+            logger.info(f"✅ [提示词查看] 成功获取文件 {filename} 的提示词，长度: {prompt_length} 字符")
             
             return jsonify({
                 'success': True,
@@ -3942,11 +4591,11 @@ def get_file_prompt(filename):
                 'updated_by': prompt_info['updated_by']
             })
         else:
-            print(f"❌ [提示词查看] 获取文件 {filename} 的提示词失败")
+            logger.error(f"❌ [提示词查看] 获取文件 {filename} 的提示词失败")
             return jsonify({'error': '获取提示词失败'}), 500
             
     except Exception as e:
-        print(f"❌ [提示词查看] 获取文件提示词错误: {e}")
+        logger.error(f"❌ [提示词查看] 获取文件提示词错误: {e}")
         return jsonify({'error': f'获取提示词失败: {str(e)}'}), 500
 
 @app.route('/api/file-prompt/<filename>', methods=['POST'])
@@ -3962,19 +4611,19 @@ def set_file_prompt(filename):
         current_user = db.get_user_by_id(session['user_id'])
         username = current_user['username'] if current_user else 'unknown'
         
-        print(f"✏️ [提示词编辑] 用户 {username} 正在编辑文件 {filename} 的提示词")
+        logger.info(f"✏️ [提示词编辑] 用户 {username} 正在编辑文件 {filename} 的提示词")
         
         if not custom_prompt:
-            print(f"⚠️ [提示词编辑] 提示词为空，用户: {username}, 文件: {filename}")
+            logger.warning(f"⚠️ [提示词编辑] 提示词为空，用户: {username}, 文件: {filename}")
             return jsonify({'error': '提示词不能为空'}), 400
         
         prompt_length = len(custom_prompt)
-        print(f"📊 [提示词编辑] 新提示词长度: {prompt_length} 字符")
+        logger.info(f"📊 [提示词编辑] 新提示词长度: {prompt_length} 字符")
         
         # 确保文件存在
         filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
         if not os.path.exists(filepath):
-            print(f"⚠️ [提示词编辑] 文件不存在: {filename}")
+            logger.warning(f"⚠️ [提示词编辑] 文件不存在: {filename}")
             return jsonify({'error': '文件不存在'}), 404
         
         # 获取旧提示词进行对比
@@ -3987,8 +4636,8 @@ def set_file_prompt(filename):
         success = db.set_file_prompt(filename, custom_prompt, updated_by)
         
         if success:
-            print(f"✅ [提示词编辑] 成功保存文件 {filename} 的提示词")
-            print(f"📈 [提示词编辑] 长度变化: {old_length} → {prompt_length} 字符 (变化: {prompt_length - old_length:+d})")
+            logger.info(f"✅ [提示词编辑] 成功保存文件 {filename} 的提示词")
+            logger.info(f"📈 [提示词编辑] 长度变化: {old_length} → {prompt_length} 字符 (变化: {prompt_length - old_length:+d})")
             
             return jsonify({
                 'success': True,
@@ -3997,11 +4646,11 @@ def set_file_prompt(filename):
                 'custom_prompt': custom_prompt
             })
         else:
-            print(f"❌ [提示词编辑] 保存文件 {filename} 的提示词失败")
+            logger.error(f"❌ [提示词编辑] 保存文件 {filename} 的提示词失败")
             return jsonify({'error': '保存提示词失败'}), 500
             
     except Exception as e:
-        print(f"❌ [提示词编辑] 设置文件提示词错误: {e}")
+        logger.error(f"❌ [提示词编辑] 设置文件提示词错误: {e}")
         return jsonify({'error': f'保存提示词失败: {str(e)}'}), 500
 
 @app.route('/api/file-data/<filename>', methods=['GET'])
@@ -4048,7 +4697,7 @@ def get_file_data(filename):
                 else:
                     row[key] = str(row[key])
         
-        print(f"📖 用户 {current_user_id} 获取文件 {filename} 数据，包含 {len(data)} 行")
+        logger.info(f"📖 用户 {current_user_id} 获取文件 {filename} 数据，包含 {len(data)} 行")
         
         return jsonify({
             'success': True,
@@ -4059,7 +4708,7 @@ def get_file_data(filename):
         })
         
     except Exception as e:
-        print(f"获取文件数据失败: {e}")
+        logger.info(f"获取文件数据失败: {e}")
         return jsonify({'error': f'获取文件数据失败: {str(e)}'}), 500
 
 @app.route('/api/file-data/<filename>', methods=['POST'])
@@ -4107,7 +4756,7 @@ def save_file_data(filename):
         if os.path.exists(filepath):
             import shutil
             shutil.copy2(filepath, backup_path)
-            print(f"📋 创建文件备份: {backup_path}")
+            logger.info(f"📋 创建文件备份: {backup_path}")
         
         # 保存文件
         try:
@@ -4116,7 +4765,7 @@ def save_file_data(filename):
             else:
                 df.to_excel(filepath, index=False, engine='openpyxl')
             
-            print(f"💾 用户 {current_user_id} 保存文件 {filename}，包含 {len(data)} 行")
+            logger.info(f"💾 用户 {current_user_id} 保存文件 {filename}，包含 {len(data)} 行")
             
             # 更新数据库记录
             if file_record:
@@ -4135,7 +4784,7 @@ def save_file_data(filename):
                     total_count=len(df),
                     file_size=file_size
                 )
-                print(f"📝 更新文件记录: {filename}")
+                logger.info(f"📝 更新文件记录: {filename}")
             
             return jsonify({
                 'success': True,
@@ -4149,7 +4798,7 @@ def save_file_data(filename):
             if os.path.exists(backup_path):
                 import shutil
                 shutil.move(backup_path, filepath)
-                print(f"🔄 保存失败，已恢复备份")
+                logger.info(f"🔄 保存失败，已恢复备份")
             raise save_error
         finally:
             # 清理备份文件
@@ -4157,7 +4806,7 @@ def save_file_data(filename):
                 os.remove(backup_path)
                 
     except Exception as e:
-        print(f"保存文件数据失败: {e}")
+        logger.info(f"保存文件数据失败: {e}")
         return jsonify({'error': f'保存文件数据失败: {str(e)}'}), 500
 
 @app.route('/api/file-prompts', methods=['GET'])
@@ -4171,7 +4820,7 @@ def list_file_prompts():
             'prompts': prompts
         })
     except Exception as e:
-        print(f"❌ 获取文件提示词列表错误: {e}")
+        logger.error(f"❌ 获取文件提示词列表错误: {e}")
         return jsonify({'error': f'获取提示词列表失败: {str(e)}'}), 500
 
 @app.route('/api/file-prompts/update-objective-defaults', methods=['POST'])
@@ -4182,7 +4831,7 @@ def update_objective_default_prompts():
         current_user = db.get_user_by_id(session['user_id'])
         username = current_user['username'] if current_user else 'admin'
         
-        print(f"🚀 [批量更新] 管理员 {username} 开始批量更新客观题默认提示词...")
+        logger.info(f"🚀 [批量更新] 管理员 {username} 开始批量更新客观题默认提示词...")
         updated_count = db.update_default_objective_prompts(updated_by=username)
         
         return jsonify({
@@ -4192,7 +4841,7 @@ def update_objective_default_prompts():
         })
         
     except Exception as e:
-        print(f"❌ 批量更新提示词失败: {e}")
+        logger.error(f"❌ 批量更新提示词失败: {e}")
         return jsonify({'error': f'批量更新提示词失败: {str(e)}'}), 500
 
 
@@ -4216,7 +4865,7 @@ def get_system_configs():
             'configs': configs
         })
     except Exception as e:
-        print(f"❌ 获取系统配置错误: {e}")
+        logger.error(f"❌ 获取系统配置错误: {e}")
         return jsonify({
             'success': False,
             'message': '获取系统配置失败'
@@ -4262,7 +4911,7 @@ def create_system_config():
             }), 500
             
     except Exception as e:
-        print(f"❌ 创建系统配置错误: {e}")
+        logger.error(f"❌ 创建系统配置错误: {e}")
         return jsonify({
             'success': False,
             'message': '创建配置项失败'
@@ -4307,7 +4956,7 @@ def update_system_config(config_key):
             }), 500
             
     except Exception as e:
-        print(f"❌ 更新系统配置错误: {e}")
+        logger.error(f"❌ 更新系统配置错误: {e}")
         return jsonify({
             'success': False,
             'message': '更新配置项失败'
@@ -4332,12 +4981,94 @@ def delete_system_config(config_key):
             }), 404
             
     except Exception as e:
-        print(f"❌ 删除系统配置错误: {e}")
+        logger.error(f"❌ 删除系统配置错误: {e}")
         return jsonify({
             'success': False,
             'message': '删除配置项失败'
         }), 500
 
+@app.route('/admin/api/judge/stats', methods=['GET'])
+@admin_required
+def get_judge_stats():
+    """获取Gemini评测连接池、限流、评测缓存、候选模型流式响应以及日志队列统计信息"""
+    try:
+        return jsonify({
+            'success': True,
+            'pool': judge_pool.get_stats(),
+            'rate_limiter': gemini_rate_limiter.get_stats(),
+            'judge_keys': judge_key_pool.get_stats(),
+            'cache': db.get_judge_cache_stats(),
+            'model_streams': stream_stats.get_stats(),
+            'logging': get_logging_stats()
+        })
+    except Exception as e:
+        logger.error(f"❌ 获取评测连接池统计错误: {e}")
+        return jsonify({
+            'success': False,
+            'message': '获取评测连接池统计失败'
+        }), 500
+
+# ========== Token用量和预算路由 ==========
+
+@app.route('/admin/api/token-usage', methods=['GET'])
+@admin_required
+def get_token_usage_summary():
+    """按用户、项目、数据集、提示模板版本或模型汇总token用量（period=month 只统计本月）"""
+    group_by = request.args.get('group_by', 'user_id')
+    period = request.args.get('period', 'month')
+    try:
+        rows = db.get_token_usage_summary(group_by, period_start(period), int(request.args.get('limit', 100)))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    if group_by == 'user_id':
+        users = {user['id']: user for user in db.list_users()}
+        for row in rows:
+            user = users.get(row['key']) or {}
+            row['display_name'] = user.get('display_name') or user.get('username') or row['key']
+    return jsonify({'success': True, 'group_by': group_by, 'period': period, 'usage': rows})
+
+@app.route('/admin/api/token-budgets', methods=['GET'])
+@admin_required
+def get_token_budgets():
+    """获取全部token预算及当前周期用量"""
+    budgets = [get_budget_status(db, budget['scope'], budget['scope_id']) for budget in db.get_token_budgets()]
+    return jsonify({'success': True, 'budgets': [budget for budget in budgets if budget]})
+
+@app.route('/admin/api/token-budgets', methods=['POST'])
+@admin_required
+def set_token_budget():
+    """设置用户或项目的token预算"""
+    data = request.get_json() or {}
+    scope = data.get('scope', 'user')
+    scope_id = str(data.get('scope_id', '')).strip()
+    period = data.get('period', 'month')
+    
+    if scope not in BUDGET_SCOPES or period not in BUDGET_PERIODS or not scope_id:
+        return jsonify({'success': False, 'message': '预算范围、对象或周期无效'}), 400
+    try:
+        token_limit = int(data.get('token_limit'))
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'Token预算必须是整数'}), 400
+    if token_limit < 0:
+        return jsonify({'success': False, 'message': 'Token预算不能为负数'}), 400
+    
+    current_user = db.get_user_by_id(session['user_id'])
+    updated_by = current_user['username'] if current_user else 'admin'
+    if not db.set_token_budget(scope, scope_id, token_limit, period, updated_by):
+        return jsonify({'success': False, 'message': '设置Token预算失败'}), 500
+    
+    logger.info(f"🪙 {updated_by} 设置{scope} {scope_id} 的Token预算: {token_limit:,} ({period})")
+    return jsonify({'success': True, 'budget': get_budget_status(db, scope, scope_id)})
+
+@app.route('/admin/api/token-budgets/<scope>/<scope_id>', methods=['DELETE'])
+@admin_required
+def delete_token_budget(scope, scope_id):
+    """删除用户或项目的token预算"""
+    if not db.delete_token_budget(scope, scope_id):
+        return jsonify({'success': False, 'message': 'Token预算不存在'}), 404
+    return jsonify({'success': True, 'message': 'Token预算已删除'})
+
 # ========== 评分标准管理路由 ==========
 
 @app.route('/admin/scoring-criteria', methods=['GET'])
@@ -4355,7 +5086,7 @@ def get_scoring_criteria():
             'criteria': criteria_list
         })
     except Exception as e:
-        print(f"❌ 获取评分标准错误: {e}")
+        logger.error(f"❌ 获取评分标准错误: {e}")
         return jsonify({
             'success': False,
             'message': '获取评分标准失败'
@@ -4402,7 +5133,7 @@ def create_scoring_criteria():
             }), 500
             
     except Exception as e:
-        print(f"❌ 创建评分标准错误: {e}")
+        logger.error(f"❌ 创建评分标准错误: {e}")
         return jsonify({
             'success': False,
             'message': '创建评分标准失败'
@@ -4427,7 +5158,7 @@ def get_scoring_criteria_detail(criteria_id):
             }), 404
             
     except Exception as e:
-        print(f"❌ 获取评分标准详情错误: {e}")
+        logger.error(f"❌ 获取评分标准详情错误: {e}")
         return jsonify({
             'success': False,
             'message': '获取评分标准详情失败'
@@ -4465,7 +5196,7 @@ def update_scoring_criteria(criteria_id):
             }), 404
             
     except Exception as e:
-        print(f"❌ 更新评分标准错误: {e}")
+        logger.error(f"❌ 更新评分标准错误: {e}")
         return jsonify({
             'success': False,
             'message': '更新评分标准失败'
@@ -4490,7 +5221,7 @@ def delete_scoring_criteria(criteria_id):
             }), 404
             
     except Exception as e:
-        print(f"❌ 删除评分标准错误: {e}")
+        logger.error(f"❌ 删除评分标准错误: {e}")
         return jsonify({
             'success': False,
             'message': '删除评分标准失败'
@@ -4508,9 +5239,10 @@ def get_running_tasks():
     """获取正在进行的任务列表"""
     try:
         current_user_id = session.get('user_id', 'anonymous')
-        tasks = db.get_running_tasks(status='running', created_by=current_user_id)
+        tasks = db.get_running_tasks(status=['queued', 'running'], created_by=current_user_id)
         
-        # 合并内存中的任务状态信息
+        # 合并内存中的任务状态信息（不返回随任务保存的用户密钥）
+        tasks = [public_task(task) for task in tasks]
         for task in tasks:
             task_id = task['task_id']
             if task_id in task_status:
@@ -4523,13 +5255,14 @@ def get_running_tasks():
                 })
             else:
                 task['is_active'] = False
+            task['paused'] = bool(task.get('paused_at'))
         
         return jsonify({
             'success': True,
             'tasks': tasks
         })
     except Exception as e:
-        print(f"❌ 获取运行任务失败: {e}")
+        logger.error(f"❌ 获取运行任务失败: {e}")
         return jsonify({'error': f'获取任务列表失败: {str(e)}'}), 500
 
 
@@ -4549,21 +5282,133 @@ def cancel_task(task_id):
         if task['created_by'] != current_user_id:
             return jsonify({'error': '无权限操作此任务'}), 403
         
-        # 从内存中删除任务状态
+        # 删除共享任务状态
         if task_id in task_status:
             del task_status[task_id]
         
-        # 从数据库中删除任务记录
+        # 从数据库中删除任务记录；执行任务的进程（可能不是当前进程）在下一次控制轮询时发现并中断评测
         db.delete_running_task(task_id)
+        job_queue.signal_task(task_id, 'cancel')
         
         return jsonify({
             'success': True,
             'message': '任务已删除'
         })
     except Exception as e:
-        print(f"❌ 删除任务失败: {e}")
+        logger.error(f"❌ 删除任务失败: {e}")
         return jsonify({'error': f'删除任务失败: {str(e)}'}), 500
 
+@app.route('/api/tasks/<task_id>/pause', methods=['POST'])
+@login_required
+def pause_task(task_id):
+    """暂停任务：正在进行的请求完成后不再开始新题目，任务保留执行名额直到恢复或删除"""
+    try:
+        current_user_id = session.get('user_id', 'anonymous')
+        task = db.get_running_task(task_id)
+        
+        if not task:
+            return jsonify({'error': '任务不存在'}), 404
+        
+        if task['created_by'] != current_user_id:
+            return jsonify({'error': '无权限操作此任务'}), 403
+        
+        if task['status'] not in ('queued', 'running'):
+            return jsonify({'error': '任务未在运行，无法暂停'}), 400
+        
+        # 执行任务的进程（可能不是当前进程）在下一次控制轮询时暂停
+        if not db.set_task_paused(task_id, True):
+            return jsonify({'error': '暂停任务失败'}), 500
+        job_queue.signal_task(task_id, 'pause')
+        logger.info(f"⏸️ 任务 {task_id} 已请求暂停")
+        
+        return jsonify({
+            'success': True,
+            'message': '任务已暂停'
+        })
+    except Exception as e:
+        logger.error(f"❌ 暂停任务失败: {e}")
+        return jsonify({'error': f'暂停任务失败: {str(e)}'}), 500
+
+@app.route('/api/tasks/<task_id>/resume', methods=['POST'])
+@login_required
+def resume_task(task_id):
+    """恢复暂停的任务，或续跑中断的任务：复用原任务记录，只评测结果日志中缺失的题目"""
+    try:
+        current_user_id = session.get('user_id', 'anonymous')
+        task = db.get_running_task(task_id)
+        
+        if not task:
+            return jsonify({'error': '任务不存在'}), 404
+        
+        if task['created_by'] != current_user_id:
+            return jsonify({'error': '无权限操作此任务'}), 403
+        
+        if task['status'] == 'completed':
+            return jsonify({'error': '任务已完成，无需续跑'}), 400
+        
+        completed_count = len(db.get_task_result_indices(task_id))
+        
+        # 暂停的任务：清除暂停标记，执行进程在下一次控制轮询时继续评测
+        was_paused = bool(task.get('paused_at'))
+        if was_paused:
+            db.set_task_paused(task_id, False)
+            job_queue.signal_task(task_id, 'resume')
+            logger.info(f"▶️ 任务 {task_id} 已请求恢复")
+            if task['status'] == 'queued':
+                return jsonify({
+                    'success': True,
+                    'task_id': task_id,
+                    'resumed': True,
+                    'completed': completed_count,
+                    'total': task['total']
+                })
+        
+        job = (task.get('metadata') or {}).get('job')
+        if not job:
+            return jsonify({'error': '任务缺少续跑所需的参数，请重新发起评测'}), 400
+        
+        if not os.path.exists(job['filepath']):
+            return jsonify({'error': '数据集文件不存在，无法续跑'}), 400
+        
+        # 放回任务队列；已在排队或仍有存活的worker在执行时拒绝（暂停的任务恢复后由原worker继续执行）
+        if not db.requeue_task(task_id, EVALUATION_HEARTBEAT_TIMEOUT):
+            if was_paused:
+                return jsonify({
+                    'success': True,
+                    'task_id': task_id,
+                    'resumed': True,
+                    'completed': completed_count,
+                    'total': task['total']
+                })
+            return jsonify({'error': '任务正在排队或运行中'}), 409
+        db.update_task_metadata(task_id, {'credentials': extract_credential_headers(request.headers)})
+        
+        queued_status = TaskStatus(task_id)
+        queued_status.status = "排队中"
+        queued_status.current_step = f"等待续跑，已完成 {completed_count}/{task['total']} 题"
+        queued_status.evaluation_mode = task['evaluation_mode']
+        queued_status.selected_models = task['selected_models']
+        queued_status.progress = completed_count
+        queued_status.total = task['total']
+        queued_status.question_count = task['total']
+        if task['started_at']:
+            queued_status.start_time = datetime.fromisoformat(task['started_at'])
+        task_status.publish(queued_status)
+        
+        if evaluation_scheduler:
+            evaluation_scheduler.wake()
+        logger.info(f"🔁 续跑任务 {task_id} 已重新排队，已完成 {completed_count}/{task['total']} 题")
+        
+        return jsonify({
+            'success': True,
+            'task_id': task_id,
+            'completed': completed_count,
+            'total': task['total']
+        })
+    except Exception as e:
+        logger.error(f"❌ 续跑任务失败: {e}")
+        return jsonify({'error': f'续跑任务失败: {str(e)}'}), 500
+
 @app.route('/api/tasks/<task_id>/connect', methods=['POST'])
 @login_required
 def connect_to_task(task_id):
@@ -4579,28 +5424,14 @@ def connect_to_task(task_id):
         if task['created_by'] != current_user_id:
             return jsonify({'error': '无权限访问此任务'}), 403
         
-        # 如果内存中没有此任务，尝试从数据库恢复
-        if task_id not in task_status and task['status'] == 'running':
-            # 重新创建内存中的任务状态
-            task_status[task_id] = TaskStatus(task_id)
-            task_status[task_id].evaluation_mode = task['evaluation_mode']
-            task_status[task_id].selected_models = task['selected_models']
-            task_status[task_id].progress = task['progress']
-            task_status[task_id].total = task['total']
-            task_status[task_id].current_step = task['current_step']
-            task_status[task_id].status = "运行中"
-            
-            # 从数据库时间戳解析
-            if task['started_at']:
-                task_status[task_id].start_time = datetime.fromisoformat(task['started_at'])
-        
+        # 任务状态由共享存储提供，任意worker都能查询；执行进程已退出的任务需要续跑
         return jsonify({
             'success': True,
             'task_id': task_id,
-            'task': task
+            'task': public_task(task)
         })
     except Exception as e:
-        print(f"❌ 连接任务失败: {e}")
+        logger.error(f"❌ 连接任务失败: {e}")
         return jsonify({'error': f'连接任务失败: {str(e)}'}), 500
 
 
@@ -4637,7 +5468,7 @@ def create_share():
             if not os.path.exists(filepath):
                 return jsonify({'error': '结果文件不存在'}), 404
             
-            print(f"📝 [分享创建] 处理临时结果文件: {filename}")
+            logger.info(f"📝 [分享创建] 处理临时结果文件: {filename}")
             
             try:
                 # 读取CSV文件获取完整信息
@@ -4660,7 +5491,7 @@ def create_share():
                 elif any(col.endswith('_评分') for col in df.columns):
                     evaluation_mode = 'subjective'
                 
-                print(f"📊 [分享创建] 提取信息: 模型={models}, 模式={evaluation_mode}, 题目数={len(df)}")
+                logger.info(f"📊 [分享创建] 提取信息: 模型={models}, 模式={evaluation_mode}, 题目数={len(df)}")
                 
                 # 创建完整的数据库记录
                 metadata = {
@@ -4697,10 +5528,10 @@ def create_share():
                 # 更新result_id为新创建的数据库记录ID
                 result_id = new_result_id
                 
-                print(f"✅ [分享创建] 成功创建数据库记录: {new_result_id}")
+                logger.info(f"✅ [分享创建] 成功创建数据库记录: {new_result_id}")
                 
             except Exception as e:
-                print(f"❌ [分享创建] 处理临时文件失败: {e}")
+                logger.error(f"❌ [分享创建] 处理临时文件失败: {e}")
                 return jsonify({'error': f'处理临时结果文件失败: {str(e)}'}), 500
         else:
             # 处理正常的数据库结果ID
@@ -4745,7 +5576,7 @@ def create_share():
             return jsonify({'error': '创建分享链接失败'}), 500
             
     except Exception as e:
-        print(f"❌ 创建分享链接错误: {e}")
+        logger.error(f"❌ 创建分享链接错误: {e}")
         return jsonify({'error': f'创建分享链接失败: {str(e)}'}), 500
 
 @app.route('/api/share/my-shares', methods=['GET'])
@@ -4777,7 +5608,7 @@ def get_my_shares():
         })
         
     except Exception as e:
-        print(f"❌ 获取分享列表错误: {e}")
+        logger.error(f"❌ 获取分享列表错误: {e}")
         return jsonify({'error': f'获取分享列表失败: {str(e)}'}), 500
 
 @app.route('/api/share/<share_id>/revoke', methods=['POST'])
@@ -4801,7 +5632,7 @@ def revoke_share(share_id):
             return jsonify({'error': '撤销分享链接失败'}), 500
             
     except Exception as e:
-        print(f"❌ 撤销分享链接错误: {e}")
+        logger.error(f"❌ 撤销分享链接错误: {e}")
         return jsonify({'error': f'撤销分享链接失败: {str(e)}'}), 500
 
 @app.route('/api/share/<share_id>/logs', methods=['GET'])
@@ -4821,7 +5652,7 @@ def get_share_logs(share_id):
         })
         
     except Exception as e:
-        print(f"❌ 获取分享日志错误: {e}")
+        logger.error(f"❌ 获取分享日志错误: {e}")
         return jsonify({'error': f'获取分享日志失败: {str(e)}'}), 500
 
 @app.route('/share/<share_token>')
@@ -4874,7 +5705,7 @@ def view_shared_result(share_token):
             for path in alternative_paths:
                 if os.path.exists(path):
                     found_path = path
-                    print(f"🔍 在备用路径找到文件: {path}")
+                    logger.info(f"🔍 在备用路径找到文件: {path}")
                     break
             
             if found_path:
@@ -4886,9 +5717,9 @@ def view_shared_result(share_token):
         # 读取CSV数据
         try:
             df = pd.read_csv(result_file_path, encoding='utf-8-sig')
-            print(f"📊 [分享页面] 成功读取CSV文件，数据形状: {df.shape}")
+            logger.info(f"📊 [分享页面] 成功读取CSV文件，数据形状: {df.shape}")
         except Exception as e:
-            print(f"❌ [分享页面] 读取CSV文件失败: {e}")
+            logger.error(f"❌ [分享页面] 读取CSV文件失败: {e}")
             return render_template('shared_error.html', 
                                  error_message=f'读取结果文件失败: {str(e)}'), 500
         
@@ -4902,7 +5733,7 @@ def view_shared_result(share_token):
             # 安全地处理 models 字段
             models_data = share_info.get('models', [])
             if not isinstance(models_data, list):
-                print(f"⚠️ [分享页面] models字段类型异常: {type(models_data)}, 值: {models_data}")
+                logger.warning(f"⚠️ [分享页面] models字段类型异常: {type(models_data)}, 值: {models_data}")
                 if isinstance(models_data, str):
                     try:
                         # 尝试JSON解析
@@ -4917,7 +5748,7 @@ def view_shared_result(share_token):
             
             # 兜底机制：如果models_data为空，尝试从CSV文件中提取
             if not models_data:
-                print(f"🔄 [分享页面] models信息缺失，尝试从CSV文件提取...")
+                logger.info(f"🔄 [分享页面] models信息缺失，尝试从CSV文件提取...")
                 try:
                     extracted_models = []
                     for col in df.columns:
@@ -4928,17 +5759,17 @@ def view_shared_result(share_token):
                     
                     if extracted_models:
                         models_data = extracted_models
-                        print(f"✅ [分享页面] 从CSV文件提取到models: {models_data}")
+                        logger.info(f"✅ [分享页面] 从CSV文件提取到models: {models_data}")
                     else:
-                        print(f"⚠️ [分享页面] 未能从CSV文件中提取到models信息")
+                        logger.warning(f"⚠️ [分享页面] 未能从CSV文件中提取到models信息")
                 except Exception as extract_error:
-                    print(f"❌ [分享页面] 提取models信息失败: {extract_error}")
+                    logger.error(f"❌ [分享页面] 提取models信息失败: {extract_error}")
                     models_data = []
             
             # 清理DataFrame数据，确保所有值都是安全的类型
             cleaned_data = []
             raw_records = df.to_dict('records')
-            print(f"🔍 [分享页面] 原始记录数量: {len(raw_records)}")
+            logger.info(f"🔍 [分享页面] 原始记录数量: {len(raw_records)}")
             
             for record in raw_records:
                 cleaned_record = {}
@@ -4952,19 +5783,19 @@ def view_shared_result(share_token):
                         cleaned_record[key] = str(value)
                 cleaned_data.append(cleaned_record)
             
-            print(f"✅ [分享页面] 清理后的数据量: {len(cleaned_data)}")
+            logger.info(f"✅ [分享页面] 清理后的数据量: {len(cleaned_data)}")
             
             # 检测和修复evaluation_mode
             evaluation_mode = share_info.get('evaluation_mode', '')
             if not evaluation_mode:
-                print(f"🔄 [分享页面] evaluation_mode信息缺失，尝试从CSV文件推断...")
+                logger.info(f"🔄 [分享页面] evaluation_mode信息缺失，尝试从CSV文件推断...")
                 if 'answer' in df.columns or '标准答案' in df.columns:
                     evaluation_mode = 'objective'
                 elif any(col.endswith('_评分') for col in df.columns):
                     evaluation_mode = 'subjective'
                 else:
                     evaluation_mode = 'unknown'
-                print(f"✅ [分享页面] 推断evaluation_mode: {evaluation_mode}")
+                logger.info(f"✅ [分享页面] 推断evaluation_mode: {evaluation_mode}")
             
             result_data = {
                 'filename': os.path.basename(result_file_path),
@@ -4982,35 +5813,34 @@ def view_shared_result(share_token):
             }
             
             # 验证数据结构
-            print(f"📝 [分享页面] 数据准备完成:")
-            print(f"  - 列数: {len(df.columns)}")
-            print(f"  - 行数: {len(df)}")
-            print(f"  - result_data.data长度: {len(result_data['data'])}")
-            print(f"  - models类型: {type(result_data['share_info']['models'])}")
-            print(f"  - models数量: {len(result_data['share_info']['models']) if isinstance(result_data['share_info']['models'], list) else 'Not a list'}")
-            print(f"  - models内容: {result_data['share_info']['models']}")
-            print(f"  - columns类型: {type(result_data['columns'])}")
-            print(f"  - data类型: {type(result_data['data'])}")
+            logger.info(f"📝 [分享页面] 数据准备完成:")
+            logger.info(f"  - 列数: {len(df.columns)}")
+            logger.info(f"  - 行数: {len(df)}")
+            logger.info(f"  - result_data.data长度: {len(result_data['data'])}")
+            logger.info(f"  - models类型: {type(result_data['share_info']['models'])}")
+            logger.info(f"  - models数量: {len(result_data['share_info']['models']) if isinstance(result_data['share_info']['models'], list) else 'Not a list'}")
+            logger.info(f"  - models内容: {result_data['share_info']['models']}")
+            logger.info(f"  - columns类型: {type(result_data['columns'])}")
+            logger.info(f"  - data类型: {type(result_data['data'])}")
             
         except Exception as e:
-            print(f"❌ [分享页面] 数据准备失败: {e}")
-            import traceback
-            print(f"🐛 [分享页面] 错误堆栈: {traceback.format_exc()}")
+            logger.error(f"❌ [分享页面] 数据准备失败: {e}")
+            logger.error("🐛 [分享页面] 错误堆栈", exc_info=True)
             return render_template('shared_error.html', 
                                  error_message=f'数据处理失败: {str(e)}'), 500
         
         # 获取统计分析（如果analytics可用）
         advanced_stats = None
-        print(f"🔍 [分享页面] Analytics 模块状态: {'可用' if analytics else '不可用'}")
+        logger.info(f"🔍 [分享页面] Analytics 模块状态: {'可用' if analytics else '不可用'}")
         
         if analytics:
             try:
                 # 预处理数据：清理评分列中的字符串格式
-                print(f"🧹 [分享页面] 开始清理数据...")
+                logger.info(f"🧹 [分享页面] 开始清理数据...")
                 try:
                     # 找到所有评分列
                     score_columns = [col for col in df.columns if isinstance(col, str) and '评分' in col]
-                    print(f"🔍 [分享页面] 发现评分列: {score_columns}")
+                    logger.info(f"🔍 [分享页面] 发现评分列: {score_columns}")
                     
                     # 清理每个评分列的数据
                     for col in score_columns:
@@ -5029,14 +5859,14 @@ def view_shared_result(share_token):
                                 return x
                             
                             df[col] = df[col].apply(clean_score)
-                            print(f"✅ [分享页面] 清理评分列 {col} 完成")
+                            logger.info(f"✅ [分享页面] 清理评分列 {col} 完成")
                     
                     # 将清理后的数据保存回临时文件
                     df.to_csv(result_file_path, index=False, encoding='utf-8')
-                    print(f"✅ [分享页面] 清理后的数据已保存")
+                    logger.info(f"✅ [分享页面] 清理后的数据已保存")
                 
                 except Exception as clean_error:
-                    print(f"⚠️ [分享页面] 数据清理过程出错: {clean_error}")
+                    logger.warning(f"⚠️ [分享页面] 数据清理过程出错: {clean_error}")
                 
                 # 尝试获取或估算时间数据
                 evaluation_data = {
@@ -5058,9 +5888,9 @@ def view_shared_result(share_token):
                                     'end_time': metadata['end_time'],
                                     'from_database': True
                                 })
-                                print(f"✅ [分享页面] 从数据库获取到时间数据")
+                                logger.info(f"✅ [分享页面] 从数据库获取到时间数据")
                     except Exception as e:
-                        print(f"⚠️ [分享页面] 获取数据库时间数据失败: {e}")
+                        logger.warning(f"⚠️ [分享页面] 获取数据库时间数据失败: {e}")
                 
                 # 如果没有找到真实时间数据，使用文件时间估算
                 if 'start_time' not in evaluation_data:
@@ -5076,13 +5906,13 @@ def view_shared_result(share_token):
                             'end_time': file_mtime.isoformat(),
                             'is_estimated': True
                         })
-                        print(f"⏰ [分享页面] 使用估算时间数据: {estimated_duration}秒估算时长")
+                        logger.warning(f"⏰ [分享页面] 使用估算时间数据: {estimated_duration}秒估算时长")
                     except Exception as e:
-                        print(f"⚠️ [分享页面] 获取文件时间失败: {e}")
+                        logger.warning(f"⚠️ [分享页面] 获取文件时间失败: {e}")
                         # 如果连文件时间都获取不到，不提供时间数据
                         pass
                 
-                print(f"🔄 [分享页面] 开始分析评测结果...")
+                logger.info(f"🔄 [分享页面] 开始分析评测结果...")
                 analysis_result = analytics.analyze_evaluation_results(
                     result_file=result_file_path,
                     evaluation_data=evaluation_data
@@ -5090,16 +5920,16 @@ def view_shared_result(share_token):
                 
                 if analysis_result.get('success'):
                     advanced_stats = analysis_result['analysis']
-                    print(f"✅ [分享页面] 成功生成高级统计分析")
+                    logger.info(f"✅ [分享页面] 成功生成高级统计分析")
                     
                     # 验证和修复高级分析数据结构
                     if advanced_stats:
-                        print(f"🔍 [分享页面] 高级分析数据结构: {type(advanced_stats)}")
-                        print(f"🔍 [分享页面] 高级分析内容: {advanced_stats}")
+                        logger.info(f"🔍 [分享页面] 高级分析数据结构: {type(advanced_stats)}")
+                        logger.info(f"🔍 [分享页面] 高级分析内容: {advanced_stats}")
                         
                         # 确保 total_responses 字段存在且为数字
                         if 'total_responses' not in advanced_stats or not isinstance(advanced_stats.get('total_responses'), (int, float)):
-                            print(f"⚠️ [分享页面] 高级分析缺少或类型错误的 total_responses，正在修复...")
+                            logger.warning(f"⚠️ [分享页面] 高级分析缺少或类型错误的 total_responses，正在修复...")
                             
                             # 尝试从分数分布计算总响应数
                             total_responses = 0
@@ -5116,24 +5946,24 @@ def view_shared_result(share_token):
                                 total_responses = len(df)
                             
                             advanced_stats['total_responses'] = total_responses
-                            print(f"✅ [分享页面] 设置 total_responses = {total_responses}")
+                            logger.info(f"✅ [分享页面] 设置 total_responses = {total_responses}")
                 else:
-                    print(f"❌ [分享页面] 分析失败: {analysis_result.get('error', '未知错误')}")
+                    logger.error(f"❌ [分享页面] 分析失败: {analysis_result.get('error', '未知错误')}")
             except Exception as e:
-                print(f"❌ [分享页面] 分析过程出错: {e}")
+                logger.error(f"❌ [分享页面] 分析过程出错: {e}")
         
         # 如果没有高级统计，生成基础的统计数据用于前端显示
         if not advanced_stats:
-            print(f"📝 [分享页面] 生成基础统计数据作为后备方案")
+            logger.info(f"📝 [分享页面] 生成基础统计数据作为后备方案")
             try:
                 # 确保df是有效的DataFrame
                 if not isinstance(df, pd.DataFrame):
-                    print(f"❌ [分享页面] df不是DataFrame类型: {type(df)}")
+                    logger.error(f"❌ [分享页面] df不是DataFrame类型: {type(df)}")
                     raise ValueError(f"数据类型错误: {type(df)}")
                     
                 # 简单的分数统计
                 score_columns = [col for col in df.columns if isinstance(col, str) and ('评分' in col or 'score' in col.lower())]
-                print(f"🔍 [分享页面] 找到评分列: {score_columns}")
+                logger.info(f"🔍 [分享页面] 找到评分列: {score_columns}")
                 
                 basic_stats = {
                     'basic_stats': {
@@ -5159,12 +5989,12 @@ def view_shared_result(share_token):
                         try:
                             if '评分' in col:
                                 model_name = col.replace('_评分', '').replace('评分', '').strip()
-                                print(f"🔄 [分享页面] 处理模型: {model_name}, 列: {col}")
+                                logger.info(f"🔄 [分享页面] 处理模型: {model_name}, 列: {col}")
                                 
                                 # 安全地处理分数数据
                                 scores_series = pd.to_numeric(df[col], errors='coerce').dropna()
                                 if not isinstance(scores_series, pd.Series):
-                                    print(f"⚠️ [分享页面] scores_series 类型异常: {type(scores_series)}")
+                                    logger.warning(f"⚠️ [分享页面] scores_series 类型异常: {type(scores_series)}")
                                     continue
                                     
                                 scores_count = len(scores_series)
@@ -5198,9 +6028,9 @@ def view_shared_result(share_token):
                                         'question_count': scores_count,
                                         'percentiles': percentiles
                                     }
-                                    print(f"✅ [分享页面] {model_name}: 平均分={avg_score:.2f}, 题数={scores_count}")
+                                    logger.info(f"✅ [分享页面] {model_name}: 平均分={avg_score:.2f}, 题数={scores_count}")
                         except Exception as col_error:
-                            print(f"⚠️ [分享页面] 处理列 {col} 时出错: {col_error}")
+                            logger.warning(f"⚠️ [分享页面] 处理列 {col} 时出错: {col_error}")
                             continue
                     
                     # 生成模型排名
@@ -5211,9 +6041,9 @@ def view_shared_result(share_token):
                                 {'model': model, 'avg_score': score} 
                                 for model, score in sorted_models
                             ]
-                            print(f"📊 [分享页面] 模型排名生成完成: {len(basic_stats['model_rankings'])} 个模型")
+                            logger.info(f"📊 [分享页面] 模型排名生成完成: {len(basic_stats['model_rankings'])} 个模型")
                         except Exception as ranking_error:
-                            print(f"⚠️ [分享页面] 生成模型排名时出错: {ranking_error}")
+                            logger.warning(f"⚠️ [分享页面] 生成模型排名时出错: {ranking_error}")
                     
                     # 分数分布统计
                     try:
@@ -5238,26 +6068,25 @@ def view_shared_result(share_token):
                             score_counts = Counter(valid_scores)
                             basic_stats['score_analysis']['score_distribution'] = dict(score_counts)
                             basic_stats['total_responses'] = len(all_scores)
-                            print(f"📈 [分享页面] 分数分布统计完成: {len(valid_scores)} 个有效分数")
+                            logger.info(f"📈 [分享页面] 分数分布统计完成: {len(valid_scores)} 个有效分数")
                     except Exception as dist_error:
-                        print(f"⚠️ [分享页面] 生成分数分布时出错: {dist_error}")
+                        logger.warning(f"⚠️ [分享页面] 生成分数分布时出错: {dist_error}")
                 else:
                     # 没有评分列时，设置基础的 total_responses
                     basic_stats['total_responses'] = len(df)
-                    print(f"📝 [分享页面] 没有评分列，设置 total_responses = {len(df)}")
+                    logger.info(f"📝 [分享页面] 没有评分列，设置 total_responses = {len(df)}")
                 
                 advanced_stats = basic_stats
-                print(f"✅ [分享页面] 基础统计数据生成成功")
-                print(f"📊 [分享页面] 统计数据内容: {advanced_stats}")
-                print(f"📊 [分享页面] model_rankings: {advanced_stats.get('model_rankings', [])}")
-                print(f"📊 [分享页面] score_distribution: {advanced_stats.get('score_analysis', {}).get('score_distribution', {})}")
+                logger.info(f"✅ [分享页面] 基础统计数据生成成功")
+                logger.info(f"📊 [分享页面] 统计数据内容: {advanced_stats}")
+                logger.info(f"📊 [分享页面] model_rankings: {advanced_stats.get('model_rankings', [])}")
+                logger.info(f"📊 [分享页面] score_distribution: {advanced_stats.get('score_analysis', {}).get('score_distribution', {})}")
                 
             except Exception as e:
-                print(f"❌ [分享页面] 生成基础统计数据失败: {e}")
-                import traceback
-                print(f"🐛 [分享页面] 详细错误堆栈: {traceback.format_exc()}")
+                logger.error(f"❌ [分享页面] 生成基础统计数据失败: {e}")
+                logger.error("🐛 [分享页面] 详细错误堆栈", exc_info=True)
                 # 提供最基本的统计数据
-                print(f"🚨 [分享页面] 使用最小化统计数据作为最后备用方案")
+                logger.info(f"🚨 [分享页面] 使用最小化统计数据作为最后备用方案")
                 advanced_stats = {
                     'basic_stats': {
                         'total_questions': len(df) if isinstance(df, pd.DataFrame) else 0,
@@ -5271,20 +6100,19 @@ def view_shared_result(share_token):
         
         # 渲染分享页面
         try:
-            print(f"🎨 [分享页面] 开始渲染模板...")
+            logger.info(f"🎨 [分享页面] 开始渲染模板...")
             return render_template('shared_result.html', 
                                  result_data=result_data,
                                  advanced_stats=advanced_stats,
                                  share_token=share_token)
         except Exception as render_error:
-            print(f"❌ [分享页面] 模板渲染失败: {render_error}")
-            import traceback
-            print(f"🐛 [分享页面] 渲染错误堆栈: {traceback.format_exc()}")
+            logger.error(f"❌ [分享页面] 模板渲染失败: {render_error}")
+            logger.error("🐛 [分享页面] 渲染错误堆栈", exc_info=True)
             return render_template('shared_error.html', 
                                  error_message=f'页面渲染失败: {str(render_error)}'), 500
         
     except Exception as e:
-        print(f"❌ 查看分享结果错误: {e}")
+        logger.error(f"❌ 查看分享结果错误: {e}")
         return render_template('shared_error.html', 
                              error_message=f'加载分享内容失败: {str(e)}'), 500
 
@@ -5329,7 +6157,7 @@ def download_shared_result(share_token):
             for path in alternative_paths:
                 if os.path.exists(path):
                     found_path = path
-                    print(f"🔍 下载时在备用路径找到文件: {path}")
+                    logger.info(f"🔍 下载时在备用路径找到文件: {path}")
                     break
             
             if found_path:
@@ -5344,7 +6172,7 @@ def download_shared_result(share_token):
         )
         
     except Exception as e:
-        print(f"❌ 下载分享文件错误: {e}")
+        logger.error(f"❌ 下载分享文件错误: {e}")
         return jsonify({'error': f'下载失败: {str(e)}'}), 500
 
 # ========== 后台任务：清理过期分享链接 ==========
@@ -5354,9 +6182,30 @@ def cleanup_expired_shares():
     try:
         expired_count = db.cleanup_expired_shares()
         if expired_count > 0:
-            print(f"🧹 清理了 {expired_count} 个过期的分享链接")
+            logger.info(f"🧹 清理了 {expired_count} 个过期的分享链接")
+    except Exception as e:
+        logger.warning(f"⚠️ 清理过期分享链接失败: {e}")
+
+def prune_judge_cache():
+    """清理过期和超出容量的评测缓存"""
+    try:
+        removed_count = db.prune_judge_cache(
+            ttl_seconds=JUDGE_CACHE_TTL_DAYS * 86400,
+            max_entries=JUDGE_CACHE_MAX_ENTRIES
+        )
+        if removed_count > 0:
+            logger.info(f"🧹 清理了 {removed_count} 条评测缓存")
     except Exception as e:
-        print(f"⚠️ 清理过期分享链接失败: {e}")
+        logger.warning(f"⚠️ 清理评测缓存失败: {e}")
+
+def prune_task_states():
+    """清理已结束任务的共享状态"""
+    try:
+        removed_count = task_status.prune()
+        if removed_count > 0:
+            logger.info(f"🧹 清理了 {removed_count} 条任务状态")
+    except Exception as e:
+        logger.warning(f"⚠️ 清理任务状态失败: {e}")
 
 def start_background_tasks():
     """启动后台任务"""
@@ -5366,17 +6215,32 @@ def start_background_tasks():
     def background_worker():
         while True:
             try:
-                # 每小时清理一次过期分享链接
+                # 每小时清理一次过期分享链接、评测缓存和任务状态
                 cleanup_expired_shares()
+                prune_judge_cache()
+                prune_task_states()
                 time.sleep(3600)  # 1小时
             except Exception as e:
-                print(f"⚠️ 后台任务执行失败: {e}")
+                logger.warning(f"⚠️ 后台任务执行失败: {e}")
                 time.sleep(300)  # 5分钟后重试
     
     # 启动后台线程
     cleanup_thread = threading.Thread(target=background_worker, daemon=True)
     cleanup_thread.start()
-    print("🔄 后台清理任务已启动")
+    logger.info("🔄 后台清理任务已启动")
+    
+    # 启动内置评测调度
+    global evaluation_scheduler
+    if EVALUATION_EXECUTOR == 'embedded':
+        evaluation_scheduler = job_queue.EvaluationScheduler(
+            db, execute_queued_task,
+            slots=EVALUATION_WORKER_SLOTS,
+            global_limit=EVALUATION_MAX_RUNNING_JOBS,
+            per_user_limit=EVALUATION_MAX_JOBS_PER_USER,
+            heartbeat_timeout=EVALUATION_HEARTBEAT_TIMEOUT,
+            control_poll_interval=EVALUATION_CONTROL_POLL_INTERVAL
+        )
+        evaluation_scheduler.start()
 
 def initialize_system_configs():
     """初始化系统配置项"""
@@ -5393,7 +6257,7 @@ def initialize_system_configs():
             '是否启用详细日志输出（包括Google API请求/响应详情）', 
             'system'
         )
-        print("✅ 初始化日志开关配置：启用")
+        logger.info("✅ 初始化日志开关配置：启用")
 
 # 初始化默认管理员账户和默认提示词
 try:
@@ -5406,16 +6270,16 @@ try:
         # 启动后台任务
         start_background_tasks()
 except Exception as e:
-    print(f"⚠️ 初始化系统数据失败: {e}")
+    logger.warning(f"⚠️ 初始化系统数据失败: {e}")
 
 
 if __name__ == '__main__':
-    print("🚀 模型评测Web系统启动中...")
+    logger.info("🚀 模型评测Web系统启动中...")
     
     # 显示配置状态
     from config import print_configuration_status
     print_configuration_status()
     
-    print("\n🌐 访问地址: http://localhost:8080")
-    print("📖 配置帮助: python3 test_config.py")
+    logger.info("\n🌐 访问地址: http://localhost:8080")
+    logger.info("📖 配置帮助: python3 test_config.py")
     app.run(debug=True, host='0.0.0.0', port=8080)
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+端到端评测基准测试
+用本地桩服务代替 Copilot / Legacy 模型和 Gemini，通过 /start_evaluation 接口提交任务，
+由内置调度器按真实流程执行（获取答案 → 评测 → 写结果），不消耗任何线上额度。
+
+每个数据规模输出：题/秒、单题耗时 p50/p95（答案请求最慢模型 + 评测请求，来自调用遥测）、
+进程内存峰值(RSS)、数据库写入语句数/提交数/连接数，以及桩服务收到的请求、错误和限流次数。
+
+使用方法:
+    python benchmarks/e2e_benchmark.py --rows 100,1000 --output benchmark_e2e.json
+    python benchmarks/e2e_benchmark.py --rows 1000 --answer-latency 0.5 --judge-throttle-rate 0.05
+    python benchmarks/e2e_benchmark.py --rows 1000 --baseline benchmark_e2e.json  # 与基线比较，回退时退出码为1
+
+所有数据库和结果文件写在临时工作目录中（--workdir 可指定），不会影响当前目录的数据。
+"""
+
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.stub_servers import StubProfile, StubServer  # noqa: E402
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# 与基线比较的指标：(字段, 越大越好)
+COMPARED_METRICS = [
+    ('questions_per_second', True),
+    ('question_p95_seconds', False),
+    ('db_writes', False),
+    ('peak_rss_mb', False)
+]
+
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+
+class DbWriteCounter:
+    """统计本进程打开的SQLite连接数、写入语句数和提交次数（按数据库文件）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.connections = Counter()
+        self.writes = Counter()
+        self.commits = Counter()
+
+    def install(self):
+        original_connect = sqlite3.connect
+
+        def connect(database, *args, **kwargs):
+            conn = original_connect(database, *args, **kwargs)
+            name = os.path.basename(str(database))
+            with self._lock:
+                self.connections[name] += 1
+            conn.set_trace_callback(lambda statement: self._on_statement(name, statement))
+            return conn
+
+        sqlite3.connect = connect
+
+    def _on_statement(self, name: str, statement: str):
+        keyword = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ''
+        if keyword in WRITE_STATEMENTS:
+            with self._lock:
+                self.writes[name] += 1
+        elif keyword == 'COMMIT':
+            with self._lock:
+                self.commits[name] += 1
+
+    def snapshot(self) -> Dict[str, Counter]:
+        with self._lock:
+            return {'connections': Counter(self.connections), 'writes': Counter(self.writes),
+                    'commits': Counter(self.commits)}
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))], 4)
+
+
+def peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为KB，macOS 为字节
+    return round(peak / 1024 / (1024 if sys.platform == 'darwin' else 1), 1)
+
+
+def write_dataset(path: str, rows: int):
+    """生成合成数据集（客观题格式，主观题评测忽略answer列）"""
+    categories = ['常识', '数学', '写作', '翻译', '推理']
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['query', 'answer', 'type'])
+        for i in range(rows):
+            writer.writerow([f"基准测试问题 {i}：请解释第{i}个概念", f"标准答案 {i}", categories[i % len(categories)]])
+
+
+def question_latencies(db_path: str, task_id: str) -> Dict[str, List[float]]:
+    """从调用遥测计算单题耗时：该题最慢的答案请求 + 评测请求（批量评测按该批第一题统计）"""
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute(
+            'SELECT row_index, call_type, total_time FROM call_telemetry WHERE task_id = ?', (task_id,)
+        ).fetchall()
+    finally:
+        conn.close()
+    answer_max: Dict[int, float] = {}
+    judge: Dict[int, float] = {}
+    answers, judges = [], []
+    for row_index, call_type, total_time in rows:
+        if call_type == 'answer':
+            answers.append(total_time)
+            answer_max[row_index] = max(answer_max.get(row_index, 0.0), total_time)
+        else:
+            judges.append(total_time)
+            judge[row_index] = judge.get(row_index, 0.0) + total_time
+    questions = [answer_max.get(i, 0.0) + judge_time for i, judge_time in judge.items()]
+    return {'answers': answers, 'judges': judges, 'questions': questions}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='端到端评测基准测试（本地桩服务）')
+    parser.add_argument('--rows', default='100,1000', help='数据集行数，逗号分隔（100 ~ 50000）')
+    parser.add_argument('--models', default='HKGAI-V1,HKGAI-V1-PROD', help='参与评测的模型，逗号分隔（Legacy和Copilot模型均可）')
+    parser.add_argument('--mode', default='objective', choices=['objective', 'subjective'])
+    parser.add_argument('--no-pipeline', action='store_true', help='先获取全部答案再统一评测')
+    parser.add_argument('--batch-judge', action='store_true', help='多题合并评测')
+    parser.add_argument('--structured-judge', action='store_true', help='结构化输出评测')
+    parser.add_argument('--hedge', action='store_true', help='启用候选模型请求对冲')
+    for name, latency in (('answer', 0.3), ('judge', 0.5)):
+        parser.add_argument(f'--{name}-latency', type=float, default=latency, help=f'{name}请求耗时中位数(秒)')
+        parser.add_argument(f'--{name}-sigma', type=float, default=0.5, help=f'{name}请求耗时的对数正态分布sigma')
+        parser.add_argument(f'--{name}-error-rate', type=float, default=0.0, help=f'{name}请求返回HTTP 500的比例')
+        parser.add_argument(f'--{name}-throttle-rate', type=float, default=0.0, help=f'{name}请求返回HTTP 429的比例')
+    parser.add_argument('--answer-chars', type=int, default=400, help='模拟答案长度(字符)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--timeout', type=float, default=3600, help='单个数据规模的最长等待时间(秒)')
+    parser.add_argument('--workdir', default=None, help='工作目录（默认新建临时目录）')
+    parser.add_argument('--log-level', default='WARNING', help='评测引擎日志级别')
+    parser.add_argument('--output', default=None, help='结果JSON输出路径')
+    parser.add_argument('--baseline', default=None, help='基线结果JSON，指标回退超过容差时退出码为1')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='与基线比较的容差（比例）')
+    return parser.parse_args()
+
+
+def build_profiles(args) -> Dict[str, StubProfile]:
+    answer = dict(latency=args.answer_latency, sigma=args.answer_sigma, error_rate=args.answer_error_rate,
+                  throttle_rate=args.answer_throttle_rate, answer_chars=args.answer_chars)
+    return {
+        'copilot': StubProfile(**answer),
+        'legacy': StubProfile(**answer),
+        'gemini': StubProfile(latency=args.judge_latency, sigma=args.judge_sigma, error_rate=args.judge_error_rate,
+                              throttle_rate=args.judge_throttle_rate)
+    }
+
+
+def run_size(web_app, client, counter: DbWriteCounter, stub: StubServer, args, rows: int) -> Dict:
+    filename = f"benchmark_{rows}.csv"
+    write_dataset(os.path.join(web_app.app.config['UPLOAD_FOLDER'], filename), rows)
+    selected_models = [name.strip() for name in args.models.split(',') if name.strip()]
+
+    db_before = counter.snapshot()
+    stub_before = stub.stats()
+    started_at = time.monotonic()
+    response = client.post('/start_evaluation', json={
+        'filename': filename,
+        'selected_models': selected_models,
+        'force_mode': args.mode,
+        'save_to_history': False,
+        'pipeline_mode': not args.no_pipeline,
+        'bypass_cache': True,
+        'batch_judge': args.batch_judge,
+        'structured_judge': args.structured_judge,
+        'hedge_requests': args.hedge
+    })
+    body = response.get_json() or {}
+    if response.status_code != 200 or not body.get('task_id'):
+        raise RuntimeError(f"提交评测任务失败: HTTP {response.status_code} {body}")
+    task_id = body['task_id']
+
+    # 等待任务结束且调度器释放任务槽（结果文件和历史记录都已写完）
+    status = None
+    while time.monotonic() - started_at < args.timeout:
+        task = web_app.task_status.get(task_id)
+        status = task.status if task else None
+        if status in ('完成', '失败') and web_app.evaluation_scheduler.active_count() == 0:
+            break
+        time.sleep(0.1)
+    elapsed = time.monotonic() - started_at
+    if status != '完成':
+        raise RuntimeError(f"{rows} 行评测未完成: 状态 {status}，已等待 {elapsed:.1f}s")
+
+    db_after = counter.snapshot()
+    stub_after = stub.stats()
+    latencies = question_latencies(web_app.db.db_path, task_id)
+    task = web_app.task_status.get(task_id)
+    return {
+        'rows': rows,
+        'elapsed_seconds': round(elapsed, 3),
+        'questions_per_second': round(rows / elapsed, 3),
+        'question_p50_seconds': percentile(latencies['questions'], 50),
+        'question_p95_seconds': percentile(latencies['questions'], 95),
+        'answer_p95_seconds': percentile(latencies['answers'], 95),
+        'judge_p95_seconds': percentile(latencies['judges'], 95),
+        'judge_calls': len(latencies['judges']),
+        'error_count': task.error_count if task else None,
+        'peak_rss_mb': peak_rss_mb(),
+        'db_writes': sum((db_after['writes'] - db_before['writes']).values()),
+        'db_commits': sum((db_after['commits'] - db_before['commits']).values()),
+        'db_connections': sum((db_after['connections'] - db_before['connections']).values()),
+        'db_writes_by_file': dict(db_after['writes'] - db_before['writes']),
+        'stub': {
+            name: {key: stub_after[name][key] - stub_before[name][key] for key in stub_after[name]}
+            for name in stub_after
+        }
+    }
+
+
+def compare_with_baseline(runs: List[Dict], baseline_path: str, tolerance: float) -> List[str]:
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {run['rows']: run for run in json.load(f).get('runs', [])}
+    regressions = []
+    for run in runs:
+        base = baseline.get(run['rows'])
+        if not base:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS:
+            current, previous = run.get(metric), base.get(metric)
+            if not current or not previous:
+                continue
+            change = (current - previous) / previous
+            if (higher_is_better and change < -tolerance) or (not higher_is_better and change > tolerance):
+                regressions.append(f"{run['rows']} 行 {metric}: {previous} -> {current} ({change:+.1%})")
+    return regressions
+
+
+def main():
+    args = parse_args()
+    sizes = sorted(int(value) for value in args.rows.split(',') if value.strip())
+    output = os.path.abspath(args.output) if args.output else None
+    baseline = os.path.abspath(args.baseline) if args.baseline else None
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='eval_benchmark_')
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+
+    # 桩服务先于评测引擎启动（fork出的子进程不继承引擎的线程）
+    stub = StubServer(build_profiles(args), seed=args.seed)
+    stub.start()
+
+    os.environ.setdefault('LOG_LEVEL', args.log_level)
+    os.environ['EVALUATION_EXECUTOR'] = 'embedded'
+    os.environ.setdefault('GOOGLE_API_KEY', 'benchmark')
+    counter = DbWriteCounter()
+    counter.install()
+
+    try:
+        import app as web_app
+        from models.copilot_client import CopilotClient
+        from models.legacy_client import LegacyClient
+
+        for model_config in LegacyClient.LEGACY_MODELS.values():
+            model_config['url'] = f"{stub.base_url}/legacy"
+            os.environ[model_config['token_env']] = 'benchmark'
+        for model_config in CopilotClient.COPILOT_MODELS.values():
+            model_config['url'] = f"{stub.base_url}/copilot"
+            os.environ[model_config['cookie_env']] = 'benchmark'
+        web_app.db.set_system_config('gemini_api_endpoint', f"{stub.base_url}/gemini")
+        web_app.db.set_system_config('enable_verbose_logging', 'false')
+
+        client = web_app.app.test_client()
+        with client.session_transaction() as session:
+            session['user_id'] = 'benchmark'
+            session['role'] = 'admin'
+
+        print(f"🚀 端到端基准测试：模型 {args.models}，{args.mode}模式，工作目录 {workdir}")
+        runs = []
+        for rows in sizes:
+            result = run_size(web_app, client, counter, stub, args, rows)
+            runs.append(result)
+            print(f"📊 {rows} 行: {result['questions_per_second']} 题/秒，单题 p95 {result['question_p95_seconds']}s，"
+                  f"内存峰值 {result['peak_rss_mb']}MB，数据库写入 {result['db_writes']} 次"
+                  f"（提交 {result['db_commits']}，连接 {result['db_connections']}）")
+    finally:
+        stub.stop()
+
+    report = {
+        'benchmark': 'e2e',
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'settings': {key: value for key, value in vars(args).items() if key not in ('output', 'baseline', 'workdir')},
+        'runs': runs
+    }
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"💾 结果已保存到 {output}")
+    else:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    exit_code = 0
+    if baseline:
+        regressions = compare_with_baseline(runs, baseline, args.tolerance)
+        for line in regressions:
+            print(f"⚠️ 性能回退 {line}")
+        if regressions:
+            exit_code = 1
+        else:
+            print("✅ 与基线相比没有超过容差的回退")
+
+    # 评测引擎的调度和后台线程不会自行结束，输出完成后直接退出
+    sys.stdout.flush()
+    os._exit(exit_code)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+CPU密集辅助函数的微基准测试
+覆盖评测热路径上的纯计算函数：评测JSON解析、SSE流式答案解析、结果平铺、文件名处理、
+评测提示构建和10k行结果的高级统计分析。
+
+每个用例先校准循环次数（单次测量不少于 --min-time 秒），再重复测量取中位数；
+结果保存为JSON，并与已保存的基线比较，中位耗时变慢超过容差时退出码为1。
+
+使用方法:
+    python benchmarks/micro_benchmark.py --save-baseline            # 生成/更新基线
+    python benchmarks/micro_benchmark.py                            # 与基线比较
+    python benchmarks/micro_benchmark.py --filter parse_json --output micro.json
+
+基线与机器相关，应在同一台机器（或同规格的CI环境）上生成和比较。
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Tuple
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+DEFAULT_BASELINE = os.path.join(REPO_ROOT, 'benchmarks', 'micro_baseline.json')
+MODEL_NAMES = ['HKGAI-V1', 'HKGAI-V2', 'HKGAI-V1-PROD']
+
+
+def judge_output(model_count: int = 3) -> str:
+    return json.dumps({
+        f"模型{j}": {"评分": str(j + 2), "准确性": "部分正确",
+                   "理由": f"回答覆盖了主要知识点，但第{j}部分的推理过程不够完整，个别术语使用不准确。" * 3}
+        for j in range(1, model_count + 1)
+    }, ensure_ascii=False, indent=2)
+
+
+def broken_judge_output() -> str:
+    """常见的格式问题：中文引号、单引号、尾随逗号、未加引号的键"""
+    return judge_output().replace('"理由"', '理由').replace('"评分": "3"', "'评分': '3'") \
+        .replace('"准确性": "部分正确"\n', '"准确性": “部分正确”,\n', 1)
+
+
+class ReplayContent:
+    def __init__(self, data: bytes, chunk_size: int):
+        self._data = data
+        self._chunk_size = chunk_size
+
+    async def iter_any(self):
+        for start in range(0, len(self._data), self._chunk_size):
+            yield self._data[start:start + self._chunk_size]
+
+
+class ReplayResponse:
+    """按固定大小分块回放预先生成的SSE响应体，供 read_sse_answer 解析"""
+
+    def __init__(self, data: bytes, chunk_size: int = 4096):
+        self.content = ReplayContent(data, chunk_size)
+
+    def close(self):
+        pass
+
+
+def copilot_stream(pieces: int) -> bytes:
+    frames = [f"event: APPEND\ndata: {json.dumps({'choices': [{'delta': {'content': f'第{i}段答案内容，'}}]}, ensure_ascii=False)}\n\n"
+              for i in range(pieces)]
+    frames.append("event: FINISH\ndata: {}\n\n")
+    return "".join(frames).encode('utf-8')
+
+
+def legacy_stream(pieces: int) -> bytes:
+    frames = [f"event: message\ndata: {json.dumps({'content': f'第{i}段答案内容，'}, ensure_ascii=False)}\n\n"
+              for i in range(pieces)]
+    frames.append("event: done\ndata: {}\n\n")
+    return "".join(frames).encode('utf-8')
+
+
+def nested_result(depth: int, width: int) -> Dict:
+    if depth == 0:
+        return {f"指标{i}": i * 0.5 for i in range(width)}
+    return {f"层{depth}_{i}": nested_result(depth - 1, width) for i in range(width)}
+
+
+def write_result_csv(path: str, rows: int, seed: int = 0):
+    """生成与评测结果相同格式的客观题CSV"""
+    from app import build_result_headers
+    rng = random.Random(seed)
+    categories = ['常识', '数学', '写作', '翻译', '推理']
+    accuracy = ['正确', '部分正确', '错误']
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(build_result_headers(MODEL_NAMES, 'objective'))
+        for i in range(rows):
+            row = [i + 1, categories[i % len(categories)], f"问题 {i}", f"标准答案 {i}"]
+            for _ in MODEL_NAMES:
+                row.extend([f"模型答案 {i}", rng.randint(1, 5), "评分理由", rng.choice(accuracy)])
+            writer.writerow(row)
+
+
+def build_cases(workdir: str) -> List[Tuple[str, Callable[[], object]]]:
+    """返回 [(用例名, 无参调用)]，所有输入数据在这里预先生成，不计入测量时间"""
+    from app import parse_json_str, flatten_json, secure_chinese_filename
+    from models.copilot_client import CopilotClient
+    from models.legacy_client import LegacyClient
+    from models.stream_reader import read_sse_answer
+    from utils.eval_prompt import CompiledEvalPrompt
+    from utils.judge_batching import build_batch_eval_prompt
+    from utils.judge_schema import model_keys, validate_judge_result
+    from utils.advanced_analytics import analytics
+
+    clean = judge_output()
+    fenced = f"以下是评测结果：\n```json\n{clean}\n```\n以上评测仅供参考。"
+    truncated = clean[:int(len(clean) * 0.7)]
+    broken = broken_judge_output()
+
+    loop = asyncio.new_event_loop()
+    copilot_data = copilot_stream(20000)
+    legacy_data = legacy_stream(20000)
+
+    def read_stream(data: bytes, content_event: str, extract, finish_event: str):
+        return loop.run_until_complete(read_sse_answer(
+            ReplayResponse(data), 'benchmark', content_event, extract, finish_event=finish_event, max_chars=0
+        ))
+
+    nested = nested_result(depth=3, width=10)
+    filenames = [f"评测数据集：第{i}批/客观题<最终版>..{'长' * (i % 80)}.csv" for i in range(200)]
+
+    rubric = "请根据回答的准确性、完整性和表达清晰度评分，1分最差，5分最好。" * 20
+    answers = {name: f"{name} 的回答内容。" * 100 for name in MODEL_NAMES}
+    template = CompiledEvalPrompt('objective', rubric, 'default', len(MODEL_NAMES))
+    batch_items = [{'index': i, 'query': f"问题 {i}" * 10, 'question_type': '常识',
+                    'standard_answer': f"标准答案 {i}", 'answers': answers} for i in range(10)]
+    keys = model_keys(len(MODEL_NAMES))
+
+    result_csv = os.path.join(workdir, 'analytics_10k.csv')
+    write_result_csv(result_csv, 10000)
+
+    return [
+        ('parse_json_str.clean', lambda: parse_json_str(clean)),
+        ('parse_json_str.fenced', lambda: parse_json_str(fenced)),
+        ('parse_json_str.truncated', lambda: parse_json_str(truncated)),
+        ('parse_json_str.broken', lambda: parse_json_str(broken)),
+        ('validate_judge_result', lambda: validate_judge_result(clean, 'objective', keys)),
+        ('read_sse_answer.copilot_20k_frames',
+         lambda: read_stream(copilot_data, 'APPEND', CopilotClient.extract_delta, 'FINISH')),
+        ('read_sse_answer.legacy_20k_frames',
+         lambda: read_stream(legacy_data, 'message', LegacyClient.extract_delta, None)),
+        ('flatten_json.10k_leaves', lambda: flatten_json(nested)),
+        ('secure_chinese_filename.200_names', lambda: [secure_chinese_filename(name) for name in filenames]),
+        ('CompiledEvalPrompt.compile', lambda: CompiledEvalPrompt('objective', rubric, 'default', len(MODEL_NAMES))),
+        ('CompiledEvalPrompt.render', lambda: template.render("问题内容" * 20, answers, '常识', "标准答案")),
+        ('build_batch_eval_prompt.10_items', lambda: build_batch_eval_prompt(rubric, batch_items, 'objective')),
+        ('analyze_evaluation_results.10k_rows', lambda: analytics.analyze_evaluation_results(result_csv, {})),
+    ]
+
+
+def measure(func: Callable[[], object], repeat: int, min_time: float) -> Dict:
+    """校准循环次数后重复测量，返回单次调用耗时统计（微秒）"""
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time or number >= 1_000_000:
+            break
+        number *= 2 if elapsed > min_time / 10 else 10
+
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - started) / number * 1e6)
+    return {
+        'median_us': round(statistics.median(samples), 3),
+        'min_us': round(min(samples), 3),
+        'max_us': round(max(samples), 3),
+        'loops': number,
+        'repeat': repeat
+    }
+
+
+def compare_with_baseline(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float) -> List[str]:
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name, {}).get('median_us')
+        if not previous:
+            continue
+        change = (result['median_us'] - previous) / previous
+        result['baseline_median_us'] = previous
+        result['change'] = round(change, 4)
+        if change > tolerance:
+            regressions.append(f"{name}: {previous}us -> {result['median_us']}us ({change:+.1%})")
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='CPU密集辅助函数的微基准测试')
+    parser.add_argument('--filter', default=None, help='只运行名称包含该字符串的用例')
+    parser.add_argument('--repeat', type=int, default=5, help='每个用例的重复测量次数')
+    parser.add_argument('--min-time', type=float, default=0.2, help='单次测量的最短时间(秒)')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='基线JSON路径')
+    parser.add_argument('--save-baseline', action='store_true', help='把本次结果保存为基线（不做比较）')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='中位耗时允许变慢的比例')
+    parser.add_argument('--output', default=None, help='结果JSON输出路径')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    output = os.path.abspath(args.output) if args.output else None
+    baseline_path = os.path.abspath(args.baseline)
+
+    # app 导入时会在当前目录初始化数据库，放到临时目录中；不启动内置评测调度
+    workdir = tempfile.mkdtemp(prefix='eval_micro_benchmark_')
+    os.chdir(workdir)
+    os.environ['EVALUATION_EXECUTOR'] = 'worker'
+    os.environ.setdefault('LOG_LEVEL', 'ERROR')
+
+    cases = [(name, func) for name, func in build_cases(workdir) if not args.filter or args.filter in name]
+    results = {}
+    for name, func in cases:
+        results[name] = measure(func, args.repeat, args.min_time)
+        print(f"⏱️ {name:<40} {results[name]['median_us']:>14.1f} us")
+
+    report = {
+        'benchmark': 'micro',
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': sys.version.split()[0],
+        'results': results
+    }
+
+    exit_code = 0
+    if args.save_baseline:
+        with open(baseline_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"💾 基线已保存到 {baseline_path}")
+    elif os.path.exists(baseline_path):
+        with open(baseline_path, encoding='utf-8') as f:
+            baseline = json.load(f).get('results', {})
+        regressions = compare_with_baseline(results, baseline, args.tolerance)
+        for line in regressions:
+            print(f"⚠️ 性能回退 {line}")
+        if regressions:
+            exit_code = 1
+        else:
+            print(f"✅ 与基线相比没有超过 {args.tolerance:.0%} 的回退")
+    else:
+        print(f"💡 未找到基线 {baseline_path}，使用 --save-baseline 生成")
+
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"💾 结果已保存到 {output}")
+
+    # app 导入后启动的后台线程不会自行结束，输出完成后直接退出
+    sys.stdout.flush()
+    os._exit(exit_code)
+
+
+if __name__ == '__main__':
+    main()
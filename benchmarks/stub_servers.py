@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+基准测试用的本地桩服务
+在子进程中启动一个aiohttp服务，模拟三类上游接口：
+
+- POST /copilot                    Copilot SSE（event: APPEND / FINISH）
+- POST /legacy                     Legacy SSE（event: message / done）
+- POST /gemini/{model}:generateContent  Gemini generateContent，按prompt中的模型和题目编号返回评测JSON
+
+每类接口的延迟（对数正态分布）、错误率(HTTP 500)和限流率(HTTP 429)可单独配置。
+"""
+
+import asyncio
+import json
+import multiprocessing
+import random
+import re
+import socket
+import time
+from typing import Dict, Optional
+
+# 流式答案默认分片数
+DEFAULT_CHUNKS = 8
+
+
+class StubProfile:
+    """一类接口的模拟参数（时间单位：秒）
+
+    latency 为总耗时中位数，sigma 为对数正态分布的形状参数（0表示固定耗时）；
+    流式接口先等待 ttft_ratio * 耗时 再输出第一个分片，其余分片均匀输出。
+    """
+
+    def __init__(self, latency: float = 0.2, sigma: float = 0.5, error_rate: float = 0.0,
+                 throttle_rate: float = 0.0, ttft_ratio: float = 0.3, chunks: int = DEFAULT_CHUNKS,
+                 answer_chars: int = 400):
+        self.latency = latency
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.ttft_ratio = ttft_ratio
+        self.chunks = max(1, chunks)
+        self.answer_chars = answer_chars
+
+    def sample_latency(self, rng: random.Random) -> float:
+        if self.latency <= 0:
+            return 0.0
+        return self.latency * rng.lognormvariate(0.0, self.sigma) if self.sigma > 0 else self.latency
+
+    def pick_failure(self, rng: random.Random) -> Optional[int]:
+        """按错误率和限流率随机返回要模拟的HTTP状态码，正常时返回None"""
+        roll = rng.random()
+        if roll < self.throttle_rate:
+            return 429
+        if roll < self.throttle_rate + self.error_rate:
+            return 500
+        return None
+
+    def to_dict(self) -> Dict:
+        return dict(self.__dict__)
+
+
+def build_answer(query: str, length: int) -> str:
+    """生成固定长度的模拟答案"""
+    base = f"关于“{query}”的回答。"
+    return (base * (length // len(base) + 1))[:length]
+
+
+def build_judge_response(prompt: str, schema: Optional[Dict]) -> str:
+    """按prompt（或responseSchema）中的题目编号和模型数量构造评测JSON"""
+    model_count = max([int(n) for n in re.findall(r'模型(\d+)', prompt)] or [1])
+    result = {
+        f"模型{j}": {"评分": str(3 + j % 3), "准确性": "正确", "理由": "基准测试桩服务返回的评测理由"}
+        for j in range(1, model_count + 1)
+    }
+    batch_keys = re.findall(r'### 题目 (Q\d+)', prompt)
+    if schema and schema.get('required'):
+        keys = schema['required']
+        if keys[0].startswith('模型'):
+            return json.dumps({key: result.get(key, result["模型1"]) for key in keys}, ensure_ascii=False)
+        batch_keys = keys
+    if batch_keys:
+        return json.dumps({key: result for key in batch_keys}, ensure_ascii=False)
+    return json.dumps(result, ensure_ascii=False)
+
+
+def create_stub_app(profiles: Dict[str, StubProfile], seed: int = 0):
+    from aiohttp import web
+
+    rng = random.Random(seed)
+    counters = {name: {'requests': 0, 'errors': 0, 'throttled': 0} for name in profiles}
+
+    def fail(name: str, status: int):
+        counters[name]['throttled' if status == 429 else 'errors'] += 1
+        headers = {'Retry-After': '1'} if status == 429 else None
+        return web.json_response({'error': {'code': status, 'message': 'stub failure'}}, status=status, headers=headers)
+
+    async def stream(request, name: str, frames):
+        """按配置的耗时逐个输出SSE帧"""
+        profile = profiles[name]
+        total = profile.sample_latency(rng)
+        resp = web.StreamResponse(headers={'Content-Type': 'text/event-stream'})
+        await resp.prepare(request)
+        await asyncio.sleep(total * profile.ttft_ratio)
+        interval = total * (1 - profile.ttft_ratio) / max(1, len(frames) - 1)
+        for i, frame in enumerate(frames):
+            if i:
+                await asyncio.sleep(interval)
+            await resp.write(frame.encode('utf-8'))
+        return resp
+
+    def split_answer(text: str, chunks: int):
+        size = max(1, len(text) // chunks)
+        return [text[i:i + size] for i in range(0, len(text), size)]
+
+    async def copilot(request):
+        body = await request.json()
+        counters['copilot']['requests'] += 1
+        status = profiles['copilot'].pick_failure(rng)
+        if status:
+            return fail('copilot', status)
+        query = next((p['value'] for p in body.get('parameters', []) if p.get('key') == 'user_instruction'), '')
+        pieces = split_answer(build_answer(query, profiles['copilot'].answer_chars), profiles['copilot'].chunks)
+        frames = [f"event: APPEND\ndata: {json.dumps({'choices': [{'delta': {'content': piece}}]}, ensure_ascii=False)}\n\n"
+                  for piece in pieces]
+        frames.append("event: FINISH\ndata: {}\n\n")
+        return await stream(request, 'copilot', frames)
+
+    async def legacy(request):
+        body = await request.json()
+        counters['legacy']['requests'] += 1
+        status = profiles['legacy'].pick_failure(rng)
+        if status:
+            return fail('legacy', status)
+        pieces = split_answer(build_answer(body.get('query', ''), profiles['legacy'].answer_chars), profiles['legacy'].chunks)
+        frames = [f"event: message\ndata: {json.dumps({'content': piece}, ensure_ascii=False)}\n\n" for piece in pieces]
+        frames.append("event: done\ndata: {}\n\n")
+        return await stream(request, 'legacy', frames)
+
+    async def gemini(request):
+        body = await request.json()
+        counters['gemini']['requests'] += 1
+        profile = profiles['gemini']
+        await asyncio.sleep(profile.sample_latency(rng))
+        status = profile.pick_failure(rng)
+        if status:
+            return fail('gemini', status)
+        prompt = body['contents'][0]['parts'][0]['text']
+        text = build_judge_response(prompt, body.get('generationConfig', {}).get('responseSchema'))
+        return web.json_response({
+            'candidates': [{'content': {'parts': [{'text': text}]}, 'finishReason': 'STOP'}],
+            'usageMetadata': {'promptTokenCount': len(prompt) // 2, 'candidatesTokenCount': len(text) // 2}
+        })
+
+    async def stats(request):
+        return web.json_response(counters)
+
+    app = web.Application(client_max_size=64 * 1024 * 1024)
+    app.router.add_post('/copilot', copilot)
+    app.router.add_post('/legacy', legacy)
+    app.router.add_post('/gemini/{name}', gemini)
+    app.router.add_get('/stats', stats)
+    return app
+
+
+def _serve(port: int, profiles: Dict[str, Dict], seed: int):
+    from aiohttp import web
+    app = create_stub_app({name: StubProfile(**params) for name, params in profiles.items()}, seed)
+    web.run_app(app, host='127.0.0.1', port=port, print=None, access_log=None)
+
+
+def find_free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class StubServer:
+    """在子进程中运行桩服务，基准测试进程的内存和CPU统计不包含桩服务"""
+
+    def __init__(self, profiles: Dict[str, StubProfile], port: int = None, seed: int = 0):
+        self.profiles = profiles
+        self.port = port or find_free_port()
+        self.seed = seed
+        self._process: Optional[multiprocessing.Process] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self, timeout: float = 10.0):
+        profiles = {name: profile.to_dict() for name, profile in self.profiles.items()}
+        self._process = multiprocessing.Process(target=_serve, args=(self.port, profiles, self.seed),
+                                                name='benchmark-stub', daemon=True)
+        self._process.start()
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                with socket.create_connection(('127.0.0.1', self.port), timeout=0.2):
+                    return
+            except OSError:
+                time.sleep(0.05)
+        self.stop()
+        raise RuntimeError(f"桩服务在 {timeout}s 内未能启动（端口 {self.port}）")
+
+    def stats(self) -> Dict:
+        import urllib.request
+        with urllib.request.urlopen(f"{self.base_url}/stats", timeout=5) as resp:
+            return json.loads(resp.read().decode('utf-8'))
+
+    def stop(self):
+        if self._process is not None and self._process.is_alive():
+            self._process.terminate()
+            self._process.join(timeout=5)
+        self._process = None
@@ -62,6 +62,102 @@ REQUEST_TIMEOUT = int(os.getenv("REQUEST_TIMEOUT", 60))
 GEMINI_CONCURRENT_REQUESTS = int(os.getenv("GEMINI_CONCURRENT_REQUESTS", 5))  # Gemini并发数，提升评测效率
 GEMINI_MAX_OUTPUT_TOKENS = int(os.getenv("GEMINI_MAX_OUTPUT_TOKENS", 8192))  # Gemini最大输出token数 (大幅增加限制)
 
+# Gemini评测连接池配置（进程内所有评测请求共享keep-alive连接）
+GEMINI_CONNECTOR_LIMIT = int(os.getenv("GEMINI_CONNECTOR_LIMIT", 50))  # 连接池最大连接数
+GEMINI_KEEPALIVE_TIMEOUT = float(os.getenv("GEMINI_KEEPALIVE_TIMEOUT", 60))  # 空闲连接保持时间(秒)
+
+# Gemini评测自适应限流（所有评测任务共享令牌桶，遇到429/5xx自动降速，成功后逐步恢复）
+GEMINI_RATE_LIMIT_ENABLED = os.getenv("GEMINI_RATE_LIMIT_ENABLED", "true").lower() == "true"
+GEMINI_RATE_INITIAL = float(os.getenv("GEMINI_RATE_INITIAL", 5))  # 初始速率(请求/秒)
+GEMINI_RATE_MIN = float(os.getenv("GEMINI_RATE_MIN", 0.5))  # 最低速率
+GEMINI_RATE_MAX = float(os.getenv("GEMINI_RATE_MAX", 50))  # 最高速率（配额上限）
+GEMINI_RATE_BURST = int(os.getenv("GEMINI_RATE_BURST", 10))  # 令牌桶容量（允许的突发请求数）
+
+# Gemini评测密钥池（逗号分隔，系统配置 gemini_api_keys / gemini_api_endpoints 优先；未配置时只使用 GOOGLE_API_KEY）
+# 配置多个密钥时每个密钥使用独立的自适应限流，按剩余容量分配请求
+GEMINI_API_KEYS = os.getenv("GEMINI_API_KEYS", "")
+GEMINI_API_ENDPOINTS = os.getenv("GEMINI_API_ENDPOINTS", "")  # 与密钥一一对应或循环分配，为空时使用 gemini_api_endpoint
+JUDGE_KEY_QUARANTINE_SECONDS = float(os.getenv("JUDGE_KEY_QUARANTINE_SECONDS", 60))  # 密钥收到429后暂停使用的最短时间(秒)
+JUDGE_KEY_FORBIDDEN_QUARANTINE_SECONDS = float(os.getenv("JUDGE_KEY_FORBIDDEN_QUARANTINE_SECONDS", 600))  # 401/403后暂停时间(秒)
+JUDGE_KEY_ERROR_THRESHOLD = int(os.getenv("JUDGE_KEY_ERROR_THRESHOLD", 3))  # 连续收到5xx达到该次数后暂停使用该密钥（时间同429）
+
+# Gemini评测响应缓存（按 评测模型+完整prompt+生成配置 的hash缓存）
+JUDGE_CACHE_ENABLED = os.getenv("JUDGE_CACHE_ENABLED", "true").lower() == "true"
+JUDGE_CACHE_TTL_DAYS = int(os.getenv("JUDGE_CACHE_TTL_DAYS", 30))  # 缓存有效期(天)
+JUDGE_CACHE_MAX_ENTRIES = int(os.getenv("JUDGE_CACHE_MAX_ENTRIES", 200000))  # 超出后按LRU淘汰
+
+# 候选模型默认并发数（模型配置中未设置 max_concurrency 时使用，每个模型独立计算）
+MODEL_CONCURRENT_REQUESTS = int(os.getenv("MODEL_CONCURRENT_REQUESTS", 5))
+# 候选模型答案长度上限(字符)，超过后停止读取流式响应（模型配置中的 max_answer_chars 可单独覆盖，0表示不限制）
+MODEL_MAX_ANSWER_CHARS = int(os.getenv("MODEL_MAX_ANSWER_CHARS", 50000))
+
+# 候选模型请求对冲（请求耗时超过该模型近期p95时再发一次相同请求，取先返回的结果）
+MODEL_HEDGE_ENABLED = os.getenv("MODEL_HEDGE_ENABLED", "false").lower() == "true"
+MODEL_HEDGE_PERCENTILE = float(os.getenv("MODEL_HEDGE_PERCENTILE", 95))  # 触发对冲的耗时分位数
+MODEL_HEDGE_MAX_RATIO = float(os.getenv("MODEL_HEDGE_MAX_RATIO", 0.05))  # 每次评测对冲请求占总请求数的上限
+MODEL_HEDGE_MIN_SAMPLES = int(os.getenv("MODEL_HEDGE_MIN_SAMPLES", 20))  # 模型耗时样本少于该数时不对冲
+MODEL_HEDGE_MIN_DELAY = float(os.getenv("MODEL_HEDGE_MIN_DELAY", 1.0))  # 对冲等待时间下限(秒)
+
+# 评测流水线配置
+# 开启后每道题的所有模型答案就绪即进入Gemini评测，答案获取与评测在同一事件循环中重叠执行
+EVALUATION_PIPELINE_MODE = os.getenv("EVALUATION_PIPELINE_MODE", "true").lower() == "true"
+
+# 批量评测模式（多道题合并为一次Gemini请求，评分标准只发送一次；每批题数按输出token上限自适应）
+JUDGE_BATCH_MODE = os.getenv("JUDGE_BATCH_MODE", "false").lower() == "true"
+JUDGE_BATCH_MAX_SIZE = int(os.getenv("JUDGE_BATCH_MAX_SIZE", 10))  # 每批最多题数
+
+# 结构化输出评测（请求附带JSON responseSchema，只解析一次；结果不合规的模型单独重试）
+JUDGE_STRUCTURED_OUTPUT = os.getenv("JUDGE_STRUCTURED_OUTPUT", "false").lower() == "true"
+JUDGE_SCHEMA_RETRIES = int(os.getenv("JUDGE_SCHEMA_RETRIES", 2))  # 缺失模型结果的最多重试次数
+
+# 评测提示token预算（超出时截断过长的模型回答，结果CSV仍保存完整回答）
+JUDGE_PROMPT_MAX_TOKENS = int(os.getenv("JUDGE_PROMPT_MAX_TOKENS", 24000))  # 单题评测提示的估算token上限（0表示不限制）
+JUDGE_ANSWER_TRUNCATION = os.getenv("JUDGE_ANSWER_TRUNCATION", "head_tail")  # head_tail: 保留首尾; head: 保留开头; none: 不截断
+JUDGE_MIN_ANSWER_TOKENS = int(os.getenv("JUDGE_MIN_ANSWER_TOKENS", 500))  # 截断后每个回答至少保留的token数
+# 单题评测的 maxOutputTokens = 基础值 + 每模型预留 × 模型数（不超过 GEMINI_MAX_OUTPUT_TOKENS；每模型预留为0时固定使用上限）
+JUDGE_OUTPUT_TOKENS_BASE = int(os.getenv("JUDGE_OUTPUT_TOKENS_BASE", 4096))  # 含思考token的余量
+JUDGE_OUTPUT_TOKENS_PER_MODEL = int(os.getenv("JUDGE_OUTPUT_TOKENS_PER_MODEL", 512))
+
+# 序贯抽样评测（按type分层随机抽题、分轮评测，各模型均分差异的置信区间都不含0时提前停止）
+SEQUENTIAL_SAMPLING_ENABLED = os.getenv("SEQUENTIAL_SAMPLING_ENABLED", "false").lower() == "true"
+SEQUENTIAL_ROUND_SIZE = int(os.getenv("SEQUENTIAL_ROUND_SIZE", 200))  # 每轮新增评测题数
+SEQUENTIAL_MIN_QUESTIONS = int(os.getenv("SEQUENTIAL_MIN_QUESTIONS", 100))  # 评测题数少于该值时不判断停止
+SEQUENTIAL_MAX_QUESTIONS = int(os.getenv("SEQUENTIAL_MAX_QUESTIONS", 2000))  # 默认最多评测题数（0表示不限制）
+SEQUENTIAL_CONFIDENCE = float(os.getenv("SEQUENTIAL_CONFIDENCE", 0.95))  # 置信水平（多对模型比较时按对数校正）
+SEQUENTIAL_TARGET_HALF_WIDTH = float(os.getenv("SEQUENTIAL_TARGET_HALF_WIDTH", 0.1))  # 只评测一个模型时均分置信区间的目标半宽
+
+# 任务状态存储（gunicorn多worker共享任务进度）
+TASK_STATE_BACKEND = os.getenv("TASK_STATE_BACKEND", "sqlite")  # sqlite: 多进程共享(WAL); memory: 仅单进程
+TASK_STATE_DB_PATH = os.getenv("TASK_STATE_DB_PATH", "task_state.db")
+TASK_STATE_FLUSH_INTERVAL = float(os.getenv("TASK_STATE_FLUSH_INTERVAL", 0.5))  # 批量同步间隔(秒)
+
+# 评测任务队列
+# embedded: 每个Web进程内置调度线程领取任务; worker: 只由独立进程 eval_worker.py 领取执行
+EVALUATION_EXECUTOR = os.getenv("EVALUATION_EXECUTOR", "embedded")
+EVALUATION_WORKER_SLOTS = int(os.getenv("EVALUATION_WORKER_SLOTS", 2))  # 每个执行进程同时运行的任务数
+EVALUATION_MAX_RUNNING_JOBS = int(os.getenv("EVALUATION_MAX_RUNNING_JOBS", 4))  # 全局同时运行的任务上限
+EVALUATION_MAX_JOBS_PER_USER = int(os.getenv("EVALUATION_MAX_JOBS_PER_USER", 1))  # 单用户同时运行的任务上限
+EVALUATION_HEARTBEAT_TIMEOUT = int(os.getenv("EVALUATION_HEARTBEAT_TIMEOUT", 60))  # 心跳超时后任务重新排队(秒)
+EVALUATION_CONTROL_POLL_INTERVAL = float(os.getenv("EVALUATION_CONTROL_POLL_INTERVAL", 1.0))  # 执行进程检查取消/暂停请求的间隔(秒)
+# 随任务保存的用户模型密钥的加密密钥（需安装 cryptography；缺省使用 SECRET_KEY，所有Web/worker进程必须一致）
+TASK_CREDENTIALS_KEY = os.getenv("TASK_CREDENTIALS_KEY") or SECRET_KEY
+
+# 系统配置缓存（system_configs 表在进程内缓存，写入时递增版本号）
+SYSTEM_CONFIG_VERSION_CHECK_INTERVAL = float(os.getenv("SYSTEM_CONFIG_VERSION_CHECK_INTERVAL", 1.0))  # 检查其他进程修改的间隔(秒)
+SYSTEM_CONFIG_CACHE_TTL = float(os.getenv("SYSTEM_CONFIG_CACHE_TTL", 60))  # 版本检查失败时快照的最长有效期(秒)
+
+# 日志（队列异步输出，见 utils/logger.py）
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_MODULE_LEVELS = os.getenv("LOG_MODULE_LEVELS", "")  # 按模块覆盖级别，如 "models.copilot_client=WARNING,database=ERROR"
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()  # text / json
+LOG_FILE = os.getenv("LOG_FILE", "")  # 为空时只输出到标准输出
+LOG_MAX_SIZE = int(os.getenv("LOG_MAX_SIZE", 10))  # 单个日志文件大小上限(MB)
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", 10))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))  # 日志队列长度，队列满时丢弃新日志
+LOG_MAX_BODY_CHARS = int(os.getenv("LOG_MAX_BODY_CHARS", 2000))  # 请求/响应体日志的最大字符数
+LOG_PAYLOAD_SAMPLE_FIRST = int(os.getenv("LOG_PAYLOAD_SAMPLE_FIRST", 5))  # 每个任务前N次请求完整记录请求/响应体
+LOG_PAYLOAD_SAMPLE_EVERY = int(os.getenv("LOG_PAYLOAD_SAMPLE_EVERY", 100))  # 之后每N次记录一次(0表示不再记录)
+
 def check_api_keys():
     """检查必需的API密钥是否已配置"""
     missing_keys = []
@@ -6,15 +6,27 @@
 import sqlite3
 import json
 import uuid
+import threading
+import time
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional, Tuple
 import os
+from config import SYSTEM_CONFIG_CACHE_TTL, SYSTEM_CONFIG_VERSION_CHECK_INTERVAL
+from utils.logger import get_logger
 
 DATABASE_PATH = 'evaluation_system.db'
 
+logger = get_logger(__name__)
+
 class EvaluationDatabase:
     def __init__(self, db_path: str = DATABASE_PATH):
         self.db_path = db_path
+        # 系统配置快照：按版本号检查其他进程的修改，无法检查时按TTL重新加载
+        self._config_lock = threading.Lock()
+        self._config_cache: Optional[Dict[str, str]] = None
+        self._config_version: Optional[int] = None
+        self._config_loaded_at = 0.0
+        self._config_checked_at = 0.0
         self.init_database()
     
     def _get_connection(self):
@@ -103,7 +115,7 @@ class EvaluationDatabase:
                 CREATE TABLE IF NOT EXISTS running_tasks (
                     task_id TEXT PRIMARY KEY,
                     task_name TEXT NOT NULL,
-                    status TEXT DEFAULT 'running', -- 'running', 'paused', 'completed', 'failed', 'cancelled'
+                    status TEXT DEFAULT 'running', -- 'queued', 'running', 'paused', 'completed', 'failed', 'cancelled'
                     
                     -- 任务配置
                     dataset_file TEXT NOT NULL,
@@ -128,7 +140,13 @@ class EvaluationDatabase:
                     
                     -- 元数据
                     metadata TEXT, -- JSON格式存储额外信息
-                    created_by TEXT
+                    created_by TEXT,
+                    
+                    -- 任务队列
+                    priority INTEGER DEFAULT 0,
+                    queued_at TIMESTAMP,
+                    claimed_by TEXT, -- 执行任务的worker标识
+                    heartbeat_at TIMESTAMP
                 )
             ''')
             
@@ -148,6 +166,23 @@ class EvaluationDatabase:
                 )
             ''')
             
+            # 系统配置版本号：任何写入都通过触发器递增，各进程据此判断配置快照是否过期
+            db_cursor.execute('''
+                CREATE TABLE IF NOT EXISTS system_config_version (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    version INTEGER NOT NULL DEFAULT 0
+                )
+            ''')
+            db_cursor.execute('INSERT OR IGNORE INTO system_config_version (id, version) VALUES (1, 0)')
+            for event in ('INSERT', 'UPDATE', 'DELETE'):
+                db_cursor.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS system_configs_version_{event.lower()}
+                    AFTER {event} ON system_configs
+                    BEGIN
+                        UPDATE system_config_version SET version = version + 1 WHERE id = 1;
+                    END
+                ''')
+            
             # 9. 文件提示词管理表
             db_cursor.execute('''
                 CREATE TABLE IF NOT EXISTS file_prompts (
@@ -232,6 +267,99 @@ class EvaluationDatabase:
                 )
             ''')
             
+            # 13. 评测(judge)响应缓存表
+            db_cursor.execute('''
+                CREATE TABLE IF NOT EXISTS judge_cache (
+                    cache_key TEXT PRIMARY KEY, -- hash(评测模型名, 完整prompt, 生成配置)
+                    model_name TEXT NOT NULL,
+                    response TEXT NOT NULL, -- 评测模型原始输出
+                    hit_count INTEGER DEFAULT 0,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    last_accessed TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            
+            # 14. 候选模型答案缓存表
+            db_cursor.execute('''
+                CREATE TABLE IF NOT EXISTS model_answer_cache (
+                    model_name TEXT NOT NULL,
+                    config_fingerprint TEXT NOT NULL, -- 模型配置指纹，配置变化后旧答案失效
+                    query_hash TEXT NOT NULL,
+                    answer TEXT NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (model_name, config_fingerprint, query_hash)
+                )
+            ''')
+            
+            # 15. 评测结果日志表（逐题追加，进程崩溃后可据此续跑）
+            db_cursor.execute('''
+                CREATE TABLE IF NOT EXISTS task_result_rows (
+                    task_id TEXT NOT NULL,
+                    row_index INTEGER NOT NULL, -- 题目在数据集中的序号（从0开始）
+                    row_data TEXT NOT NULL, -- JSON格式存储CSV行数据
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (task_id, row_index)
+                )
+            ''')
+            
+            # 16. 调用遥测表（每次模型答案请求/评测请求的耗时明细，结果保存后关联result_id）
+            db_cursor.execute('''
+                CREATE TABLE IF NOT EXISTS call_telemetry (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    task_id TEXT NOT NULL,
+                    result_id TEXT,
+                    row_index INTEGER NOT NULL, -- 题目序号（从0开始），批量评测时为该批第一题
+                    model_name TEXT NOT NULL,
+                    call_type TEXT NOT NULL, -- answer: 候选模型答案; judge: Gemini评测
+                    item_count INTEGER DEFAULT 1, -- 一次请求包含的题数
+                    queue_wait REAL DEFAULT 0, -- 排队等待(秒)：并发名额和限流
+                    connect_time REAL DEFAULT 0, -- 新建连接耗时(秒)，复用连接为0
+                    ttft REAL, -- 首字延迟(秒)，非流式请求为响应头到达时间
+                    total_time REAL DEFAULT 0, -- 端到端耗时(秒)，包含排队等待
+                    bytes INTEGER DEFAULT 0,
+                    retries INTEGER DEFAULT 0,
+                    http_status INTEGER,
+                    input_tokens INTEGER DEFAULT 0,
+                    output_tokens INTEGER DEFAULT 0,
+                    tokens_estimated INTEGER DEFAULT 0, -- 1: 接口未返回用量，按字符数估算
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            
+            # 17. Token用量表（按任务、模型和调用类型汇总，用于统计和预算检查）
+            db_cursor.execute('''
+                CREATE TABLE IF NOT EXISTS token_usage (
+                    task_id TEXT NOT NULL,
+                    result_id TEXT,
+                    user_id TEXT,
+                    project_id TEXT,
+                    dataset_file TEXT,
+                    prompt_version TEXT,
+                    model_name TEXT NOT NULL,
+                    call_type TEXT NOT NULL, -- answer: 候选模型答案; judge: Gemini评测
+                    calls INTEGER DEFAULT 0,
+                    input_tokens INTEGER DEFAULT 0,
+                    output_tokens INTEGER DEFAULT 0,
+                    estimated_tokens INTEGER DEFAULT 0, -- 其中按字符数估算的token数
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (task_id, model_name, call_type)
+                )
+            ''')
+            
+            # 18. Token预算表（按用户或项目限制token用量，调度器启动或续跑任务前检查）
+            db_cursor.execute('''
+                CREATE TABLE IF NOT EXISTS token_budgets (
+                    scope TEXT NOT NULL, -- 'user' or 'project'
+                    scope_id TEXT NOT NULL,
+                    token_limit INTEGER NOT NULL,
+                    period TEXT DEFAULT 'month', -- 'month': 按自然月; 'total': 累计
+                    updated_by TEXT,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (scope, scope_id)
+                )
+            ''')
+            
             # 执行数据库迁移
             self._migrate_database(db_cursor)
             
@@ -242,7 +370,7 @@ class EvaluationDatabase:
     
     def _migrate_database(self, cursor):
         """执行数据库迁移，安全地添加新字段"""
-        print("🔄 检查数据库迁移...")
+        logger.info("🔄 检查数据库迁移...")
         
         # 检查并添加 evaluation_results 表的 created_by 字段
         try:
@@ -250,14 +378,14 @@ class EvaluationDatabase:
             columns = [column[1] for column in cursor.fetchall()]
             
             if 'created_by' not in columns:
-                print("➕ 添加 evaluation_results.created_by 字段...")
+                logger.info("➕ 添加 evaluation_results.created_by 字段...")
                 cursor.execute("ALTER TABLE evaluation_results ADD COLUMN created_by TEXT")
                 
                 # 为现有记录设置默认值
                 cursor.execute("UPDATE evaluation_results SET created_by = 'legacy' WHERE created_by IS NULL")
-                print("✅ evaluation_results.created_by 字段添加完成")
+                logger.info("✅ evaluation_results.created_by 字段添加完成")
         except Exception as e:
-            print(f"⚠️ 迁移 evaluation_results 表时出错: {e}")
+            logger.warning(f"⚠️ 迁移 evaluation_results 表时出错: {e}")
         
         # 检查并添加 running_tasks 表的 created_by 字段
         try:
@@ -265,16 +393,51 @@ class EvaluationDatabase:
             columns = [column[1] for column in cursor.fetchall()]
             
             if 'created_by' not in columns:
-                print("➕ 添加 running_tasks.created_by 字段...")
+                logger.info("➕ 添加 running_tasks.created_by 字段...")
                 cursor.execute("ALTER TABLE running_tasks ADD COLUMN created_by TEXT")
                 
                 # 为现有记录设置默认值
                 cursor.execute("UPDATE running_tasks SET created_by = 'legacy' WHERE created_by IS NULL")
-                print("✅ running_tasks.created_by 字段添加完成")
+                logger.info("✅ running_tasks.created_by 字段添加完成")
         except Exception as e:
-            print(f"⚠️ 迁移 running_tasks 表时出错: {e}")
+            logger.warning(f"⚠️ 迁移 running_tasks 表时出错: {e}")
         
-        print("✅ 数据库迁移完成")
+        # 检查并添加 running_tasks 表的任务队列字段
+        try:
+            cursor.execute("PRAGMA table_info(running_tasks)")
+            columns = [column[1] for column in cursor.fetchall()]
+            
+            queue_columns = [
+                ('priority', 'INTEGER DEFAULT 0'),
+                ('queued_at', 'TIMESTAMP'),
+                ('claimed_by', 'TEXT'),
+                ('heartbeat_at', 'TIMESTAMP')
+            ]
+            for column_name, column_type in queue_columns:
+                if column_name not in columns:
+                    logger.info(f"➕ 添加 running_tasks.{column_name} 字段...")
+                    cursor.execute(f"ALTER TABLE running_tasks ADD COLUMN {column_name} {column_type}")
+        except Exception as e:
+            logger.warning(f"⚠️ 迁移 running_tasks 队列字段时出错: {e}")
+        
+        # 检查并添加 call_telemetry 表的token用量字段
+        try:
+            cursor.execute("PRAGMA table_info(call_telemetry)")
+            columns = [column[1] for column in cursor.fetchall()]
+            
+            token_columns = [
+                ('input_tokens', 'INTEGER DEFAULT 0'),
+                ('output_tokens', 'INTEGER DEFAULT 0'),
+                ('tokens_estimated', 'INTEGER DEFAULT 0')
+            ]
+            for column_name, column_type in token_columns:
+                if column_name not in columns:
+                    logger.info(f"➕ 添加 call_telemetry.{column_name} 字段...")
+                    cursor.execute(f"ALTER TABLE call_telemetry ADD COLUMN {column_name} {column_type}")
+        except Exception as e:
+            logger.warning(f"⚠️ 迁移 call_telemetry token字段时出错: {e}")
+        
+        logger.info("✅ 数据库迁移完成")
     
     def _create_indexes(self, cursor):
         """创建索引，处理可能的错误"""
@@ -293,21 +456,31 @@ class EvaluationDatabase:
             ('idx_shared_links_shared_by', 'shared_links', 'shared_by'),
             ('idx_shared_links_active', 'shared_links', 'is_active'),
             ('idx_shared_access_logs_share', 'shared_access_logs', 'share_id'),
+            ('idx_judge_cache_accessed', 'judge_cache', 'last_accessed'),
+            ('idx_call_telemetry_task', 'call_telemetry', 'task_id'),
+            ('idx_token_usage_user', 'token_usage', 'user_id'),
+            ('idx_token_usage_project', 'token_usage', 'project_id'),
+            ('idx_token_usage_result', 'token_usage', 'result_id'),
         ]
         
         for index_name, table_name, column_name in indexes:
             try:
                 cursor.execute(f'CREATE INDEX IF NOT EXISTS {index_name} ON {table_name}({column_name})')
             except Exception as e:
-                print(f"⚠️ 创建索引 {index_name} 失败: {e}")
+                logger.warning(f"⚠️ 创建索引 {index_name} 失败: {e}")
         
         # 复合索引
         try:
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_uploaded_files_type ON uploaded_files(file_type, uploaded_by)')
         except Exception as e:
-            print(f"⚠️ 创建复合索引 idx_uploaded_files_type 失败: {e}")
+            logger.warning(f"⚠️ 创建复合索引 idx_uploaded_files_type 失败: {e}")
+        
+        try:
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_call_telemetry_result ON call_telemetry(result_id, row_index)')
+        except Exception as e:
+            logger.warning(f"⚠️ 创建复合索引 idx_call_telemetry_result 失败: {e}")
         
-        print("✅ 索引创建完成")
+        logger.info("✅ 索引创建完成")
 
     def create_project(self, name: str, description: str = "", created_by: str = "system") -> str:
         """创建新项目"""
@@ -320,6 +493,21 @@ class EvaluationDatabase:
             ''', (project_id, name, description, created_by))
             conn.commit()
         return project_id
+
+    def get_project(self, project_id: str) -> Optional[Dict]:
+        """获取项目信息（settings 解析为字典），不存在时返回None"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                row = conn.execute('SELECT * FROM projects WHERE id = ?', (project_id,)).fetchone()
+                if not row:
+                    return None
+                project = dict(row)
+                project['settings'] = json.loads(project['settings']) if project.get('settings') else {}
+                return project
+        except Exception as e:
+            logger.info(f"获取项目失败: {e}")
+            return None
     
     def save_evaluation_result(self, 
                              project_id: str,
@@ -436,10 +624,10 @@ class EvaluationDatabase:
         clean_filename = filename
         if filename.startswith('results_history/'):
             clean_filename = filename.replace('results_history/', '', 1)
-            print(f"🔍 [数据库] 检测到history路径前缀，清理后: {clean_filename}")
+            logger.info(f"🔍 [数据库] 检测到history路径前缀，清理后: {clean_filename}")
         elif filename.startswith('results/'):
             clean_filename = filename.replace('results/', '', 1)
-            print(f"🔍 [数据库] 检测到results路径前缀，清理后: {clean_filename}")
+            logger.info(f"🔍 [数据库] 检测到results路径前缀，清理后: {clean_filename}")
         
         with sqlite3.connect(self.db_path) as conn:
             db_cursor = conn.cursor()
@@ -456,7 +644,7 @@ class EvaluationDatabase:
                 result = db_cursor.fetchone()
                 if result:
                     result_id, stored_path = result
-                    print(f"🔍 [数据库] 找到匹配记录: {result_id}, 存储路径: {stored_path}")
+                    logger.info(f"🔍 [数据库] 找到匹配记录: {result_id}, 存储路径: {stored_path}")
                     return result_id  # 找到记录就直接返回，不再检查文件是否存在
             
             # 如果直接匹配失败，尝试通过文件名模糊匹配查找可能的记录
@@ -466,7 +654,7 @@ class EvaluationDatabase:
             # 尝试通过时间戳匹配 - evaluation_result_YYYYMMDD_HHMMSS.csv 格式
             if base_filename.startswith('evaluation_result_'):
                 timestamp_part = base_filename.replace('evaluation_result_', '')
-                print(f"🔍 [数据库] 尝试通过时间戳匹配: {timestamp_part}")
+                logger.info(f"🔍 [数据库] 尝试通过时间戳匹配: {timestamp_part}")
                 
                 db_cursor.execute('''
                     SELECT id, result_file FROM evaluation_results 
@@ -478,11 +666,11 @@ class EvaluationDatabase:
                 if results:
                     # 优先选择最近的记录
                     result_id, stored_path = results[0]
-                    print(f"✅ [数据库] 通过时间戳匹配找到记录: {result_id}, 路径: {stored_path}")
+                    logger.info(f"✅ [数据库] 通过时间戳匹配找到记录: {result_id}, 路径: {stored_path}")
                     return result_id
             
             # 如果还是找不到，尝试通过数据集名称匹配
-            print(f"🔍 [数据库] 尝试通过数据集名称模糊匹配...")
+            logger.info(f"🔍 [数据库] 尝试通过数据集名称模糊匹配...")
             db_cursor.execute('''
                 SELECT id, result_file, dataset_file FROM evaluation_results 
                 WHERE dataset_file LIKE ? 
@@ -492,16 +680,16 @@ class EvaluationDatabase:
             
             fuzzy_results = db_cursor.fetchall()
             if fuzzy_results:
-                print(f"🔍 [数据库] 找到 {len(fuzzy_results)} 个可能的匹配记录")
+                logger.info(f"🔍 [数据库] 找到 {len(fuzzy_results)} 个可能的匹配记录")
                 for result_id, stored_path, dataset_file in fuzzy_results:
-                    print(f"   - {result_id}: {dataset_file} -> {stored_path}")
+                    logger.info(f"   - {result_id}: {dataset_file} -> {stored_path}")
                 
                 # 返回最近的一个
                 result_id = fuzzy_results[0][0]
-                print(f"✅ [数据库] 选择最近的记录: {result_id}")
+                logger.info(f"✅ [数据库] 选择最近的记录: {result_id}")
                 return result_id
             
-            print(f"❌ [数据库] 未找到文件 {clean_filename} (原始: {filename}) 对应的数据库记录")
+            logger.error(f"❌ [数据库] 未找到文件 {clean_filename} (原始: {filename}) 对应的数据库记录")
             return None
     
     def get_result_by_id(self, result_id: str) -> Optional[Dict]:
@@ -752,24 +940,65 @@ class EvaluationDatabase:
                         email='admin@system.local',
                         created_by='system'
                     )
-                    print(f"✅ 创建默认管理员账户: {username} / {password}")
+                    logger.info(f"✅ 创建默认管理员账户: {username} / {password}")
                     return admin_id
                 else:
-                    print(f"ℹ️ 管理员账户已存在，跳过创建")
+                    logger.info(f"ℹ️ 管理员账户已存在，跳过创建")
                     return None
         except Exception as e:
-            print(f"❌ 创建默认管理员失败: {e}")
+            logger.error(f"❌ 创建默认管理员失败: {e}")
             return None
     
     # ========== 系统配置管理方法 ==========
     
     def get_system_config(self, config_key: str, default_value: str = None) -> str:
-        """获取系统配置值"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT config_value FROM system_configs WHERE config_key = ?', (config_key,))
-            result = cursor.fetchone()
-            return result[0] if result else default_value
+        """获取系统配置值（从内存快照读取）"""
+        snapshot = self._get_config_snapshot()
+        return snapshot[config_key] if config_key in snapshot else default_value
+    
+    def _get_config_snapshot(self) -> Dict[str, str]:
+        """返回系统配置快照
+        
+        每隔 SYSTEM_CONFIG_VERSION_CHECK_INTERVAL 秒读取一次版本号，其他进程写入配置后重新加载；
+        版本号读取失败时继续使用快照，超过 SYSTEM_CONFIG_CACHE_TTL 秒后无条件重新加载。
+        """
+        now = time.monotonic()
+        snapshot = self._config_cache
+        if snapshot is not None and now - self._config_loaded_at < SYSTEM_CONFIG_CACHE_TTL:
+            if now - self._config_checked_at < SYSTEM_CONFIG_VERSION_CHECK_INTERVAL:
+                return snapshot
+            self._config_checked_at = now
+            version = self._read_config_version()
+            if version is None or version == self._config_version:
+                return snapshot
+        
+        with self._config_lock:
+            if self._config_cache is not None and self._config_cache is not snapshot:
+                return self._config_cache  # 其他线程已重新加载
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT version FROM system_config_version WHERE id = 1')
+                row = cursor.fetchone()
+                cursor.execute('SELECT config_key, config_value FROM system_configs')
+                snapshot = dict(cursor.fetchall())
+            self._config_version = row[0] if row else None
+            self._config_loaded_at = self._config_checked_at = time.monotonic()
+            self._config_cache = snapshot
+            return snapshot
+    
+    def _read_config_version(self) -> Optional[int]:
+        try:
+            with sqlite3.connect(self.db_path, timeout=1) as conn:
+                row = conn.execute('SELECT version FROM system_config_version WHERE id = 1').fetchone()
+                return row[0] if row else None
+        except Exception as e:
+            logger.warning(f"⚠️ 读取系统配置版本失败: {e}")
+            return None
+    
+    def invalidate_config_cache(self):
+        """丢弃本进程的系统配置快照，下次读取时重新加载"""
+        with self._config_lock:
+            self._config_cache = None
     
     def set_system_config(self, config_key: str, config_value: str, config_type: str = 'string', 
                          description: str = '', category: str = 'general', is_sensitive: bool = False,
@@ -788,7 +1017,8 @@ class EvaluationDatabase:
                 description, category, is_sensitive, datetime.now().isoformat(), updated_by
             ))
             conn.commit()
-            return True
+        self.invalidate_config_cache()
+        return True
     
     def get_all_system_configs(self, category: str = None) -> List[Dict]:
         """获取所有系统配置"""
@@ -829,7 +1059,9 @@ class EvaluationDatabase:
             cursor = conn.cursor()
             cursor.execute('DELETE FROM system_configs WHERE config_key = ?', (config_key,))
             conn.commit()
-            return cursor.rowcount > 0
+            deleted = cursor.rowcount > 0
+        self.invalidate_config_cache()
+        return deleted
     
     # ========== 默认提示词管理方法 ==========
     
@@ -840,12 +1072,7 @@ class EvaluationDatabase:
         Returns:
             提示词内容，如果不存在返回None
         """
-        config_key = f'default_prompt_{prompt_type}'
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT config_value FROM system_configs WHERE config_key = ?', (config_key,))
-            result = cursor.fetchone()
-            return result[0] if result else None
+        return self.get_system_config(f'default_prompt_{prompt_type}')
     
     def set_default_prompt(self, prompt_type: str, prompt_content: str, updated_by: str = 'admin') -> bool:
         """设置默认提示词
@@ -957,19 +1184,19 @@ class EvaluationDatabase:
             # 检查并初始化每种提示词
             if not self.get_default_prompt('objective'):
                 self.set_default_prompt('objective', objective_prompt, 'system')
-                print("✅ 初始化客观题默认提示词")
+                logger.info("✅ 初始化客观题默认提示词")
             
             if not self.get_default_prompt('subjective'):
                 self.set_default_prompt('subjective', subjective_prompt, 'system')
-                print("✅ 初始化主观题默认提示词")
+                logger.info("✅ 初始化主观题默认提示词")
             
             if not self.get_default_prompt('mixed'):
                 self.set_default_prompt('mixed', mixed_prompt, 'system')
-                print("✅ 初始化混合题默认提示词")
+                logger.info("✅ 初始化混合题默认提示词")
             
             return True
         except Exception as e:
-            print(f"❌ 初始化默认提示词失败: {e}")
+            logger.error(f"❌ 初始化默认提示词失败: {e}")
             return False
     
     def _count_prompt_usage(self, prompt_type: str) -> int:
@@ -988,7 +1215,7 @@ class EvaluationDatabase:
                               criteria_config: Dict = None, dataset_pattern: str = None,
                               is_default: bool = False, created_by: str = 'system') -> str:
         """创建评分标准 - 已废弃，请使用文件提示词功能"""
-        print("⚠️ [废弃警告] create_scoring_criteria方法已废弃，请使用文件提示词功能")
+        logger.warning("⚠️ [废弃警告] create_scoring_criteria方法已废弃，请使用文件提示词功能")
         return None
     
     def get_scoring_criteria(self, criteria_id: str) -> Optional[Dict]:
@@ -1024,7 +1251,7 @@ class EvaluationDatabase:
                 'usage_count': self._count_prompt_usage(prompt_type)
             }
         except Exception as e:
-            print(f"❌ 获取评分标准详情失败: {e}")
+            logger.error(f"❌ 获取评分标准详情失败: {e}")
             return None
     
     def get_all_scoring_criteria(self, criteria_type: str = None, active_only: bool = True) -> List[Dict]:
@@ -1060,7 +1287,7 @@ class EvaluationDatabase:
             
             return criteria
         except Exception as e:
-            print(f"❌ 获取评分标准失败: {e}")
+            logger.error(f"❌ 获取评分标准失败: {e}")
             return []
     
     def update_scoring_criteria(self, criteria_id: str, **kwargs) -> bool:
@@ -1068,12 +1295,12 @@ class EvaluationDatabase:
         try:
             # 解析criteria_id
             if not criteria_id.startswith('default_'):
-                print(f"❌ 不支持更新非默认评分标准: {criteria_id}")
+                logger.error(f"❌ 不支持更新非默认评分标准: {criteria_id}")
                 return False
                 
             prompt_type = criteria_id.replace('default_', '')
             if prompt_type not in ['objective', 'subjective', 'mixed']:
-                print(f"❌ 无效的提示词类型: {prompt_type}")
+                logger.error(f"❌ 无效的提示词类型: {prompt_type}")
                 return False
             
             # 检查更新字段
@@ -1085,32 +1312,32 @@ class EvaluationDatabase:
                 # 更新默认提示词
                 success = self.set_default_prompt(prompt_type, new_prompt, updated_by)
                 if success:
-                    print(f"✅ 更新{prompt_type}题型默认提示词成功")
+                    logger.info(f"✅ 更新{prompt_type}题型默认提示词成功")
                     return True
                 else:
-                    print(f"❌ 更新{prompt_type}题型默认提示词失败")
+                    logger.error(f"❌ 更新{prompt_type}题型默认提示词失败")
                     return False
             
             # 其他字段更新（暂时忽略，因为默认提示词只关心内容）
-            print(f"⚠️ 仅支持更新提示词内容，忽略其他字段更新")
+            logger.warning(f"⚠️ 仅支持更新提示词内容，忽略其他字段更新")
             return True
             
         except Exception as e:
-            print(f"❌ 更新评分标准失败: {e}")
+            logger.error(f"❌ 更新评分标准失败: {e}")
             return False
     
     def delete_scoring_criteria(self, criteria_id: str) -> bool:
         """删除评分标准（默认提示词不可删除）"""
         if criteria_id.startswith('default_'):
-            print(f"⚠️ 默认评分标准不可删除: {criteria_id}")
+            logger.warning(f"⚠️ 默认评分标准不可删除: {criteria_id}")
             return False
         else:
-            print(f"⚠️ 仅支持默认评分标准管理")
+            logger.warning(f"⚠️ 仅支持默认评分标准管理")
             return False
     
     def get_default_scoring_criteria(self, criteria_type: str) -> Optional[Dict]:
         """获取默认评分标准 - 已废弃，请使用文件提示词功能"""
-        print("⚠️ [废弃警告] get_default_scoring_criteria方法已废弃，请使用文件提示词功能")
+        logger.warning("⚠️ [废弃警告] get_default_scoring_criteria方法已废弃，请使用文件提示词功能")
         return None
     # ========== 文件提示词管理方法 ==========
     
@@ -1243,7 +1470,7 @@ class EvaluationDatabase:
             return False
             
         except Exception as e:
-            print(f"⚠️ [检测客观题] 检测失败: {e}")
+            logger.warning(f"⚠️ [检测客观题] 检测失败: {e}")
             # 如果检测失败，默认返回False（使用通用提示词）
             return False
     
@@ -1314,7 +1541,7 @@ class EvaluationDatabase:
                     should_update = any(indicator in current_prompt for indicator in old_prompts_indicators)
                     
                     if should_update:
-                        print(f"🔄 [批量更新] 发现客观题文件 {filename} 使用旧默认提示词，正在更新...")
+                        logger.info(f"🔄 [批量更新] 发现客观题文件 {filename} 使用旧默认提示词，正在更新...")
                         
                         # 更新为新的客观题提示词
                         cursor.execute('''
@@ -1324,11 +1551,11 @@ class EvaluationDatabase:
                         ''', (new_objective_prompt, datetime.now().isoformat(), updated_by, filename))
                         
                         updated_count += 1
-                        print(f"✅ [批量更新] 已更新文件 {filename} 的提示词")
+                        logger.info(f"✅ [批量更新] 已更新文件 {filename} 的提示词")
             
             conn.commit()
         
-        print(f"🎉 [批量更新] 完成！共更新了 {updated_count} 个客观题文件的默认提示词")
+        logger.info(f"🎉 [批量更新] 完成！共更新了 {updated_count} 个客观题文件的默认提示词")
         return updated_count
     
     def list_all_file_prompts(self) -> List[Dict]:
@@ -1357,24 +1584,27 @@ class EvaluationDatabase:
     
     def create_running_task(self, task_id: str, task_name: str, dataset_file: str, 
                            dataset_filename: str, evaluation_mode: str, selected_models: List[str],
-                           total: int, created_by: str = 'system') -> bool:
-        """创建运行时任务记录"""
+                           total: int, created_by: str = 'system', status: str = 'running',
+                           priority: int = 0, metadata: Dict = None) -> bool:
+        """创建运行时任务记录（status='queued' 时进入任务队列，由评测worker领取）"""
         try:
+            now = datetime.now().isoformat()
             with sqlite3.connect(self.db_path) as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     INSERT INTO running_tasks 
                     (task_id, task_name, dataset_file, dataset_filename, evaluation_mode, 
-                     selected_models, total, started_at, created_by)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                     selected_models, total, started_at, created_by, status, priority, queued_at, metadata)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                 ''', (
                     task_id, task_name, dataset_file, dataset_filename, evaluation_mode,
-                    json.dumps(selected_models), total, datetime.now().isoformat(), created_by
+                    json.dumps(selected_models), total, None if status == 'queued' else now, created_by,
+                    status, priority, now, json.dumps(metadata, ensure_ascii=False) if metadata else None
                 ))
                 conn.commit()
                 return True
         except Exception as e:
-            print(f"创建运行时任务失败: {e}")
+            logger.info(f"创建运行时任务失败: {e}")
             return False
     
     def update_task_progress(self, task_id: str, progress: int, current_step: str = '') -> bool:
@@ -1390,7 +1620,23 @@ class EvaluationDatabase:
                 conn.commit()
                 return cursor.rowcount > 0
         except Exception as e:
-            print(f"更新任务进度失败: {e}")
+            logger.info(f"更新任务进度失败: {e}")
+            return False
+    
+    def update_tasks_progress(self, rows: List[tuple]) -> bool:
+        """批量更新任务进度，rows 为 (progress, current_step, task_id) 列表"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.executemany('''
+                    UPDATE running_tasks 
+                    SET progress = ?, current_step = ?
+                    WHERE task_id = ? AND status = 'running'
+                ''', rows)
+                conn.commit()
+                return True
+        except Exception as e:
+            logger.info(f"批量更新任务进度失败: {e}")
             return False
     
     def update_task_status(self, task_id: str, status: str, **kwargs) -> bool:
@@ -1418,6 +1664,10 @@ class EvaluationDatabase:
                         update_fields.append('error_message = ?')
                         values.append(kwargs['error_message'])
                 
+                # 任务结束后不再保留用户提供的模型密钥
+                if status in ('completed', 'failed', 'cancelled'):
+                    update_fields.append("metadata = json_remove(COALESCE(metadata, '{}'), '$.credentials')")
+                
                 values.append(task_id)
                 
                 cursor.execute(f'''
@@ -1428,7 +1678,28 @@ class EvaluationDatabase:
                 conn.commit()
                 return cursor.rowcount > 0
         except Exception as e:
-            print(f"更新任务状态失败: {e}")
+            logger.info(f"更新任务状态失败: {e}")
+            return False
+    
+    def update_task_metadata(self, task_id: str, metadata: Dict) -> bool:
+        """合并更新任务元数据"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT metadata FROM running_tasks WHERE task_id = ?', (task_id,))
+                row = cursor.fetchone()
+                if not row:
+                    return False
+                
+                current = json.loads(row[0]) if row[0] else {}
+                current.update(metadata)
+                cursor.execute('''
+                    UPDATE running_tasks SET metadata = ? WHERE task_id = ?
+                ''', (json.dumps(current, ensure_ascii=False), task_id))
+                conn.commit()
+                return cursor.rowcount > 0
+        except Exception as e:
+            logger.info(f"更新任务元数据失败: {e}")
             return False
     
     def update_evaluation_result_name(self, result_id: str, new_name: str) -> bool:
@@ -1444,7 +1715,7 @@ class EvaluationDatabase:
                 conn.commit()
                 return cursor.rowcount > 0
         except Exception as e:
-            print(f"更新结果名称失败: {e}")
+            logger.info(f"更新结果名称失败: {e}")
             return False
     
     def get_running_task(self, task_id: str) -> Optional[Dict]:
@@ -1468,7 +1739,7 @@ class EvaluationDatabase:
                     return task_data
                 return None
         except Exception as e:
-            print(f"获取运行时任务失败: {e}")
+            logger.info(f"获取运行时任务失败: {e}")
             return None
     
     def get_running_tasks(self, status: str = None, created_by: str = None) -> List[Dict]:
@@ -1481,7 +1752,10 @@ class EvaluationDatabase:
                 params = []
                 conditions = []
                 
-                if status:
+                if isinstance(status, (list, tuple)):
+                    conditions.append(f"status IN ({','.join('?' * len(status))})")
+                    params.extend(status)
+                elif status:
                     conditions.append('status = ?')
                     params.append(status)
                 
@@ -1510,7 +1784,7 @@ class EvaluationDatabase:
                 
                 return tasks
         except Exception as e:
-            print(f"获取运行时任务列表失败: {e}")
+            logger.info(f"获取运行时任务列表失败: {e}")
             return []
     
     # ========== 文件上传记录管理方法 ==========
@@ -1544,7 +1818,7 @@ class EvaluationDatabase:
                         original_filename, file_path, file_size, mode, total_count,
                         json.dumps(metadata or {}), file_id
                     ))
-                    print(f"📝 更新文件记录: {filename} (用户: {uploaded_by})")
+                    logger.info(f"📝 更新文件记录: {filename} (用户: {uploaded_by})")
                 else:
                     # 创建新记录
                     file_id = str(uuid.uuid4())
@@ -1558,12 +1832,12 @@ class EvaluationDatabase:
                         file_type, mode, total_count, uploaded_by, 
                         json.dumps(metadata or {})
                     ))
-                    print(f"📁 创建文件记录: {filename} (用户: {uploaded_by})")
+                    logger.info(f"📁 创建文件记录: {filename} (用户: {uploaded_by})")
                 
                 conn.commit()
                 return file_id
         except Exception as e:
-            print(f"保存文件上传记录失败: {e}")
+            logger.info(f"保存文件上传记录失败: {e}")
             return None
     
     def get_user_uploaded_files(self, uploaded_by: str = None, file_type: str = None, 
@@ -1614,7 +1888,7 @@ class EvaluationDatabase:
                 
                 return files
         except Exception as e:
-            print(f"获取用户上传文件失败: {e}")
+            logger.info(f"获取用户上传文件失败: {e}")
             return []
     
     def delete_uploaded_file_record(self, file_id: str) -> bool:
@@ -1629,7 +1903,7 @@ class EvaluationDatabase:
                 conn.commit()
                 return cursor.rowcount > 0
         except Exception as e:
-            print(f"删除文件上传记录失败: {e}")
+            logger.info(f"删除文件上传记录失败: {e}")
             return False
     
     def get_uploaded_file_by_filename(self, filename: str, uploaded_by: str = None) -> Optional[Dict]:
@@ -1669,7 +1943,7 @@ class EvaluationDatabase:
                     }
                 return None
         except Exception as e:
-            print(f"获取文件上传记录失败: {e}")
+            logger.info(f"获取文件上传记录失败: {e}")
             return None
     
     def delete_running_task(self, task_id: str) -> bool:
@@ -1677,11 +1951,12 @@ class EvaluationDatabase:
         try:
             with sqlite3.connect(self.db_path) as conn:
                 cursor = conn.cursor()
+                cursor.execute('DELETE FROM task_result_rows WHERE task_id = ?', (task_id,))
                 cursor.execute('DELETE FROM running_tasks WHERE task_id = ?', (task_id,))
                 conn.commit()
                 return cursor.rowcount > 0
         except Exception as e:
-            print(f"删除运行时任务失败: {e}")
+            logger.info(f"删除运行时任务失败: {e}")
             return False
     
     def cleanup_completed_tasks(self, days_old: int = 7) -> int:
@@ -1695,12 +1970,426 @@ class EvaluationDatabase:
                     WHERE status IN ('completed', 'failed', 'cancelled') 
                     AND completed_at < ?
                 ''', (cutoff_date,))
+                deleted_count = cursor.rowcount
+                # 清理已不存在任务的结果日志
+                cursor.execute('''
+                    DELETE FROM task_result_rows 
+                    WHERE task_id NOT IN (SELECT task_id FROM running_tasks)
+                ''')
+                conn.commit()
+                return deleted_count
+        except Exception as e:
+            logger.info(f"清理已完成任务失败: {e}")
+            return 0
+    
+    # ========== 任务队列方法 ==========
+    
+    def claim_next_task(self, worker_id: str, global_limit: int, per_user_limit: int,
+                        heartbeat_timeout: int) -> Optional[Dict]:
+        """领取下一个排队任务
+        
+        调度规则：全局运行数和单用户运行数不超过上限；优先级高的先执行；
+        同优先级下当前运行任务少的用户优先（公平调度），再按排队时间先后。
+        """
+        try:
+            now = datetime.now()
+            alive_cutoff = (now - timedelta(seconds=heartbeat_timeout)).isoformat()
+            with sqlite3.connect(self.db_path, timeout=30) as conn:
+                conn.isolation_level = None
+                cursor = conn.cursor()
+                # 立即获取写锁，多个worker同时领取时串行执行
+                cursor.execute('BEGIN IMMEDIATE')
+                try:
+                    cursor.execute('''
+                        SELECT created_by, COUNT(*) FROM running_tasks
+                        WHERE status = 'running' AND claimed_by IS NOT NULL AND heartbeat_at >= ?
+                        GROUP BY created_by
+                    ''', (alive_cutoff,))
+                    running_by_user = dict(cursor.fetchall())
+                    if sum(running_by_user.values()) >= global_limit:
+                        cursor.execute('COMMIT')
+                        return None
+                    
+                    cursor.execute('''
+                        SELECT task_id, created_by, COALESCE(priority, 0), COALESCE(queued_at, created_at)
+                        FROM running_tasks WHERE status = 'queued'
+                    ''')
+                    candidates = [
+                        row for row in cursor.fetchall()
+                        if running_by_user.get(row[1], 0) < per_user_limit
+                    ]
+                    if not candidates:
+                        cursor.execute('COMMIT')
+                        return None
+                    
+                    task_id = min(
+                        candidates,
+                        key=lambda row: (-row[2], running_by_user.get(row[1], 0), row[3])
+                    )[0]
+                    cursor.execute('''
+                        UPDATE running_tasks
+                        SET status = 'running', claimed_by = ?, heartbeat_at = ?,
+                            started_at = COALESCE(started_at, ?)
+                        WHERE task_id = ? AND status = 'queued'
+                    ''', (worker_id, now.isoformat(), now.isoformat(), task_id))
+                    cursor.execute('COMMIT')
+                except Exception:
+                    cursor.execute('ROLLBACK')
+                    raise
+            return self.get_running_task(task_id)
+        except Exception as e:
+            logger.info(f"领取排队任务失败: {e}")
+            return None
+    
+    def heartbeat_tasks(self, worker_id: str, task_ids: List[str]) -> Dict[str, str]:
+        """刷新worker正在执行的任务心跳，返回 {task_id: 当前状态}（已删除的任务不在结果中）"""
+        if not task_ids:
+            return {}
+        try:
+            placeholders = ','.join('?' * len(task_ids))
+            with sqlite3.connect(self.db_path, timeout=30) as conn:
+                cursor = conn.cursor()
+                cursor.execute(f'''
+                    UPDATE running_tasks SET heartbeat_at = ?
+                    WHERE claimed_by = ? AND status = 'running' AND task_id IN ({placeholders})
+                ''', (datetime.now().isoformat(), worker_id, *task_ids))
+                cursor.execute(f'''
+                    SELECT task_id, status FROM running_tasks WHERE task_id IN ({placeholders})
+                ''', task_ids)
+                statuses = dict(cursor.fetchall())
+                conn.commit()
+                return statuses
+        except Exception as e:
+            logger.info(f"刷新任务心跳失败: {e}")
+            # 读取失败时按仍在运行处理，避免误取消
+            return {task_id: 'running' for task_id in task_ids}
+    
+    def get_task_controls(self, task_ids: List[str]) -> Dict[str, Tuple[str, bool]]:
+        """读取任务的控制状态，返回 {task_id: (状态, 是否暂停)}（已删除的任务不在结果中）"""
+        if not task_ids:
+            return {}
+        try:
+            placeholders = ','.join('?' * len(task_ids))
+            with sqlite3.connect(self.db_path, timeout=30) as conn:
+                cursor = conn.cursor()
+                cursor.execute(f'''
+                    SELECT task_id, status, paused_at IS NOT NULL FROM running_tasks
+                    WHERE task_id IN ({placeholders})
+                ''', task_ids)
+                return {row[0]: (row[1], bool(row[2])) for row in cursor.fetchall()}
+        except Exception as e:
+            logger.info(f"读取任务控制状态失败: {e}")
+            # 读取失败时按正常运行处理，避免误取消
+            return {task_id: ('running', False) for task_id in task_ids}
+
+    def set_task_paused(self, task_id: str, paused: bool) -> bool:
+        """暂停/恢复任务（任务保持 running 状态和执行名额，执行进程停止开始新题目）"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    UPDATE running_tasks SET paused_at = ?
+                    WHERE task_id = ? AND status IN ('queued', 'running')
+                ''', (datetime.now().isoformat() if paused else None, task_id))
+                conn.commit()
+                return cursor.rowcount > 0
+        except Exception as e:
+            logger.info(f"更新任务暂停状态失败: {e}")
+            return False
+
+    def requeue_stale_tasks(self, heartbeat_timeout: int) -> int:
+        """把心跳超时（执行进程已退出）的任务放回队列，返回数量"""
+        try:
+            cutoff = (datetime.now() - timedelta(seconds=heartbeat_timeout)).isoformat()
+            with sqlite3.connect(self.db_path, timeout=30) as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    UPDATE running_tasks
+                    SET status = 'queued', claimed_by = NULL, heartbeat_at = NULL
+                    WHERE status = 'running' AND claimed_by IS NOT NULL AND heartbeat_at < ?
+                ''', (cutoff,))
                 conn.commit()
                 return cursor.rowcount
         except Exception as e:
-            print(f"清理已完成任务失败: {e}")
+            logger.info(f"回收超时任务失败: {e}")
             return 0
     
+    def requeue_task(self, task_id: str, heartbeat_timeout: int) -> bool:
+        """把中断的任务重新放入队列；仍在队列中或有存活worker执行时返回False"""
+        try:
+            cutoff = (datetime.now() - timedelta(seconds=heartbeat_timeout)).isoformat()
+            with sqlite3.connect(self.db_path, timeout=30) as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    UPDATE running_tasks
+                    SET status = 'queued', claimed_by = NULL, heartbeat_at = NULL, queued_at = ?
+                    WHERE task_id = ? AND status NOT IN ('queued', 'completed')
+                    AND NOT (status = 'running' AND claimed_by IS NOT NULL AND heartbeat_at >= ?)
+                ''', (datetime.now().isoformat(), task_id, cutoff))
+                conn.commit()
+                return cursor.rowcount > 0
+        except Exception as e:
+            logger.info(f"任务重新排队失败: {e}")
+            return False
+    
+    # ========== 评测结果日志方法 ==========
+    
+    def append_task_result_row(self, task_id: str, row_index: int, row_data: List) -> bool:
+        """追加一道题的评测结果到任务日志"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    INSERT OR REPLACE INTO task_result_rows (task_id, row_index, row_data, created_at)
+                    VALUES (?, ?, ?, ?)
+                ''', (task_id, row_index, json.dumps(row_data, ensure_ascii=False, default=str),
+                      datetime.now().isoformat()))
+                conn.commit()
+                return True
+        except Exception as e:
+            logger.info(f"写入评测结果日志失败: {e}")
+            return False
+    
+    def get_task_result_indices(self, task_id: str) -> set:
+        """获取任务日志中已完成的题目序号"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT row_index FROM task_result_rows WHERE task_id = ?', (task_id,))
+                return {row[0] for row in cursor.fetchall()}
+        except Exception as e:
+            logger.info(f"获取评测结果日志失败: {e}")
+            return set()
+    
+    def iter_task_result_rows(self, task_id: str):
+        """按题目序号顺序逐行读取任务日志，避免一次性载入全部结果"""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT row_index, row_data FROM task_result_rows 
+                WHERE task_id = ? ORDER BY row_index
+            ''', (task_id,))
+            for row_index, row_data in cursor:
+                yield row_index, json.loads(row_data)
+    
+    def delete_task_result_rows(self, task_id: str) -> int:
+        """删除任务日志"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute('DELETE FROM task_result_rows WHERE task_id = ?', (task_id,))
+                conn.commit()
+                return cursor.rowcount
+        except Exception as e:
+            logger.info(f"删除评测结果日志失败: {e}")
+            return 0
+    
+    # ========== 调用遥测方法 ==========
+    
+    def save_call_telemetry(self, task_id: str, rows: List[tuple]) -> bool:
+        """批量写入调用遥测记录（CallRecord.to_row() 的结果）"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.executemany('''
+                    INSERT INTO call_telemetry (
+                        task_id, row_index, model_name, call_type, item_count, queue_wait,
+                        connect_time, ttft, total_time, bytes, retries, http_status,
+                        input_tokens, output_tokens, tokens_estimated
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', [(task_id,) + tuple(row) for row in rows])
+                conn.commit()
+                return True
+        except Exception as e:
+            logger.info(f"写入调用遥测失败: {e}")
+            return False
+    
+    def attach_call_telemetry(self, task_id: str, result_id: str) -> int:
+        """把任务的调用遥测和token用量关联到保存的评测结果"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    UPDATE call_telemetry SET result_id = ? WHERE task_id = ? AND result_id IS NULL
+                ''', (result_id, task_id))
+                attached = cursor.rowcount
+                cursor.execute('''
+                    UPDATE token_usage SET result_id = ? WHERE task_id = ? AND result_id IS NULL
+                ''', (result_id, task_id))
+                conn.commit()
+                return attached
+        except Exception as e:
+            logger.info(f"关联调用遥测失败: {e}")
+            return 0
+    
+    def get_call_telemetry(self, result_id: str) -> List[Dict]:
+        """获取评测结果的调用遥测记录"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT row_index, model_name, call_type, item_count, queue_wait, connect_time,
+                           ttft, total_time, bytes, retries, http_status,
+                           input_tokens, output_tokens, tokens_estimated
+                    FROM call_telemetry WHERE result_id = ? ORDER BY row_index
+                ''', (result_id,))
+                return [dict(row) for row in cursor.fetchall()]
+        except Exception as e:
+            logger.info(f"获取调用遥测失败: {e}")
+            return []
+    
+    # ========== Token用量和预算方法 ==========
+    
+    TOKEN_USAGE_GROUPS = ('user_id', 'project_id', 'dataset_file', 'prompt_version', 'model_name', 'call_type', 'task_id')
+    
+    def add_token_usage(self, task_id: str, context: Dict, rows: List[tuple]) -> bool:
+        """累加任务的token用量，rows 为 (model_name, call_type, calls, input_tokens, output_tokens, estimated_tokens)"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.executemany('''
+                    INSERT INTO token_usage (
+                        task_id, user_id, project_id, dataset_file, prompt_version, model_name, call_type,
+                        calls, input_tokens, output_tokens, estimated_tokens
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(task_id, model_name, call_type) DO UPDATE SET
+                        calls = calls + excluded.calls,
+                        input_tokens = input_tokens + excluded.input_tokens,
+                        output_tokens = output_tokens + excluded.output_tokens,
+                        estimated_tokens = estimated_tokens + excluded.estimated_tokens,
+                        updated_at = CURRENT_TIMESTAMP
+                ''', [(task_id, context.get('user_id'), context.get('project_id'), context.get('dataset_file'),
+                       context.get('prompt_version')) + tuple(row) for row in rows])
+                conn.commit()
+                return True
+        except Exception as e:
+            logger.info(f"写入token用量失败: {e}")
+            return False
+    
+    def get_token_usage(self, task_id: str = None, result_id: str = None) -> Dict:
+        """获取单个任务或评测结果的token用量（总计和按模型、调用类型的明细）"""
+        column, value = ('result_id', result_id) if result_id else ('task_id', task_id)
+        summary = {'calls': 0, 'input_tokens': 0, 'output_tokens': 0, 'estimated_tokens': 0, 'models': []}
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
+                cursor.execute(f'''
+                    SELECT model_name, call_type, SUM(calls) AS calls, SUM(input_tokens) AS input_tokens,
+                           SUM(output_tokens) AS output_tokens, SUM(estimated_tokens) AS estimated_tokens
+                    FROM token_usage WHERE {column} = ?
+                    GROUP BY model_name, call_type ORDER BY call_type, model_name
+                ''', (value,))
+                for row in cursor.fetchall():
+                    entry = dict(row)
+                    summary['models'].append(entry)
+                    for key in ('calls', 'input_tokens', 'output_tokens', 'estimated_tokens'):
+                        summary[key] += entry[key] or 0
+        except Exception as e:
+            logger.info(f"获取token用量失败: {e}")
+        summary['total_tokens'] = summary['input_tokens'] + summary['output_tokens']
+        return summary
+    
+    def get_token_usage_summary(self, group_by: str = 'user_id', since: str = None, limit: int = 100) -> List[Dict]:
+        """按用户、项目、数据集、提示模板版本、模型等维度汇总token用量"""
+        if group_by not in self.TOKEN_USAGE_GROUPS:
+            raise ValueError(f"不支持的分组字段: {group_by}")
+        query = f'''
+            SELECT {group_by} AS key, COUNT(DISTINCT task_id) AS tasks, SUM(calls) AS calls,
+                   SUM(input_tokens) AS input_tokens, SUM(output_tokens) AS output_tokens,
+                   SUM(estimated_tokens) AS estimated_tokens, MAX(updated_at) AS last_used_at
+            FROM token_usage
+        '''
+        params = []
+        if since:
+            query += ' WHERE created_at >= ?'
+            params.append(since)
+        query += f' GROUP BY {group_by} ORDER BY SUM(input_tokens + output_tokens) DESC LIMIT ?'
+        params.append(limit)
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
+                cursor.execute(query, params)
+                rows = [dict(row) for row in cursor.fetchall()]
+        except Exception as e:
+            logger.info(f"汇总token用量失败: {e}")
+            return []
+        for row in rows:
+            row['total_tokens'] = (row['input_tokens'] or 0) + (row['output_tokens'] or 0)
+        return rows
+    
+    def get_token_usage_total(self, scope: str, scope_id: str, since: str = None) -> int:
+        """获取用户或项目的token用量合计（since 为空时统计全部）"""
+        column = 'user_id' if scope == 'user' else 'project_id'
+        query = f'SELECT COALESCE(SUM(input_tokens + output_tokens), 0) FROM token_usage WHERE {column} = ?'
+        params = [scope_id]
+        if since:
+            query += ' AND created_at >= ?'
+            params.append(since)
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute(query, params)
+                return cursor.fetchone()[0]
+        except Exception as e:
+            logger.info(f"获取token用量合计失败: {e}")
+            return 0
+    
+    def get_token_budgets(self) -> List[Dict]:
+        """获取全部token预算"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
+                cursor.execute('SELECT * FROM token_budgets ORDER BY scope, scope_id')
+                return [dict(row) for row in cursor.fetchall()]
+        except Exception as e:
+            logger.info(f"获取token预算失败: {e}")
+            return []
+    
+    def get_token_budget(self, scope: str, scope_id: str) -> Optional[Dict]:
+        """获取用户或项目的token预算，未设置时返回None"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
+                cursor.execute('SELECT * FROM token_budgets WHERE scope = ? AND scope_id = ?', (scope, scope_id))
+                row = cursor.fetchone()
+                return dict(row) if row else None
+        except Exception as e:
+            logger.info(f"获取token预算失败: {e}")
+            return None
+    
+    def set_token_budget(self, scope: str, scope_id: str, token_limit: int, period: str = 'month',
+                         updated_by: str = None) -> bool:
+        """设置用户或项目的token预算"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    INSERT OR REPLACE INTO token_budgets (scope, scope_id, token_limit, period, updated_by, updated_at)
+                    VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ''', (scope, scope_id, token_limit, period, updated_by))
+                conn.commit()
+                return True
+        except Exception as e:
+            logger.info(f"设置token预算失败: {e}")
+            return False
+    
+    def delete_token_budget(self, scope: str, scope_id: str) -> bool:
+        """删除用户或项目的token预算"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute('DELETE FROM token_budgets WHERE scope = ? AND scope_id = ?', (scope, scope_id))
+                conn.commit()
+                return cursor.rowcount > 0
+        except Exception as e:
+            logger.info(f"删除token预算失败: {e}")
+            return False
+    
     # ========== 分享管理方法 ==========
     
     def create_share_link(self, result_id: str, shared_by: str, share_type: str = 'public',
@@ -1749,7 +2438,7 @@ class EvaluationDatabase:
                     'access_limit': access_limit
                 }
         except Exception as e:
-            print(f"创建分享链接失败: {e}")
+            logger.info(f"创建分享链接失败: {e}")
             return None
     
     def get_share_link_by_token(self, share_token: str) -> Optional[Dict]:
@@ -1778,7 +2467,7 @@ class EvaluationDatabase:
                         try:
                             share_info['models'] = json.loads(models_raw)
                         except (json.JSONDecodeError, TypeError) as e:
-                            print(f"⚠️ 解析models字段失败: {e}, 原始值: {models_raw}")
+                            logger.warning(f"⚠️ 解析models字段失败: {e}, 原始值: {models_raw}")
                             share_info['models'] = []
                     else:
                         # models字段为空时设为空列表
@@ -1787,7 +2476,7 @@ class EvaluationDatabase:
                     return share_info
                 return None
         except Exception as e:
-            print(f"获取分享链接失败: {e}")
+            logger.info(f"获取分享链接失败: {e}")
             return None
     
     def verify_share_access(self, share_token: str, password: str = None) -> Dict:
@@ -1849,7 +2538,7 @@ class EvaluationDatabase:
                 conn.commit()
                 return True
         except Exception as e:
-            print(f"记录分享访问失败: {e}")
+            logger.info(f"记录分享访问失败: {e}")
             return False
     
     def get_user_shared_links(self, user_id: str, include_revoked: bool = False) -> List[Dict]:
@@ -1888,7 +2577,7 @@ class EvaluationDatabase:
                 
                 return shares
         except Exception as e:
-            print(f"获取用户分享链接失败: {e}")
+            logger.info(f"获取用户分享链接失败: {e}")
             return []
     
     def revoke_share_link(self, share_id: str, revoked_by: str) -> bool:
@@ -1904,7 +2593,7 @@ class EvaluationDatabase:
                 conn.commit()
                 return cursor.rowcount > 0
         except Exception as e:
-            print(f"撤销分享链接失败: {e}")
+            logger.info(f"撤销分享链接失败: {e}")
             return False
     
     def get_share_access_logs(self, share_id: str, limit: int = 50) -> List[Dict]:
@@ -1926,7 +2615,7 @@ class EvaluationDatabase:
                 
                 return [dict(zip(columns, row)) for row in rows]
         except Exception as e:
-            print(f"获取分享访问日志失败: {e}")
+            logger.info(f"获取分享访问日志失败: {e}")
             return []
     
     def cleanup_expired_shares(self) -> int:
@@ -1944,8 +2633,134 @@ class EvaluationDatabase:
                 conn.commit()
                 return cursor.rowcount
         except Exception as e:
-            print(f"清理过期分享链接失败: {e}")
+            logger.info(f"清理过期分享链接失败: {e}")
+            return 0
+
+    
+    # ========== 评测响应缓存方法 ==========
+    
+    def get_judge_cache(self, cache_key: str, ttl_seconds: int = None) -> Optional[str]:
+        """获取缓存的评测响应，过期的条目会被删除并返回None"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT response, created_at FROM judge_cache WHERE cache_key = ?', (cache_key,))
+                row = cursor.fetchone()
+                if not row:
+                    return None
+                
+                response, created_at = row
+                if ttl_seconds and created_at:
+                    if datetime.fromisoformat(created_at) < datetime.now() - timedelta(seconds=ttl_seconds):
+                        cursor.execute('DELETE FROM judge_cache WHERE cache_key = ?', (cache_key,))
+                        conn.commit()
+                        return None
+                
+                cursor.execute('''
+                    UPDATE judge_cache 
+                    SET hit_count = hit_count + 1, last_accessed = ?
+                    WHERE cache_key = ?
+                ''', (datetime.now().isoformat(), cache_key))
+                conn.commit()
+                return response
+        except Exception as e:
+            logger.info(f"读取评测缓存失败: {e}")
+            return None
+    
+    def set_judge_cache(self, cache_key: str, model_name: str, response: str) -> bool:
+        """写入评测响应缓存"""
+        try:
+            now = datetime.now().isoformat()
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    INSERT OR REPLACE INTO judge_cache 
+                    (cache_key, model_name, response, hit_count, created_at, last_accessed)
+                    VALUES (?, ?, ?, 0, ?, ?)
+                ''', (cache_key, model_name, response, now, now))
+                conn.commit()
+                return True
+        except Exception as e:
+            logger.info(f"写入评测缓存失败: {e}")
+            return False
+    
+    def prune_judge_cache(self, ttl_seconds: int = None, max_entries: int = None) -> int:
+        """清理评测缓存：先删除过期条目，再按最近访问时间(LRU)淘汰超出上限的条目"""
+        try:
+            removed = 0
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                if ttl_seconds:
+                    cutoff = (datetime.now() - timedelta(seconds=ttl_seconds)).isoformat()
+                    cursor.execute('DELETE FROM judge_cache WHERE created_at < ?', (cutoff,))
+                    removed += cursor.rowcount
+                
+                if max_entries:
+                    cursor.execute('''
+                        DELETE FROM judge_cache WHERE cache_key IN (
+                            SELECT cache_key FROM judge_cache 
+                            ORDER BY last_accessed DESC 
+                            LIMIT -1 OFFSET ?
+                        )
+                    ''', (max_entries,))
+                    removed += cursor.rowcount
+                
+                conn.commit()
+            return removed
+        except Exception as e:
+            logger.info(f"清理评测缓存失败: {e}")
             return 0
+    
+    def get_judge_cache_stats(self) -> Dict:
+        """获取评测缓存统计信息"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT COUNT(*), COALESCE(SUM(hit_count), 0) FROM judge_cache')
+                entries, hits = cursor.fetchone()
+                return {'entries': entries, 'total_hits': hits}
+        except Exception as e:
+            logger.info(f"获取评测缓存统计失败: {e}")
+            return {'entries': 0, 'total_hits': 0}
+
+    
+    # ========== 模型答案缓存方法 ==========
+    
+    def get_model_answers(self, model_name: str, config_fingerprint: str, query_hashes: List[str]) -> Dict[str, str]:
+        """批量获取缓存的模型答案，返回 {query_hash: answer}"""
+        answers = {}
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                # 分批查询，避免超出SQLite参数个数限制
+                for start in range(0, len(query_hashes), 500):
+                    batch = query_hashes[start:start + 500]
+                    placeholders = ','.join('?' * len(batch))
+                    cursor.execute(f'''
+                        SELECT query_hash, answer FROM model_answer_cache
+                        WHERE model_name = ? AND config_fingerprint = ? AND query_hash IN ({placeholders})
+                    ''', [model_name, config_fingerprint] + batch)
+                    answers.update(dict(cursor.fetchall()))
+        except Exception as e:
+            logger.info(f"读取模型答案缓存失败: {e}")
+        return answers
+    
+    def save_model_answers(self, rows: List[Tuple[str, str, str, str]]) -> bool:
+        """批量保存模型答案，rows为 (model_name, config_fingerprint, query_hash, answer)"""
+        try:
+            now = datetime.now().isoformat()
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.executemany('''
+                    INSERT OR REPLACE INTO model_answer_cache 
+                    (model_name, config_fingerprint, query_hash, answer, created_at)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', [row + (now,) for row in rows])
+                conn.commit()
+                return True
+        except Exception as e:
+            logger.info(f"保存模型答案缓存失败: {e}")
+            return False
 
 
 # 创建全局数据库实例
@@ -1953,19 +2768,19 @@ db = EvaluationDatabase()
 
 if __name__ == "__main__":
     # 测试数据库功能
-    print("初始化高级评测系统数据库...")
+    logger.info("初始化高级评测系统数据库...")
     
     # 创建默认项目
     project_id = db.create_project("默认项目", "系统默认项目")
-    print(f"创建项目: {project_id}")
+    logger.info(f"创建项目: {project_id}")
     
     # 初始化默认管理员账户
     admin_id = db.init_default_admin()
     if admin_id:
-        print(f"创建管理员账户: {admin_id}")
+        logger.info(f"创建管理员账户: {admin_id}")
     
     # 获取统计信息
     stats = db.get_statistics()
-    print(f"系统统计: {stats}")
+    logger.info(f"系统统计: {stats}")
     
-    print("数据库初始化完成！")
+    logger.info("数据库初始化完成！")
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+评测worker进程池
+从 running_tasks 任务队列领取评测任务并执行，与 gunicorn Web 进程分离，
+Web 进程回收或重启不会中断正在执行的评测。
+
+使用方法:
+    EVALUATION_EXECUTOR=worker python eval_worker.py --processes 2 --slots 2
+
+Web 进程也需要设置 EVALUATION_EXECUTOR=worker，只负责把任务放入队列。
+"""
+
+import argparse
+import multiprocessing
+import os
+import signal
+import sys
+import time
+
+
+def run_worker(slots: int):
+    """单个worker进程：导入评测逻辑后循环领取任务"""
+    # 导入app前设置，避免在worker进程中再启动内置调度
+    os.environ['EVALUATION_EXECUTOR'] = 'worker'
+
+    import app as web_app
+    from utils.job_queue import EvaluationScheduler
+    from config import (
+        EVALUATION_MAX_RUNNING_JOBS, EVALUATION_MAX_JOBS_PER_USER, EVALUATION_HEARTBEAT_TIMEOUT,
+        EVALUATION_CONTROL_POLL_INTERVAL
+    )
+
+    scheduler = EvaluationScheduler(
+        web_app.db, web_app.execute_queued_task,
+        slots=slots,
+        global_limit=EVALUATION_MAX_RUNNING_JOBS,
+        per_user_limit=EVALUATION_MAX_JOBS_PER_USER,
+        heartbeat_timeout=EVALUATION_HEARTBEAT_TIMEOUT,
+        control_poll_interval=EVALUATION_CONTROL_POLL_INTERVAL
+    )
+    signal.signal(signal.SIGTERM, lambda signum, frame: scheduler.stop())
+    scheduler.run_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='评测worker进程池')
+    parser.add_argument('--processes', type=int, default=1, help='worker进程数')
+    parser.add_argument('--slots', type=int, default=None, help='每个进程同时执行的任务数（默认读取 EVALUATION_WORKER_SLOTS）')
+    args = parser.parse_args()
+
+    from config import EVALUATION_WORKER_SLOTS
+    slots = args.slots or EVALUATION_WORKER_SLOTS
+
+    if args.processes <= 1:
+        run_worker(slots)
+        return
+
+    print(f"🚀 启动 {args.processes} 个评测worker进程，每个进程 {slots} 个任务槽")
+    processes = {}
+    stopping = [False]
+
+    def stop_all(signum, frame):
+        stopping[0] = True
+        for process in processes.values():
+            process.terminate()
+
+    signal.signal(signal.SIGTERM, stop_all)
+    signal.signal(signal.SIGINT, stop_all)
+
+    # 监控子进程，异常退出后重新拉起（其未完成的任务会在心跳超时后重新排队）
+    while not stopping[0]:
+        for index in range(args.processes):
+            process = processes.get(index)
+            if process is None or not process.is_alive():
+                if process is not None:
+                    print(f"⚠️ 评测worker {index} 已退出(code={process.exitcode})，重新启动")
+                process = multiprocessing.Process(target=run_worker, args=(slots,), name=f"eval-worker-{index}")
+                process.start()
+                processes[index] = process
+        time.sleep(5)
+
+    for process in processes.values():
+        process.join(timeout=10)
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
@@ -6,15 +6,26 @@ ENV_NAME="myenv"                      # conda 環境名稱
 APP_MODULE="app:app"                  # WSGI 模組
 BIND="0.0.0.0:8080"                   # 綁定地址
 WORKERS=4                             # gunicorn worker 數
+THREADS=16                            # 每個 worker 的線程數（SSE 進度推送為長連接）
+
+EVAL_WORKERS=0                        # 獨立評測進程數（0 表示在 gunicorn worker 內執行評測）
 
 PID_FILE="$APP_DIR/gunicorn.pid"
+EVAL_PID_FILE="$APP_DIR/eval_worker.pid"
 
 start() {
     echo "Starting gunicorn..."
     source "$ENV_PATH/bin/activate"
     conda activate "$ENV_NAME"
     cd "$APP_DIR" || exit 1
-    gunicorn --workers "$WORKERS" --bind "$BIND" "$APP_MODULE" \
+    if [ "$EVAL_WORKERS" -gt 0 ]; then
+        export EVALUATION_EXECUTOR=worker
+        mkdir -p logs
+        nohup python eval_worker.py --processes "$EVAL_WORKERS" > logs/eval_worker.log 2>&1 &
+        echo $! > "$EVAL_PID_FILE"
+        echo "Evaluation workers started with PID $(cat $EVAL_PID_FILE)"
+    fi
+    gunicorn --workers "$WORKERS" --worker-class gthread --threads "$THREADS" --bind "$BIND" "$APP_MODULE" \
         --daemon --pid "$PID_FILE"
     echo "Gunicorn started with PID $(cat $PID_FILE)"
 }
@@ -27,6 +38,10 @@ stop() {
     else
         echo "No PID file found. Gunicorn may not be running."
     fi
+    if [ -f "$EVAL_PID_FILE" ]; then
+        kill -TERM $(cat "$EVAL_PID_FILE") && rm -f "$EVAL_PID_FILE"
+        echo "Evaluation workers stopped."
+    fi
 }
 
 restart() {
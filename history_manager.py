@@ -67,6 +67,11 @@ class EvaluationHistoryManager:
                 'start_time': evaluation_data.get('start_time'),
                 'end_time': evaluation_data.get('end_time'),
                 'question_count': evaluation_data.get('question_count', 0),
+                'prompt_version': evaluation_data.get('prompt_version'),  # 评测提示模板版本
+                'hedging': evaluation_data.get('hedging'),  # 请求对冲统计
+                'sampling': evaluation_data.get('sampling'),  # 序贯抽样统计
+                'token_usage': evaluation_data.get('token_usage'),  # token用量
+                'prompt_budget': evaluation_data.get('prompt_budget'),  # 评测提示截断统计
                 'evaluation_settings': {
                     'mode': evaluation_data.get('evaluation_mode', 'unknown'),
                     'models': evaluation_data.get('models', []),
@@ -161,6 +166,9 @@ class EvaluationHistoryManager:
                 result['total_rows'] = len(df)
                 result['columns'] = df.columns.tolist()
             
+            # 本次评测的token用量（按模型和调用类型）
+            result['token_usage'] = db.get_token_usage(result_id=result_id)
+            
             # 标注功能已移除
             result['annotations'] = []
             result['annotation_count'] = 0
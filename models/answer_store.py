@@ -0,0 +1,96 @@
+"""
+模型答案存储
+按 (模型名, 模型配置指纹, 问题hash) 缓存候选模型的答案，重新评测时无需再次请求模型
+"""
+
+import hashlib
+import json
+import threading
+from typing import Dict, List, Optional
+
+# 这些前缀表示请求失败或无效回答，不写入答案缓存
+ERROR_ANSWER_PREFIXES = (
+    "❌", "⚠️", "错误：", "请求失败", "请求异常", "不支持的模型类型", "获取答案失败", "无有效内容返回"
+)
+
+
+def is_error_answer(answer: str) -> bool:
+    """判断答案是否为错误信息"""
+    if not answer or not str(answer).strip():
+        return True
+    return str(answer).startswith(ERROR_ANSWER_PREFIXES)
+
+
+def hash_query(query: str) -> str:
+    """计算问题内容的hash"""
+    return hashlib.sha256((query or "").encode('utf-8')).hexdigest()
+
+
+def get_model_fingerprint(model_config: Optional[Dict]) -> str:
+    """计算模型配置指纹，模型地址、模型名或请求参数变化后旧答案自动失效"""
+    relevant = {
+        key: value for key, value in (model_config or {}).items()
+        if key not in ('max_concurrency',)  # 并发数不影响答案内容
+    }
+    source = json.dumps(relevant, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(source.encode('utf-8')).hexdigest()[:16]
+
+
+class AnswerStore:
+    """单次评测使用的答案存储
+
+    查找顺序：preloaded（来自指定历史结果的答案）-> 答案缓存表（reuse_cache=True时）。
+    新获取的有效答案总是写入答案缓存表，供以后的重新评测复用。
+    """
+
+    def __init__(self, db, fingerprints: Dict[str, str], reuse_cache: bool = False,
+                 preloaded: Dict[str, Dict[str, str]] = None, flush_size: int = 50):
+        self.db = db
+        self.fingerprints = fingerprints
+        self.reuse_cache = reuse_cache
+        self.preloaded = preloaded or {}
+        self.flush_size = flush_size
+        self._cached: Dict[str, Dict[str, str]] = {}
+        self._pending: List[tuple] = []
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def prefetch(self, model_names: List[str], queries: List[str]):
+        """批量预取答案缓存，避免每个问题单独查询数据库"""
+        if not self.reuse_cache or not self.db:
+            return
+        query_hashes = list({hash_query(query) for query in queries})
+        for model_name in model_names:
+            fingerprint = self.fingerprints.get(model_name)
+            if fingerprint:
+                self._cached[model_name] = self.db.get_model_answers(model_name, fingerprint, query_hashes)
+
+    def lookup(self, model_name: str, query: str) -> Optional[str]:
+        """查找已有答案，未命中返回None"""
+        answer = self.preloaded.get(model_name, {}).get(query)
+        if answer is None and self.reuse_cache:
+            answer = self._cached.get(model_name, {}).get(hash_query(query))
+        if answer is not None and not is_error_answer(answer):
+            self.hits += 1
+            return answer
+        self.misses += 1
+        return None
+
+    def save(self, model_name: str, query: str, answer: str):
+        """记录新获取的答案（错误答案忽略），攒够一批后写入数据库"""
+        fingerprint = self.fingerprints.get(model_name)
+        if not self.db or not fingerprint or is_error_answer(answer):
+            return
+        with self._lock:
+            self._pending.append((model_name, fingerprint, hash_query(query), answer))
+            should_flush = len(self._pending) >= self.flush_size
+        if should_flush:
+            self.flush()
+
+    def flush(self):
+        """把缓冲的答案写入数据库"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if pending:
+            self.db.save_model_answers(pending)
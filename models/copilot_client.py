@@ -6,10 +6,17 @@ Copilot AI模型客户端
 import os
 import json
 import uuid
+import time
 import asyncio
 import aiohttp
 from typing import Dict, List, Optional
 from datetime import datetime
+from .stream_reader import read_sse_answer, get_max_answer_chars
+from .telemetry import CallRecord
+from utils.cancellation import get_task_token
+from utils.logger import get_logger, log_payload
+
+logger = get_logger(__name__)
 
 
 class CopilotClient:
@@ -22,6 +29,7 @@ class CopilotClient:
             "url": "https://copilot.hkgai.org/copilot/api/instruction/completion",
             "model": "HKGAI-V1",
             "cookie_env": "COPILOT_COOKIE_PROD",
+            "max_concurrency": 5,
             "headers_template": {
                 "Content-Type": "application/json",
                 "X-App-Id": "2"
@@ -42,6 +50,7 @@ class CopilotClient:
             "url": "https://copilot.hkgai.org/copilot/api/instruction/completion",
             "model": "HKGAI-V1-Thinking",
             "cookie_env": "COPILOT_COOKIE_PROD",
+            "max_concurrency": 5,
             "headers_template": {
                 "Content-Type": "application/json",
                 "X-App-Id": "2"
@@ -62,6 +71,7 @@ class CopilotClient:
             "url": "https://copilot-test.hkgai.org/copilot/api/instruction/completion",
             "model": "HKGAI-V1",
             "cookie_env": "COPILOT_COOKIE_TEST",
+            "max_concurrency": 5,
             "headers_template": {
                 "Content-Type": "application/json",
                 "X-App-Id": "2"
@@ -82,6 +92,7 @@ class CopilotClient:
             "url": "https://copilot-test.hkgai.org/copilot/api/instruction/completion",
             "model": "HKGAI-V1-Thinking",
             "cookie_env": "COPILOT_COOKIE_TEST",
+            "max_concurrency": 5,
             "headers_template": {
                 "Content-Type": "application/json",
                 "X-App-Id": "2"
@@ -102,6 +113,7 @@ class CopilotClient:
             "url": "https://copilot.hkgai.net/copilot/api/instruction/completion",
             "model": "HKGAI-V1",
             "cookie_env": "COPILOT_COOKIE_NET",
+            "max_concurrency": 5,
             "headers_template": {
                 "Content-Type": "application/json",
                 "X-App-Id": "2"
@@ -122,6 +134,7 @@ class CopilotClient:
             "url": "https://copilot.hkgai.net/copilot/api/instruction/completion",
             "model": "HKGAI-V1-Thinking",
             "cookie_env": "COPILOT_COOKIE_NET",
+            "max_concurrency": 5,
             "headers_template": {
                 "Content-Type": "application/json",
                 "X-App-Id": "2"
@@ -178,53 +191,18 @@ class CopilotClient:
         return True, ""
     
     @staticmethod
-    def extract_stream_content(stream: List[str]) -> str:
-        """提取Copilot流式响应的内容"""
-        buffer = []
-        current_event = None
-
-        for raw_line in stream:
-            line = raw_line.strip()
-            if not line:
-                continue
-
-            if line.startswith("event:"):
-                current_event = line[len("event:"):].strip()
-                continue
-
-            if line.startswith("data:") and current_event == "APPEND":
-                json_part = line[len("data:"):].strip()
-                try:
-                    payload = json.loads(json_part)
-                    
-                    # 提取choices[0].delta.content
-                    choices = payload.get("choices", [])
-                    if choices and len(choices) > 0:
-                        delta = choices[0].get("delta", {})
-                        content = delta.get("content", "")
-                        if content:
-                            buffer.append(content)
-                            
-                except json.JSONDecodeError as e:
-                    print(f"⚠️ JSON解析失败: {e}, 内容: {json_part[:100]}...")
-                    continue
-                except (KeyError, IndexError, TypeError) as e:
-                    print(f"⚠️ 数据结构解析失败: {e}")
-                    continue
-
-            elif line.startswith("data:") and current_event == "FINISH":
-                # 响应结束，可以在这里做一些清理工作
-                break
-
-        result = "".join(buffer)
-        print(f"✅ Copilot响应解析完成，总长度: {len(result)} 字符")
-        return result
+    def extract_delta(payload: Dict) -> str:
+        """提取Copilot流式响应 APPEND 事件中的文本片段（choices[0].delta.content）"""
+        choices = payload.get("choices", [])
+        if choices:
+            return choices[0].get("delta", {}).get("content", "")
+        return ""
     
     @classmethod
     async def fetch_answer(cls, session: aiohttp.ClientSession, query: str, model_name: str, 
                           idx: int, sem_model: asyncio.Semaphore, task_id: str, 
-                          task_status: Dict = None) -> str:
-        """获取Copilot模型的答案"""
+                          task_status: Dict = None, call: CallRecord = None) -> str:
+        """获取Copilot模型的答案，call 用于记录本次请求的耗时明细"""
         
         # 获取模型配置
         model_config = cls.get_model_config(model_name)
@@ -263,59 +241,73 @@ class CopilotClient:
         }
         
         # 发送请求并解析响应
+        call = call or CallRecord(idx, model_name, 'answer')
         async with sem_model:
+            # 任务暂停时不再发出新请求，等待恢复
+            await get_task_token(task_id).wait_if_paused()
+            call.queue_wait = call.elapsed()
             try:
-                # 详细请求日志 - 开始
-                print(f"📤 [Copilot请求] {model_name}")
-                print(f"🔗 URL: {model_config['url']}")
-                print(f"📋 Headers:")
-                for key, value in headers.items():
-                    if key.lower() == 'cookie':
-                        # 只显示Cookie的前50字符
-                        print(f"   {key}: {value[:50]}...")
-                    else:
-                        print(f"   {key}: {value}")
-                print(f"📄 Payload: {json.dumps(payload, ensure_ascii=False)}")
-                print(f"🚀 开始发送请求...")
-                # 详细请求日志 - 结束
+                # 详细请求日志（DEBUG级别，按任务抽样；Cookie只显示前50字符）
+                logger.debug(f"📤 [Copilot请求] {model_name} -> {model_config['url']}")
+                log_payload(logger, f"📋 [Copilot请求] {model_name} Headers/Payload", {
+                    'headers': {key: f"{value[:50]}..." if key.lower() == 'cookie' else value
+                                for key, value in headers.items()},
+                    'payload': payload
+                })
                 
-                async with session.post(model_config["url"], headers=headers, json=payload, timeout=60) as resp:
-                    raw_response = await resp.text()
-                    
-                    # 响应日志
-                    print(f"📥 [Copilot响应] HTTP {resp.status}")
-                    print(f"📊 响应长度: {len(raw_response)} 字符")
-                    print(f"📝 响应前200字符: {raw_response[:200]}...")
+                started_at = time.monotonic()
+                async with session.post(model_config["url"], headers=headers, json=payload, timeout=60,
+                                        trace_request_ctx=call) as resp:
+                    call.http_status = resp.status
+                    logger.debug(f"📥 [Copilot响应] {model_name} HTTP {resp.status}")
                     
                     if resp.status == 200:
+                        # 边接收边解析流式响应，收到FINISH事件后立即关闭连接
+                        stream = await read_sse_answer(
+                            resp, model_name, "APPEND", cls.extract_delta, finish_event="FINISH",
+                            max_chars=get_max_answer_chars(model_config), started_at=started_at
+                        )
+                        call.ttft = stream.first_token_seconds
+                        call.bytes = stream.bytes_read
+                        ttft = f"{stream.first_token_seconds:.2f}s" if stream.first_token_seconds is not None else "无"
+                        logger.debug(f"✅ Copilot响应解析完成，总长度: {len(stream.content)} 字符，首字延迟: {ttft}，耗时: {stream.elapsed:.2f}s")
+                        
                         # 检查是否为错误响应（即使HTTP 200）
-                        if raw_response.strip().startswith('{"code":'):
+                        # 响应体是错误信息时按失败记录（认证失败记为401，其他记为502），
+                        # 避免请求对冲、耗时统计和token估算把失败的调用当作成功
+                        error_text = stream.preamble.strip()
+                        if not stream.content and error_text.startswith('{"code":'):
+                            logger.info(f"📝 响应前200字符: {error_text[:200]}...")
                             try:
-                                error_data = json.loads(raw_response.strip())
+                                error_data = json.loads(error_text)
+                                call.http_status = 401 if error_data.get("code") == 401 else 502
                                 if error_data.get("code") == 401:
-                                    print(f"❌ Copilot认证失败: Cookie已过期或无效")
-                                    print(f"💡 错误详情: {error_data}")
-                                    print(f"🔍 使用的Cookie环境变量: {model_config['cookie_env']}")
+                                    logger.error(f"❌ Copilot认证失败: Cookie已过期或无效")
+                                    logger.info(f"💡 错误详情: {error_data}")
+                                    logger.info(f"🔍 使用的Cookie环境变量: {model_config['cookie_env']}")
                                     return f"❌ Cookie认证失败: {error_data.get('msg', 'Unauthorized')}"
                                 else:
-                                    print(f"❌ Copilot API错误: {error_data}")
+                                    logger.error(f"❌ Copilot API错误: {error_data}")
                                     error_code = error_data.get('code', 'Unknown')
                                     error_msg = error_data.get('msg', f'Code {error_code}')
                                     return f"❌ API错误: {error_msg}"
                             except json.JSONDecodeError:
                                 pass
                         
-                        # 正常流式响应解析
-                        content = cls.extract_stream_content(raw_response.splitlines())
+                        content = stream.content
                         
                         # 更新进度
                         if task_status and task_id in task_status:
                             task_status[task_id].progress += 1
                             task_status[task_id].current_step = f"已完成 {task_status[task_id].progress}/{task_status[task_id].total} 个查询"
                         
-                        return content if content.strip() else "⚠️ API响应为空，请检查Cookie是否有效"
+                        if not content.strip():
+                            call.http_status = 502
+                            return "⚠️ API响应为空，请检查Cookie是否有效"
+                        return content
                     else:
-                        print(f"❌ Copilot请求失败: HTTP {resp.status} - {raw_response[:200]}...")
+                        raw_response = await resp.text()
+                        logger.error(f"❌ Copilot请求失败: HTTP {resp.status} - {raw_response[:200]}...")
                         if resp.status == 401:
                             return f"❌ Cookie认证失败: 请更新 {model_config['cookie_env']} Cookie"
                         elif resp.status == 403:
@@ -323,7 +315,7 @@ class CopilotClient:
                         else:
                             return f"❌ 请求失败: HTTP {resp.status}"
             except Exception as e:
-                print(f"❌ Copilot请求异常: {e}")
+                logger.error(f"❌ Copilot请求异常: {e}")
                 return f"❌ 请求异常: {str(e)}"
 
 
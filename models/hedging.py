@@ -0,0 +1,145 @@
+"""
+候选模型请求对冲
+单次答案请求的耗时超过该模型近期耗时的 p95 时，再发出一个相同的请求，
+取先成功返回的结果并取消另一个，缩短少数慢请求拖长的评测尾部时间。
+对冲请求占总请求数的比例受 MODEL_HEDGE_MAX_RATIO 限制（每次评测内所有模型共享）。
+"""
+
+import asyncio
+import threading
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, Tuple
+from .telemetry import CallRecord
+from config import MODEL_HEDGE_MAX_RATIO, MODEL_HEDGE_MIN_DELAY, MODEL_HEDGE_MIN_SAMPLES, MODEL_HEDGE_PERCENTILE
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# 每个模型保留的最近耗时样本数
+LATENCY_WINDOW = 500
+
+
+class LatencyTracker:
+    """按模型记录最近成功请求的服务耗时（不含排队等待），计算对冲阈值（进程内）"""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples: Dict[str, Deque[float]] = {}
+
+    def record(self, model_name: str, call: CallRecord):
+        """记录一次已完成的成功请求"""
+        if not is_successful(call):
+            return
+        seconds = (call.total_time or call.elapsed()) - call.queue_wait
+        with self._lock:
+            self._samples.setdefault(model_name, deque(maxlen=self.window)).append(seconds)
+
+    def threshold(self, model_name: str) -> Optional[float]:
+        """返回该模型的对冲等待时间，样本不足时返回None（不对冲）"""
+        with self._lock:
+            samples = sorted(self._samples.get(model_name, ()))
+        if len(samples) < MODEL_HEDGE_MIN_SAMPLES:
+            return None
+        index = min(len(samples) - 1, int(len(samples) * MODEL_HEDGE_PERCENTILE / 100))
+        return max(MODEL_HEDGE_MIN_DELAY, samples[index])
+
+
+class HedgeStats:
+    """单次评测的对冲预算和统计"""
+
+    def __init__(self, max_ratio: float = MODEL_HEDGE_MAX_RATIO):
+        self.max_ratio = max_ratio
+        self._lock = threading.Lock()
+        self._models: Dict[str, Dict[str, int]] = {}
+        self.requests = 0
+        self.hedged = 0
+
+    def _model(self, model_name: str) -> Dict[str, int]:
+        return self._models.setdefault(model_name, {'requests': 0, 'hedged': 0, 'hedge_wins': 0})
+
+    def on_request(self, model_name: str):
+        with self._lock:
+            self.requests += 1
+            self._model(model_name)['requests'] += 1
+
+    def try_hedge(self, model_name: str) -> bool:
+        """对冲请求数不超过总请求数的 max_ratio 时占用一个名额"""
+        with self._lock:
+            if self.hedged + 1 > self.requests * self.max_ratio:
+                return False
+            self.hedged += 1
+            self._model(model_name)['hedged'] += 1
+            return True
+
+    def on_hedge_win(self, model_name: str):
+        with self._lock:
+            self._model(model_name)['hedge_wins'] += 1
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'hedged': self.hedged,
+                'hedge_wins': sum(stats['hedge_wins'] for stats in self._models.values()),
+                'max_ratio': self.max_ratio,
+                'models': {model_name: dict(stats) for model_name, stats in self._models.items()}
+            }
+
+
+def is_successful(call: CallRecord) -> bool:
+    return call.http_status == 200
+
+
+async def hedged_fetch(fetch: Callable[[CallRecord], Awaitable[str]], model_name: str, idx: int,
+                       stats: HedgeStats) -> Tuple[str, CallRecord]:
+    """执行一次答案请求，超过对冲阈值时发出重复请求，返回 (答案, 采用的请求记录)
+
+    fetch(call) 发出一次请求并把耗时明细写入 call；阈值从请求实际发出（获得并发名额）时开始计算。
+    先完成的请求失败而另一个仍在进行时，继续等待另一个。
+    """
+    stats.on_request(model_name)
+    primary_call = CallRecord(idx, model_name, 'answer')
+    primary_call.request_started = asyncio.Event()
+    primary = asyncio.ensure_future(fetch(primary_call))
+    pending = {primary}
+    calls = {primary: primary_call}
+    hedge = started = None
+
+    try:
+        # 等待请求获得并发名额、实际发出后再计时，排队时间不计入阈值
+        started = asyncio.ensure_future(primary_call.request_started.wait())
+        await asyncio.wait({primary, started}, return_when=asyncio.FIRST_COMPLETED)
+        threshold = None if primary.done() else answer_latency.threshold(model_name)
+        if threshold is not None:
+            await asyncio.wait({primary}, timeout=max(0.0, threshold - (primary_call.request_elapsed() or 0.0)))
+            if not primary.done() and stats.try_hedge(model_name):
+                logger.debug(f"🔀 [{model_name}] 第{idx+1}题请求超过 {threshold:.2f}s，发出对冲请求")
+                hedge_call = CallRecord(idx, model_name, 'answer')
+                hedge = asyncio.ensure_future(fetch(hedge_call))
+                calls[hedge] = hedge_call
+                pending.add(hedge)
+
+        winner = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            succeeded = [task for task in done if is_successful(calls[task])]
+            if succeeded:
+                winner = succeeded[0]
+                break
+            winner = winner or next(iter(done))
+        calls[winner].finish()
+    finally:
+        leftovers = [task for task in (primary, hedge, started) if task is not None]
+        for task in leftovers:
+            if not task.done():
+                task.cancel()
+        await asyncio.gather(*leftovers, return_exceptions=True)
+
+    if winner is hedge:
+        stats.on_hedge_win(model_name)
+    return winner.result(), calls[winner]
+
+
+# 创建全局实例
+answer_latency = LatencyTracker()
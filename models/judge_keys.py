@@ -0,0 +1,225 @@
+"""
+Gemini评测密钥池
+评测请求可以分摊到多个API密钥（和端点）上，每个密钥有独立的自适应限流状态：
+- 按各密钥的剩余容量（1秒内无需排队即可发出的请求数）加权随机选择
+- 收到 429 的密钥按 Retry-After（至少 JUDGE_KEY_QUARANTINE_SECONDS）暂停使用，401/403 暂停更长时间，
+  连续 JUDGE_KEY_ERROR_THRESHOLD 次 5xx 的密钥也暂停 JUDGE_KEY_QUARANTINE_SECONDS
+- 密钥/端点列表读取系统配置 gemini_api_keys / gemini_api_endpoints，未配置时使用环境变量
+  GEMINI_API_KEYS / GEMINI_API_ENDPOINTS；都未配置时退回单个 GOOGLE_API_KEY（与原有行为一致）
+
+端点数量与密钥数量相同时一一对应，否则按顺序循环分配。
+"""
+
+import asyncio
+import hashlib
+import random
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from config import (
+    GOOGLE_API_KEY, GEMINI_API_KEYS, GEMINI_API_ENDPOINTS, GEMINI_RATE_LIMIT_ENABLED, GEMINI_RATE_INITIAL,
+    GEMINI_RATE_MIN, GEMINI_RATE_MAX, GEMINI_RATE_BURST, TASK_STATE_BACKEND, TASK_STATE_DB_PATH,
+    JUDGE_KEY_QUARANTINE_SECONDS, JUDGE_KEY_FORBIDDEN_QUARANTINE_SECONDS, JUDGE_KEY_ERROR_THRESHOLD
+)
+from utils.rate_limiter import AdaptiveRateLimiter, gemini_rate_limiter
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_GEMINI_ENDPOINT = 'https://gemini-proxy.hkgai.net/v1beta/models'
+# 重新读取密钥/端点配置的最短间隔（秒），避免每次评测请求都查询数据库
+CONFIG_REFRESH_SECONDS = 10.0
+
+
+def split_config_list(value: Optional[str]) -> List[str]:
+    """解析逗号或换行分隔的配置列表"""
+    return [item.strip() for item in (value or '').replace('\n', ',').split(',') if item.strip()]
+
+
+def mask_key(key: str) -> str:
+    return f"{key[:4]}...{key[-4:]}" if len(key) > 12 else "***"
+
+
+class JudgeCredential:
+    """密钥池中的一个 (密钥, 端点) 及其限流和隔离状态"""
+
+    def __init__(self, key: str, endpoint: str, limiter: AdaptiveRateLimiter):
+        self.key = key
+        self.endpoint = endpoint.rstrip('/')
+        self.label = mask_key(key)
+        self.limiter = limiter
+        self.quarantined_until = 0.0
+        self.consecutive_errors = 0
+        self._lock = threading.Lock()
+        self._stats = {'requests': 0, 'successes': 0, 'throttled': 0, 'forbidden': 0, 'errors': 0, 'quarantines': 0}
+
+    def is_available(self, now: float = None) -> bool:
+        return (now or time.time()) >= self.quarantined_until
+
+    def quarantine(self, seconds: float, reason: str):
+        with self._lock:
+            until = time.time() + seconds
+            if until <= self.quarantined_until:
+                return
+            self.quarantined_until = until
+            self._stats['quarantines'] += 1
+        logger.warning(f"⚠️ 评测密钥 {self.label} {reason}，暂停使用 {seconds:.0f} 秒")
+
+    def record(self, field: str):
+        with self._lock:
+            self._stats[field] += 1
+            # 只统计连续的5xx，收到其他响应时重新计数
+            if field == 'errors':
+                self.consecutive_errors += 1
+            elif field != 'requests':
+                self.consecutive_errors = 0
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update({
+            'key': self.label,
+            'endpoint': self.endpoint,
+            'rate': round(self.limiter.rate, 3),
+            'headroom': round(self.limiter.headroom(), 2),
+            'quarantined_seconds': round(max(0.0, self.quarantined_until - time.time()), 1)
+        })
+        return stats
+
+
+class JudgeKeyPool:
+    """评测密钥池：按剩余容量分配请求，按响应状态码更新各密钥的限流和隔离状态"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._signature: Optional[Tuple] = None
+        self._loaded_at = 0.0
+        self._credentials: List[JudgeCredential] = []
+        self._by_key: Dict[Tuple[str, str], JudgeCredential] = {}
+
+    def _load_entries(self) -> List[Tuple[str, str]]:
+        from database import db
+        keys = split_config_list(db.get_system_config('gemini_api_keys')) or split_config_list(GEMINI_API_KEYS)
+        endpoints = split_config_list(db.get_system_config('gemini_api_endpoints')) or split_config_list(GEMINI_API_ENDPOINTS)
+        if not endpoints:
+            endpoints = [db.get_system_config('gemini_api_endpoint', DEFAULT_GEMINI_ENDPOINT)]
+        if not keys:
+            keys = [GOOGLE_API_KEY] if GOOGLE_API_KEY else []
+        return [(key, endpoints[i % len(endpoints)]) for i, key in enumerate(keys)]
+
+    def _create_limiter(self, key: str, pooled: bool) -> AdaptiveRateLimiter:
+        if not pooled:
+            # 单个密钥时沿用原有的全局限流器
+            return gemini_rate_limiter
+        fingerprint = hashlib.sha256(key.encode('utf-8')).hexdigest()[:8]
+        return AdaptiveRateLimiter(
+            f'Gemini-{fingerprint}',
+            initial_rate=GEMINI_RATE_INITIAL,
+            min_rate=GEMINI_RATE_MIN,
+            max_rate=GEMINI_RATE_MAX,
+            burst=GEMINI_RATE_BURST,
+            shared_db_path=TASK_STATE_DB_PATH if TASK_STATE_BACKEND == 'sqlite' else None,
+            enabled=GEMINI_RATE_LIMIT_ENABLED
+        )
+
+    def credentials(self) -> List[JudgeCredential]:
+        """当前密钥池（配置变化时重建，未变化的密钥保留限流和隔离状态）"""
+        if time.time() - self._loaded_at < CONFIG_REFRESH_SECONDS:
+            return self._credentials
+        entries = self._load_entries()
+        self._loaded_at = time.time()
+        signature = tuple(entries)
+        with self._lock:
+            if signature != self._signature:
+                pooled = len(entries) > 1
+                by_key = {}
+                for key, endpoint in entries:
+                    credential = self._by_key.get((key, endpoint))
+                    if credential is None or (credential.limiter is gemini_rate_limiter) == pooled:
+                        credential = JudgeCredential(key, endpoint, self._create_limiter(key, pooled))
+                    by_key[(key, endpoint)] = credential
+                self._by_key = by_key
+                self._credentials = list(by_key.values())
+                self._signature = signature
+                if pooled:
+                    logger.info(f"🔑 评测密钥池: {len(entries)} 个密钥，{len(set(e for _, e in entries))} 个端点")
+            return self._credentials
+
+    def size(self) -> int:
+        return len(self.credentials())
+
+    def total_rate(self) -> float:
+        return sum(credential.limiter.rate for credential in self.credentials())
+
+    def for_key(self, api_key: str) -> JudgeCredential:
+        """调用方指定密钥（如请求头中的用户密钥）时不经过密钥池，使用全局限流器"""
+        credential = self._by_key.get((api_key, ''))
+        if credential is None:
+            from database import db
+            endpoint = db.get_system_config('gemini_api_endpoint', DEFAULT_GEMINI_ENDPOINT)
+            credential = JudgeCredential(api_key, endpoint, gemini_rate_limiter)
+            with self._lock:
+                self._by_key.setdefault((api_key, ''), credential)
+        return credential
+
+    def select(self) -> Tuple[Optional[JudgeCredential], float]:
+        """选择一个密钥，返回 (密钥, 0)；全部被隔离时返回 (None, 最早恢复前需等待的秒数)"""
+        credentials = self.credentials()
+        if not credentials:
+            return None, 0.0
+        now = time.time()
+        available = [credential for credential in credentials if credential.is_available(now)]
+        if not available:
+            return None, max(0.1, min(credential.quarantined_until for credential in credentials) - now)
+        weights = [max(credential.limiter.headroom(), 0.01) for credential in available]
+        return random.choices(available, weights=weights)[0], 0.0
+
+    async def acquire(self, api_key: str = None) -> Optional[JudgeCredential]:
+        """选择密钥并等待其限流许可；没有可用密钥时返回None"""
+        if api_key:
+            credential = self.for_key(api_key)
+        else:
+            while True:
+                credential, wait = self.select()
+                if credential is not None or not wait:
+                    break
+                await asyncio.sleep(wait)
+            if credential is None:
+                return None
+        await credential.limiter.acquire()
+        credential.record('requests')
+        return credential
+
+    def report(self, credential: JudgeCredential, status: int, retry_after: Optional[float] = None):
+        """按响应状态码更新密钥状态：成功加速，429/5xx 降速，429/401/403 和连续5xx隔离该密钥"""
+        if status == 200:
+            credential.record('successes')
+            credential.limiter.on_success()
+        elif status == 429:
+            credential.record('throttled')
+            credential.limiter.on_throttle(retry_after)
+            if len(self.credentials()) > 1:
+                credential.quarantine(max(retry_after or 0, JUDGE_KEY_QUARANTINE_SECONDS), "被限流(429)")
+        elif status in (401, 403):
+            credential.record('forbidden')
+            if len(self.credentials()) > 1:
+                credential.quarantine(JUDGE_KEY_FORBIDDEN_QUARANTINE_SECONDS, f"无权限({status})")
+        elif status >= 500:
+            credential.record('errors')
+            credential.limiter.on_throttle(retry_after)
+            if len(self.credentials()) > 1 and credential.consecutive_errors >= JUDGE_KEY_ERROR_THRESHOLD:
+                credential.quarantine(max(retry_after or 0, JUDGE_KEY_QUARANTINE_SECONDS),
+                                      f"连续 {credential.consecutive_errors} 次服务端错误({status})")
+
+    def get_stats(self) -> Dict:
+        credentials = self.credentials()
+        return {
+            'keys': len(credentials),
+            'available': sum(1 for credential in credentials if credential.is_available()),
+            'total_rate': round(sum(credential.limiter.rate for credential in credentials), 3),
+            'credentials': [credential.get_stats() for credential in credentials]
+        }
+
+
+# 创建全局实例
+judge_key_pool = JudgeKeyPool()
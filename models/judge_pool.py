@@ -0,0 +1,176 @@
+"""
+Gemini评测客户端连接池
+所有评测(judge)请求共享一个长生命周期的aiohttp会话，复用keep-alive连接
+"""
+
+import asyncio
+import threading
+import time
+import aiohttp
+from typing import Dict, Optional
+from config import GEMINI_CONNECTOR_LIMIT, GEMINI_KEEPALIVE_TIMEOUT
+from .telemetry import create_trace_config
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class JudgeResponse:
+    """评测请求的响应结果（已完整读取响应体）"""
+
+    def __init__(self, status: int, text: str, elapsed: float, retry_after: Optional[float] = None):
+        self.status = status
+        self.text = text
+        self.elapsed = elapsed
+        self.retry_after = retry_after  # 限流响应的 Retry-After（秒）
+
+
+class JudgeSessionPool:
+    """评测请求连接池
+
+    每个进程维护一个专用事件循环线程和一个共享的ClientSession。
+    评测任务运行在各自的事件循环中，请求统一提交到连接池的事件循环执行，
+    因此同一进程内的所有问题、所有评测任务都复用同一组TCP/TLS连接。
+    """
+
+    def __init__(self, limit: int = GEMINI_CONNECTOR_LIMIT, keepalive_timeout: float = GEMINI_KEEPALIVE_TIMEOUT):
+        self.limit = limit
+        self.keepalive_timeout = keepalive_timeout
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._lock = threading.Lock()
+        self._started_at = None
+
+        # 连接统计（只在连接池事件循环中修改，无需加锁）
+        self._stats = {
+            'requests': 0,
+            'connections_created': 0,
+            'connections_reused': 0,
+            'sessions_created': 0,
+            'errors': 0
+        }
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        """按需启动连接池专用的事件循环线程"""
+        with self._lock:
+            if self._loop is None or self._loop.is_closed():
+                ready = threading.Event()
+
+                def run_loop():
+                    loop = asyncio.new_event_loop()
+                    asyncio.set_event_loop(loop)
+                    self._loop = loop
+                    ready.set()
+                    loop.run_forever()
+
+                self._thread = threading.Thread(target=run_loop, name='judge-session-pool', daemon=True)
+                self._thread.start()
+                ready.wait()
+                self._started_at = time.time()
+            return self._loop
+
+    def _create_trace_config(self) -> aiohttp.TraceConfig:
+        """创建用于统计连接复用情况的TraceConfig"""
+        trace_config = aiohttp.TraceConfig()
+
+        async def on_request_start(session, context, params):
+            self._stats['requests'] += 1
+
+        async def on_connection_create_end(session, context, params):
+            self._stats['connections_created'] += 1
+
+        async def on_connection_reuseconn(session, context, params):
+            self._stats['connections_reused'] += 1
+
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        return trace_config
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """获取共享会话（必须在连接池事件循环中调用）"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                keepalive_timeout=self.keepalive_timeout
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                trace_configs=[self._create_trace_config(), create_trace_config()]
+            )
+            self._stats['sessions_created'] += 1
+            logger.info(f"🔌 [评测连接池] 创建共享会话，连接上限: {self.limit}，keep-alive: {self.keepalive_timeout}s")
+        return self._session
+
+    async def _post(self, url: str, headers: Dict, payload: Dict, timeout: float, trace_ctx=None) -> JudgeResponse:
+        """在连接池事件循环中发送请求并读取完整响应"""
+        session = self._get_session()
+        start = time.time()
+        try:
+            async with session.post(url, headers=headers, json=payload,
+                                    timeout=aiohttp.ClientTimeout(total=timeout),
+                                    trace_request_ctx=trace_ctx) as response:
+                text = await response.text()
+                retry_after = None
+                try:
+                    retry_after = float(response.headers.get('Retry-After', ''))
+                except ValueError:
+                    pass
+                return JudgeResponse(response.status, text, time.time() - start, retry_after)
+        except Exception:
+            self._stats['errors'] += 1
+            raise
+
+    async def post(self, url: str, headers: Dict, payload: Dict, timeout: float = 60, trace_ctx=None) -> JudgeResponse:
+        """发送评测请求，可在任意事件循环中await
+
+        取消调用方的任务会同时取消连接池中正在进行的请求。
+        trace_ctx 为 CallRecord 时记录连接耗时和响应头到达时间。
+        """
+        loop = self._ensure_loop()
+        future = asyncio.run_coroutine_threadsafe(self._post(url, headers, payload, timeout, trace_ctx), loop)
+        return await asyncio.wrap_future(future)
+
+    def get_stats(self) -> Dict:
+        """获取连接池统计信息"""
+        stats = dict(self._stats)
+        active = 0
+        idle = 0
+
+        session = self._session
+        if session is not None and not session.closed:
+            connector = session.connector
+            # aiohttp未公开连接计数接口，这里读取连接器内部状态
+            active = len(getattr(connector, '_acquired', ()))
+            idle = sum(len(conns) for conns in getattr(connector, '_conns', {}).values())
+
+        connections_total = stats['connections_created'] + stats['connections_reused']
+        stats.update({
+            'limit': self.limit,
+            'keepalive_timeout': self.keepalive_timeout,
+            'active_connections': active,
+            'idle_connections': idle,
+            'open_connections': active + idle,
+            'reuse_ratio': round(stats['connections_reused'] / connections_total, 4) if connections_total else 0.0,
+            'uptime_seconds': round(time.time() - self._started_at, 1) if self._started_at else 0
+        })
+        return stats
+
+    def close(self):
+        """关闭共享会话和事件循环线程"""
+        with self._lock:
+            loop = self._loop
+            if loop is None or loop.is_closed():
+                return
+            if self._session is not None and not self._session.closed:
+                asyncio.run_coroutine_threadsafe(self._session.close(), loop).result(timeout=5)
+            loop.call_soon_threadsafe(loop.stop)
+            self._thread.join(timeout=5)
+            loop.close()
+            self._loop = None
+            self._session = None
+
+
+# 创建全局实例
+judge_pool = JudgeSessionPool()
@@ -4,11 +4,14 @@ Legacy AI模型客户端
 """
 
 import os
-import json
 import uuid
+import time
 import asyncio
 import aiohttp
 from typing import Dict, List, Optional
+from .stream_reader import read_sse_answer, get_max_answer_chars
+from .telemetry import CallRecord
+from utils.cancellation import get_task_token
 
 
 class LegacyClient:
@@ -21,6 +24,7 @@ class LegacyClient:
             "url": "https://chat.hkchat.app/goapi/v1/chat/stream",
             "model": "HKGAI-V1",
             "token_env": "ARK_API_KEY_HKGAI_V1",
+            "max_concurrency": 5,
             "headers_template": {
                 "Accept": "text/event-stream",
                 "Content-Type": "application/json"
@@ -31,6 +35,7 @@ class LegacyClient:
             "url": "https://test.hkchat.app/goapi/v1/chat/stream",
             "model": "HKGAI-V2", 
             "token_env": "ARK_API_KEY_HKGAI_V2",
+            "max_concurrency": 5,
             "headers_template": {
                 "Accept": "text/event-stream",
                 "Content-Type": "application/json"
@@ -77,37 +82,16 @@ class LegacyClient:
         return True, ""
     
     @staticmethod
-    def extract_stream_content(stream: List[str]) -> str:
-        """提取Legacy流式响应的内容"""
-        buffer = []
-        current_event = None
-
-        for raw_line in stream:
-            line = raw_line.strip()
-            if not line:
-                continue
-
-            if line.startswith("event:"):
-                current_event = line[len("event:"):].strip()
-                continue
-
-            if line.startswith("data:") and current_event == "message":
-                json_part = line[len("data:"):].strip()
-                try:
-                    payload = json.loads(json_part)
-                    content = payload.get("content", "")
-                    if content:
-                        buffer.append(content)
-                except json.JSONDecodeError:
-                    continue
-
-        return "".join(buffer)
+    def extract_delta(payload: Dict) -> str:
+        """提取Legacy流式响应 message 事件中的文本片段"""
+        return payload.get("content", "")
     
     @classmethod
     async def fetch_answer(cls, session: aiohttp.ClientSession, query: str, model_name: str,
                           idx: int, sem_model: asyncio.Semaphore, task_id: str,
-                          task_status: Dict = None, request_headers: Dict = None) -> str:
-        """获取Legacy模型的答案"""
+                          task_status: Dict = None, request_headers: Dict = None,
+                          call: CallRecord = None) -> str:
+        """获取Legacy模型的答案，call 用于记录本次请求的耗时明细"""
         
         # 获取模型配置
         model_config = cls.get_model_config(model_name)
@@ -118,7 +102,9 @@ class LegacyClient:
         token = os.getenv(model_config["token_env"])
         if not token and request_headers:
             model_name_key = model_config["model"]
-            token = request_headers.get(f'X-{model_name_key.replace("-", "-")}-Key')
+            # 任务保存的请求头名称为小写
+            header_name = f'X-{model_name_key}-Key'
+            token = request_headers.get(header_name) or request_headers.get(header_name.lower())
         
         if not token:
             return f"错误：未配置 {model_config['token_env']} API密钥"
@@ -133,12 +119,24 @@ class LegacyClient:
             "chat_id": str(uuid.uuid4())
         }
 
+        call = call or CallRecord(idx, model_name, 'answer')
         async with sem_model:
+            # 任务暂停时不再发出新请求，等待恢复
+            await get_task_token(task_id).wait_if_paused()
+            call.queue_wait = call.elapsed()
             try:
-                async with session.post(model_config["url"], headers=headers, json=payload, timeout=60) as resp:
+                started_at = time.monotonic()
+                async with session.post(model_config["url"], headers=headers, json=payload, timeout=60,
+                                        trace_request_ctx=call) as resp:
+                    call.http_status = resp.status
                     if resp.status == 200:
-                        raw = await resp.text()
-                        content = cls.extract_stream_content(raw.splitlines())
+                        stream = await read_sse_answer(
+                            resp, model_name, "message", cls.extract_delta,
+                            max_chars=get_max_answer_chars(model_config), started_at=started_at
+                        )
+                        call.ttft = stream.first_token_seconds
+                        call.bytes = stream.bytes_read
+                        content = stream.content
                         
                         # 更新进度
                         if task_status and task_id in task_status:
@@ -8,6 +8,11 @@ import aiohttp
 from typing import Dict, List, Optional, Tuple
 from .copilot_client import copilot_client
 from .legacy_client import legacy_client
+from .answer_store import AnswerStore, get_model_fingerprint
+from .telemetry import CallRecord, CallTelemetry, create_trace_config
+from .hedging import HedgeStats, answer_latency, hedged_fetch
+from config import MODEL_CONCURRENT_REQUESTS
+from utils.token_budget import estimate_tokens
 
 
 class ModelFactory:
@@ -77,56 +82,158 @@ class ModelFactory:
                 return False, error_msg
         return True, ""
     
+    def create_answer_store(self, db, selected_models: List[str], reuse_cache: bool = False,
+                            preloaded: Dict[str, Dict[str, str]] = None) -> AnswerStore:
+        """创建单次评测使用的答案存储"""
+        fingerprints = {
+            model_name: get_model_fingerprint(self.get_model_config(model_name))
+            for model_name in selected_models
+        }
+        return AnswerStore(db, fingerprints, reuse_cache=reuse_cache, preloaded=preloaded)
+    
     async def fetch_model_answer(self, session: aiohttp.ClientSession, query: str, 
                                 model_name: str, idx: int, sem_model: asyncio.Semaphore, 
                                 task_id: str, task_status: Dict = None, 
-                                request_headers: Dict = None) -> str:
-        """统一的模型答案获取入口"""
+                                request_headers: Dict = None, answer_store: AnswerStore = None,
+                                telemetry: CallTelemetry = None, hedge_stats: HedgeStats = None) -> str:
+        """统一的模型答案获取入口，优先使用答案存储中的已有答案
         
-        model_type = self.get_model_type(model_name)
+        提供 telemetry 时记录实际发出的请求的耗时明细。
+        提供 hedge_stats 时启用请求对冲：耗时超过该模型 p95 的请求会再发出一次，取先返回的结果。
+        """
         
+        if answer_store is not None:
+            stored_answer = answer_store.lookup(model_name, query)
+            if stored_answer is not None:
+                if task_status and task_id in task_status:
+                    task_status[task_id].progress += 1
+                    task_status[task_id].current_step = f"已完成 {task_status[task_id].progress}/{task_status[task_id].total} 个查询"
+                return stored_answer
+        
+        model_type = self.get_model_type(model_name)
         if model_type == 'copilot':
-            return await copilot_client.fetch_answer(
-                session, query, model_name, idx, sem_model, task_id, task_status
-            )
+            def fetch(call: CallRecord, progress: Optional[Dict]):
+                return copilot_client.fetch_answer(
+                    session, query, model_name, idx, sem_model, task_id, progress, call
+                )
         elif model_type == 'legacy':
-            return await legacy_client.fetch_answer(
-                session, query, model_name, idx, sem_model, task_id, task_status, request_headers
-            )
+            def fetch(call: CallRecord, progress: Optional[Dict]):
+                return legacy_client.fetch_answer(
+                    session, query, model_name, idx, sem_model, task_id, progress, request_headers, call
+                )
         else:
             return f"不支持的模型类型: {model_name}"
+        
+        if hedge_stats is not None:
+            # 对冲的两个请求都可能完成，进度只按采用的结果更新一次
+            answer, call = await hedged_fetch(lambda c: fetch(c, None), model_name, idx, hedge_stats)
+            if call.http_status == 200 and task_status and task_id in task_status:
+                task_status[task_id].progress += 1
+                task_status[task_id].current_step = f"已完成 {task_status[task_id].progress}/{task_status[task_id].total} 个查询"
+        else:
+            call = CallRecord(idx, model_name, 'answer')
+            answer = await fetch(call, task_status)
+            call.finish()
+        answer_latency.record(model_name, call)
+        
+        if call.http_status == 200 and not (call.input_tokens or call.output_tokens):
+            # 候选模型的流式接口不返回用量，按字符数估算
+            call.input_tokens = estimate_tokens(query)
+            call.output_tokens = estimate_tokens(answer)
+            call.tokens_estimated = True
+        
+        if telemetry is not None:
+            telemetry.record(call)
+        
+        if answer_store is not None:
+            answer_store.save(model_name, query, answer)
+        return answer
+    
+    def get_model_concurrency(self, model_name: str) -> int:
+        """获取模型的最大并发请求数（模型配置中的 max_concurrency，缺省使用全局配置）"""
+        model_config = self.get_model_config(model_name) or {}
+        try:
+            return max(1, int(model_config.get("max_concurrency", MODEL_CONCURRENT_REQUESTS)))
+        except (ValueError, TypeError):
+            return MODEL_CONCURRENT_REQUESTS
+    
+    def create_model_semaphores(self, selected_models: List[str]) -> Dict[str, asyncio.Semaphore]:
+        """为每个模型创建独立的并发控制信号量，不同模型之间互不占用名额"""
+        return {
+            model_name: asyncio.Semaphore(self.get_model_concurrency(model_name))
+            for model_name in selected_models
+        }
+    
+    def create_session(self, selected_models: List[str] = None) -> aiohttp.ClientSession:
+        """创建模型答案获取使用的HTTP会话"""
+        # 多个模型可能部署在同一主机上，连接上限需覆盖它们的并发总和
+        total_concurrency = sum(self.get_model_concurrency(m) for m in (selected_models or []))
+        connector = aiohttp.TCPConnector(limit_per_host=max(10, total_concurrency))
+        timeout = aiohttp.ClientTimeout(total=60)
+        return aiohttp.ClientSession(connector=connector, timeout=timeout, trace_configs=[create_trace_config()])
+    
+    async def get_query_answers(self, session: aiohttp.ClientSession, query: str, idx: int,
+                                selected_models: List[str], sem_models: Dict[str, asyncio.Semaphore],
+                                task_id: str, task_status: Dict = None,
+                                request_headers: Dict = None, answer_store: AnswerStore = None,
+                                telemetry: CallTelemetry = None, hedge_stats: HedgeStats = None) -> Dict[str, str]:
+        """并发获取单个问题在所有选中模型上的答案（流水线评测使用）"""
+        answers = await asyncio.gather(*[
+            self.fetch_model_answer(
+                session, query, model_name, idx, sem_models[model_name], task_id, task_status,
+                request_headers, answer_store, telemetry, hedge_stats
+            )
+            for model_name in selected_models
+        ])
+        return dict(zip(selected_models, answers))
     
     async def get_multiple_model_answers(self, queries: List[str], selected_models: List[str], 
                                        task_id: str, task_status: Dict = None,
-                                       request_headers: Dict = None) -> Dict[str, List[str]]:
-        """获取多个模型的答案"""
-        connector = aiohttp.TCPConnector(limit_per_host=10)
-        timeout = aiohttp.ClientTimeout(total=60)
-        sem_model = asyncio.Semaphore(5)  # 控制并发数
+                                       request_headers: Dict = None,
+                                       answer_store: AnswerStore = None,
+                                       telemetry: CallTelemetry = None,
+                                       indices: List[int] = None,
+                                       hedge_stats: HedgeStats = None) -> Dict[str, List[str]]:
+        """获取多个模型的答案
+        
+        所有 (模型, 问题) 组合同时调度，每个模型使用各自的并发名额，
+        总耗时取决于最慢的模型，而不是各模型耗时之和。
+        提供 answer_store 时已有答案直接复用，不再请求模型。
+        indices 为各问题在数据集中的序号（只获取部分题目时使用），缺省为 0..n-1。
+        提供 hedge_stats 时对慢请求发出对冲请求并统计。
+        """
+        indices = indices if indices is not None else list(range(len(queries)))
+        # 过滤不支持的模型
+        models = [model_name for model_name in selected_models if self.get_model_type(model_name)]
+        sem_models = self.create_model_semaphores(models)
 
         results = {model: [] for model in selected_models}
         
         if task_status and task_id in task_status:
-            task_status[task_id].total = len(queries) * len(selected_models)
+            task_status[task_id].total = len(queries) * len(models)
             task_status[task_id].status = "获取模型答案中"
 
-        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
-            # 为每个模型创建任务
-            for model_name in selected_models:
-                # 验证模型是否支持
-                if not self.get_model_type(model_name):
-                    continue
-                    
-                tasks = []
-                
-                for i, query in enumerate(queries):
-                    tasks.append(self.fetch_model_answer(
-                        session, query, model_name, i, sem_model, task_id, task_status, request_headers
-                    ))
-                
-                # 获取该模型的所有答案
+        async with self.create_session(models) as session:
+            tasks = [
+                self.fetch_model_answer(
+                    session, query, model_name, indices[i], sem_models[model_name], task_id, task_status,
+                    request_headers, answer_store, telemetry, hedge_stats
+                )
+                for model_name in models
+                for i, query in enumerate(queries)
+            ]
+            try:
                 answers = await asyncio.gather(*tasks)
-                results[model_name] = answers
+            finally:
+                # 任务中途取消时也写回已获取的答案
+                if answer_store is not None:
+                    answer_store.flush()
+            if telemetry is not None:
+                telemetry.flush()
+            
+            # 按模型拆分答案，保持问题顺序
+            for m, model_name in enumerate(models):
+                results[model_name] = answers[m * len(queries):(m + 1) * len(queries)]
 
         return results
 
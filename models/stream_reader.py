@@ -0,0 +1,173 @@
+"""
+流式响应读取
+按字节到达的顺序增量解析SSE(event:/data:)帧，不再等待完整响应体，
+支持答案长度上限、收到结束事件后立即关闭连接，并记录首字延迟(TTFT)
+"""
+
+import json
+import threading
+import time
+import aiohttp
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+from config import MODEL_MAX_ANSWER_CHARS
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# 非SSE内容（如HTTP 200中返回的错误JSON）最多保留的字符数
+MAX_PREAMBLE_CHARS = 4096
+
+
+class StreamResult:
+    """一次流式读取的结果"""
+
+    def __init__(self):
+        self.content = ""
+        self.preamble = ""  # 出现在SSE帧之外的文本（错误响应等）
+        self.first_token_seconds: Optional[float] = None
+        self.elapsed = 0.0
+        self.bytes_read = 0
+        self.finished = False  # 收到结束事件
+        self.truncated = False  # 超过答案长度上限被截断
+
+
+async def iter_stream_lines(resp: aiohttp.ClientResponse, result: Optional[StreamResult] = None) -> AsyncIterator[str]:
+    """按行增量读取响应体（按字节切分，避免多字节字符被拆开）"""
+    buffer = bytearray()
+    async for chunk in resp.content.iter_any():
+        if result is not None:
+            result.bytes_read += len(chunk)
+        buffer.extend(chunk)
+        start = 0
+        while True:
+            end = buffer.find(b"\n", start)
+            if end < 0:
+                break
+            yield buffer[start:end].decode("utf-8", errors="replace").rstrip("\r")
+            start = end + 1
+        del buffer[:start]
+    if buffer:
+        yield buffer.decode("utf-8", errors="replace").rstrip("\r")
+
+
+async def read_sse_answer(resp: aiohttp.ClientResponse, model_name: str, content_event: str,
+                          extract: Callable[[Dict[str, Any]], str], finish_event: Optional[str] = None,
+                          max_chars: Optional[int] = None, started_at: Optional[float] = None) -> StreamResult:
+    """增量读取SSE答案流
+
+    content_event 事件的 data 经 extract(payload) 取出文本片段；
+    收到 finish_event 或答案超过 max_chars 时停止读取并关闭连接。
+    started_at 为发送请求的时间(time.monotonic())，用于计算首字延迟。
+    """
+    result = StreamResult()
+    started_at = started_at if started_at is not None else time.monotonic()
+    buffer = []
+    length = 0
+    current_event = None
+
+    async for raw_line in iter_stream_lines(resp, result):
+        line = raw_line.strip()
+        if not line:
+            continue
+
+        if line.startswith("event:"):
+            current_event = line[len("event:"):].strip()
+            continue
+
+        if not line.startswith("data:"):
+            if len(result.preamble) < MAX_PREAMBLE_CHARS:
+                result.preamble += raw_line + "\n"
+            continue
+
+        if finish_event and current_event == finish_event:
+            result.finished = True
+            break
+
+        if current_event != content_event:
+            continue
+
+        json_part = line[len("data:"):].strip()
+        try:
+            piece = extract(json.loads(json_part))
+        except json.JSONDecodeError as e:
+            logger.warning(f"⚠️ JSON解析失败: {e}, 内容: {json_part[:100]}...")
+            continue
+        except (KeyError, IndexError, TypeError, AttributeError) as e:
+            logger.warning(f"⚠️ 数据结构解析失败: {e}")
+            continue
+        if not piece:
+            continue
+
+        if result.first_token_seconds is None:
+            result.first_token_seconds = time.monotonic() - started_at
+        buffer.append(piece)
+        length += len(piece)
+        if max_chars and length >= max_chars:
+            result.truncated = True
+            break
+
+    if result.finished or result.truncated:
+        # 不再读取剩余数据，直接关闭连接（不放回连接池）
+        resp.close()
+
+    result.content = "".join(buffer)
+    if result.truncated:
+        result.content = result.content[:max_chars]
+        logger.info(f"✂️ [{model_name}] 答案超过长度上限 {max_chars} 字符，已截断")
+    result.elapsed = time.monotonic() - started_at
+    stream_stats.record(model_name, result)
+    return result
+
+
+def get_max_answer_chars(model_config: Dict) -> int:
+    """模型答案长度上限（模型配置中的 max_answer_chars，缺省使用全局配置，0表示不限制）"""
+    try:
+        return max(0, int(model_config.get("max_answer_chars", MODEL_MAX_ANSWER_CHARS)))
+    except (ValueError, TypeError):
+        return MODEL_MAX_ANSWER_CHARS
+
+
+class StreamStats:
+    """按模型汇总流式请求的首字延迟和耗时（进程内）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._models: Dict[str, Dict] = {}
+
+    def record(self, model_name: str, result: StreamResult):
+        with self._lock:
+            stats = self._models.setdefault(model_name, {
+                'requests': 0,
+                'ttft_count': 0,
+                'ttft_total': 0.0,
+                'ttft_max': 0.0,
+                'elapsed_total': 0.0,
+                'finished': 0,
+                'truncated': 0
+            })
+            stats['requests'] += 1
+            stats['elapsed_total'] += result.elapsed
+            stats['finished'] += int(result.finished)
+            stats['truncated'] += int(result.truncated)
+            if result.first_token_seconds is not None:
+                stats['ttft_count'] += 1
+                stats['ttft_total'] += result.first_token_seconds
+                stats['ttft_max'] = max(stats['ttft_max'], result.first_token_seconds)
+
+    def get_stats(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {
+                model_name: {
+                    'requests': stats['requests'],
+                    'avg_ttft_seconds': round(stats['ttft_total'] / stats['ttft_count'], 3) if stats['ttft_count'] else None,
+                    'max_ttft_seconds': round(stats['ttft_max'], 3),
+                    'avg_elapsed_seconds': round(stats['elapsed_total'] / stats['requests'], 3),
+                    'finished': stats['finished'],
+                    'truncated': stats['truncated']
+                }
+                for model_name, stats in self._models.items()
+            }
+
+
+# 创建全局实例
+stream_stats = StreamStats()
@@ -0,0 +1,160 @@
+"""
+调用遥测
+记录每次候选模型答案请求和Gemini评测请求的耗时明细：
+排队等待、建立连接、首字延迟(TTFT)、总耗时、响应字节数、重试次数、HTTP状态码和token用量。
+记录按任务缓冲后批量写入 call_telemetry 表，token用量同时按模型和调用类型累加到 token_usage 表，
+结果保存后关联到 result_id。
+"""
+
+import asyncio
+import threading
+import time
+import aiohttp
+from typing import Callable, Dict, List, Optional
+
+# 缓冲的记录数达到该值时写入数据库
+TELEMETRY_FLUSH_SIZE = 100
+
+
+class CallRecord:
+    """单次调用的遥测数据（时间单位：秒）
+
+    total_time 为调用方视角的端到端耗时，包含 queue_wait；
+    connect_time 只在新建连接时不为0，复用keep-alive连接时为0。
+    """
+
+    def __init__(self, row_index: int, model_name: str, call_type: str, item_count: int = 1):
+        self.row_index = row_index
+        self.model_name = model_name
+        self.call_type = call_type  # answer: 候选模型答案; judge: Gemini评测
+        self.item_count = item_count  # 批量评测时一次请求包含的题数
+        self.queue_wait = 0.0
+        self.connect_time = 0.0
+        self.ttft: Optional[float] = None
+        self.total_time = 0.0
+        self.bytes = 0
+        self.retries = 0
+        self.http_status: Optional[int] = None
+        self.cached = False  # 命中缓存，没有实际发出请求
+        self.input_tokens = 0  # 所有尝试的token用量之和
+        self.output_tokens = 0
+        self.tokens_estimated = False  # 接口未返回用量，按字符数估算
+        self.started_at = time.monotonic()
+        self.request_started: Optional[asyncio.Event] = None  # 设置后在请求实际发出时被set
+        self._request_started_at: Optional[float] = None
+        self._connect_started_at: Optional[float] = None
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    def request_elapsed(self) -> Optional[float]:
+        """请求实际发出后经过的时间，尚未发出时返回None"""
+        if self._request_started_at is None:
+            return None
+        return time.monotonic() - self._request_started_at
+
+    def finish(self):
+        self.total_time = self.elapsed()
+
+    def to_row(self) -> tuple:
+        return (self.row_index, self.model_name, self.call_type, self.item_count,
+                round(self.queue_wait, 4), round(self.connect_time, 4),
+                round(self.ttft, 4) if self.ttft is not None else None,
+                round(self.total_time, 4), self.bytes, self.retries, self.http_status,
+                self.input_tokens, self.output_tokens, int(self.tokens_estimated))
+
+
+def create_trace_config() -> aiohttp.TraceConfig:
+    """创建记录连接耗时和响应头到达时间的TraceConfig
+
+    请求时通过 trace_request_ctx=CallRecord 传入记录对象，未传入时不做任何处理。
+    """
+    trace_config = aiohttp.TraceConfig()
+
+    def get_call(context) -> Optional[CallRecord]:
+        call = context.trace_request_ctx
+        return call if isinstance(call, CallRecord) else None
+
+    async def on_request_start(session, context, params):
+        call = get_call(context)
+        if call:
+            call._request_started_at = time.monotonic()
+            if call.request_started is not None:
+                call.request_started.set()
+
+    async def on_connection_create_start(session, context, params):
+        call = get_call(context)
+        if call:
+            call._connect_started_at = time.monotonic()
+
+    async def on_connection_create_end(session, context, params):
+        call = get_call(context)
+        if call and call._connect_started_at is not None:
+            call.connect_time += time.monotonic() - call._connect_started_at
+
+    async def on_request_end(session, context, params):
+        # 响应头到达：非流式请求以此作为首字节时间
+        call = get_call(context)
+        if call and call._request_started_at is not None:
+            call.ttft = time.monotonic() - call._request_started_at
+
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_connection_create_start.append(on_connection_create_start)
+    trace_config.on_connection_create_end.append(on_connection_create_end)
+    trace_config.on_request_end.append(on_request_end)
+    return trace_config
+
+
+class CallTelemetry:
+    """单个评测任务的调用遥测收集器
+
+    context 为写入 token_usage 的归属信息（user_id、project_id、dataset_file、prompt_version）。
+    提供 on_usage 时每次写入token用量后调用（用于运行中检查预算）。
+    """
+
+    def __init__(self, db, task_id: str, context: Dict = None, on_usage: Callable[[], None] = None):
+        self.db = db
+        self.task_id = task_id
+        self.context = context or {}
+        self.on_usage = on_usage
+        self._buffer: List[tuple] = []
+        self._usage: Dict[tuple, List[int]] = {}
+        self._lock = threading.Lock()
+
+    def _add_usage(self, call: CallRecord):
+        usage = self._usage.setdefault((call.model_name, call.call_type), [0, 0, 0, 0])
+        usage[0] += 1
+        usage[1] += call.input_tokens
+        usage[2] += call.output_tokens
+        if call.tokens_estimated:
+            usage[3] += call.input_tokens + call.output_tokens
+
+    def _write(self, rows: List[tuple], usage: Dict[tuple, List[int]]):
+        if rows:
+            self.db.save_call_telemetry(self.task_id, rows)
+        if usage:
+            self.db.add_token_usage(self.task_id, self.context,
+                                    [key + tuple(values) for key, values in usage.items()])
+            if self.on_usage is not None:
+                self.on_usage()
+
+    def record(self, call: CallRecord):
+        """记录一次已完成的调用（命中缓存的调用不记录）"""
+        if call.cached:
+            return
+        if not call.total_time:
+            call.finish()
+        with self._lock:
+            self._buffer.append(call.to_row())
+            self._add_usage(call)
+            if len(self._buffer) < TELEMETRY_FLUSH_SIZE:
+                return
+            rows, self._buffer = self._buffer, []
+            usage, self._usage = self._usage, {}
+        self._write(rows, usage)
+
+    def flush(self):
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+            usage, self._usage = self._usage, {}
+        self._write(rows, usage)
@@ -23,10 +23,12 @@ def get_result_analysis(result_id):
         result_file = detail['result']['result_file']
         
         # 构建评测数据
+        from database import db
         evaluation_data = {
             'start_time': detail['result'].get('start_time'),
             'end_time': detail['result'].get('end_time'),
-            'question_count': detail['result'].get('total_rows', 0)
+            'question_count': detail['result'].get('total_rows', 0),
+            'call_telemetry': db.get_call_telemetry(result_id)
         }
         
         # 执行分析
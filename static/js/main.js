@@ -1298,7 +1298,73 @@ function startProgressMonitoring() {
 
     console.log(`🔄 开始监控任务进度: ${currentTaskId}`);
     
-    // 清除之前可能存在的定时器
+    // 清除之前可能存在的定时器和事件流
+    stopProgressMonitoring();
+    
+    // 优先使用SSE推送进度，不支持或连接失败时回退到轮询
+    if (window.EventSource) {
+        startProgressEventStream(currentTaskId);
+    } else {
+        startProgressPolling();
+    }
+}
+
+// 停止进度监控
+function stopProgressMonitoring() {
+    if (window.progressInterval) {
+        clearInterval(window.progressInterval);
+        window.progressInterval = null;
+    }
+    if (window.progressEventSource) {
+        window.progressEventSource.close();
+        window.progressEventSource = null;
+    }
+}
+
+// 通过SSE接收进度：首个status事件为完整状态，之后的progress事件只包含变化的字段
+function startProgressEventStream(taskId) {
+    const source = new EventSource(`/api/tasks/${taskId}/events`);
+    window.progressEventSource = source;
+    let currentStatus = null;
+    
+    source.addEventListener('status', (event) => {
+        currentStatus = JSON.parse(event.data);
+        updateProgressDisplay(currentStatus);
+    });
+    
+    source.addEventListener('progress', (event) => {
+        if (!currentStatus) {
+            return;
+        }
+        currentStatus = Object.assign(currentStatus, JSON.parse(event.data));
+        updateProgressDisplay(currentStatus);
+    });
+    
+    source.addEventListener('done', (event) => {
+        stopProgressMonitoring();
+        const status = JSON.parse(event.data);
+        updateProgressDisplay(status);
+        if (status.status === '完成') {
+            console.log('✅ 任务完成，停止进度监控');
+            onEvaluationComplete(status);
+        } else {
+            console.log('❌ 任务失败，停止进度监控');
+            onEvaluationFailed(status);
+        }
+    });
+    
+    source.onerror = () => {
+        // 连接被服务器定期关闭时浏览器会自动重连；被拒绝（如任务状态丢失）时回退到轮询
+        if (source.readyState === EventSource.CLOSED && window.progressEventSource === source) {
+            console.warn('⚠️ 进度事件流不可用，回退到轮询');
+            window.progressEventSource = null;
+            startProgressPolling();
+        }
+    };
+}
+
+// 轮询任务状态（SSE不可用时使用）
+function startProgressPolling() {
     if (window.progressInterval) {
         clearInterval(window.progressInterval);
     }
@@ -1378,7 +1444,7 @@ function updateProgressDisplay(status) {
     progressPercent.textContent = percentage + '%';
     progressDetail.textContent = status.current_step;
     currentStatus.textContent = status.status;
-    elapsedTime.textContent = status.elapsed_time;
+    elapsedTime.textContent = status.eta_seconds ? `${status.elapsed_time}（预计剩余 ${Math.ceil(status.eta_seconds)}秒）` : status.elapsed_time;
     evalModeDisplay.textContent = status.evaluation_mode === 'objective' ? '客观题评测' : '主观题评测';
     selectedModelsDisplay.textContent = status.selected_models.join(', ');
 
@@ -2795,6 +2861,19 @@ function displayRunningTasks(tasks) {
                                 style="padding: 4px 8px; font-size: 12px; min-width: 60px;">
                             <i class="fas fa-external-link-alt"></i> 进入
                         </button>
+                        ${task.is_active ? (task.paused ? `
+                        <button class="btn btn-sm btn-success" onclick="resumeTask('${task.task_id}')" 
+                                style="padding: 4px 8px; font-size: 12px;">
+                            <i class="fas fa-play"></i> 继续
+                        </button>` : `
+                        <button class="btn btn-sm btn-warning" onclick="pauseTask('${task.task_id}')" 
+                                style="padding: 4px 8px; font-size: 12px;">
+                            <i class="fas fa-pause"></i> 暂停
+                        </button>`) : `
+                        <button class="btn btn-sm btn-success" onclick="resumeTask('${task.task_id}')" 
+                                style="padding: 4px 8px; font-size: 12px;">
+                            <i class="fas fa-redo"></i> 续跑
+                        </button>`}
                         <button class="btn btn-sm btn-danger" onclick="cancelTask('${task.task_id}')" 
                                 style="padding: 4px 8px; font-size: 12px;">
                             <i class="fas fa-trash"></i> 删除
@@ -2851,6 +2930,55 @@ async function connectToTask(taskId) {
 }
 
 
+// 续跑中断的任务（已完成的题目会被跳过）
+async function resumeTask(taskId) {
+    try {
+        const response = await fetch(`/api/tasks/${taskId}/resume`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            }
+        });
+        
+        const result = await response.json();
+        
+        if (result.success) {
+            showSuccess(result.resumed
+                ? `任务已恢复，已完成 ${result.completed}/${result.total} 题`
+                : `任务已续跑，已完成 ${result.completed}/${result.total} 题`);
+            await connectToTask(taskId);
+        } else {
+            showError(result.error || '续跑任务失败');
+        }
+    } catch (error) {
+        console.error('续跑任务失败:', error);
+        showError('续跑任务失败: ' + error.message);
+    }
+}
+
+// 暂停任务（正在进行的请求完成后不再开始新题目）
+async function pauseTask(taskId) {
+    try {
+        const response = await fetch(`/api/tasks/${taskId}/pause`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            }
+        });
+        
+        const result = await response.json();
+        
+        if (result.success) {
+            showSuccess('任务已暂停');
+            setTimeout(() => loadRunningTasks(), 1000);
+        } else {
+            showError(result.error || '暂停任务失败');
+        }
+    } catch (error) {
+        console.error('暂停任务失败:', error);
+        showError('暂停任务失败: ' + error.message);
+    }
+}
 
 // 取消/删除任务
 async function cancelTask(taskId) {
@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试公共配置：把仓库根目录加入导入路径；需要 app 的测试通过 app_module 在临时目录中导入。
+所有测试都不访问网络。
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+# 任务状态库（全局限流器的共享状态也保存在其中）写到临时目录，不在仓库中留下文件
+os.environ.setdefault('TASK_STATE_DB_PATH', os.path.join(tempfile.mkdtemp(prefix='model_eval_tests_'), 'task_state.db'))
+
+
+@pytest.fixture(scope='session')
+def app_module(tmp_path_factory):
+    """在临时目录中导入 app（数据库和结果文件都写到临时目录，不启动内置评测调度）"""
+    workdir = tmp_path_factory.mktemp('app')
+    previous = os.getcwd()
+    os.chdir(workdir)
+    os.environ['EVALUATION_EXECUTOR'] = 'worker'
+    os.environ.setdefault('LOG_LEVEL', 'ERROR')
+    try:
+        import app
+        yield app
+    finally:
+        os.chdir(previous)
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""复用历史结果中的模型答案：只能复用自己的结果（管理员除外）"""
+
+import uuid
+
+import pandas as pd
+import pytest
+
+
+@pytest.fixture
+def reuse_result(app_module, tmp_path):
+    db = app_module.db
+    suffix = uuid.uuid4().hex[:8]
+    owner = db.create_user(f'owner_{suffix}', 'pw')
+    other = db.create_user(f'other_{suffix}', 'pw')
+    admin = db.create_user(f'admin_{suffix}', 'pw', role='admin')
+    result_file = tmp_path / 'result.csv'
+    pd.DataFrame({'query': ['问题1', '问题2'], 'A_答案': ['答案1', '答案2']}).to_csv(
+        result_file, index=False, encoding='utf-8-sig')
+    result_id = db.save_evaluation_result('default', '复用测试', str(result_file), ['A'], str(result_file),
+                                          'subjective', created_by=owner)
+    return result_id, owner, other, admin
+
+
+def test_owner_and_admin_can_reuse_answers(app_module, reuse_result):
+    result_id, owner, _, admin = reuse_result
+    expected = {'A': {'问题1': '答案1', '问题2': '答案2'}}
+    assert app_module.load_answers_from_result(result_id, ['A'], owner) == expected
+    assert app_module.load_answers_from_result(result_id, ['A'], admin) == expected
+
+
+def test_other_users_cannot_reuse_answers(app_module, reuse_result):
+    result_id, _, other, _ = reuse_result
+    assert not app_module.user_can_access_result(app_module.db.get_result_by_id(result_id), other)
+    with pytest.raises(ValueError, match='没有权限'):
+        app_module.load_answers_from_result(result_id, ['A'], other)
+    with pytest.raises(ValueError, match='没有权限'):
+        app_module.load_answers_from_result(result_id, ['A'], 'anonymous')
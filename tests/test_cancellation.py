@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""任务控制令牌：暂停/恢复/取消唤醒等待方（包括从其他线程设置），取消时中断正在执行的协程"""
+
+import asyncio
+import threading
+
+import pytest
+
+from utils.cancellation import (
+    CANCELLED, PAUSED, RUNNING, CancellationToken, TaskCancelledError, find_task_token, get_task_token,
+    register_task_token, release_task_token, run_cancellable
+)
+
+
+def test_state_transitions():
+    token = CancellationToken('t')
+    assert token.state == RUNNING
+    assert not token.resume()  # 未暂停时恢复不生效
+    assert token.pause() and token.paused
+    assert not token.pause()
+    assert token.resume() and token.state == RUNNING
+    assert token.cancel() and token.cancelled
+    # 已取消的令牌不再改变
+    assert not token.resume() and not token.pause() and not token.cancel()
+    assert token.state == CANCELLED
+
+
+def test_resume_wakes_paused_waiter():
+    async def scenario():
+        token = CancellationToken('t', paused=True)
+        waiter = asyncio.ensure_future(token.wait_if_paused())
+        await asyncio.sleep(0.01)
+        assert not waiter.done()
+        token.resume()
+        return await asyncio.wait_for(waiter, 1)
+
+    assert asyncio.run(scenario()) is True
+
+
+def test_cancel_from_another_thread_wakes_waiter():
+    async def scenario():
+        token = CancellationToken('t', paused=True)
+        waiter = asyncio.ensure_future(token.wait_if_paused())
+        await asyncio.sleep(0.01)
+        threading.Timer(0.02, token.cancel).start()
+        return await asyncio.wait_for(waiter, 1)
+
+    assert asyncio.run(scenario()) is False
+
+
+def test_wait_changed_returns_immediately_when_state_differs():
+    async def scenario():
+        token = CancellationToken('t')
+        return await asyncio.wait_for(token.wait_changed(PAUSED), 1)
+
+    assert asyncio.run(scenario()) == RUNNING
+
+
+def test_run_cancellable_interrupts_work():
+    finished = []
+
+    async def slow_work():
+        try:
+            await asyncio.sleep(10)
+        finally:
+            finished.append('cleanup')
+
+    async def scenario():
+        token = CancellationToken('t')
+        asyncio.get_running_loop().call_later(0.02, token.cancel)
+        await asyncio.wait_for(run_cancellable(token, slow_work()), 1)
+
+    with pytest.raises(TaskCancelledError):
+        asyncio.run(scenario())
+    assert finished == ['cleanup']  # 协程收到取消后完成了清理
+
+
+def test_run_cancellable_reports_pause_and_resume():
+    states = []
+
+    async def work(token):
+        await asyncio.sleep(0.01)
+        token.pause()
+        await asyncio.sleep(0.01)
+        token.resume()
+        await asyncio.sleep(0.01)
+        return 'done'
+
+    async def scenario():
+        token = CancellationToken('t')
+        return await run_cancellable(token, work(token), states.append)
+
+    assert asyncio.run(scenario()) == 'done'
+    assert states == [PAUSED, RUNNING]
+
+
+def test_task_token_registry():
+    token = register_task_token('registry-test', paused=True)
+    assert find_task_token('registry-test') is token
+    assert get_task_token('registry-test') is token
+    release_task_token('registry-test')
+    assert find_task_token('registry-test') is None
+    # 不在本进程执行的任务得到一个独立的新令牌
+    assert get_task_token('registry-test') is not token
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""任务凭据：加密保存与读取、请求头名称归一化、返回给浏览器的任务记录不含凭据"""
+
+import uuid
+
+import pytest
+from werkzeug.datastructures import Headers
+
+from utils import credential_vault
+from utils.credential_vault import open_credentials, public_task, seal_credentials
+
+
+def test_round_trip_normalizes_header_names():
+    sealed = seal_credentials({'X-Google-Api-Key': 'g-key', 'X-HKGAI-V1-Key': 'v1-key'})
+    assert open_credentials(sealed) == {'x-google-api-key': 'g-key', 'x-hkgai-v1-key': 'v1-key'}
+
+
+def test_empty_and_invalid_values():
+    assert seal_credentials({}) is None
+    assert open_credentials(None) == {}
+    assert open_credentials('fernet:not-a-token') == {}
+    assert open_credentials('plain text') == {}
+
+
+def test_sealed_credentials_are_encrypted():
+    pytest.importorskip('cryptography')
+    sealed = seal_credentials({'X-Google-API-Key': 'secret-value'})
+    assert isinstance(sealed, str) and sealed.startswith(credential_vault.SEALED_PREFIX)
+    assert 'secret-value' not in sealed
+    assert open_credentials(sealed) == {'x-google-api-key': 'secret-value'}
+
+
+def test_public_task_strips_credentials():
+    task = {'task_id': 't1', 'metadata': {'job': {'mode': 'objective'}, 'credentials': {'x-google-api-key': 'k'}}}
+    public = public_task(task)
+    assert public['metadata'] == {'job': {'mode': 'objective'}}
+    assert 'credentials' in task['metadata']  # 不修改原记录
+    assert public_task({'task_id': 't2', 'metadata': {}}) == {'task_id': 't2', 'metadata': {}}
+    assert public_task(None) is None
+
+
+def test_request_headers_are_stored_lowercase(app_module):
+    """werkzeug 把 X-Google-API-Key 改写为 X-Google-Api-Key，评测进程仍能按小写名称读到密钥"""
+    headers = Headers([('X-Google-API-Key', 'g-key'), ('X-HKGAI-V1-Key', 'v1-key'), ('Content-Type', 'json')])
+    credentials = open_credentials(app_module.extract_credential_headers(headers))
+    assert credentials == {'x-google-api-key': 'g-key', 'x-hkgai-v1-key': 'v1-key'}
+
+
+def test_terminal_status_clears_credentials(app_module):
+    db = app_module.db
+    task_id = f'test-credentials-{uuid.uuid4().hex[:8]}'
+    db.create_running_task(task_id=task_id, task_name='t', dataset_file='d.csv', dataset_filename='d.csv',
+                           evaluation_mode='objective', selected_models=['A'], total=1, created_by='u',
+                           status='queued', metadata={'job': {}, 'credentials': seal_credentials({'X-A-Key': 'k'})})
+    assert db.get_running_task(task_id)['metadata']['credentials']
+    db.update_task_status(task_id, 'failed', error_message='预算不足')
+    assert 'credentials' not in db.get_running_task(task_id)['metadata']
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""请求对冲：耗时阈值、对冲比例上限、先成功的请求胜出，排队时间不计入阈值"""
+
+import asyncio
+import time
+
+import pytest
+
+from config import MODEL_HEDGE_MIN_DELAY, MODEL_HEDGE_MIN_SAMPLES
+from models import hedging
+from models.hedging import HedgeStats, LatencyTracker, hedged_fetch
+from models.telemetry import CallRecord
+
+THRESHOLD = 0.05
+
+
+def fake_fetch(plan):
+    """plan 为每次请求的 (排队秒数, 服务秒数, HTTP状态码)，按发出顺序使用"""
+    attempts = []
+    cancelled = []
+
+    async def fetch(call: CallRecord):
+        queue_seconds, service_seconds, status = plan[len(attempts)]
+        attempts.append(call)
+        try:
+            await asyncio.sleep(queue_seconds)
+            call._request_started_at = time.monotonic()
+            if call.request_started is not None:
+                call.request_started.set()
+            await asyncio.sleep(service_seconds)
+        except asyncio.CancelledError:
+            cancelled.append(len(attempts))
+            raise
+        call.http_status = status
+        return f'answer-{len(attempts)}' if status == 200 else '请求失败'
+
+    return fetch, attempts, cancelled
+
+
+@pytest.fixture
+def fixed_threshold(monkeypatch):
+    monkeypatch.setattr(hedging.answer_latency, 'threshold', lambda model_name: THRESHOLD)
+
+
+def run(fetch, stats):
+    return asyncio.run(hedged_fetch(fetch, 'model', 0, stats))
+
+
+def completed_call(seconds: float, status: int = 200, queue_wait: float = 0.0) -> CallRecord:
+    call = CallRecord(0, 'model', 'answer')
+    call.http_status = status
+    call.total_time = seconds + queue_wait
+    call.queue_wait = queue_wait
+    return call
+
+
+def test_threshold_needs_samples_and_uses_percentile():
+    tracker = LatencyTracker()
+    for _ in range(MODEL_HEDGE_MIN_SAMPLES - 1):
+        tracker.record('m', completed_call(2.0))
+    assert tracker.threshold('m') is None
+    for seconds in range(1, 101):
+        tracker.record('m', completed_call(float(seconds), queue_wait=5.0))  # 排队时间不计入
+    assert 90 <= tracker.threshold('m') <= 100
+    assert tracker.threshold('unknown') is None
+
+
+def test_threshold_floor_and_failed_calls_ignored():
+    tracker = LatencyTracker()
+    for _ in range(MODEL_HEDGE_MIN_SAMPLES):
+        tracker.record('m', completed_call(0.01))
+        tracker.record('m', completed_call(60.0, status=500))
+    assert tracker.threshold('m') == MODEL_HEDGE_MIN_DELAY
+
+
+def test_hedge_ratio_is_capped():
+    stats = HedgeStats(max_ratio=0.1)
+    for _ in range(10):
+        stats.on_request('m')
+    assert stats.try_hedge('m')
+    assert not stats.try_hedge('m')
+    assert stats.to_dict()['hedged'] == 1
+
+
+def test_fast_request_is_not_hedged(fixed_threshold):
+    fetch, attempts, _ = fake_fetch([(0, 0.0, 200)])
+    stats = HedgeStats(max_ratio=1.0)
+    answer, call = run(fetch, stats)
+    assert answer == 'answer-1'
+    assert len(attempts) == 1
+    assert stats.to_dict()['hedged'] == 0
+
+
+def test_slow_request_is_hedged_and_hedge_wins(fixed_threshold):
+    fetch, attempts, cancelled = fake_fetch([(0, 1.0, 200), (0, 0.01, 200)])
+    stats = HedgeStats(max_ratio=1.0)
+    answer, call = run(fetch, stats)
+    assert answer == 'answer-2'
+    assert call is attempts[1]
+    assert cancelled == [2]  # 慢的原请求被取消
+    summary = stats.to_dict()
+    assert summary['hedged'] == 1 and summary['hedge_wins'] == 1
+
+
+def test_no_hedge_when_budget_is_used(fixed_threshold):
+    fetch, attempts, _ = fake_fetch([(0, 0.1, 200)])
+    stats = HedgeStats(max_ratio=0.0)
+    answer, _ = run(fetch, stats)
+    assert answer == 'answer-1'
+    assert len(attempts) == 1
+
+
+def test_failed_first_finisher_waits_for_other_request(fixed_threshold):
+    fetch, _, _ = fake_fetch([(0, 0.1, 500), (0, 0.2, 200)])
+    answer, call = run(fetch, HedgeStats(max_ratio=1.0))
+    assert answer == 'answer-2'
+    assert call.http_status == 200
+
+
+def test_queue_time_does_not_count_towards_threshold(fixed_threshold):
+    fetch, attempts, _ = fake_fetch([(0.2, 0.01, 200)])
+    answer, _ = run(fetch, HedgeStats(max_ratio=1.0))
+    assert answer == 'answer-1'
+    assert len(attempts) == 1
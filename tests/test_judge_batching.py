@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""批量评测：批大小自适应、结果拆分，以及输出不完整时只拆分重试缺失的题目"""
+
+import asyncio
+import json
+import re
+
+from utils.eval_prompt import CompiledEvalPrompt
+from utils.judge_batching import (
+    INITIAL_TOKENS_PER_MODEL, AdaptiveBatchSizer, batch_key, build_batch_eval_prompt, split_batch_results
+)
+
+MODELS = ['HKGAI-V1', 'HKGAI-V2']
+
+
+def make_item(index: int, answers=None, judge_answers=None):
+    item = {'index': index, 'query': f'问题{index}', 'question_type': '常识', 'standard_answer': f'答案{index}',
+            'answers': answers or {name: f'{name} 的回答{index}' for name in MODELS}}
+    if judge_answers is not None:
+        item['judge_answers'] = judge_answers
+    return item
+
+
+def model_result(score='4'):
+    return {'评分': score, '准确性': '正确', '理由': '回答正确'}
+
+
+def test_sizer_initial_size_follows_output_budget():
+    sizer = AdaptiveBatchSizer(4096, 2, 10)
+    assert sizer.size == int(4096 * 0.6 // (INITIAL_TOKENS_PER_MODEL * 2))
+    assert AdaptiveBatchSizer(100000, 2, 10).size == 10
+    assert AdaptiveBatchSizer(100, 5, 10).size == 1
+
+
+def test_sizer_shrinks_on_incomplete_and_grows_on_short_output():
+    sizer = AdaptiveBatchSizer(4096, 2, 10)
+    initial = sizer.size
+    sizer.on_incomplete()
+    assert sizer.size < initial
+    for _ in range(20):
+        sizer.observe(output_chars=150, item_count=1)
+    assert sizer.size == 10
+    sizer.observe(output_chars=0, item_count=0)  # 无效的观测被忽略
+    assert sizer.size == 10
+
+
+def test_split_batch_results_separates_incomplete_items():
+    items = [make_item(i) for i in range(4)]
+    parsed = {
+        batch_key(0): {'模型1': model_result(), '模型2': model_result()},
+        batch_key(1): {'模型1': model_result()},  # 缺少模型2
+        batch_key(2): {'模型1': model_result(), '模型2': model_result('')},  # 评分为空
+    }
+    completed, missing = split_batch_results(parsed, items)
+    assert [item['index'] for item, _ in completed] == [0]
+    assert [item['index'] for item in missing] == [1, 2, 3]
+    assert split_batch_results([], items) == ([], items)
+
+
+def test_batch_prompt_uses_truncated_answers():
+    item = make_item(0, judge_answers={name: '截断后的回答' for name in MODELS})
+    prompt = build_batch_eval_prompt('评分标准', [item, make_item(1)], 'objective')
+    assert '截断后的回答' in prompt
+    assert 'HKGAI-V1 的回答0' not in prompt
+    assert 'HKGAI-V1 的回答1' in prompt
+    assert '### 题目 Q1' in prompt and '### 题目 Q2' in prompt
+
+
+def test_oversized_batch_is_split_and_retried(app_module, monkeypatch, tmp_path):
+    """评测模型每次最多返回2道题的结果：缺失的题目拆成两半重试，全部题目最终都有评分"""
+    calls = []
+
+    async def fake_query(prompt, *args, **kwargs):
+        keys = re.findall(r'### 题目 (Q\d+)', prompt)
+        calls.append(len(keys))
+        if not keys:
+            return json.dumps({'模型1': model_result(), '模型2': model_result()}, ensure_ascii=False)
+        # 输出在第2道题之后被截断
+        return json.dumps({key: {'模型1': model_result(), '模型2': model_result('3')} for key in keys[:2]},
+                          ensure_ascii=False)
+
+    monkeypatch.setattr(app_module, 'query_gemini_model', fake_query)
+    data = [{'query': f'问题{i}', 'type': '常识', 'answer': f'答案{i}'} for i in range(6)]
+    model_results = {name: [f'{name} 的回答{i}' for i in range(6)] for name in MODELS}
+    template = CompiledEvalPrompt('objective', '评分标准', 'default', len(MODELS))
+    output_file = str(tmp_path / 'batch.csv')
+
+    asyncio.run(app_module.evaluate_models(
+        data, 'objective', model_results, 'test-batch-split', output_file=output_file, batch_judge=True,
+        prompt_template=template, use_judge_cache=False
+    ))
+
+    # 第一批6题只返回2题，缺失的4题拆成两批各2题
+    assert calls == [6, 2, 2]
+    rows = dict(app_module.db.iter_task_result_rows('test-batch-split'))
+    assert sorted(rows) == list(range(6))
+    assert all(row[5] in ('4', '3') and row[9] in ('4', '3') for row in rows.values())
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""评测密钥池：按剩余容量选择密钥，429/401/403 和连续5xx隔离密钥，全部隔离时等待最早恢复的密钥"""
+
+import asyncio
+import time
+
+import pytest
+
+from config import JUDGE_KEY_ERROR_THRESHOLD, JUDGE_KEY_FORBIDDEN_QUARANTINE_SECONDS, JUDGE_KEY_QUARANTINE_SECONDS
+from models.judge_keys import JudgeKeyPool, mask_key, split_config_list
+from utils.rate_limiter import AdaptiveRateLimiter
+
+
+class StaticKeyPool(JudgeKeyPool):
+    """使用固定密钥列表、进程内限流器的密钥池"""
+
+    def __init__(self, keys, endpoints=('https://a.example/v1beta/models',)):
+        super().__init__()
+        self.entries = [(key, endpoints[i % len(endpoints)]) for i, key in enumerate(keys)]
+
+    def _load_entries(self):
+        return self.entries
+
+    def _create_limiter(self, key, pooled):
+        return AdaptiveRateLimiter(f'test-{key}', initial_rate=5.0, min_rate=0.5, max_rate=10.0, burst=5,
+                                   cooldown=0.0)
+
+
+def credential_for(pool, key):
+    return next(credential for credential in pool.credentials() if credential.key == key)
+
+
+def test_split_config_list_and_mask():
+    assert split_config_list('a, b\nc,,') == ['a', 'b', 'c']
+    assert split_config_list(None) == []
+    assert mask_key('AIzaSyABCDEFGHIJ') == 'AIza...GHIJ'
+    assert mask_key('short') == '***'
+
+
+def test_endpoints_are_assigned_round_robin():
+    pool = StaticKeyPool(['k1', 'k2', 'k3'], endpoints=('https://a/', 'https://b'))
+    assert [credential.endpoint for credential in pool.credentials()] == ['https://a', 'https://b', 'https://a']
+
+
+def test_throttled_key_is_quarantined_for_retry_after():
+    pool = StaticKeyPool(['k1', 'k2'])
+    credential = credential_for(pool, 'k1')
+    pool.report(credential, 429, retry_after=JUDGE_KEY_QUARANTINE_SECONDS + 60)
+    assert not credential.is_available()
+    assert credential.quarantined_until - time.time() > JUDGE_KEY_QUARANTINE_SECONDS + 50
+    assert credential.limiter.rate == pytest.approx(2.5)
+    # 其余请求全部分配给未隔离的密钥
+    assert {pool.select()[0].key for _ in range(20)} == {'k2'}
+
+
+def test_forbidden_key_is_quarantined_longer():
+    pool = StaticKeyPool(['k1', 'k2'])
+    credential = credential_for(pool, 'k1')
+    pool.report(credential, 403)
+    remaining = credential.quarantined_until - time.time()
+    assert remaining == pytest.approx(JUDGE_KEY_FORBIDDEN_QUARANTINE_SECONDS, abs=5)
+    assert credential.get_stats()['forbidden'] == 1
+
+
+def test_repeated_server_errors_quarantine_key():
+    pool = StaticKeyPool(['k1', 'k2'])
+    credential = credential_for(pool, 'k1')
+    for _ in range(JUDGE_KEY_ERROR_THRESHOLD - 1):
+        pool.report(credential, 503)
+    assert credential.is_available()
+    pool.report(credential, 500)
+    assert not credential.is_available()
+    assert credential.get_stats()['errors'] == JUDGE_KEY_ERROR_THRESHOLD
+
+
+def test_success_resets_consecutive_server_errors():
+    pool = StaticKeyPool(['k1', 'k2'])
+    credential = credential_for(pool, 'k1')
+    for _ in range(JUDGE_KEY_ERROR_THRESHOLD - 1):
+        pool.report(credential, 502)
+    pool.report(credential, 200)
+    for _ in range(JUDGE_KEY_ERROR_THRESHOLD - 1):
+        pool.report(credential, 502)
+    assert credential.is_available()
+
+
+def test_single_key_is_never_quarantined():
+    pool = StaticKeyPool(['only'])
+    credential = credential_for(pool, 'only')
+    pool.report(credential, 429)
+    for _ in range(JUDGE_KEY_ERROR_THRESHOLD):
+        pool.report(credential, 500)
+    assert credential.is_available()
+
+
+def test_all_quarantined_waits_for_earliest_recovery():
+    pool = StaticKeyPool(['k1', 'k2'])
+    pool.report(credential_for(pool, 'k1'), 429, retry_after=JUDGE_KEY_QUARANTINE_SECONDS + 100)
+    pool.report(credential_for(pool, 'k2'), 429, retry_after=JUDGE_KEY_QUARANTINE_SECONDS + 10)
+    credential, wait = pool.select()
+    assert credential is None
+    assert wait == pytest.approx(JUDGE_KEY_QUARANTINE_SECONDS + 10, abs=2)
+
+
+def test_selection_is_weighted_by_headroom():
+    pool = StaticKeyPool(['fast', 'slow'])
+    for _ in range(4):
+        credential_for(pool, 'slow').limiter.on_throttle()
+    picks = [pool.select()[0].key for _ in range(400)]
+    assert picks.count('fast') > picks.count('slow') * 2
+
+
+def test_acquire_counts_requests_and_uses_given_key(app_module):
+    pool = StaticKeyPool(['k1', 'k2'])
+    credential = asyncio.run(pool.acquire())
+    assert credential.key in ('k1', 'k2')
+    assert credential.get_stats()['requests'] == 1
+    # 调用方指定密钥时不经过密钥池
+    user_credential = asyncio.run(pool.acquire('user-key'))
+    assert user_credential.key == 'user-key'
+    assert user_credential not in pool.credentials()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""结构化输出评测：responseSchema 结构、一次解析校验、只对缺失或不合规的模型重试"""
+
+import asyncio
+import json
+
+from utils.eval_prompt import CompiledEvalPrompt
+from utils.judge_schema import (
+    ACCURACY_VALUES, build_batch_response_schema, build_response_schema, build_retry_prompt, load_fenced_json_object,
+    load_json_object, model_keys, validate_judge_result
+)
+
+
+def model_result(score='4', accuracy='正确'):
+    return {'评分': score, '理由': '回答正确', '准确性': accuracy}
+
+
+def test_objective_schema_requires_accuracy():
+    schema = build_response_schema('objective', model_keys(2))
+    assert schema['required'] == ['模型1', '模型2']
+    entry = schema['properties']['模型1']
+    assert entry['required'] == ['评分', '理由', '准确性']
+    assert entry['properties']['准确性']['enum'] == ACCURACY_VALUES
+
+    subjective = build_response_schema('subjective', ['模型2'])['properties']['模型2']
+    assert '准确性' not in subjective['properties']
+    assert subjective['required'] == ['评分', '理由']
+
+
+def test_batch_schema_nests_models_under_items():
+    schema = build_batch_response_schema('objective', ['Q1', 'Q2'], 3)
+    assert schema['required'] == ['Q1', 'Q2']
+    assert schema['properties']['Q2']['required'] == ['模型1', '模型2', '模型3']
+
+
+def test_validate_splits_valid_and_missing_models():
+    text = json.dumps({
+        '模型1': model_result(),
+        '模型2': model_result(accuracy='大致正确'),  # 不在枚举值中
+        '模型3': {'评分': '', '理由': 'x', '准确性': '正确'},
+    }, ensure_ascii=False)
+    valid, missing = validate_judge_result(text, 'objective', model_keys(4))
+    assert list(valid) == ['模型1']
+    assert missing == ['模型2', '模型3', '模型4']
+
+    # 主观题不要求准确性
+    valid, missing = validate_judge_result(json.dumps({'模型1': {'评分': '8', '理由': 'ok'}}), 'subjective', ['模型1'])
+    assert missing == [] and valid['模型1']['评分'] == '8'
+
+
+def test_load_json_object_does_not_repair():
+    assert load_json_object('{"a": 1}') == {'a': 1}
+    assert load_json_object('[1, 2]') == {}
+    assert load_json_object('{"a": 1,}') == {}
+    assert load_json_object(None) == {}
+    assert validate_judge_result('not json', 'objective', ['模型1']) == ({}, ['模型1'])
+
+
+def test_fenced_json_is_accepted_but_not_repaired():
+    assert load_fenced_json_object('```json\n{"a": 1}\n```') == {'a': 1}
+    assert load_fenced_json_object('```\n{"a": 1}\n```') == {'a': 1}
+    assert load_fenced_json_object('说明：```json\n{"a": 1}\n```') == {}
+    assert load_fenced_json_object('```json\n{"a": 1,}\n```') == {}
+    assert load_fenced_json_object('') == {}
+
+
+def test_retry_prompt_names_missing_models():
+    prompt = build_retry_prompt('原始提示', ['模型2', '模型3'])
+    assert prompt.startswith('原始提示')
+    assert '模型2、模型3' in prompt
+
+
+def test_structured_judge_retries_only_missing_models(app_module, monkeypatch, tmp_path):
+    requests = []
+
+    async def fake_query(prompt, *args, response_schema=None, **kwargs):
+        keys = response_schema['required']
+        requests.append(keys)
+        if len(requests) == 1:
+            # 第一次只返回模型1的合规结果
+            return json.dumps({'模型1': model_result('5')}, ensure_ascii=False)
+        return json.dumps({key: model_result('3') for key in keys}, ensure_ascii=False)
+
+    monkeypatch.setattr(app_module, 'query_gemini_model', fake_query)
+    data = [{'query': '问题', 'type': '常识', 'answer': '答案'}]
+    task_id = 'test-structured-retry'
+    asyncio.run(app_module.evaluate_models(
+        data, 'objective', {'A': ['回答A'], 'B': ['回答B']}, task_id, output_file=str(tmp_path / 'out.csv'),
+        prompt_template=CompiledEvalPrompt('objective', '评分标准', 'default', 2), structured_judge=True,
+        use_judge_cache=False
+    ))
+    assert requests == [['模型1', '模型2'], ['模型2']]
+    row = dict(app_module.db.iter_task_result_rows(task_id))[0]
+    assert row[5] == '5' and row[9] == '3'
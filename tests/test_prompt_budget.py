@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""评测提示token预算：截断后不超过预算、短回答保留全文、截断策略和输出token上限"""
+
+import pytest
+
+from utils.eval_prompt import CompiledEvalPrompt
+from utils.prompt_budget import PromptBudgeter, cut_to_tokens, judge_output_tokens, truncate_answer
+from utils.token_budget import estimate_tokens
+
+RUBRIC = "请根据回答的准确性、完整性和表达清晰度评分，1分最差，5分最好。" * 10
+QUERY = "请解释光合作用的过程，并说明其对生态系统的意义。"
+
+
+def make_budgeter(max_tokens=3000, policy='head_tail', min_answer_tokens=200, model_count=3):
+    template = CompiledEvalPrompt('objective', RUBRIC, 'default', model_count)
+    return template, PromptBudgeter(template, max_tokens, policy, min_answer_tokens)
+
+
+def long_answers():
+    return {
+        'short': '光合作用把光能转化为化学能。',
+        'cjk': '第一步，叶绿体吸收光能。' * 2000 + '结论：光合作用是生态系统能量的来源。',
+        'latin': 'Light reactions produce ATP and NADPH. ' * 3000 + 'CONCLUSION',
+    }
+
+
+@pytest.mark.parametrize('max_tokens', [2000, 3000, 8000])
+@pytest.mark.parametrize('policy', ['head_tail', 'head'])
+def test_rendered_prompt_stays_within_budget(max_tokens, policy):
+    template, budgeter = make_budgeter(max_tokens, policy)
+    fitted, truncated = budgeter.fit(QUERY, long_answers(), '生物', '光能转化为化学能')
+    prompt = template.render(QUERY, fitted, '生物', '光能转化为化学能')
+    assert estimate_tokens(prompt) <= max_tokens
+    assert set(truncated) == {'cjk', 'latin'}
+    for original, kept in truncated.values():
+        assert kept < original
+
+
+def test_short_answers_are_kept_whole_and_get_no_share():
+    _, budgeter = make_budgeter()
+    answers = long_answers()
+    fitted, truncated = budgeter.fit(QUERY, answers)
+    assert fitted['short'] == answers['short']
+    assert 'short' not in truncated
+    # 两个长回答平分剩余空间
+    assert truncated['cjk'][1] == truncated['latin'][1]
+
+
+def test_answers_within_budget_are_returned_unchanged():
+    _, budgeter = make_budgeter()
+    answers = {'a': '回答一', 'b': 'answer two'}
+    fitted, truncated = budgeter.fit(QUERY, answers)
+    assert fitted is answers
+    assert truncated == {}
+    assert budgeter.to_dict()['truncated_prompts'] == 0
+
+
+def test_head_tail_keeps_conclusion_and_marks_omission():
+    _, budgeter = make_budgeter()
+    fitted, _ = budgeter.fit(QUERY, long_answers())
+    assert fitted['cjk'].startswith('第一步')
+    assert fitted['cjk'].endswith('结论：光合作用是生态系统能量的来源。')
+    assert '中间省略约' in fitted['cjk']
+    assert fitted['latin'].endswith('CONCLUSION')
+
+
+def test_head_policy_drops_the_tail():
+    _, budgeter = make_budgeter(policy='head')
+    fitted, _ = budgeter.fit(QUERY, long_answers())
+    assert 'CONCLUSION' not in fitted['latin']
+    assert '已截断' in fitted['latin']
+
+
+def test_disabled_budgeter_never_truncates():
+    for max_tokens, policy in ((0, 'head_tail'), (1000, 'none')):
+        _, budgeter = make_budgeter(max_tokens, policy)
+        answers = long_answers()
+        fitted, truncated = budgeter.fit(QUERY, answers)
+        assert fitted is answers and truncated == {}
+        assert budgeter.to_dict()['prompts'] == 1
+
+
+def test_min_answer_tokens_is_a_floor():
+    _, budgeter = make_budgeter(max_tokens=600, min_answer_tokens=400)
+    _, truncated = budgeter.fit(QUERY, long_answers())
+    assert all(kept == 400 for _, kept in truncated.values())
+
+
+def test_stats_are_accumulated():
+    _, budgeter = make_budgeter()
+    budgeter.fit(QUERY, long_answers())
+    budgeter.fit(QUERY, {'short': '短'})
+    stats = budgeter.to_dict()
+    assert stats['prompts'] == 2
+    assert stats['truncated_prompts'] == 1
+    assert stats['truncated_answers'] == 2
+    assert stats['models'] == {'cjk': 1, 'latin': 1}
+    assert stats['tokens_removed'] > 0
+
+
+def test_unknown_policy_falls_back_to_head_tail():
+    _, budgeter = make_budgeter(policy='summarize')
+    assert budgeter.policy == 'head_tail'
+
+
+def test_cut_to_tokens():
+    assert cut_to_tokens('短文本', 100) == '短文本'
+    assert cut_to_tokens('一二三四五六', 3) == '一二三'
+    assert cut_to_tokens('一二三四五六', 3, from_end=True) == '四五六'
+    # 非中日韩字符按4个字符1个token估算
+    assert cut_to_tokens('abcdefghij', 2) == 'abcdefgh'
+    assert estimate_tokens(cut_to_tokens('混合 mixed 文本 text' * 100, 50)) <= 50
+
+
+def test_truncate_answer_stays_within_limit():
+    text = '回答内容。' * 1000
+    for policy in ('head', 'head_tail'):
+        truncated = truncate_answer(text, 300, estimate_tokens(text), policy)
+        # 标注省略的文字约占20个token
+        assert estimate_tokens(truncated) <= 300 + 30
+
+
+def test_judge_output_tokens():
+    assert judge_output_tokens(2, 4096, 512, 8192) == 5120
+    assert judge_output_tokens(20, 4096, 512, 8192) == 8192
+    assert judge_output_tokens(0, 4096, 512, 8192) == 4608
+    assert judge_output_tokens(5, 4096, 0, 8192) == 8192
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""自适应限流：AIMD 降速与恢复、Retry-After 暂停、令牌桶等待和跨进程共享速率"""
+
+import asyncio
+import sqlite3
+import time
+
+import pytest
+
+from utils.rate_limiter import AdaptiveRateLimiter
+
+
+def make_limiter(**kwargs):
+    options = dict(initial_rate=8.0, min_rate=0.5, max_rate=10.0, burst=2, cooldown=0.0)
+    options.update(kwargs)
+    return AdaptiveRateLimiter('test', **options)
+
+
+def test_throttle_halves_rate_down_to_minimum():
+    limiter = make_limiter()
+    limiter.on_throttle()
+    assert limiter.rate == pytest.approx(4.0)
+    for _ in range(10):
+        limiter.on_throttle()
+    assert limiter.rate == pytest.approx(0.5)
+    assert limiter.get_stats()['decreases'] == 11
+
+
+def test_cooldown_decreases_once_per_wave():
+    limiter = make_limiter(cooldown=60.0)
+    for _ in range(5):
+        limiter.on_throttle()
+    assert limiter.rate == pytest.approx(4.0)
+    stats = limiter.get_stats()
+    assert stats['throttled'] == 5 and stats['decreases'] == 1
+
+
+def test_success_recovers_rate_additively_up_to_maximum():
+    limiter = make_limiter(initial_rate=2.0)
+    limiter.on_throttle()
+    assert limiter.rate == pytest.approx(1.0)
+    # 每次成功增加 1/速率，按当前速率计的一轮成功请求约增加1个请求/秒
+    limiter.on_success()
+    assert limiter.rate == pytest.approx(2.0)
+    for _ in range(2):
+        limiter.on_success()
+    assert limiter.rate == pytest.approx(2.0 + 1 / 2.0 + 1 / 2.5)
+    for _ in range(200):
+        limiter.on_success()
+    assert limiter.rate == pytest.approx(10.0)
+
+
+def test_retry_after_blocks_sending():
+    limiter = make_limiter()
+    assert limiter.headroom() > 0
+    limiter.on_throttle(retry_after=30)
+    assert limiter.headroom() == 0.0
+    assert limiter.get_stats()['blocked_seconds'] > 25
+
+
+def test_acquire_waits_when_burst_is_used():
+    limiter = make_limiter(initial_rate=10.0, burst=1)
+
+    async def acquire_twice():
+        started = time.monotonic()
+        await limiter.acquire()
+        first = time.monotonic() - started
+        await limiter.acquire()
+        return first, time.monotonic() - started
+
+    first, total = asyncio.run(acquire_twice())
+    assert first < 0.05
+    assert total >= 0.08  # 第二个令牌按10个/秒补充
+    assert limiter.get_stats()['acquired'] == 2
+
+
+def test_disabled_limiter_is_a_no_op():
+    limiter = make_limiter(enabled=False)
+    limiter.on_throttle(retry_after=30)
+    assert limiter.rate == pytest.approx(8.0)
+    assert limiter.headroom() == 10.0
+    asyncio.run(limiter.acquire())
+    assert limiter.get_stats()['acquired'] == 0
+
+
+def test_backoff_delay_is_bounded():
+    limiter = make_limiter()
+    for attempt in range(8):
+        delay = limiter.backoff_delay(attempt, base=1.0, cap=5.0)
+        assert 0 <= delay <= min(5.0, 2 ** attempt)
+
+
+def test_processes_share_decrease_and_split_rate(tmp_path):
+    """多个进程共享同一个全局速率：活跃进程平分速率，一方降速另一方同步后生效"""
+    db_path = str(tmp_path / 'shared.db')
+    first = make_limiter(shared_db_path=db_path, sync_interval=0.0)
+    second = make_limiter(shared_db_path=db_path, sync_interval=0.0)
+    with sqlite3.connect(db_path) as conn:
+        # 模拟另一个最近发起过请求的进程
+        conn.execute('INSERT INTO rate_limiter_members (name, owner, last_seen) VALUES (?, ?, ?)',
+                     ('test', 'other-host:1', time.time()))
+
+    asyncio.run(first.acquire())
+    assert first.get_stats()['active_processes'] == 2
+    assert first.rate == pytest.approx(4.0)
+
+    second.on_throttle()
+    first._maybe_sync()
+    assert first.get_stats()['global_rate'] == pytest.approx(4.0)
+    assert first.rate == pytest.approx(2.0)
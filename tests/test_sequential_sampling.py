@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""序贯抽样：分层估计、Bonferroni 区间、抽题计划和停止条件"""
+
+import asyncio
+import json
+import random
+from statistics import NormalDist
+
+import pytest
+
+from utils.eval_prompt import CompiledEvalPrompt
+from utils.sequential_sampling import (
+    STOP_BUDGET, STOP_EXHAUSTED, STOP_SETTLED, SequentialSampler, StratifiedEstimate, parse_score
+)
+
+MODELS = ['A', 'B']
+
+
+def make_types(n: int):
+    """数学占50%，常识30%，写作20%，另有1道单题的层"""
+    types = ['数学' if i % 10 < 5 else '常识' if i % 10 < 8 else '写作' for i in range(n)]
+    types[7] = '罕见'
+    return types
+
+
+def make_sampler(n=1000, models=MODELS, budget=600, min_questions=50, round_size=60, seed=7):
+    return SequentialSampler(make_types(n), models, 'objective', seed, round_size, budget,
+                             min_questions, 0.95, 0.1)
+
+
+def score_row(index: int, scores):
+    """与客观题结果CSV相同的行：序号、类型、问题、标准答案，随后每个模型 答案/评分/理由/准确性"""
+    row = [index + 1, 'type', f'q{index}', 'a']
+    for score in scores:
+        row.extend(['answer', '' if score is None else str(score), 'reason', '正确'])
+    return row
+
+
+def run_rounds(sampler: SequentialSampler, score_fn):
+    """模拟评测循环，返回 (停止原因, 最后一次分析结果, 已评测题目)"""
+    rows = {}
+    while True:
+        report = sampler.analyze(rows.items())
+        reason = sampler.stop_reason(report)
+        if reason:
+            return reason, report, rows
+        selected = sampler.next_round(rows.keys())
+        if not selected:
+            return None, report, rows
+        for index in selected:
+            assert index not in rows
+            rows[index] = score_row(index, score_fn(index))
+
+
+def test_parse_score():
+    assert parse_score('4') == 4.0
+    assert parse_score(' 3.5 ') == 3.5
+    assert parse_score('') is None
+    assert parse_score('按提示词标准') is None
+    assert parse_score(float('nan')) is None
+
+
+def test_stratified_estimate_weights_strata_by_population():
+    estimate = StratifiedEstimate({'x': 90, 'y': 10})
+    for value in (1, 1, 1):
+        estimate.add('x', value)
+    for value in (5, 5, 5):
+        estimate.add('y', value)
+    result = estimate.estimate(1.96)
+    # 按总体题数加权而不是按样本数：0.9*1 + 0.1*5
+    assert result['mean'] == pytest.approx(1.4)
+    assert result['n'] == 6
+
+
+def test_stratified_estimate_census_has_zero_width():
+    """每层都全部评测时有限总体校正使区间宽度为0"""
+    estimate = StratifiedEstimate({'x': 3, 'y': 2})
+    for value in (1, 2, 3):
+        estimate.add('x', value)
+    for value in (4, 5):
+        estimate.add('y', value)
+    assert estimate.estimate(1.96)['half_width'] == 0
+
+
+def test_stratified_estimate_needs_two_samples():
+    estimate = StratifiedEstimate({'x': 10})
+    estimate.add('x', 3)
+    estimate.add('x', None)
+    assert estimate.estimate(1.96) is None
+
+
+def test_pair_intervals_use_bonferroni_correction():
+    """三个模型比较3对，差值区间按 alpha/3 计算，比单个均值的区间更宽"""
+    sampler = make_sampler(models=['A', 'B', 'C'])
+    rng = random.Random(0)
+    rows = {i: score_row(i, [rng.randint(1, 5) for _ in range(3)]) for i in range(200)}
+    report = sampler.analyze(rows.items())
+    assert len(report['pairs']) == 3
+
+    # 用同样的样本手工计算 A-B 的分层估计，检查使用的z值
+    population = sampler.population
+    diff = StratifiedEstimate(population)
+    for index, row in rows.items():
+        diff.add(sampler.types[index], float(row[5]) - float(row[9]))
+    z_pair = NormalDist().inv_cdf(1 - 0.05 / 2 / 3)
+    expected = diff.estimate(z_pair)
+    assert report['pairs'][0]['models'] == ['A', 'B']
+    assert report['pairs'][0]['half_width'] == pytest.approx(expected['half_width'], abs=1e-4)
+    unadjusted = diff.estimate(NormalDist().inv_cdf(0.975))
+    assert expected['half_width'] > unadjusted['half_width']
+
+
+def test_next_round_covers_every_stratum_without_repeats():
+    sampler = make_sampler(round_size=60)
+    first = sampler.next_round(set())
+    assert len(first) == 60
+    assert len(set(first)) == 60
+    # 单题的层也会被抽到，每层至少2题（层内不足2题时全部抽取）
+    strata = {}
+    for index in first:
+        strata[sampler.types[index]] = strata.get(sampler.types[index], 0) + 1
+    assert strata['罕见'] == 1
+    assert all(count >= 2 for stratum, count in strata.items() if stratum != '罕见')
+
+    second = sampler.next_round(set(first))
+    assert len(second) == 60
+    assert not set(first) & set(second)
+
+
+def test_next_round_is_deterministic_for_seed():
+    assert make_sampler(seed=3).next_round(set()) == make_sampler(seed=3).next_round(set())
+    assert make_sampler(seed=3).next_round(set()) != make_sampler(seed=4).next_round(set())
+
+
+def test_stops_early_when_models_are_clearly_separated():
+    """A 比 B 高1分以上时，达到最少题数后即可确定排序"""
+    sampler = make_sampler(budget=600, min_questions=50)
+    rng = random.Random(1)
+
+    def scores(index):
+        return [min(5, max(1, round(4 + rng.gauss(0, 0.5)))), min(5, max(1, round(2 + rng.gauss(0, 0.5))))]
+
+    reason, report, rows = run_rounds(sampler, scores)
+    assert reason == STOP_SETTLED
+    assert report['judged'] == len(rows)
+    assert report['judged'] < 600
+    assert report['judged'] >= 50
+    assert all(pair['separated'] for pair in report['pairs'])
+    assert report['pairs'][0]['ci'][0] > 0
+
+
+def test_does_not_stop_before_min_questions():
+    sampler = make_sampler(budget=600, min_questions=200, round_size=60)
+    reason, report, _ = run_rounds(sampler, lambda index: [5, 1])
+    assert reason == STOP_SETTLED
+    assert report['judged'] >= 200
+
+
+def test_stops_at_budget_when_models_are_equal():
+    """两个模型分数分布相同时区间一直包含0，达到题数上限停止"""
+    sampler = make_sampler(budget=300, min_questions=50)
+    rng = random.Random(2)
+    reason, report, rows = run_rounds(sampler, lambda index: [rng.randint(1, 5), rng.randint(1, 5)])
+    assert reason == STOP_BUDGET
+    assert report['judged'] == 300
+    assert len(rows) == 300
+
+
+def test_stops_when_population_is_exhausted():
+    sampler = make_sampler(n=40, budget=0, min_questions=1000, round_size=15)
+    reason, report, rows = run_rounds(sampler, lambda index: [3, 3])
+    assert reason == STOP_EXHAUSTED
+    assert len(rows) == 40
+
+
+def test_single_model_stops_on_target_half_width():
+    sampler = make_sampler(models=['A'], budget=600, min_questions=50)
+    reason, report, _ = run_rounds(sampler, lambda index: [3])
+    assert reason == STOP_SETTLED
+    assert report['models']['A']['half_width'] <= 0.1
+
+
+def test_missing_scores_are_ignored():
+    sampler = make_sampler()
+    rows = {i: score_row(i, [4, None if i % 2 else 2]) for i in range(100)}
+    report = sampler.analyze(rows.items())
+    assert report['models']['A']['n'] == 100
+    assert report['models']['B']['n'] == 50
+    assert report['pairs'][0]['n'] == 50
+
+
+def test_sampling_rounds_only_write_the_journal(app_module, monkeypatch, tmp_path):
+    """每轮评测只追加结果日志，CSV由调用方在全部轮次结束后生成一次"""
+    async def fake_query(prompt, *args, **kwargs):
+        return json.dumps({'模型1': {'评分': '4', '准确性': '正确', '理由': 'ok'}}, ensure_ascii=False)
+
+    monkeypatch.setattr(app_module, 'query_gemini_model', fake_query)
+    data = [{'query': f'问题{i}', 'type': '常识', 'answer': f'答案{i}'} for i in range(6)]
+    output_file = tmp_path / 'rounds.csv'
+    task_id = 'test-sampling-rounds'
+    template = CompiledEvalPrompt('objective', '评分标准', 'default', 1)
+    for round_indices in ([0, 2], [4, 5]):
+        asyncio.run(app_module.evaluate_models(data, 'objective', {'A': [f'回答{i}' for i in range(6)]}, task_id,
+                                               output_file=str(output_file), indices=round_indices,
+                                               prompt_template=template, use_judge_cache=False))
+    assert not output_file.exists()
+    assert app_module.db.get_task_result_indices(task_id) == {0, 2, 4, 5}
+    written = app_module.write_result_csv_from_journal(task_id, str(output_file),
+                                                       app_module.build_result_headers(['A'], 'objective'))
+    assert written == 4
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""流式响应读取：SSE帧跨数据块拆分、结束事件后关闭连接、答案长度上限和非SSE错误内容"""
+
+import asyncio
+import json
+
+from config import MODEL_MAX_ANSWER_CHARS
+from models.stream_reader import get_max_answer_chars, read_sse_answer, stream_stats
+
+
+class FakeContent:
+    def __init__(self, chunks, response):
+        self.chunks = chunks
+        self.response = response
+
+    async def iter_any(self):
+        for chunk in self.chunks:
+            if self.response.closed:
+                return
+            self.response.chunks_read += 1
+            yield chunk
+
+
+class FakeResponse:
+    """按给定的字节块返回响应体的 aiohttp 响应替身"""
+
+    def __init__(self, chunks):
+        self.closed = False
+        self.chunks_read = 0
+        self.content = FakeContent(chunks, self)
+
+    def close(self):
+        self.closed = True
+
+
+def sse_body(pieces, finish=True, line_end='\n'):
+    frames = [f"event: message{line_end}data: {json.dumps({'content': piece}, ensure_ascii=False)}{line_end}{line_end}"
+              for piece in pieces]
+    if finish:
+        frames.append(f"event: done{line_end}data: {{}}{line_end}{line_end}")
+    return ''.join(frames).encode('utf-8')
+
+
+def split_every(data: bytes, size: int):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def read(chunks, **kwargs):
+    response = FakeResponse(chunks)
+    options = dict(content_event='message', extract=lambda payload: payload['content'], finish_event='done')
+    options.update(kwargs)
+    return response, asyncio.run(read_sse_answer(response, 'test-model', **options))
+
+
+def test_frames_split_across_chunks_and_characters():
+    body = sse_body(['光合作用', '把光能', '转化为化学能'], line_end='\r\n')
+    # 每3字节一块：事件行、\r\n 和多字节的中文字符都会被拆开
+    response, result = read(split_every(body, 3))
+    assert result.content == '光合作用把光能转化为化学能'
+    assert result.finished
+    # 收到结束事件后不再读取最后的空行
+    assert len(body) - 3 < result.bytes_read <= len(body)
+    assert result.first_token_seconds is not None
+    assert response.closed
+
+
+def test_finish_event_stops_reading():
+    body = sse_body(['答案'])
+    trailing = sse_body(['不应读取'], finish=False)
+    response, result = read([body, trailing, trailing])
+    assert result.content == '答案'
+    assert response.chunks_read == 1
+
+
+def test_answer_is_truncated_at_max_chars():
+    body = sse_body(['一二三四五', '六七八九十', '不应读取'], finish=False)
+    response, result = read(split_every(body, 7), max_chars=7)
+    assert result.content == '一二三四五六七'
+    assert result.truncated and not result.finished
+    assert response.closed
+
+
+def test_last_line_without_newline_is_read():
+    body = b'event: message\ndata: {"content": "end"}'
+    response, result = read([body])
+    assert result.content == 'end'
+    assert not result.finished
+    assert not response.closed  # 正常读完，连接可以复用
+
+
+def test_non_sse_body_is_kept_as_preamble():
+    error_body = json.dumps({'code': 401, 'message': 'invalid token'}).encode('utf-8')
+    _, result = read(split_every(error_body, 5))
+    assert result.content == ''
+    assert '"code": 401' in result.preamble
+
+
+def test_malformed_frames_are_skipped():
+    body = (b'event: message\ndata: {not json}\n\n'
+            b'event: message\ndata: {"other": 1}\n\n'
+            b'event: ping\ndata: {"content": "ignored"}\n\n') + sse_body(['ok'])
+    _, result = read([body])
+    assert result.content == 'ok'
+
+
+def test_stream_stats_are_recorded():
+    read([sse_body(['a'])], max_chars=None)
+    stats = stream_stats.get_stats()['test-model']
+    assert stats['requests'] >= 1
+    assert stats['finished'] >= 1
+
+
+def test_max_answer_chars_from_model_config():
+    assert get_max_answer_chars({'max_answer_chars': 500}) == 500
+    assert get_max_answer_chars({'max_answer_chars': -1}) == 0
+    assert get_max_answer_chars({'max_answer_chars': 'x'}) == MODEL_MAX_ANSWER_CHARS
+    assert get_max_answer_chars({}) == MODEL_MAX_ANSWER_CHARS
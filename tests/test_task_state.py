@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""任务状态存储：多个worker通过共享后端读写状态、只同步有变化的状态、过期与清理"""
+
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from utils import task_state
+from utils.task_state import (
+    MemoryTaskStateBackend, SQLiteTaskStateBackend, TaskStateBackend, TaskStateStore, TaskStatus,
+    create_task_state_store
+)
+
+
+class RecordingBackend(MemoryTaskStateBackend):
+    """记录每次批量写入的任务"""
+
+    def __init__(self):
+        super().__init__()
+        self.saved = []
+
+    def save_many(self, states):
+        self.saved.append([state['task_id'] for state in states])
+        super().save_many(states)
+
+
+def make_status(task_id: str, status: str = '运行中', progress: int = 0) -> TaskStatus:
+    item = TaskStatus(task_id)
+    item.status = status
+    item.progress = progress
+    item.total = 10
+    return item
+
+
+def test_incomplete_backend_cannot_be_created():
+    class PartialBackend(TaskStateBackend):
+        def save_many(self, states):
+            pass
+
+    with pytest.raises(TypeError):
+        PartialBackend()
+
+
+def test_status_round_trip():
+    item = make_status('t1', progress=3)
+    item.end_time = datetime(2026, 1, 2, 3, 4, 5)
+    restored = TaskStatus.from_dict(item.to_dict())
+    assert restored.progress == 3
+    assert restored.end_time == item.end_time
+    assert restored._dirty is False
+
+
+def test_workers_share_state_through_sqlite(tmp_path):
+    db_path = str(tmp_path / 'state.db')
+    runner = TaskStateStore(SQLiteTaskStateBackend(db_path), flush_interval=3600)
+    reader = TaskStateStore(SQLiteTaskStateBackend(db_path), flush_interval=3600)
+    runner['t1'] = make_status('t1')
+    assert 't1' not in reader  # 还未同步
+
+    runner['t1'].progress = 4
+    runner.flush()
+    assert reader['t1'].progress == 4
+    assert not reader.is_local('t1') and runner.is_local('t1')
+    assert [task_id for task_id, _ in reader.items()] == ['t1']
+
+    del runner['t1']
+    assert 't1' not in reader
+
+
+def test_flush_writes_only_changed_states():
+    backend = RecordingBackend()
+    store = TaskStateStore(backend, flush_interval=3600)
+    store['a'] = make_status('a')
+    store['b'] = make_status('b')
+    store.flush()
+    assert sorted(backend.saved[-1]) == ['a', 'b']
+
+    store['a'].progress = 1
+    store.flush()
+    assert backend.saved[-1] == ['a']
+
+    saves = len(backend.saved)
+    store.flush()  # 没有变化且未到心跳时间
+    assert len(backend.saved) == saves
+
+
+def test_stale_running_state_is_hidden():
+    backend = MemoryTaskStateBackend()
+    now = time.time()
+    backend.save_many([
+        {**make_status('running').to_dict(), '_updated_at': now - 3600},
+        {**make_status('queued', '排队中').to_dict(), '_updated_at': now - 3600},
+        {**make_status('done', '完成').to_dict(), '_updated_at': now - 3600},
+    ])
+    store = TaskStateStore(backend, flush_interval=3600)
+    # 运行中但长时间未刷新，视为所在进程已退出；排队中和已结束的任务不过期
+    assert 'running' not in store
+    assert 'queued' in store and 'done' in store
+
+
+def test_prune_removes_finished_tasks():
+    store = TaskStateStore(MemoryTaskStateBackend(), flush_interval=3600)
+    finished = make_status('old', '完成')
+    finished.end_time = datetime.now() - timedelta(days=2)
+    store['old'] = finished
+    store['live'] = make_status('live')
+    store.flush()
+    store.backend._states['old']['_updated_at'] = time.time() - 2 * 86400
+    assert store.prune(86400) == 1
+    assert not store.is_local('old')
+    assert store.is_local('live')
+
+
+def test_publish_notifies_listeners():
+    store = TaskStateStore(MemoryTaskStateBackend(), flush_interval=3600)
+    received = []
+    store.add_flush_listener(received.extend)
+    store.publish(make_status('queued', task_state.QUEUED_STATUS))
+    assert [state['task_id'] for state in received] == ['queued']
+    assert store['queued'].status == task_state.QUEUED_STATUS
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        create_task_state_store('redis')
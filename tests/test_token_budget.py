@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Token预算：用量估算、项目权限校验、预算检查，以及运行中预算用完时停止评测"""
+
+import asyncio
+import json
+import sqlite3
+import uuid
+from datetime import datetime
+
+import pytest
+
+from models import telemetry as telemetry_module
+from models.telemetry import CallTelemetry
+from utils.cancellation import CancellationToken, TaskCancelledError, run_cancellable
+from utils.eval_prompt import CompiledEvalPrompt
+from utils.token_budget import (
+    BudgetGuard, check_project_access, check_token_budget, estimate_tokens, get_budget_status, period_start
+)
+
+
+def unique(prefix: str) -> str:
+    return f'{prefix}-{uuid.uuid4().hex[:8]}'
+
+
+def add_usage(db, user_id: str, project_id: str, tokens: int):
+    db.add_token_usage(unique('task'), {'user_id': user_id, 'project_id': project_id},
+                       [('gemini', 'judge', 1, tokens, 0, 0)])
+
+
+def test_estimate_tokens():
+    assert estimate_tokens('') == 0
+    assert estimate_tokens('你好世界') == 4
+    assert estimate_tokens('abcdefgh') == 2
+    assert estimate_tokens('你好 abc') == 3
+
+
+def test_period_start():
+    assert period_start('month', datetime(2026, 3, 17, 8, 30)) == '2026-03-01 00:00:00'
+    assert period_start('total') is None
+
+
+def test_project_access(app_module):
+    db = app_module.db
+    owner = db.create_user(unique('owner'), 'pw')
+    member = db.create_user(unique('member'), 'pw')
+    outsider = db.create_user(unique('outsider'), 'pw')
+    admin = db.create_user(unique('admin'), 'pw', role='admin')
+    project_id = db.create_project('预算项目', created_by=owner)
+    with sqlite3.connect(db.db_path) as conn:
+        conn.execute('UPDATE projects SET settings = ? WHERE id = ?', (json.dumps({'members': [member]}), project_id))
+
+    assert check_project_access(db, outsider, 'default') == (True, '')
+    assert check_project_access(db, owner, project_id)[0]
+    assert check_project_access(db, member, project_id)[0]
+    assert check_project_access(db, admin, project_id)[0]
+    allowed, message = check_project_access(db, outsider, project_id)
+    assert not allowed and '无权使用' in message
+    allowed, message = check_project_access(db, owner, 'no-such-project')
+    assert not allowed and '不存在' in message
+    assert not check_project_access(db, owner, None)[0]
+
+    with sqlite3.connect(db.db_path) as conn:
+        conn.execute("UPDATE projects SET status = 'archived' WHERE id = ?", (project_id,))
+    assert not check_project_access(db, owner, project_id)[0]
+
+
+def test_user_and_project_budgets(app_module):
+    db = app_module.db
+    user_id, project_id = unique('user'), unique('project')
+    assert get_budget_status(db, 'user', user_id) is None
+    assert check_token_budget(db, user_id, project_id) == (True, '')
+
+    db.set_token_budget('user', user_id, 1000, 'month')
+    db.set_token_budget('project', project_id, 500, 'total')
+    add_usage(db, user_id, project_id, 400)
+    status = get_budget_status(db, 'user', user_id)
+    assert status['used'] == 400 and status['remaining'] == 600 and not status['exceeded']
+    assert check_token_budget(db, user_id, project_id)[0]
+
+    add_usage(db, unique('someone-else'), project_id, 100)
+    allowed, message = check_token_budget(db, user_id, project_id)
+    assert not allowed
+    assert f'项目 {project_id}' in message and '累计' in message
+    # 不计入该项目时只检查用户预算
+    assert check_token_budget(db, user_id)[0]
+
+
+def test_budget_guard_fires_once(app_module):
+    db = app_module.db
+    user_id = unique('user')
+    db.set_token_budget('user', user_id, 100, 'month')
+    messages = []
+    guard = BudgetGuard(db, user_id, 'default', messages.append)
+    guard.check()
+    assert messages == [] and guard.exceeded_message is None
+    add_usage(db, user_id, 'default', 150)
+    guard.check()
+    guard.check()
+    assert len(messages) == 1
+    assert guard.exceeded_message == messages[0]
+
+
+def test_exhausted_budget_stops_running_evaluation(app_module, monkeypatch, tmp_path):
+    """每次评测请求消耗1000 token、预算5000：写入用量后预算用完，取消令牌并中断剩余的评测"""
+    db = app_module.db
+    user_id, task_id = unique('user'), unique('test-budget-stop')
+    db.set_token_budget('user', user_id, 5000, 'month')
+    monkeypatch.setattr(telemetry_module, 'TELEMETRY_FLUSH_SIZE', 1)
+    calls = []
+
+    async def fake_query(prompt, *args, call=None, **kwargs):
+        calls.append(prompt)
+        await asyncio.sleep(0.02 * len(calls))  # 依次完成
+        call.http_status = 200
+        call.input_tokens, call.output_tokens = 900, 100
+        return json.dumps({'模型1': {'评分': '4', '准确性': '正确', '理由': 'ok'}}, ensure_ascii=False)
+
+    monkeypatch.setattr(app_module, 'query_gemini_model', fake_query)
+    token = CancellationToken(task_id)
+    guard = BudgetGuard(db, user_id, 'default', lambda message: token.cancel())
+    telemetry = CallTelemetry(db, task_id, {'user_id': user_id, 'project_id': 'default'}, on_usage=guard.check)
+    data = [{'query': f'问题{i}', 'type': '常识', 'answer': f'答案{i}'} for i in range(20)]
+
+    with pytest.raises(TaskCancelledError):
+        asyncio.run(run_cancellable(token, app_module.evaluate_models(
+            data, 'objective', {'A': [f'回答{i}' for i in range(20)]}, task_id,
+            output_file=str(tmp_path / 'out.csv'), telemetry=telemetry, use_judge_cache=False,
+            prompt_template=CompiledEvalPrompt('objective', '评分标准', 'default', 1)
+        )))
+
+    assert '预算已用完' in guard.exceeded_message
+    judged = db.get_task_result_indices(task_id)
+    assert 5 <= len(judged) < len(data)
+    assert db.get_token_usage_total('user', user_id) < 20 * 1000
@@ -118,6 +118,7 @@ class AdvancedAnalytics:
                 'model_comparison': self._compare_models(df),
                 'question_type_analysis': self._analyze_by_question_type(df),
                 'time_analysis': self._analyze_time_efficiency(evaluation_data),
+                'latency_analysis': self._analyze_call_latency(df, evaluation_data),
                 'recommendations': self._generate_recommendations(df)
             }
             
@@ -488,6 +489,88 @@ class AdvancedAnalytics:
         
         return time_analysis
     
+    def _latency_percentiles(self, values: pd.Series) -> Dict:
+        """计算耗时分位数（秒）"""
+        values = values.dropna()
+        if values.empty:
+            return {'p50': None, 'p95': None, 'p99': None}
+        quantiles = values.quantile([0.5, 0.95, 0.99])
+        return {
+            'p50': round(float(quantiles[0.5]), 3),
+            'p95': round(float(quantiles[0.95]), 3),
+            'p99': round(float(quantiles[0.99]), 3)
+        }
+    
+    def _analyze_call_latency(self, df: pd.DataFrame, evaluation_data: Dict = None) -> Dict:
+        """按模型和问题类型分析每次调用的延迟分位数
+        
+        evaluation_data['call_telemetry'] 为 call_telemetry 表中该结果的记录。
+        """
+        latency_analysis = {
+            'available': False,
+            'by_model': [],
+            'by_question_type': [],
+            'bottlenecks': []
+        }
+        
+        records = (evaluation_data or {}).get('call_telemetry')
+        if not records:
+            return latency_analysis
+        
+        calls = pd.DataFrame(records)
+        latency_analysis['available'] = True
+        
+        # 题目序号 -> 问题类型
+        index_column = next((col for col in df.columns if str(col).lstrip('\ufeff') == '序号'), None)
+        if '类型' in df.columns:
+            row_indices = pd.to_numeric(df[index_column], errors='coerce') - 1 if index_column else pd.Series(range(len(df)))
+            type_map = dict(zip(row_indices, df['类型'].astype(str)))
+            calls['question_type'] = calls['row_index'].map(type_map).fillna('未分类')
+        else:
+            calls['question_type'] = '未分类'
+        
+        for (call_type, model_name), group in calls.groupby(['call_type', 'model_name']):
+            errors = group['http_status'].fillna(0).astype(int) != 200
+            latency_analysis['by_model'].append({
+                'model': model_name,
+                'call_type': call_type,
+                'calls': len(group),
+                'total_time': self._latency_percentiles(group['total_time']),
+                'ttft': self._latency_percentiles(group['ttft']),
+                'queue_wait': self._latency_percentiles(group['queue_wait']),
+                'avg_connect_time': round(float(group['connect_time'].mean()), 3),
+                'avg_bytes': int(group['bytes'].mean()),
+                'retries': int(group['retries'].sum()),
+                'error_rate': round(float(errors.mean()) * 100, 2)
+            })
+        
+        for (call_type, question_type), group in calls.groupby(['call_type', 'question_type']):
+            latency_analysis['by_question_type'].append({
+                'question_type': question_type,
+                'call_type': call_type,
+                'calls': len(group),
+                'total_time': self._latency_percentiles(group['total_time'])
+            })
+        
+        # 找出拖慢评测的模型和问题类型（按p95排序）
+        for key in ('by_model', 'by_question_type'):
+            latency_analysis[key].sort(key=lambda item: item['total_time']['p95'] or 0, reverse=True)
+        
+        answer_models = [item for item in latency_analysis['by_model'] if item['call_type'] == 'answer']
+        if len(answer_models) > 1:
+            slowest = answer_models[0]
+            latency_analysis['bottlenecks'].append(
+                f"{slowest['model']} 的答案请求最慢（p95 {slowest['total_time']['p95']}秒）"
+            )
+        answer_types = [item for item in latency_analysis['by_question_type'] if item['call_type'] == 'answer']
+        if len(answer_types) > 1:
+            slowest = answer_types[0]
+            latency_analysis['bottlenecks'].append(
+                f"{slowest['question_type']} 类问题耗时最长（p95 {slowest['total_time']['p95']}秒）"
+            )
+        
+        return latency_analysis
+    
     def _generate_recommendations(self, df: pd.DataFrame) -> List[str]:
         """生成改进建议"""
         recommendations = []
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+评测任务取消/暂停令牌
+每个执行中的任务对应一个进程内令牌，状态为 运行/暂停/取消：
+评测协程在开始新题目前检查令牌（暂停时挂起等待恢复），取消时立即中断正在进行的HTTP请求。
+
+令牌可以从任意线程设置（取消接口、调度器的控制轮询线程），
+等待方所在的事件循环通过 call_soon_threadsafe 被唤醒，不需要轮询数据库。
+"""
+
+import asyncio
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+RUNNING = 'running'
+PAUSED = 'paused'
+CANCELLED = 'cancelled'
+
+
+class TaskCancelledError(Exception):
+    """评测任务已被取消"""
+
+    def __init__(self, task_id: str = None):
+        super().__init__(f"任务 {task_id} 已被取消")
+        self.task_id = task_id
+
+
+class CancellationToken:
+    """线程安全的任务控制令牌，可在任意事件循环中等待状态变化"""
+
+    def __init__(self, task_id: str = None, paused: bool = False):
+        self.task_id = task_id
+        self._state = PAUSED if paused else RUNNING
+        self._lock = threading.Lock()
+        self._waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = []
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    @property
+    def cancelled(self) -> bool:
+        return self._state == CANCELLED
+
+    @property
+    def paused(self) -> bool:
+        return self._state == PAUSED
+
+    def cancel(self) -> bool:
+        return self._set_state(CANCELLED)
+
+    def pause(self) -> bool:
+        return self._set_state(PAUSED, only_from=RUNNING)
+
+    def resume(self) -> bool:
+        return self._set_state(RUNNING, only_from=PAUSED)
+
+    def _set_state(self, state: str, only_from: str = None) -> bool:
+        """切换状态并唤醒所有等待方；已取消的令牌不再改变，返回是否发生了切换"""
+        with self._lock:
+            if self._state in (CANCELLED, state) or (only_from and self._state != only_from):
+                return False
+            self._state = state
+            waiters, self._waiters = self._waiters, []
+        for loop, event in waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                pass  # 等待方的事件循环已关闭
+        return True
+
+    async def wait_changed(self, state: str) -> str:
+        """等待状态离开 state，返回新状态"""
+        event = asyncio.Event()
+        waiter = (asyncio.get_running_loop(), event)
+        with self._lock:
+            if self._state != state:
+                return self._state
+            self._waiters.append(waiter)
+        try:
+            await event.wait()
+        finally:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+        return self._state
+
+    async def wait_if_paused(self) -> bool:
+        """暂停时挂起直到恢复或取消，返回任务是否可以继续"""
+        while self._state == PAUSED:
+            await self.wait_changed(PAUSED)
+        return self._state != CANCELLED
+
+
+async def run_cancellable(token: CancellationToken, coro,
+                          on_state_change: Optional[Callable[[str], None]] = None):
+    """运行协程，令牌被取消时立即取消协程（包括其中正在进行的HTTP请求）并抛出 TaskCancelledError
+
+    on_state_change(state) 在暂停/恢复时调用，用于更新任务状态显示。
+    """
+    work = asyncio.ensure_future(coro)
+
+    async def watch():
+        state = token.state
+        while state != CANCELLED:
+            state = await token.wait_changed(state)
+            if on_state_change is not None and state != CANCELLED:
+                try:
+                    on_state_change(state)
+                except Exception as e:
+                    logger.warning(f"⚠️ 更新任务 {token.task_id} 暂停状态失败: {e}")
+
+    watcher = asyncio.ensure_future(watch())
+    try:
+        await asyncio.wait({work, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        if not work.done():
+            work.cancel()
+            # 等待协程处理完取消（关闭连接、写回已获取的答案）
+            await asyncio.gather(work, return_exceptions=True)
+            if token.cancelled:
+                raise TaskCancelledError(token.task_id)
+        watcher.cancel()
+        await asyncio.gather(watcher, return_exceptions=True)
+    return work.result()
+
+
+# 本进程中正在执行的任务 -> 令牌
+_tokens: Dict[str, CancellationToken] = {}
+_tokens_lock = threading.Lock()
+
+
+def register_task_token(task_id: str, paused: bool = False) -> CancellationToken:
+    """为本进程开始执行的任务创建令牌"""
+    token = CancellationToken(task_id, paused=paused)
+    with _tokens_lock:
+        _tokens[task_id] = token
+    return token
+
+
+def release_task_token(task_id: str):
+    with _tokens_lock:
+        _tokens.pop(task_id, None)
+
+
+def get_task_token(task_id: str) -> CancellationToken:
+    """获取任务令牌；任务不在本进程执行时返回一个不会被设置的新令牌"""
+    token = _tokens.get(task_id)
+    return token if token is not None else CancellationToken(task_id)
+
+
+def find_task_token(task_id: str) -> Optional[CancellationToken]:
+    """任务在本进程执行时返回其令牌，否则返回None"""
+    return _tokens.get(task_id)
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+评测任务凭据的加密保存
+用户在请求头中提供的模型密钥需要随任务保存到 running_tasks.metadata，供评测进程（可能是另一个进程）读取。
+安装了 cryptography 时用 Fernet 加密后保存，密钥由 TASK_CREDENTIALS_KEY（缺省为 SECRET_KEY）派生；
+未安装时明文保存并输出一次警告。任务结束（完成/失败/取消）后凭据会从元数据中删除。
+请求头名称统一保存为小写（werkzeug 会把 X-Google-API-Key 改写为 X-Google-Api-Key），读取时也按小写查找。
+"""
+
+import base64
+import hashlib
+import json
+from typing import Dict, Optional
+from config import TASK_CREDENTIALS_KEY
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+try:
+    from cryptography.fernet import Fernet, InvalidToken
+except ImportError:  # 可选依赖 [security]
+    Fernet = None
+    InvalidToken = ValueError
+
+# 加密后的凭据以该前缀标记，便于与旧版本保存的明文凭据区分
+SEALED_PREFIX = 'fernet:'
+
+_fernet = None
+_warned = False
+
+
+def _get_fernet():
+    global _fernet
+    if _fernet is None and Fernet is not None:
+        key = base64.urlsafe_b64encode(hashlib.sha256(TASK_CREDENTIALS_KEY.encode('utf-8')).digest())
+        _fernet = Fernet(key)
+    return _fernet
+
+
+def normalize_credentials(credentials: Dict[str, str]) -> Dict[str, str]:
+    """请求头名称转为小写"""
+    return {key.lower(): value for key, value in credentials.items()}
+
+
+def seal_credentials(credentials: Dict[str, str]):
+    """加密凭据，返回可保存到任务元数据的值（没有凭据时返回None）"""
+    global _warned
+    if not credentials:
+        return None
+    credentials = normalize_credentials(credentials)
+    fernet = _get_fernet()
+    if fernet is None:
+        if not _warned:
+            _warned = True
+            logger.warning("⚠️ 未安装 cryptography，任务凭据将以明文保存到数据库（pip install cryptography）")
+        return credentials
+    token = fernet.encrypt(json.dumps(credentials).encode('utf-8'))
+    return SEALED_PREFIX + token.decode('ascii')
+
+
+def open_credentials(value) -> Dict[str, str]:
+    """解密任务元数据中的凭据（请求头名称为小写），无法解密时返回空字典"""
+    if not value:
+        return {}
+    if isinstance(value, dict):
+        return normalize_credentials(value)
+    fernet = _get_fernet()
+    if fernet is None or not str(value).startswith(SEALED_PREFIX):
+        logger.warning("⚠️ 任务凭据无法解密（未安装 cryptography 或格式不正确），按未提供凭据处理")
+        return {}
+    try:
+        return normalize_credentials(json.loads(fernet.decrypt(value[len(SEALED_PREFIX):].encode('ascii'))))
+    except (InvalidToken, ValueError):
+        logger.warning("⚠️ 任务凭据解密失败（TASK_CREDENTIALS_KEY 可能已更换），按未提供凭据处理")
+        return {}
+
+
+def public_task(task: Optional[Dict]) -> Optional[Dict]:
+    """返回给浏览器的任务记录：去掉元数据中的凭据"""
+    if not task or not isinstance(task.get('metadata'), dict) or 'credentials' not in task['metadata']:
+        return task
+    metadata = {key: value for key, value in task['metadata'].items() if key != 'credentials'}
+    return dict(task, metadata=metadata)
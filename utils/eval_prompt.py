@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+评测提示模板
+每次评测开始时把评分标准和输出格式要求编译为不可变的模板对象，
+每道题只需填入问题和模型回答，不再逐题查询数据库和重复生成格式示例。
+模板版本号(version)由模板全文计算，随评测结果一起保存，便于缓存和复现。
+"""
+
+import hashlib
+import json
+from typing import Dict
+
+# 主观题：评测要求 + 输出格式（{score_instruction}/{score_validation}/{json_example} 编译时填入）
+SUBJECTIVE_FOOTER = """
+=== 评测要求 ===
+1. {score_instruction}
+2. 提供详细的评分理由
+3. 确保评分客观公正，基于事实和逻辑
+
+=== 关键输出格式要求 ===
+❗重要：必须严格按照JSON格式输出，不得包含任何解释文字❗
+
+✅ 正确格式示例：
+{json_example}
+
+❌ 错误格式：
+- 不要添加"以下是评测结果："等前缀
+- 不要使用markdown代码块```json```
+- 不要在JSON前后添加任何说明文字
+- 不要使用不标准的引号或符号
+
+⚠️ 格式检查清单：
+1. 输出必须以 {{ 开始，以 }} 结束
+2. 所有字符串必须用双引号包围
+3. {score_validation}
+4. 理由字段不能为空
+5. JSON结构必须完整且有效
+
+请现在输出评测结果的JSON：
+"""
+
+# 客观题：评测要求 + 输出格式
+OBJECTIVE_FOOTER = """
+=== 评测要求 ===
+1. {score_instruction}
+2. 重点评估内容的准确性、完整性和语言本地化程度  
+3. 提供详细的评分依据和理由
+4. 客观公正，基于事实判断
+
+=== 关键输出格式要求 ===
+❗重要：必须严格按照JSON格式输出，不得包含任何解释文字❗
+
+✅ 正确格式示例：
+{json_example}
+
+❌ 错误格式：
+- 不要添加"以下是评测结果："等前缀
+- 不要使用markdown代码块```json```
+- 不要在JSON前后添加任何说明文字
+- 不要使用不标准的引号或符号
+
+⚠️ 格式检查清单：
+1. 输出必须以 {{ 开始，以 }} 结束
+2. 所有字符串必须用双引号包围
+3. {score_validation}
+4. 准确性必须是"正确"、"部分正确"或"错误"之一
+5. 理由字段不能为空
+6. JSON结构必须完整且有效
+
+请现在输出评测结果的JSON：
+"""
+
+
+class CompiledEvalPrompt:
+    """编译后的评测提示模板（创建后不可修改）"""
+
+    __slots__ = ('mode', 'rubric', 'rubric_source', 'model_count', 'version', '_header', '_footer')
+
+    def __init__(self, mode: str, rubric: str, rubric_source: str, model_count: int):
+        """rubric_source: file 表示文件自定义提示词，default 表示系统默认提示词"""
+        if rubric_source == 'file':
+            score_instruction = "请严格按照上述自定义提示词中定义的评分标准进行评分"
+            score_validation = "评分必须符合自定义提示词中定义的评分标准和范围"
+        else:
+            score_instruction = "请严格按照上述提示词中定义的评分标准进行评分"
+            score_validation = "评分必须符合提示词中定义的评分标准和范围"
+
+        if mode == 'objective':
+            model_fields = {"评分": "按提示词标准", "准确性": "正确/部分正确/错误", "理由": "评分理由"}
+            footer = OBJECTIVE_FOOTER
+        else:
+            model_fields = {"评分": "按提示词标准", "理由": "评分理由"}
+            footer = SUBJECTIVE_FOOTER
+        json_example = json.dumps({f"模型{i+1}": model_fields for i in range(model_count)}, ensure_ascii=False, indent=2)
+
+        header = f"\n{rubric}\n\n=== 评测任务 ===\n"
+        footer = footer.format(score_instruction=score_instruction, score_validation=score_validation,
+                               json_example=json_example)
+        version = hashlib.sha256(f"{mode}\0{header}\0{footer}".encode('utf-8')).hexdigest()[:16]
+
+        for name, value in (('mode', mode), ('rubric', rubric), ('rubric_source', rubric_source),
+                            ('model_count', model_count), ('version', version),
+                            ('_header', header), ('_footer', footer)):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("CompiledEvalPrompt 不可修改")
+
+    def render(self, query: str, answers: Dict[str, str], question_type: str = "", standard_answer: str = "") -> str:
+        """填入一道题的问题和各模型回答"""
+        parts = [self._header]
+        if question_type:
+            parts.append(f"问题类型: {question_type}\n")
+        parts.append(f"问题: {query}\n")
+        if self.mode == 'objective':
+            parts.append(f"标准答案: {standard_answer}\n")
+        parts.append("\n=== 模型回答 ===\n")
+        for i, (model_name, answer) in enumerate(answers.items(), 1):
+            parts.append(f"模型{i}({model_name})回答: {answer}\n\n")
+        parts.append("\n")
+        parts.append(self._footer)
+        return "".join(parts)
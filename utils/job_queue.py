@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+评测任务队列调度
+任务以 status='queued' 保存在 running_tasks 表中，评测worker按全局/单用户并发上限、
+优先级和公平调度规则领取执行；执行中的任务定期刷新心跳，进程退出后由其他worker重新领取。
+
+取消任务只需删除数据库记录（或把状态改为 cancelled），暂停任务设置 paused_at；
+执行任务的进程按 control_poll_interval 读取这些控制状态并设置任务令牌，因此请求可以落在任意 Web worker 上。
+请求恰好落在执行任务的进程时直接设置令牌，不必等待下一次轮询。
+"""
+
+import os
+import socket
+import threading
+import time
+from typing import Callable, Dict
+
+from utils.cancellation import find_task_token, register_task_token, release_task_token
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def is_task_cancelled(task_id: str) -> bool:
+    """检查本进程执行的任务是否已被取消"""
+    token = find_task_token(task_id)
+    return token is not None and token.cancelled
+
+
+def signal_task(task_id: str, action: str) -> bool:
+    """任务在本进程执行时立即设置其令牌（cancel/pause/resume），返回是否在本进程执行"""
+    token = find_task_token(task_id)
+    if token is None:
+        return False
+    getattr(token, action)()
+    return True
+
+
+class EvaluationScheduler:
+    """从数据库队列领取评测任务并在本进程的线程中执行"""
+
+    def __init__(self, db, runner: Callable[[Dict], None], slots: int = 1,
+                 global_limit: int = 4, per_user_limit: int = 1, heartbeat_timeout: int = 60,
+                 poll_interval: float = 2.0, control_poll_interval: float = 1.0, worker_id: str = None):
+        self.db = db
+        self.runner = runner
+        self.slots = slots
+        self.global_limit = global_limit
+        self.per_user_limit = per_user_limit
+        self.heartbeat_timeout = heartbeat_timeout
+        self.heartbeat_interval = max(1.0, heartbeat_timeout / 6)
+        self.poll_interval = poll_interval
+        self.control_poll_interval = min(control_poll_interval, self.heartbeat_interval)
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self._active: Dict[str, threading.Thread] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._threads = []
+
+    def start(self):
+        """启动调度线程和心跳线程"""
+        for target, name in ((self._dispatch_loop, 'evaluation-dispatcher'),
+                             (self._heartbeat_loop, 'evaluation-heartbeat')):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"📋 评测调度已启动: {self.worker_id}，并发任务数: {self.slots}，"
+                    f"全局上限: {self.global_limit}，单用户上限: {self.per_user_limit}")
+
+    def run_forever(self):
+        """阻塞运行（独立worker进程使用）"""
+        self.start()
+        try:
+            while not self._stopped.wait(1):
+                pass
+        except KeyboardInterrupt:
+            self.stop()
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+
+    def wake(self):
+        """有新任务入队时立即尝试领取"""
+        self._wakeup.set()
+
+    def active_count(self) -> int:
+        with self._lock:
+            return len(self._active)
+
+    def _dispatch_loop(self):
+        last_requeue = 0
+        while not self._stopped.is_set():
+            try:
+                if time.time() - last_requeue >= self.heartbeat_interval:
+                    requeued = self.db.requeue_stale_tasks(self.heartbeat_timeout)
+                    if requeued:
+                        logger.info(f"♻️ {requeued} 个任务的执行进程已退出，重新放回队列")
+                    last_requeue = time.time()
+
+                task = self.db.claim_next_task(self.worker_id, self.global_limit,
+                                               self.per_user_limit, self.heartbeat_timeout) \
+                    if self.active_count() < self.slots else None
+                if task:
+                    self._start_task(task)
+                    continue
+            except Exception as e:
+                logger.warning(f"⚠️ 评测调度出错: {e}")
+
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    def _start_task(self, task: Dict):
+        task_id = task['task_id']
+        # 暂停中被重新排队的任务领取后保持暂停
+        register_task_token(task_id, paused=bool(task.get('paused_at')))
+        thread = threading.Thread(target=self._run_task, args=(task,), name=f"evaluation-{task_id}", daemon=True)
+        with self._lock:
+            self._active[task_id] = thread
+        logger.info(f"▶️ [{self.worker_id}] 领取任务 {task_id}（用户: {task.get('created_by')}，优先级: {task.get('priority') or 0}）")
+        thread.start()
+
+    def _run_task(self, task: Dict):
+        task_id = task['task_id']
+        try:
+            self.runner(task)
+        except Exception as e:
+            logger.error(f"❌ 执行任务 {task_id} 失败: {e}")
+        finally:
+            with self._lock:
+                self._active.pop(task_id, None)
+            release_task_token(task_id)
+            # 释放名额后立即领取下一个任务
+            self._wakeup.set()
+
+    def _heartbeat_loop(self):
+        """按 control_poll_interval 读取取消/暂停请求，按 heartbeat_interval 刷新心跳"""
+        last_heartbeat = time.time()
+        while not self._stopped.wait(self.control_poll_interval):
+            with self._lock:
+                task_ids = list(self._active.keys())
+            if not task_ids:
+                continue
+            if time.time() - last_heartbeat >= self.heartbeat_interval:
+                statuses = self.db.heartbeat_tasks(self.worker_id, task_ids)
+                controls = {task_id: (status, None) for task_id, status in statuses.items()}
+                last_heartbeat = time.time()
+            else:
+                controls = self.db.get_task_controls(task_ids)
+            for task_id in task_ids:
+                self._apply_control(task_id, *controls.get(task_id, (None, None)))
+
+    def _apply_control(self, task_id: str, status: str, paused: bool):
+        """把数据库中的控制状态同步到任务令牌（paused 为 None 时不改变暂停状态）"""
+        token = find_task_token(task_id)
+        if token is None or token.cancelled:
+            return
+        if status in (None, 'cancelled'):
+            logger.info(f"🛑 任务 {task_id} 已被取消，停止评测")
+            token.cancel()
+        elif paused and token.pause():
+            logger.info(f"⏸️ 任务 {task_id} 已暂停")
+        elif paused is False and token.resume():
+            logger.info(f"▶️ 任务 {task_id} 已恢复")
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量评测
+把多道题打包进一次Gemini请求：评分标准只出现一次，每道题的结果按题目编号返回。
+每批题数按输出token上限自适应调整，返回不完整时只拆分重试缺失的题目。
+"""
+
+import json
+import threading
+from typing import Any, Dict, List, Tuple
+
+# 估算输出token时每个token对应的字符数（中文评测理由约1.5~2个字符/token，取保守值）
+CHARS_PER_TOKEN = 1.5
+# 每道题每个模型的初始输出token估计（评分+准确性+理由）
+INITIAL_TOKENS_PER_MODEL = 200
+# 流水线模式下凑批的最长等待时间(秒)，超时后不足一批的题目也立即发送
+JUDGE_BATCH_WAIT_SECONDS = 2.0
+
+
+class AdaptiveBatchSizer:
+    """根据实际输出长度估算每批可容纳的题数"""
+
+    def __init__(self, max_output_tokens: int, model_count: int, max_size: int, safety: float = 0.6):
+        self.max_output_tokens = max_output_tokens
+        self.max_size = max_size
+        self.safety = safety
+        self._tokens_per_item = float(INITIAL_TOKENS_PER_MODEL * max(1, model_count))
+        self._lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        """当前每批题数"""
+        with self._lock:
+            budget = self.max_output_tokens * self.safety
+            return max(1, min(self.max_size, int(budget // self._tokens_per_item)))
+
+    def observe(self, output_chars: int, item_count: int):
+        """记录一批完整返回的输出长度（指数移动平均）"""
+        if item_count <= 0 or output_chars <= 0:
+            return
+        observed = output_chars / CHARS_PER_TOKEN / item_count
+        with self._lock:
+            self._tokens_per_item = 0.7 * self._tokens_per_item + 0.3 * observed
+
+    def on_incomplete(self):
+        """返回被截断或缺题时调大单题估计，缩小之后的批次"""
+        with self._lock:
+            self._tokens_per_item *= 1.5
+
+
+def batch_key(index: int) -> str:
+    """题目在批量结果中的编号"""
+    return f"Q{index + 1}"
+
+
+def build_batch_eval_prompt(rubric: str, items: List[Dict], mode: str) -> str:
+    """构建批量评测提示：评分标准一次，随后逐题列出问题和各模型回答（有 judge_answers 时使用截断后的回答）"""
+    model_names = list(items[0]['answers'].keys())
+    model_fields = {"评分": "按提示词标准", "理由": "评分理由"}
+    if mode == 'objective':
+        model_fields = {"评分": "按提示词标准", "准确性": "正确/部分正确/错误", "理由": "评分理由"}
+    example = {
+        batch_key(items[0]['index']): {f"模型{j}": model_fields for j in range(1, len(model_names) + 1)}
+    }
+
+    sections = []
+    for item in items:
+        lines = [f"### 题目 {batch_key(item['index'])}"]
+        if item.get('question_type'):
+            lines.append(f"问题类型: {item['question_type']}")
+        lines.append(f"问题: {item['query']}")
+        if mode == 'objective':
+            lines.append(f"标准答案: {item['standard_answer']}")
+        for j, (model_name, answer) in enumerate((item.get('judge_answers') or item['answers']).items(), 1):
+            lines.append(f"模型{j}({model_name})回答: {answer}")
+        sections.append("\n".join(lines))
+
+    keys = "、".join(batch_key(item['index']) for item in items)
+    accuracy_rule = '\n5. 准确性必须是"正确"、"部分正确"或"错误"之一' if mode == 'objective' else ''
+    return f"""
+{rubric}
+
+=== 批量评测任务 ===
+以下共 {len(items)} 道题，请按上述评分标准逐题独立评测，题目之间互不影响。
+
+{chr(10).join(sections)}
+
+=== 关键输出格式要求 ===
+❗重要：只输出一个JSON对象，不得包含任何解释文字❗
+顶层键为题目编号（{keys}），每道题下按"模型1"、"模型2"……给出评测结果。
+
+✅ 正确格式示例（只展示一道题）：
+{json.dumps(example, ensure_ascii=False, indent=2)}
+
+⚠️ 格式检查清单：
+1. 必须包含全部 {len(items)} 道题的题目编号
+2. 每道题必须包含全部 {len(model_names)} 个模型
+3. 所有字符串必须用双引号包围
+4. 理由字段不能为空{accuracy_rule}
+
+请现在输出评测结果的JSON：
+"""
+
+
+def split_batch_results(parsed: Dict[str, Any], items: List[Dict]) -> Tuple[List[Tuple[Dict, Dict]], List[Dict]]:
+    """拆分批量结果，返回 (完整的 [(题目, 该题结果)], 缺失或不完整的题目)"""
+    completed, missing = [], []
+    for item in items:
+        result = parsed.get(batch_key(item['index'])) if isinstance(parsed, dict) else None
+        model_count = len(item['answers'])
+        if isinstance(result, dict) and all(
+            isinstance(result.get(f"模型{j}"), dict) and result[f"模型{j}"].get("评分") not in (None, "")
+            for j in range(1, model_count + 1)
+        ):
+            completed.append((item, result))
+        else:
+            missing.append(item)
+    return completed, missing
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+结构化输出评测
+请求Gemini时附带 responseMimeType=application/json 和按模型数量、评测模式生成的 responseSchema，
+返回内容直接 json.loads 一次即可校验，不再经过 parse_json_str 的多轮修复；
+个别模型的结果缺失或不合规时，只针对这些模型重新请求。
+"""
+
+import json
+from typing import Any, Dict, List, Tuple
+
+ACCURACY_VALUES = ["正确", "部分正确", "错误"]
+
+
+def model_keys(model_count: int) -> List[str]:
+    return [f"模型{j}" for j in range(1, model_count + 1)]
+
+
+def _model_result_schema(mode: str) -> Dict[str, Any]:
+    properties = {
+        "评分": {"type": "STRING", "description": "按评分标准给出的评分"},
+        "理由": {"type": "STRING", "description": "评分理由"}
+    }
+    required = ["评分", "理由"]
+    if mode == 'objective':
+        properties["准确性"] = {"type": "STRING", "enum": ACCURACY_VALUES}
+        required.append("准确性")
+    return {"type": "OBJECT", "properties": properties, "required": required, "propertyOrdering": required}
+
+
+def build_response_schema(mode: str, keys: List[str]) -> Dict[str, Any]:
+    """单题评测的 responseSchema：顶层为 keys 中的各模型（如 模型1、模型2）"""
+    return {
+        "type": "OBJECT",
+        "properties": {key: _model_result_schema(mode) for key in keys},
+        "required": list(keys),
+        "propertyOrdering": list(keys)
+    }
+
+
+def build_batch_response_schema(mode: str, item_keys: List[str], model_count: int) -> Dict[str, Any]:
+    """批量评测的 responseSchema：顶层为题目编号，每道题下为各模型的结果"""
+    item_schema = build_response_schema(mode, model_keys(model_count))
+    return {
+        "type": "OBJECT",
+        "properties": {key: item_schema for key in item_keys},
+        "required": list(item_keys),
+        "propertyOrdering": list(item_keys)
+    }
+
+
+def is_valid_model_result(entry: Any, mode: str) -> bool:
+    if not isinstance(entry, dict):
+        return False
+    if entry.get("评分") in (None, "") or not isinstance(entry.get("理由"), str):
+        return False
+    return mode != 'objective' or entry.get("准确性") in ACCURACY_VALUES
+
+
+def load_json_object(text: str) -> Dict[str, Any]:
+    """结构化输出只解析一次，解析失败或不是JSON对象时返回空字典"""
+    try:
+        parsed = json.loads(text)
+    except (json.JSONDecodeError, TypeError):
+        return {}
+    return parsed if isinstance(parsed, dict) else {}
+
+
+def load_fenced_json_object(text: str) -> Dict[str, Any]:
+    """同 load_json_object，但允许输出被 ```json 代码块包裹（不做任何格式修复）"""
+    parsed = load_json_object(text)
+    if parsed or not text:
+        return parsed
+    body = text.strip()
+    if body.startswith('```') and body.endswith('```') and body.count('```') == 2:
+        body = body[3:-3]
+        if body[:4].lower() == 'json':
+            body = body[4:]
+        return load_json_object(body)
+    return {}
+
+
+def validate_judge_result(text: str, mode: str, keys: List[str]) -> Tuple[Dict[str, Dict], List[str]]:
+    """校验单题评测输出，返回 (合规的 {模型键: 结果}, 缺失或不合规的模型键)"""
+    parsed = load_json_object(text)
+    valid, missing = {}, []
+    for key in keys:
+        if is_valid_model_result(parsed.get(key), mode):
+            valid[key] = parsed[key]
+        else:
+            missing.append(key)
+    return valid, missing
+
+
+def build_retry_prompt(prompt: str, missing_keys: List[str]) -> str:
+    """只要求重新输出缺失模型的评测结果"""
+    return (f"{prompt}\n\n上一次输出中 {'、'.join(missing_keys)} 的评测结果缺失或格式不正确。"
+            f"请只输出这些模型的评测结果，其他模型不需要重复输出。")
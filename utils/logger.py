@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+日志
+所有模块通过 get_logger(__name__) 获取logger，日志记录先放入内存队列，
+由后台线程写到标准输出（和日志文件），事件循环中的写日志调用不会被stdout阻塞。
+
+- LOG_LEVEL 为默认级别，LOG_MODULE_LEVELS 按模块覆盖，如 "models.copilot_client=WARNING,database=ERROR"
+- 队列满时丢弃新日志并计数，不阻塞调用方
+- 请求/响应体等大段内容通过 log_payload 输出：DEBUG级别、按任务抽样、超长截断
+- 评测任务中的日志自动带上当前 task_id（见 set_log_task）
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from config import (
+    LOG_LEVEL, LOG_MODULE_LEVELS, LOG_FORMAT, LOG_FILE, LOG_MAX_SIZE, LOG_BACKUP_COUNT,
+    LOG_QUEUE_SIZE, LOG_MAX_BODY_CHARS, LOG_PAYLOAD_SAMPLE_FIRST, LOG_PAYLOAD_SAMPLE_EVERY
+)
+
+# 当前协程/线程正在执行的评测任务（asyncio任务创建时自动继承）
+_current_task_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('log_task_id', default=None)
+
+# 按 (任务, logger) 统计的请求体日志次数，用于抽样（只保留最近的任务）
+MAX_SAMPLED_TASKS = 1000
+_payload_counts: 'OrderedDict[tuple, int]' = OrderedDict()
+_payload_lock = threading.Lock()
+
+_setup_lock = threading.Lock()
+_queue_handler: Optional['DroppingQueueHandler'] = None
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """非阻塞队列handler：队列满时丢弃日志并计数"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class TaskContextFilter(logging.Filter):
+    """为日志记录补充当前 task_id"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.task_id = _current_task_id.get()
+        return True
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s [%(name)s] %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        task_id = getattr(record, 'task_id', None)
+        if task_id:
+            head, _, message = text.partition('] ')
+            text = f"{head}] [{task_id}] {message}"
+        return text
+
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出一行JSON，便于日志平台按字段检索"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage()
+        }
+        task_id = getattr(record, 'task_id', None)
+        if task_id:
+            entry['task_id'] = task_id
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def parse_module_levels(spec: str) -> Dict[str, int]:
+    """解析 "模块=级别,模块=级别" 格式的按模块日志级别"""
+    levels = {}
+    for part in (spec or '').split(','):
+        name, sep, level = part.partition('=')
+        if not sep or not name.strip():
+            continue
+        value = logging.getLevelName(level.strip().upper())
+        if isinstance(value, int):
+            levels[name.strip()] = value
+        else:
+            print(f"⚠️ 忽略无效的日志级别配置: {part}")
+    return levels
+
+
+def setup_logging():
+    """初始化日志队列和输出线程（只执行一次，首次获取logger时自动调用）"""
+    global _queue_handler, _listener
+    with _setup_lock:
+        if _queue_handler is not None:
+            return
+
+        formatter = JsonFormatter() if LOG_FORMAT == 'json' else TextFormatter()
+        handlers = []
+        stream_handler = logging.StreamHandler(sys.stdout)
+        stream_handler.setFormatter(formatter)
+        handlers.append(stream_handler)
+        if LOG_FILE:
+            try:
+                os.makedirs(os.path.dirname(LOG_FILE) or '.', exist_ok=True)
+                file_handler = logging.handlers.RotatingFileHandler(
+                    LOG_FILE, maxBytes=LOG_MAX_SIZE * 1024 * 1024, backupCount=LOG_BACKUP_COUNT, encoding='utf-8'
+                )
+                file_handler.setFormatter(formatter)
+                handlers.append(file_handler)
+            except OSError as e:
+                print(f"⚠️ 无法打开日志文件 {LOG_FILE}，只输出到标准输出: {e}")
+
+        _queue_handler = DroppingQueueHandler(queue.Queue(maxsize=LOG_QUEUE_SIZE))
+        _queue_handler.addFilter(TaskContextFilter())
+        _listener = logging.handlers.QueueListener(_queue_handler.queue, *handlers, respect_handler_level=True)
+        _listener.start()
+
+        # 进程退出前写出队列中剩余的日志
+        atexit.register(_listener.stop)
+
+        root = logging.getLogger()
+        root.addHandler(_queue_handler)
+        level = logging.getLevelName(LOG_LEVEL.upper())
+        root.setLevel(level if isinstance(level, int) else logging.INFO)
+        for name, level in parse_module_levels(LOG_MODULE_LEVELS).items():
+            logging.getLogger(name).setLevel(level)
+
+
+def get_logger(name: str) -> logging.Logger:
+    setup_logging()
+    return logging.getLogger(name)
+
+
+def set_log_task(task_id: Optional[str]) -> contextvars.Token:
+    """设置当前上下文的评测任务，之后的日志带上该task_id"""
+    return _current_task_id.set(task_id)
+
+
+def truncate_body(text, limit: int = None) -> str:
+    """截断过长的日志内容，保留开头并注明总长度"""
+    text = text if isinstance(text, str) else str(text)
+    limit = LOG_MAX_BODY_CHARS if limit is None else limit
+    if limit and len(text) > limit:
+        return f"{text[:limit]}...（共 {len(text)} 字符，已截断）"
+    return text
+
+
+def should_log_payload(logger_name: str) -> bool:
+    """按任务抽样：每个任务在每个logger上前 LOG_PAYLOAD_SAMPLE_FIRST 次，之后每 LOG_PAYLOAD_SAMPLE_EVERY 次记录一次"""
+    key = (_current_task_id.get() or '', logger_name)
+    with _payload_lock:
+        count = _payload_counts.pop(key, 0) + 1
+        _payload_counts[key] = count
+        if len(_payload_counts) > MAX_SAMPLED_TASKS:
+            _payload_counts.popitem(last=False)
+    if count <= LOG_PAYLOAD_SAMPLE_FIRST:
+        return True
+    return LOG_PAYLOAD_SAMPLE_EVERY > 0 and (count - LOG_PAYLOAD_SAMPLE_FIRST) % LOG_PAYLOAD_SAMPLE_EVERY == 0
+
+
+def log_payload(logger: logging.Logger, label: str, body, limit: int = None, level: int = logging.DEBUG):
+    """记录请求/响应体（默认DEBUG级别，按任务抽样并截断）"""
+    if not logger.isEnabledFor(level) or not should_log_payload(logger.name):
+        return
+    if not isinstance(body, str):
+        body = json.dumps(body, ensure_ascii=False, default=str)
+    logger.log(level, f"{label}:\n{truncate_body(body, limit)}")
+
+
+def get_logging_stats() -> Dict:
+    return {
+        'queued': _queue_handler.queue.qsize() if _queue_handler else 0,
+        'dropped': _queue_handler.dropped if _queue_handler else 0,
+        'level': LOG_LEVEL.upper(),
+        'module_levels': {name: logging.getLevelName(level)
+                          for name, level in parse_module_levels(LOG_MODULE_LEVELS).items()}
+    }
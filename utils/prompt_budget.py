@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+评测提示的token预算
+按 评分标准+问题+标准答案 的估算token数计算留给模型回答的空间，超出时按策略截断过长的回答：
+回答较短的模型保留全文，剩余空间在较长的回答之间平均分配（每个回答至少保留 min_answer_tokens）。
+
+截断策略:
+- head_tail: 保留开头约2/3和结尾约1/3，中间标注省略（结论通常在回答末尾）
+- head: 只保留开头
+- none: 不截断
+
+截断只影响发送给评测模型的提示，结果CSV中仍保存完整回答。
+同时按模型数量估算评测输出所需的 maxOutputTokens，避免为少量模型预留过大的输出上限。
+"""
+
+import threading
+from typing import Dict, Tuple
+from .token_budget import CHARS_PER_TOKEN_LATIN, estimate_tokens, is_cjk
+
+TRUNCATION_POLICIES = ('head_tail', 'head', 'none')
+
+
+def cut_to_tokens(text: str, tokens: int, from_end: bool = False) -> str:
+    """截取开头（或结尾）估算token数不超过 tokens 的部分"""
+    if len(text) <= tokens:
+        return text
+    used, count = 0.0, 0
+    for char in (reversed(text) if from_end else text):
+        used += 1.0 if is_cjk(char) else 1.0 / CHARS_PER_TOKEN_LATIN
+        if used > tokens:
+            break
+        count += 1
+    return text[len(text) - count:] if from_end else text[:count]
+
+
+def truncate_answer(text: str, limit: int, original_tokens: int, policy: str) -> str:
+    """按策略把回答截断到约 limit 个token，并标注省略的内容"""
+    if policy == 'head':
+        return f"{cut_to_tokens(text, limit)}\n…[回答过长已截断，原文约{original_tokens}个token]"
+    head_limit = limit * 2 // 3
+    head = cut_to_tokens(text, head_limit)
+    tail = cut_to_tokens(text[len(head):], limit - head_limit, from_end=True)
+    return f"{head}\n…[回答过长，中间省略约{original_tokens - limit}个token]…\n{tail}"
+
+
+def judge_output_tokens(model_count: int, base: int, per_model: int, cap: int) -> int:
+    """按模型数量估算单题评测的 maxOutputTokens（per_model 为0时直接使用上限）"""
+    if per_model <= 0:
+        return cap
+    return min(cap, base + per_model * max(1, model_count))
+
+
+class PromptBudgeter:
+    """单次评测的回答截断器，记录截断统计"""
+
+    def __init__(self, template, max_input_tokens: int, policy: str = 'head_tail', min_answer_tokens: int = 500):
+        self.max_input_tokens = max_input_tokens
+        self.policy = policy if policy in TRUNCATION_POLICIES else 'head_tail'
+        self.min_answer_tokens = min_answer_tokens
+        # 评分标准和输出格式说明在每道题中相同，只估算一次
+        self._template_tokens = estimate_tokens(template.render("", {}))
+        self._lock = threading.Lock()
+        self.prompts = 0
+        self.truncated_prompts = 0
+        self.truncated_answers = 0
+        self.tokens_removed = 0
+        self._models: Dict[str, int] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_input_tokens > 0 and self.policy != 'none'
+
+    def fit(self, query: str, answers: Dict[str, str], question_type: str = "",
+            standard_answer: str = "") -> Tuple[Dict[str, str], Dict[str, Tuple[int, int]]]:
+        """返回 (用于评测提示的回答, {模型: (原估算token数, 保留token数)})，未截断时原样返回"""
+        with self._lock:
+            self.prompts += 1
+        if not self.enabled:
+            return answers, {}
+
+        fixed = self._template_tokens + estimate_tokens(query) + estimate_tokens(question_type) + \
+            estimate_tokens(standard_answer) + 20 * len(answers)
+        remaining = max(0, self.max_input_tokens - fixed)
+        # 每个字符最多估算为1个token，总字符数不超过空间时无需逐字估算
+        if sum(len(answer) for answer in answers.values()) <= remaining:
+            return answers, {}
+
+        sizes = {model_name: estimate_tokens(answer) for model_name, answer in answers.items()}
+        if sum(sizes.values()) <= remaining:
+            return answers, {}
+
+        fitted, truncated = dict(answers), {}
+        ordered = sorted(answers, key=sizes.get)
+        for k, model_name in enumerate(ordered):
+            share = remaining / (len(ordered) - k)
+            if sizes[model_name] <= share:
+                remaining -= sizes[model_name]
+                continue
+            limit = max(self.min_answer_tokens, int(share))
+            if sizes[model_name] <= limit:
+                remaining -= sizes[model_name]
+                continue
+            fitted[model_name] = truncate_answer(answers[model_name], limit, sizes[model_name], self.policy)
+            truncated[model_name] = (sizes[model_name], limit)
+            remaining = max(0, remaining - limit)
+
+        if truncated:
+            with self._lock:
+                self.truncated_prompts += 1
+                self.truncated_answers += len(truncated)
+                for model_name, (original, kept) in truncated.items():
+                    self.tokens_removed += original - kept
+                    self._models[model_name] = self._models.get(model_name, 0) + 1
+        return fitted, truncated
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            return {
+                'policy': self.policy,
+                'max_input_tokens': self.max_input_tokens,
+                'prompts': self.prompts,
+                'truncated_prompts': self.truncated_prompts,
+                'truncated_answers': self.truncated_answers,
+                'tokens_removed': self.tokens_removed,
+                'models': dict(self._models)
+            }
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Gemini评测请求自适应限流
+进程内所有评测任务共享一个令牌桶，按 AIMD 规则调整速率：
+请求成功时速率线性增加，遇到 429/5xx 时按比例下降，使总吞吐量贴近配额上限而不引发重试风暴。
+
+配置共享状态库后，多个进程（gunicorn worker / 评测worker）共享同一个全局速率，
+每个进程按当前活跃进程数平分。
+"""
+
+import asyncio
+import os
+import random
+import socket
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+from config import (
+    GEMINI_RATE_LIMIT_ENABLED, GEMINI_RATE_INITIAL, GEMINI_RATE_MIN, GEMINI_RATE_MAX, GEMINI_RATE_BURST,
+    TASK_STATE_BACKEND, TASK_STATE_DB_PATH
+)
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# 超过该时间没有发起请求的进程不参与平分速率
+MEMBER_ACTIVE_SECONDS = 10
+
+
+class AdaptiveRateLimiter:
+    """AIMD 自适应令牌桶，线程安全，可在任意事件循环中使用"""
+
+    def __init__(self, name: str, initial_rate: float, min_rate: float, max_rate: float, burst: int,
+                 increase: float = 1.0, decrease_factor: float = 0.5, cooldown: float = 1.0,
+                 shared_db_path: Optional[str] = None, sync_interval: float = 1.0, enabled: bool = True):
+        self.name = name
+        self.enabled = enabled
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.increase = increase  # 每秒（按当前速率计的一轮成功请求）增加的速率
+        self.decrease_factor = decrease_factor
+        self.cooldown = cooldown  # 两次降速的最小间隔，避免同一波限流响应连续降速
+        self.shared_db_path = shared_db_path
+        self.sync_interval = sync_interval
+
+        self._lock = threading.Lock()
+        self._global_rate = max(min_rate, min(initial_rate, max_rate))
+        self._members = 1
+        self._tokens = float(burst)
+        self._last_refill = time.monotonic()
+        self._blocked_until = 0.0  # time.time()，Retry-After 或降速后的全局暂停
+        self._last_decrease = 0.0
+        self._pending_increase = 0.0
+        self._last_sync = 0.0
+        self._active_since_sync = False
+        self._owner = None
+
+        self._stats = {
+            'acquired': 0,
+            'throttled': 0,
+            'successes': 0,
+            'decreases': 0,
+            'total_wait_seconds': 0.0
+        }
+
+        if shared_db_path:
+            self._init_shared_state()
+
+    # ---------- 令牌桶 ----------
+
+    @property
+    def rate(self) -> float:
+        """本进程当前允许的速率（请求/秒）"""
+        return self._global_rate / max(1, self._members)
+
+    def _reserve(self) -> float:
+        """预占一个令牌，返回需要等待的秒数（必须持有锁）"""
+        now = time.monotonic()
+        rate = self.rate
+        self._tokens = min(float(self.burst), self._tokens + (now - self._last_refill) * rate)
+        self._last_refill = now
+        self._tokens -= 1
+        wait = 0.0 if self._tokens >= 0 else -self._tokens / rate
+        return max(wait, self._blocked_until - time.time())
+
+    async def acquire(self):
+        """等待发送许可"""
+        if not self.enabled:
+            return
+        self._maybe_sync()
+        with self._lock:
+            wait = self._reserve()
+            self._stats['acquired'] += 1
+            self._active_since_sync = True
+            if wait > 0:
+                self._stats['total_wait_seconds'] += wait
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def headroom(self) -> float:
+        """1秒内无需排队即可发出的请求数估计（当前令牌 + 1秒的补充量），暂停期间为0"""
+        if not self.enabled:
+            return float(self.max_rate)
+        with self._lock:
+            if self._blocked_until > time.time():
+                return 0.0
+            rate = self.rate
+            tokens = min(float(self.burst), self._tokens + (time.monotonic() - self._last_refill) * rate)
+            return max(0.0, tokens + rate)
+
+    # ---------- AIMD ----------
+
+    def on_success(self):
+        """请求成功：线性加速"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._stats['successes'] += 1
+            step = self.increase / max(self._global_rate, 1.0)
+            self._global_rate = min(self.max_rate, self._global_rate + step)
+            self._pending_increase += step
+
+    def on_throttle(self, retry_after: Optional[float] = None):
+        """收到 429/5xx：按比例降速，并在 Retry-After 期间暂停发送"""
+        if not self.enabled:
+            return
+        now = time.time()
+        with self._lock:
+            self._stats['throttled'] += 1
+            if retry_after:
+                self._blocked_until = max(self._blocked_until, now + retry_after)
+            if now - self._last_decrease < self.cooldown:
+                return
+            self._last_decrease = now
+            self._stats['decreases'] += 1
+            self._global_rate = max(self.min_rate, self._global_rate * self.decrease_factor)
+            self._pending_increase = 0.0
+            # 清空积攒的突发令牌，降速立即生效
+            self._tokens = min(self._tokens, 0.0)
+            new_rate = self._global_rate
+        logger.warning(f"🐢 [{self.name}限流] 收到限流响应，速率降至 {new_rate:.2f} 请求/秒")
+        self._push_decrease(new_rate, retry_after)
+
+    def backoff_delay(self, attempt: int, base: float = 1.0, cap: float = 30.0) -> float:
+        """重试前的退避时间（full jitter），避免多个请求同时重试"""
+        return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+    # ---------- 跨进程共享 ----------
+
+    def _init_shared_state(self):
+        try:
+            with sqlite3.connect(self.shared_db_path, timeout=10) as conn:
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS rate_limiter_state (
+                        name TEXT PRIMARY KEY,
+                        rate REAL NOT NULL,
+                        blocked_until REAL DEFAULT 0,
+                        last_decrease REAL DEFAULT 0
+                    )
+                ''')
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS rate_limiter_members (
+                        name TEXT NOT NULL,
+                        owner TEXT NOT NULL,
+                        last_seen REAL NOT NULL,
+                        PRIMARY KEY (name, owner)
+                    )
+                ''')
+                conn.execute('''
+                    INSERT OR IGNORE INTO rate_limiter_state (name, rate) VALUES (?, ?)
+                ''', (self.name, self._global_rate))
+                conn.commit()
+        except Exception as e:
+            logger.warning(f"⚠️ [{self.name}限流] 初始化共享状态失败，改为进程内限流: {e}")
+            self.shared_db_path = None
+
+    def _maybe_sync(self):
+        """定期与共享状态同步：上报本进程的加速量和活跃状态，读取全局速率"""
+        if not self.shared_db_path or time.time() - self._last_sync < self.sync_interval:
+            return
+        with self._lock:
+            if time.time() - self._last_sync < self.sync_interval:
+                return
+            self._last_sync = time.time()
+            increase, self._pending_increase = self._pending_increase, 0.0
+            active, self._active_since_sync = self._active_since_sync, False
+
+        # gunicorn fork 后进程号变化，按当前进程重新标识
+        owner = f"{socket.gethostname()}:{os.getpid()}"
+        now = time.time()
+        try:
+            with sqlite3.connect(self.shared_db_path, timeout=5) as conn:
+                if active or self._owner != owner:
+                    conn.execute('''
+                        INSERT OR REPLACE INTO rate_limiter_members (name, owner, last_seen) VALUES (?, ?, ?)
+                    ''', (self.name, owner, now))
+                    self._owner = owner
+                if increase:
+                    conn.execute('''
+                        UPDATE rate_limiter_state SET rate = MIN(?, rate + ?) WHERE name = ?
+                    ''', (self.max_rate, increase, self.name))
+                row = conn.execute('''
+                    SELECT rate, blocked_until FROM rate_limiter_state WHERE name = ?
+                ''', (self.name,)).fetchone()
+                members = conn.execute('''
+                    SELECT COUNT(*) FROM rate_limiter_members WHERE name = ? AND last_seen >= ?
+                ''', (self.name, now - MEMBER_ACTIVE_SECONDS)).fetchone()[0]
+                conn.commit()
+        except Exception as e:
+            logger.warning(f"⚠️ [{self.name}限流] 同步共享状态失败: {e}")
+            return
+
+        if row:
+            with self._lock:
+                self._global_rate = max(self.min_rate, min(self.max_rate, row[0]))
+                self._blocked_until = max(self._blocked_until, row[1] or 0)
+                self._members = max(1, members)
+
+    def _push_decrease(self, new_rate: float, retry_after: Optional[float]):
+        """把降速同步到共享状态（冷却期内只降一次）"""
+        if not self.shared_db_path:
+            return
+        now = time.time()
+        try:
+            with sqlite3.connect(self.shared_db_path, timeout=5) as conn:
+                conn.execute('''
+                    UPDATE rate_limiter_state
+                    SET rate = MAX(?, MIN(rate * ?, ?)), last_decrease = ?
+                    WHERE name = ? AND last_decrease < ?
+                ''', (self.min_rate, self.decrease_factor, new_rate, now, self.name, now - self.cooldown))
+                if retry_after:
+                    conn.execute('''
+                        UPDATE rate_limiter_state SET blocked_until = MAX(blocked_until, ?) WHERE name = ?
+                    ''', (now + retry_after, self.name))
+                conn.commit()
+        except Exception as e:
+            logger.warning(f"⚠️ [{self.name}限流] 同步降速失败: {e}")
+
+    # ---------- 统计 ----------
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                'enabled': self.enabled,
+                'shared': bool(self.shared_db_path),
+                'global_rate': round(self._global_rate, 3),
+                'process_rate': round(self.rate, 3),
+                'active_processes': self._members,
+                'min_rate': self.min_rate,
+                'max_rate': self.max_rate,
+                'burst': self.burst,
+                'blocked_seconds': round(max(0.0, self._blocked_until - time.time()), 1),
+                'total_wait_seconds': round(self._stats['total_wait_seconds'], 2)
+            })
+        return stats
+
+
+# 创建全局实例（sqlite任务状态后端可用时跨进程共享速率）
+gemini_rate_limiter = AdaptiveRateLimiter(
+    'Gemini',
+    initial_rate=GEMINI_RATE_INITIAL,
+    min_rate=GEMINI_RATE_MIN,
+    max_rate=GEMINI_RATE_MAX,
+    burst=GEMINI_RATE_BURST,
+    shared_db_path=TASK_STATE_DB_PATH if TASK_STATE_BACKEND == 'sqlite' else None,
+    enabled=GEMINI_RATE_LIMIT_ENABLED
+)
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+序贯抽样评测
+按 type 列分层随机抽题，分轮评测；每轮结束后用分层估计计算各模型均分及两两均分差的置信区间，
+所有模型两两之间的差异区间都不含0（排序已确定）或达到题数上限时停止。
+
+- 每层按题数占比分配抽样数（每层至少2题以便估计方差），层内顺序由随机种子决定，续跑时抽样顺序不变
+- 均分差按同一道题上两个模型的分差计算（配对），比单独比较两个均分的区间更窄
+- 多对模型同时比较时按比较对数做 Bonferroni 校正；每轮都检查一次停止条件会略微提高误判率，
+  因此题数少于 SEQUENTIAL_MIN_QUESTIONS 时不判断停止
+"""
+
+import math
+import random
+from itertools import combinations
+from statistics import NormalDist
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# 停止原因
+STOP_SETTLED = 'settled'      # 排序已确定（单模型时均分区间足够窄）
+STOP_BUDGET = 'budget'        # 达到题数上限
+STOP_EXHAUSTED = 'exhausted'  # 全部题目已评测
+
+
+def parse_score(value) -> Optional[float]:
+    """解析评分单元格，空白或非数字返回None"""
+    try:
+        score = float(str(value).strip())
+    except (TypeError, ValueError):
+        return None
+    return score if math.isfinite(score) else None
+
+
+class StratifiedEstimate:
+    """按层累计样本，计算分层均值及其置信区间（含有限总体校正）"""
+
+    def __init__(self, population: Dict[str, int]):
+        self.population = population
+        self._values: Dict[str, List[float]] = {}
+
+    def add(self, stratum: str, value: Optional[float]):
+        if value is not None:
+            self._values.setdefault(stratum, []).append(value)
+
+    @property
+    def count(self) -> int:
+        return sum(len(values) for values in self._values.values())
+
+    def estimate(self, z: float) -> Optional[Dict]:
+        if self.count < 2:
+            return None
+        # 只在有样本的层之间按题数加权；单题的层用全部样本的方差代替
+        pooled = [value for values in self._values.values() for value in values]
+        pooled_mean = sum(pooled) / len(pooled)
+        pooled_var = sum((value - pooled_mean) ** 2 for value in pooled) / (len(pooled) - 1)
+        total = sum(self.population[stratum] for stratum in self._values)
+        mean = variance = 0.0
+        for stratum, values in self._values.items():
+            weight = self.population[stratum] / total
+            n = len(values)
+            stratum_mean = sum(values) / n
+            stratum_var = sum((value - stratum_mean) ** 2 for value in values) / (n - 1) if n > 1 else pooled_var
+            mean += weight * stratum_mean
+            variance += weight ** 2 * max(0.0, 1 - n / self.population[stratum]) * stratum_var / n
+        half_width = z * math.sqrt(variance)
+        return {
+            'mean': round(mean, 4),
+            'ci': [round(mean - half_width, 4), round(mean + half_width, 4)],
+            'half_width': round(half_width, 4),
+            'n': self.count
+        }
+
+
+class SequentialSampler:
+    """一次序贯抽样评测的抽题计划和停止判断"""
+
+    def __init__(self, types: List[str], model_names: List[str], mode: str, seed: int,
+                 round_size: int, budget: int, min_questions: int, confidence: float, target_half_width: float):
+        self.model_names = model_names
+        self.mode = mode
+        self.round_size = max(1, round_size)
+        self.budget = min(len(types), budget) if budget > 0 else len(types)
+        self.min_questions = min_questions
+        self.confidence = confidence
+        self.target_half_width = target_half_width
+        self.types = types
+        self.rounds = 0
+
+        rng = random.Random(seed)
+        self.strata: Dict[str, List[int]] = {}
+        for i, question_type in enumerate(types):
+            self.strata.setdefault(question_type, []).append(i)
+        for indices in self.strata.values():
+            rng.shuffle(indices)
+        self.population = {stratum: len(indices) for stratum, indices in self.strata.items()}
+
+    def next_round(self, judged: Iterable[int]) -> List[int]:
+        """返回下一轮要评测的题目序号（不含已评测的题目），达到上限时返回空列表"""
+        judged = set(judged)
+        target = min(self.budget, len(judged) + self.round_size)
+        room = max(0, target - len(judged))
+        total = len(self.types)
+        pending, takes = {}, {}
+        for stratum, indices in self.strata.items():
+            done = sum(1 for i in indices if i in judged)
+            want = min(len(indices), max(min(2, len(indices)), round(target * len(indices) / total)))
+            pending[stratum] = [i for i in indices if i not in judged]
+            takes[stratum] = min(len(pending[stratum]), max(0, want - done))
+        # 超出本轮题数时从分配最多的层减少，不足时从剩余比例最高的层补齐
+        while sum(takes.values()) > room:
+            takes[max(takes, key=takes.get)] -= 1
+        while sum(takes.values()) < room:
+            candidates = [s for s in takes if takes[s] < len(pending[s])]
+            if not candidates:
+                break
+            stratum = max(candidates, key=lambda s: (len(pending[s]) - takes[s]) / self.population[s])
+            takes[stratum] += 1
+        selected = [i for stratum, take in takes.items() for i in pending[stratum][:take]]
+        if selected:
+            self.rounds += 1
+        return sorted(selected)
+
+    def _score_columns(self) -> List[int]:
+        """评测结果行中各模型评分所在的列"""
+        base = 4 if self.mode == 'objective' else 3
+        width = 4 if self.mode == 'objective' else 3
+        return [base + j * width + 1 for j in range(len(self.model_names))]
+
+    def analyze(self, rows: Iterable[Tuple[int, List]]) -> Dict:
+        """根据已评测的结果行（题目序号, CSV行数据）计算各模型均分和两两差异的置信区间"""
+        columns = self._score_columns()
+        means = {name: StratifiedEstimate(self.population) for name in self.model_names}
+        pairs = list(combinations(range(len(self.model_names)), 2))
+        diffs = {pair: StratifiedEstimate(self.population) for pair in pairs}
+        judged = 0
+        strata_judged: Dict[str, int] = {}
+        for index, row_data in rows:
+            judged += 1
+            stratum = self.types[index]
+            strata_judged[stratum] = strata_judged.get(stratum, 0) + 1
+            scores = [parse_score(row_data[column]) if column < len(row_data) else None for column in columns]
+            for name, score in zip(self.model_names, scores):
+                means[name].add(stratum, score)
+            for a, b in pairs:
+                if scores[a] is not None and scores[b] is not None:
+                    diffs[(a, b)].add(stratum, scores[a] - scores[b])
+
+        alpha = 1 - self.confidence
+        z_mean = NormalDist().inv_cdf(1 - alpha / 2)
+        z_pair = NormalDist().inv_cdf(1 - alpha / 2 / max(1, len(pairs)))
+        report_pairs = []
+        for (a, b), estimate in diffs.items():
+            result = estimate.estimate(z_pair)
+            entry = {'models': [self.model_names[a], self.model_names[b]], 'separated': False}
+            if result:
+                entry.update(result)
+                entry['separated'] = result['ci'][0] > 0 or result['ci'][1] < 0
+            report_pairs.append(entry)
+
+        return {
+            'judged': judged,
+            'population': len(self.types),
+            'budget': self.budget,
+            'rounds': self.rounds,
+            'confidence': self.confidence,
+            'models': {name: estimate.estimate(z_mean) for name, estimate in means.items()},
+            'pairs': report_pairs,
+            'strata': {stratum: {'population': population, 'judged': strata_judged.get(stratum, 0)}
+                       for stratum, population in self.population.items()}
+        }
+
+    def stop_reason(self, report: Dict) -> Optional[str]:
+        """返回停止原因，需要继续评测时返回None"""
+        judged = report['judged']
+        if judged >= len(self.types):
+            return STOP_EXHAUSTED
+        if judged >= self.min_questions:
+            if report['pairs']:
+                if all(pair['separated'] for pair in report['pairs']):
+                    return STOP_SETTLED
+            else:
+                estimate = next(iter(report['models'].values()), None)
+                if estimate and estimate['half_width'] <= self.target_half_width:
+                    return STOP_SETTLED
+        if judged >= self.budget:
+            return STOP_BUDGET
+        return None
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+任务进度事件分发
+为 /api/tasks/<task_id>/events (SSE) 提供进度推送。
+
+每个 worker 只有一个监听线程：本进程执行的任务在状态同步时直接推送，
+其他 worker 执行的任务由监听线程按固定间隔对状态后端做一次增量查询。
+开销与订阅的客户端数量无关；同一任务的连续更新只保留最新状态（合并突发更新）。
+"""
+
+import threading
+import time
+from typing import Dict, List, Optional
+
+from utils.task_state import TaskStateStore
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# 远程任务增量查询间隔(秒)
+TASK_EVENTS_POLL_INTERVAL = 0.5
+# 增量查询的时间重叠窗口，避免并发写入时漏掉更新（重复的快照按更新时间去重）
+TASK_EVENTS_POLL_OVERLAP = 2.0
+
+
+class TaskSubscription:
+    """单个客户端的订阅，只保存该任务的最新状态快照"""
+
+    def __init__(self, task_id: str):
+        self.task_id = task_id
+        self._latest: Optional[Dict] = None
+        self._condition = threading.Condition()
+
+    def publish(self, snapshot: Dict):
+        with self._condition:
+            self._latest = snapshot
+            self._condition.notify()
+
+    def wait(self, timeout: float) -> Optional[Dict]:
+        """等待新状态，超时返回None；等待期间的多次更新合并为最后一次"""
+        with self._condition:
+            if self._latest is None:
+                self._condition.wait(timeout)
+            snapshot, self._latest = self._latest, None
+            return snapshot
+
+
+class TaskEventHub:
+    """任务进度事件中心（每个进程一个）"""
+
+    def __init__(self, store: TaskStateStore, poll_interval: float = TASK_EVENTS_POLL_INTERVAL):
+        self.store = store
+        self.poll_interval = poll_interval
+        self._subscriptions: Dict[str, List[TaskSubscription]] = {}
+        self._last_published: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._watcher: Optional[threading.Thread] = None
+        self._since = time.time()
+        store.add_flush_listener(self._publish_many)
+
+    def subscribe(self, task_id: str) -> TaskSubscription:
+        subscription = TaskSubscription(task_id)
+        with self._lock:
+            self._subscriptions.setdefault(task_id, []).append(subscription)
+            if self._watcher is None or not self._watcher.is_alive():
+                self._since = time.time()
+                self._watcher = threading.Thread(target=self._watch_loop, name='task-event-watcher', daemon=True)
+                self._watcher.start()
+        return subscription
+
+    def unsubscribe(self, subscription: TaskSubscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.task_id, [])
+            if subscription in subscriptions:
+                subscriptions.remove(subscription)
+            if not subscriptions:
+                self._subscriptions.pop(subscription.task_id, None)
+                self._last_published.pop(subscription.task_id, None)
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+    def _publish_many(self, snapshots: List[Dict]):
+        """把状态快照推送给订阅者，同一快照只推送一次"""
+        with self._lock:
+            targets = []
+            for snapshot in snapshots:
+                task_id = snapshot.get('task_id')
+                subscriptions = self._subscriptions.get(task_id)
+                if not subscriptions:
+                    continue
+                updated_at = snapshot.get('_updated_at', 0)
+                if updated_at <= self._last_published.get(task_id, 0):
+                    continue
+                self._last_published[task_id] = updated_at
+                targets.append((snapshot, list(subscriptions)))
+        for snapshot, subscriptions in targets:
+            for subscription in subscriptions:
+                subscription.publish(snapshot)
+
+    def _watch_loop(self):
+        """增量查询其他worker写入的状态，没有订阅者时退出"""
+        while True:
+            time.sleep(self.poll_interval)
+            with self._lock:
+                if not self._subscriptions:
+                    self._watcher = None
+                    return
+                since = self._since
+            try:
+                snapshots = self.store.backend.load_changed(since - TASK_EVENTS_POLL_OVERLAP)
+            except Exception as e:
+                logger.warning(f"⚠️ 读取任务进度更新失败: {e}")
+                continue
+            if snapshots:
+                self._since = max(since, max(snapshot.get('_updated_at', 0) for snapshot in snapshots))
+                self._publish_many(snapshots)
@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+任务状态存储
+gunicorn 多个 worker 之间共享评测任务的运行状态（进度、当前步骤、耗时等），
+任意 worker 都能回答任意任务的状态查询。
+
+运行任务的 worker 在内存中修改 TaskStatus，后台线程定期把有变化的状态批量写入后端，
+避免每道题同步写一次数据库；其他 worker 查询时从后端读取快照。
+"""
+
+import json
+import os
+from abc import ABC, abstractmethod
+import socket
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# 任务运行中但超过该时间没有刷新状态，视为所在进程已退出
+TASK_STATE_STALE_SECONDS = 60
+# 运行中的任务即使没有变化也定期刷新一次，作为存活心跳
+TASK_STATE_HEARTBEAT_SECONDS = 10
+# 已结束任务的状态在后端保留的时间
+TASK_STATE_RETENTION_SECONDS = 24 * 3600
+
+FINISHED_STATUSES = ('完成', '失败')
+# 排队中的任务没有执行进程刷新心跳，不做过期判断
+QUEUED_STATUS = '排队中'
+
+
+class TaskStatus:
+    """单个评测任务的运行状态，属性赋值会被记录为待同步"""
+
+    FIELDS = ('task_id', 'status', 'progress', 'total', 'current_step', 'result_file', 'error_message',
+              'evaluation_mode', 'selected_models', 'start_time', 'end_time', 'question_count',
+              'answers_fetched', 'error_count')
+
+    def __init__(self, task_id):
+        self.task_id = task_id
+        self.status = "待开始"
+        self.progress = 0
+        self.total = 0
+        self.current_step = ""
+        self.result_file = ""
+        self.error_message = ""
+        self.evaluation_mode = ""
+        self.selected_models = []
+        self.start_time = datetime.now()
+        self.end_time = None
+        self.question_count = 0
+        self.answers_fetched = 0
+        self.error_count = 0
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if name != '_dirty':
+            object.__setattr__(self, '_dirty', True)
+
+    def to_dict(self) -> Dict:
+        """序列化为可写入后端的字典"""
+        data = {field: getattr(self, field) for field in self.FIELDS}
+        for field in ('start_time', 'end_time'):
+            if isinstance(data[field], datetime):
+                data[field] = data[field].isoformat()
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'TaskStatus':
+        """从后端快照还原任务状态"""
+        status = cls(data['task_id'])
+        for field in cls.FIELDS:
+            if field in data:
+                setattr(status, field, data[field])
+        for field in ('start_time', 'end_time'):
+            value = getattr(status, field)
+            if isinstance(value, str) and value:
+                setattr(status, field, datetime.fromisoformat(value))
+        status._dirty = False
+        return status
+
+
+class TaskStateBackend(ABC):
+    """任务状态存储后端接口（缺少任一方法的后端在创建时即报错）"""
+
+    @abstractmethod
+    def save_many(self, states: List[Dict]):
+        """批量写入任务状态（每项包含task_id）"""
+
+    @abstractmethod
+    def load(self, task_id: str) -> Optional[Dict]:
+        """读取单个任务状态，不存在返回None"""
+
+    @abstractmethod
+    def load_all(self) -> Dict[str, Dict]:
+        """读取全部任务状态"""
+
+    @abstractmethod
+    def load_changed(self, since: float) -> List[Dict]:
+        """读取 since 之后有更新的任务状态"""
+
+    @abstractmethod
+    def delete(self, task_id: str):
+        """删除任务状态"""
+
+    @abstractmethod
+    def prune(self, max_age_seconds: float) -> int:
+        """删除超过保留时间的已结束任务，返回删除数量"""
+
+
+class MemoryTaskStateBackend(TaskStateBackend):
+    """进程内存后端，仅适用于单进程部署（开发环境）"""
+
+    def __init__(self):
+        self._states: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def save_many(self, states: List[Dict]):
+        with self._lock:
+            for state in states:
+                self._states[state['task_id']] = dict(state)
+
+    def load(self, task_id: str) -> Optional[Dict]:
+        with self._lock:
+            state = self._states.get(task_id)
+            return dict(state) if state else None
+
+    def load_all(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {task_id: dict(state) for task_id, state in self._states.items()}
+
+    def load_changed(self, since: float) -> List[Dict]:
+        with self._lock:
+            return [dict(state) for state in self._states.values() if state.get('_updated_at', 0) > since]
+
+    def delete(self, task_id: str):
+        with self._lock:
+            self._states.pop(task_id, None)
+
+    def prune(self, max_age_seconds: float) -> int:
+        cutoff = time.time() - max_age_seconds
+        with self._lock:
+            expired = [task_id for task_id, state in self._states.items()
+                       if state.get('status') in FINISHED_STATUSES and state.get('_updated_at', 0) < cutoff]
+            for task_id in expired:
+                del self._states[task_id]
+        return len(expired)
+
+
+class SQLiteTaskStateBackend(TaskStateBackend):
+    """SQLite后端（WAL模式），同一台机器上的多个worker进程共享"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._init_database()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def _init_database(self):
+        """初始化状态表并开启WAL，读写互不阻塞"""
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS task_state (
+                    task_id TEXT PRIMARY KEY,
+                    status TEXT,
+                    state TEXT NOT NULL,
+                    owner TEXT,
+                    updated_at REAL NOT NULL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_task_state_updated ON task_state(updated_at)')
+            conn.commit()
+
+    def save_many(self, states: List[Dict]):
+        if not states:
+            return
+        rows = [
+            (state['task_id'], state.get('status'), json.dumps(state, ensure_ascii=False),
+             state.get('_owner'), state.get('_updated_at', time.time()))
+            for state in states
+        ]
+        with self._connect() as conn:
+            conn.executemany('''
+                INSERT OR REPLACE INTO task_state (task_id, status, state, owner, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+            ''', rows)
+            conn.commit()
+
+    def load(self, task_id: str) -> Optional[Dict]:
+        with self._connect() as conn:
+            row = conn.execute('SELECT state FROM task_state WHERE task_id = ?', (task_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def load_all(self) -> Dict[str, Dict]:
+        with self._connect() as conn:
+            rows = conn.execute('SELECT task_id, state FROM task_state').fetchall()
+        return {task_id: json.loads(state) for task_id, state in rows}
+
+    def load_changed(self, since: float) -> List[Dict]:
+        with self._connect() as conn:
+            rows = conn.execute('SELECT state FROM task_state WHERE updated_at > ?', (since,)).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def delete(self, task_id: str):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM task_state WHERE task_id = ?', (task_id,))
+            conn.commit()
+
+    def prune(self, max_age_seconds: float) -> int:
+        cutoff = time.time() - max_age_seconds
+        placeholders = ','.join('?' * len(FINISHED_STATUSES))
+        with self._connect() as conn:
+            cursor = conn.execute(f'''
+                DELETE FROM task_state
+                WHERE status IN ({placeholders}) AND updated_at < ?
+            ''', (*FINISHED_STATUSES, cutoff))
+            conn.commit()
+            return cursor.rowcount
+
+
+class TaskStateStore:
+    """跨worker的任务状态存储，用法与原来的 task_status 字典一致
+
+    - 本进程创建的任务保存在内存中，直接修改属性即可，后台线程按 flush_interval 批量同步到后端；
+    - 查询本进程没有的任务时读取后端快照（只读副本），超过 TASK_STATE_STALE_SECONDS
+      未刷新的运行中任务视为所在进程已退出，按不存在处理。
+    """
+
+    def __init__(self, backend: TaskStateBackend, flush_interval: float = 0.5):
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._local: Dict[str, TaskStatus] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._last_saved: Dict[str, float] = {}
+        self._listeners: List[Callable[[List[Dict]], None]] = []
+        self._flusher: Optional[threading.Thread] = None
+        self._flusher_pid = None
+
+    # ---------- 字典接口 ----------
+
+    def __setitem__(self, task_id: str, status: TaskStatus):
+        with self._lock:
+            self._local[task_id] = status
+        status._dirty = True
+        self._ensure_flusher()
+
+    def __getitem__(self, task_id: str) -> TaskStatus:
+        status = self._local.get(task_id)
+        if status is not None:
+            return status
+        state = self._load_remote(task_id)
+        if state is None:
+            raise KeyError(task_id)
+        return TaskStatus.from_dict(state)
+
+    def __contains__(self, task_id) -> bool:
+        return task_id in self._local or self._load_remote(task_id) is not None
+
+    def __delitem__(self, task_id: str):
+        with self._lock:
+            self._local.pop(task_id, None)
+            self._last_saved.pop(task_id, None)
+        self.backend.delete(task_id)
+
+    def publish(self, status: TaskStatus):
+        """直接写入一次状态快照，不由本进程继续维护（如排队中的任务，之后由领取任务的进程接管）"""
+        snapshot = status.to_dict()
+        snapshot['_owner'] = self.owner
+        snapshot['_updated_at'] = time.time()
+        self.backend.save_many([snapshot])
+        for listener in self._listeners:
+            try:
+                listener([snapshot])
+            except Exception as e:
+                logger.warning(f"⚠️ 任务状态同步回调失败: {e}")
+
+    def get(self, task_id: str, default=None) -> Optional[TaskStatus]:
+        try:
+            return self[task_id]
+        except KeyError:
+            return default
+
+    def items(self):
+        """返回全部任务（本进程 + 其他worker）"""
+        merged = {}
+        try:
+            for task_id, state in self.backend.load_all().items():
+                if not self._is_stale(state):
+                    merged[task_id] = TaskStatus.from_dict(state)
+        except Exception as e:
+            logger.warning(f"⚠️ 读取任务状态失败: {e}")
+        with self._lock:
+            merged.update(self._local)
+        return list(merged.items())
+
+    def is_local(self, task_id: str) -> bool:
+        """任务是否由本进程执行"""
+        return task_id in self._local
+
+    # ---------- 同步 ----------
+
+    def add_flush_listener(self, listener: Callable[[List[Dict]], None]):
+        """注册同步回调，每批写入后端后以状态快照列表调用"""
+        self._listeners.append(listener)
+
+    def flush(self):
+        """把本进程中有变化的任务状态批量写入后端"""
+        with self._flush_lock:
+            now = time.time()
+            snapshots = []
+            with self._lock:
+                for task_id, status in self._local.items():
+                    heartbeat_due = (status.status not in FINISHED_STATUSES and
+                                     now - self._last_saved.get(task_id, 0) >= TASK_STATE_HEARTBEAT_SECONDS)
+                    if not getattr(status, '_dirty', True) and not heartbeat_due:
+                        continue
+                    status._dirty = False
+                    snapshot = status.to_dict()
+                    snapshot['_owner'] = self.owner
+                    snapshot['_updated_at'] = now
+                    snapshots.append(snapshot)
+                    self._last_saved[task_id] = now
+            if not snapshots:
+                return
+
+            self.backend.save_many(snapshots)
+            for listener in self._listeners:
+                try:
+                    listener(snapshots)
+                except Exception as e:
+                    logger.warning(f"⚠️ 任务状态同步回调失败: {e}")
+
+    def prune(self, max_age_seconds: float = TASK_STATE_RETENTION_SECONDS) -> int:
+        """清理已结束任务：后端删除过期记录，本进程内存中只保留未过期的任务"""
+        cutoff = datetime.now().timestamp() - max_age_seconds
+        with self._lock:
+            for task_id, status in list(self._local.items()):
+                end_time = status.end_time if isinstance(status.end_time, datetime) else None
+                if status.status in FINISHED_STATUSES and end_time and end_time.timestamp() < cutoff:
+                    del self._local[task_id]
+                    self._last_saved.pop(task_id, None)
+        return self.backend.prune(max_age_seconds)
+
+    def _ensure_flusher(self):
+        """按需启动同步线程（gunicorn fork 后在子进程中重新启动）"""
+        if self._flusher is not None and self._flusher.is_alive() and self._flusher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._flusher is not None and self._flusher.is_alive() and self._flusher_pid == os.getpid():
+                return
+            self.owner = f"{socket.gethostname()}:{os.getpid()}"
+            self._flusher_pid = os.getpid()
+            self._flusher = threading.Thread(target=self._flush_loop, name='task-state-flusher', daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning(f"⚠️ 同步任务状态失败: {e}")
+
+    def _load_remote(self, task_id: str) -> Optional[Dict]:
+        try:
+            state = self.backend.load(task_id)
+        except Exception as e:
+            logger.warning(f"⚠️ 读取任务状态失败: {e}")
+            return None
+        if state is None or self._is_stale(state):
+            return None
+        return state
+
+    @staticmethod
+    def _is_stale(state: Dict) -> bool:
+        if state.get('status') in FINISHED_STATUSES or state.get('status') == QUEUED_STATUS:
+            return False
+        return time.time() - state.get('_updated_at', 0) > TASK_STATE_STALE_SECONDS
+
+
+def create_task_state_store(backend_name: str = 'sqlite', db_path: str = 'task_state.db',
+                            flush_interval: float = 0.5) -> TaskStateStore:
+    """根据配置创建任务状态存储"""
+    if backend_name == 'memory':
+        backend = MemoryTaskStateBackend()
+    elif backend_name == 'sqlite':
+        backend = SQLiteTaskStateBackend(db_path)
+    else:
+        raise ValueError(f"不支持的任务状态后端: {backend_name}")
+    logger.info(f"🗂️ 任务状态后端: {backend_name}，同步间隔: {flush_interval}s")
+    return TaskStateStore(backend, flush_interval)
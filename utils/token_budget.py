@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Token用量估算与预算检查
+- Gemini评测请求的用量来自响应中的 usageMetadata；候选模型的流式接口不返回用量，按字符数估算
+- 预算按用户或项目设置（token_budgets 表），周期为自然月(UTC)或累计；
+  启动或续跑评测任务前检查，运行中每次写入用量后再检查一次，用量达到预算后停止评测
+- 评测计入的项目由服务端校验：default 为所有用户共享的项目，其他项目必须存在且处于 active 状态，
+  并且当前用户是项目创建者、settings.members 中的成员或管理员
+"""
+
+import math
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+BUDGET_SCOPES = ('user', 'project')
+BUDGET_PERIODS = ('month', 'total')
+DEFAULT_PROJECT_ID = 'default'
+
+# 估算token时非中日韩字符对应的字符数（中日韩字符按每字1个token计）
+CHARS_PER_TOKEN_LATIN = 4.0
+
+
+def is_cjk(char: str) -> bool:
+    """中日韩文字和全角符号"""
+    return '\u3000' <= char <= '\u9fff' or '\uac00' <= char <= '\ud7af' or '\uff00' <= char <= '\uffef'
+
+
+def estimate_tokens(text: str) -> int:
+    """按字符数粗略估算文本的token数"""
+    if not text:
+        return 0
+    cjk = sum(1 for char in text if is_cjk(char))
+    return cjk + math.ceil((len(text) - cjk) / CHARS_PER_TOKEN_LATIN)
+
+
+def period_start(period: str, now: datetime = None) -> Optional[str]:
+    """预算周期的起始时间（与 CURRENT_TIMESTAMP 相同的UTC格式），累计预算返回None"""
+    if period != 'month':
+        return None
+    now = now or datetime.utcnow()
+    return now.strftime('%Y-%m-01 00:00:00')
+
+
+def get_budget_status(db, scope: str, scope_id: str) -> Optional[Dict]:
+    """返回预算和当前周期用量，未设置预算时返回None"""
+    budget = db.get_token_budget(scope, scope_id)
+    if not budget:
+        return None
+    used = db.get_token_usage_total(scope, scope_id, period_start(budget['period']))
+    return dict(budget, used=used, remaining=max(0, budget['token_limit'] - used),
+                exceeded=used >= budget['token_limit'])
+
+
+def check_project_access(db, user_id: str, project_id: str) -> Tuple[bool, str]:
+    """检查用户能否把评测计入该项目，返回 (是否允许, 不允许时的说明)"""
+    if project_id == DEFAULT_PROJECT_ID:
+        return True, ''
+    project = db.get_project(project_id) if isinstance(project_id, str) and project_id else None
+    if not project or project.get('status', 'active') != 'active':
+        return False, f"项目 {project_id} 不存在或已停用"
+    if project.get('created_by') == user_id or user_id in (project['settings'].get('members') or []):
+        return True, ''
+    user = db.get_user_by_id(user_id)
+    if user and user.get('role') == 'admin':
+        return True, ''
+    return False, f"无权使用项目 {project_id}"
+
+
+def check_token_budget(db, user_id: str, project_id: str = None) -> Tuple[bool, str]:
+    """检查用户和项目的token预算，返回 (是否允许执行, 超出时的说明)"""
+    checks: List[Tuple[str, str]] = [('user', user_id)]
+    if project_id:
+        checks.append(('project', project_id))
+    for scope, scope_id in checks:
+        status = get_budget_status(db, scope, scope_id)
+        if status and status['exceeded']:
+            label = '用户' if scope == 'user' else '项目'
+            period = '本月' if status['period'] == 'month' else '累计'
+            return False, (f"{label} {scope_id} 的{period}Token预算已用完"
+                           f"（已用 {status['used']:,} / 预算 {status['token_limit']:,}）")
+    return True, ''
+
+
+class BudgetGuard:
+    """评测运行中的预算检查：每次写入token用量后检查，预算用完时调用一次 on_exceeded(说明)"""
+
+    def __init__(self, db, user_id: str, project_id: str, on_exceeded: Callable[[str], None]):
+        self.db = db
+        self.user_id = user_id
+        self.project_id = project_id
+        self.on_exceeded = on_exceeded
+        self.exceeded_message: Optional[str] = None
+
+    def check(self):
+        if self.exceeded_message is not None:
+            return
+        allowed, message = check_token_budget(self.db, self.user_id, self.project_id)
+        if not allowed:
+            self.exceeded_message = message
+            self.on_exceeded(message)